@@ -0,0 +1,65 @@
+<?
+// Large configuration arrays passed around by value: given to
+// functions, returned from getters and stored in objects, but hardly
+// ever modified.  Reports the time and how many of the copies had to
+// duplicate the array (hippy_array_copy_stats()).
+
+function make_config($sections, $keys) {
+    $config = array();
+    for ($i = 0; $i < $sections; $i++) {
+        $section = array();
+        for ($j = 0; $j < $keys; $j++) {
+            $section["key" . $j] = "value" . $i . "_" . $j;
+        }
+        $section["ids"] = range(0, $keys);
+        $config["section" . $i] = $section;
+    }
+    return $config;
+}
+
+class Service {
+    private $config;
+
+    function __construct($config) {
+        $this->config = $config;
+    }
+
+    function getConfig() {
+        return $this->config;
+    }
+}
+
+function lookup($config, $i) {
+    return $config["section" . ($i % 100)]["key" . ($i % 50)];
+}
+
+function with_override($config, $i) {
+    $config["section0"]["key0"] = $i;
+    return $config;
+}
+
+$config = make_config(100, 50);
+for ($run = 0; $run < 3; $run++) {
+    $start = microtime(true);
+    $services = array();
+    $found = 0;
+    for ($i = 0; $i < 100000; $i++) {
+        $service = new Service($config);
+        if ($i % 1000 == 0) {
+            $services[] = $service;
+        }
+        $found += strlen(lookup($service->getConfig(), $i));
+    }
+    $t1 = microtime(true);
+    for ($i = 0; $i < 1000; $i++) {
+        $copy = with_override($config, $i);
+    }
+    $t2 = microtime(true);
+    echo "read-only copies: " . ($t1 - $start) .
+         " modified copies: " . ($t2 - $t1) . "\n";
+}
+
+$stats = hippy_array_copy_stats();
+echo "copies: " . $stats['copies'] .
+     " materialized: " . $stats['materialized'] . "\n";
+?>
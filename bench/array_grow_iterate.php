@@ -0,0 +1,80 @@
+<?
+// Hashes with string keys that grow while they are walked: a work list
+// walked by foreach by reference, with each(), and with current()/next(),
+// which appends new entries and drops the ones it has done.  Each of them
+// should take time linear in the number of entries visited.
+
+$n = 100000;
+
+function report($name, $start, $check) {
+    echo $name . ": " . (microtime(true) - $start) . " (" . $check . ")\n";
+}
+
+$start = microtime(true);
+$work = array("job0" => 0);
+$next = 1;
+$done = 0;
+foreach ($work as $key => &$job) {
+    $done++;
+    if ($next < $n) {
+        $work["job" . $next] = $next;
+        $next++;
+    }
+    if ($next < $n && $job % 3 == 0) {
+        $work["job" . $next] = $next;
+        $next++;
+    }
+    unset($work[$key]);
+}
+unset($job);
+report("foreach by reference, growing", $start, $done);
+
+$start = microtime(true);
+$work = array("job0" => 0);
+$next = 1;
+$done = 0;
+while (list($key, $job) = each($work)) {
+    $done++;
+    if ($next < $n) {
+        $work["job" . $next] = $next;
+        $next++;
+    }
+    if ($next < $n && $job % 3 == 0) {
+        $work["job" . $next] = $next;
+        $next++;
+    }
+}
+report("each(), growing", $start, $done);
+
+$start = microtime(true);
+$work = array("job0" => 0);
+$next = 1;
+$done = 0;
+while (($key = key($work)) !== null) {
+    $job = current($work);
+    $done++;
+    if ($next < $n) {
+        $work["job" . $next] = $next;
+        $next++;
+    }
+    next($work);
+    unset($work[$key]);
+}
+report("current() and next(), growing and unsetting", $start, $done);
+
+$start = microtime(true);
+$a = array();
+for ($i = 0; $i < $n; $i++) {
+    $a["k" . $i] = $i;
+}
+$sum = 0;
+foreach ($a as $key => &$value) {
+    $sum += $value;
+    if ($value % 2 == 0) {
+        unset($a[$key]);
+        $a["again" . $key] = 1;
+    }
+}
+unset($value);
+report("foreach by reference, replacing", $start, $sum);
+?>
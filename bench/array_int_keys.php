@@ -0,0 +1,41 @@
+<?
+// Arrays with integer keys that are not a dense list: writes and reads
+// of sparse integer keys (an id map built from DB rows, say), and
+// foreach over a 1M-element sparse array.
+
+function sparse_write($n) {
+    $a = array();
+    for ($i = 0; $i < $n; $i++) {
+        $a[$i * 7 + 1000000] = $i;
+    }
+    return $a;
+}
+
+function sparse_read($a, $n) {
+    $total = 0;
+    for ($i = 0; $i < $n; $i++) {
+        $total += $a[$i * 7 + 1000000];
+    }
+    return $total;
+}
+
+function sparse_foreach($a) {
+    $total = 0;
+    foreach ($a as $k => $v) {
+        $total += $k - $v;
+    }
+    return $total;
+}
+
+for ($i = 0; $i < 3; $i++) {
+    $start = microtime(true);
+    $a = sparse_write(1000000);
+    $t1 = microtime(true);
+    sparse_read($a, 1000000);
+    $t2 = microtime(true);
+    sparse_foreach($a);
+    $t3 = microtime(true);
+    echo "write: " . ($t1 - $start) . " read: " . ($t2 - $t1) .
+         " foreach: " . ($t3 - $t2) . "\n";
+}
+?>
@@ -0,0 +1,76 @@
+<?
+// Queue workloads on arrays of 100k elements: array_shift() on a list
+// and on a hash with string keys, a breadth-first walk that pushes and
+// shifts, and a cache that evicts its oldest entries with unset() while
+// walking it with the internal pointer.  Each of them should take time
+// linear in the number of operations: testing the queue in the loop
+// condition or counting it does not make the next shift or unset copy
+// it.
+
+$n = 100000;
+
+function report($name, $start, $check) {
+    echo $name . ": " . (microtime(true) - $start) . " (" . $check . ")\n";
+}
+
+$start = microtime(true);
+$q = array();
+for ($i = 0; $i < $n; $i++) {
+    $q[] = $i;
+}
+$sum = 0;
+while ($q) {
+    $sum += array_shift($q);
+}
+report("list fill then shift", $start, $sum);
+
+$start = microtime(true);
+$q = array();
+for ($i = 0; $i < $n; $i++) {
+    $q["job" . $i] = $i;
+}
+$sum = 0;
+while ($q) {
+    $sum += array_shift($q);
+}
+report("hash fill then shift", $start, $sum);
+
+$start = microtime(true);
+$q = array(0);
+$seen = 0;
+while ($q) {
+    $node = array_shift($q);
+    $seen++;
+    if (2 * $node + 2 < $n) {
+        $q[] = 2 * $node + 1;
+        $q[] = 2 * $node + 2;
+    }
+}
+report("breadth-first push and shift", $start, $seen);
+
+$start = microtime(true);
+$cache = array();
+$evicted = 0;
+for ($i = 0; $i < $n; $i++) {
+    $cache["key" . $i] = $i;
+    if (count($cache) > 1000) {
+        reset($cache);
+        unset($cache[key($cache)]);
+        $evicted++;
+    }
+}
+report("cache evicting the oldest entry", $start, $evicted);
+
+$start = microtime(true);
+$a = array();
+for ($i = 0; $i < $n; $i++) {
+    $a["k" . $i] = $i;
+}
+$sum = 0;
+while (($k = key($a)) !== null) {
+    $sum += current($a);
+    next($a);
+    unset($a[$k]);
+}
+report("walk and unset behind the pointer", $start, $sum);
+?>
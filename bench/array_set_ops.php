@@ -0,0 +1,34 @@
+<?
+// Scaling of the array_diff / array_intersect family: two lists of ids
+// of n elements that overlap by half, for n from 1k to 1M.  With a
+// hash set of the other array's values the time grows linearly in n.
+
+function ids($start, $n) {
+    $ids = array();
+    for ($i = 0; $i < $n; $i++) {
+        $ids[] = "id" . ($start + $i);
+    }
+    return $ids;
+}
+
+function time_it($name, $f, $a, $b) {
+    $start = microtime(true);
+    $result = $f($a, $b);
+    $t = microtime(true) - $start;
+    echo "  " . $name . ": " . $t . " (" . count($result) . ")\n";
+}
+
+foreach (array(1000, 10000, 100000, 1000000) as $n) {
+    $a = ids(0, $n);
+    $b = ids($n / 2, $n);
+    $ka = array_flip($a);
+    $kb = array_flip($b);
+    echo "n = " . $n . "\n";
+    time_it("array_diff", 'array_diff', $a, $b);
+    time_it("array_intersect", 'array_intersect', $a, $b);
+    time_it("array_diff_assoc", 'array_diff_assoc', $a, $b);
+    time_it("array_intersect_assoc", 'array_intersect_assoc', $a, $b);
+    time_it("array_diff_key", 'array_diff_key', $ka, $kb);
+    time_it("array_intersect_key", 'array_intersect_key', $ka, $kb);
+}
+?>
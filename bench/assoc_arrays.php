@@ -0,0 +1,65 @@
+<?
+// Associative arrays with literal string keys: building records, reading
+// and updating their fields, and a lookup table indexed by literals, next
+// to the same work with keys built at run time:
+//   php assoc_arrays.php [<n>]
+
+$n = isset($argv[1]) ? (int)$argv[1] : 1000000;
+
+function report($name, $start, $check) {
+    echo $name . ": " . (microtime(true) - $start) . " (" . $check . ")\n";
+}
+
+$start = microtime(true);
+$rows = array();
+for ($i = 0; $i < 1000; $i++) {
+    $rows[] = array("id" => $i, "name" => "user" . $i, "visits" => 0,
+                    "score" => 0.0, "active" => $i % 3 != 0);
+}
+$total = 0;
+for ($i = 0; $i < $n; $i++) {
+    $row = &$rows[$i % 1000];
+    if ($row["active"]) {
+        $row["visits"] += 1;
+        $row["score"] += $row["id"] * 0.5;
+    }
+    $total += $row["visits"];
+    unset($row);
+}
+report("record fields", $start, $total);
+
+$start = microtime(true);
+$config = array("host" => "localhost", "port" => 8080, "debug" => false,
+                "timeout" => 30, "retries" => 3, "user" => "www");
+$total = 0;
+for ($i = 0; $i < $n; $i++) {
+    if (isset($config["debug"]) && $config["debug"]) {
+        $total -= 1;
+    }
+    $total += $config["port"] + $config["timeout"] * $config["retries"];
+}
+report("literal lookups", $start, $total);
+
+$start = microtime(true);
+$keys = array("host", "port", "debug", "timeout", "retries", "user");
+$total = 0;
+for ($i = 0; $i < $n; $i++) {
+    $key = $keys[$i % 6] . "";
+    if (isset($config[$key])) {
+        $total += 1;
+    }
+}
+report("computed key lookups", $start, $total);
+
+$start = microtime(true);
+$counts = array();
+for ($i = 0; $i < $n; $i++) {
+    $word = "w" . ($i % 5000);
+    if (isset($counts[$word])) {
+        $counts[$word]++;
+    } else {
+        $counts[$word] = 1;
+    }
+}
+report("word counts", $start, count($counts));
+?>
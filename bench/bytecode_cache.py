@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+""" ./bytecode_cache.py [-i <hippy binary>] [-n <files>] [-r <runs>]
+
+Generates a large include tree and compares the start time of hippy
+without the on-disk bytecode cache, with a cold cache and with a warm
+cache (see 'hippy.bytecode_cache_dir' in hippy.ini).
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import optparse
+import subprocess
+
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+CLASS_TEMPLATE = """<?php
+/** Generated class number %(n)d */
+class Generated%(n)d {
+    const LIMIT = %(n)d;
+    public $items = array('a' => 1, 'b' => 2.5, 'c' => "text %(n)d");
+    protected static $instances = 0;
+
+    function __construct($x = null, $y = array()) {
+        self::$instances++;
+        $this->items['x'] = $x;
+    }
+
+    function compute($a, $b = self::LIMIT) {
+        $total = 0;
+        for ($i = 0; $i < $b; $i++) {
+            if ($i %% 3 == 0) {
+                $total += $a * $i;
+            } elseif ($i %% 3 == 1) {
+                $total -= $i;
+            } else {
+                $total .= "";
+            }
+        }
+        return $total;
+    }
+
+    function describe() {
+        return sprintf("%%s(%%d): %%s", get_class($this), self::LIMIT,
+                       implode(",", array_keys($this->items)));
+    }
+}
+
+function generated_helper_%(n)d($a, $b = 2) {
+    static $calls = 0;
+    $calls++;
+    return $a * $b + $calls;
+}
+"""
+
+
+def generate_tree(root, count):
+    lines = ["<?php"]
+    for n in range(count):
+        subdir = os.path.join(root, "lib", "pkg%d" % (n % 10))
+        if not os.path.isdir(subdir):
+            os.makedirs(subdir)
+        path = os.path.join(subdir, "Generated%d.php" % n)
+        with open(path, "w") as f:
+            f.write(CLASS_TEMPLATE % {"n": n})
+        # keep away from the file update protection window
+        old = time.time() - 60
+        os.utime(path, (old, old))
+        lines.append("require_once '%s';" % path)
+    lines.append("$o = new Generated0(1);")
+    lines.append("echo $o->compute(2), \"\\n\";")
+    main = os.path.join(root, "main.php")
+    with open(main, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    old = time.time() - 60
+    os.utime(main, (old, old))
+    return main
+
+
+def run_once(interpreter, cwd, main):
+    t0 = time.time()
+    p = subprocess.Popen([interpreter, main], cwd=cwd,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = p.communicate()
+    t1 = time.time()
+    if p.returncode or stderr:
+        print "%s failed:\n%s%s" % (interpreter, stdout, stderr)
+        sys.exit(1)
+    return t1 - t0
+
+
+def avg(lst):
+    return sum(lst) / len(lst)
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option("-i", dest="interpreter",
+                      default=os.path.join(BASE_DIR, "..", "hippy-c"))
+    parser.add_option("-n", dest="files", type="int", default=500)
+    parser.add_option("-r", dest="runs", type="int", default=5)
+    options, _ = parser.parse_args()
+    interpreter = os.path.abspath(options.interpreter)
+
+    root = tempfile.mkdtemp(prefix="hippy-bccache-")
+    try:
+        main = generate_tree(root, options.files)
+        nocache_dir = os.path.join(root, "nocache")
+        cache_dir = os.path.join(root, "cache")
+        os.mkdir(nocache_dir)
+        with open(os.path.join(root, "hippy.ini"), "w") as f:
+            f.write("hippy.bytecode_cache_dir = %s\n" % cache_dir)
+
+        nocache = [run_once(interpreter, nocache_dir, main)
+                   for i in range(options.runs)]
+        cold = []
+        for i in range(options.runs):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            cold.append(run_once(interpreter, root, main))
+        warm = [run_once(interpreter, root, main)
+                for i in range(options.runs)]
+
+        print "include tree: %d files" % options.files
+        print "no cache:   %.3fs" % avg(nocache)
+        print "cold cache: %.3fs" % avg(cold)
+        print "warm cache: %.3fs" % avg(warm)
+        print "speedup (no cache / warm cache): %.2fx" % (
+            avg(nocache) / avg(warm))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
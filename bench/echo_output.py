@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+""" ./echo_output.py [-i <hippy binary>] [-n <rows>] [-r <runs>]
+
+Generates a template-heavy script: a table of <rows> rows rendered with
+inline HTML and short echo tags, about ten small fragments of output per
+row, without any ob_start() buffer.  The script is run with the stdout
+writer disabled (hippy.output_write_size = 0, one write() per fragment)
+and with a few write sizes, and the wall-clock time, the output throughput
+and, if strace is available, the number of write and writev system calls
+are printed for each.
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import tempfile
+import optparse
+import subprocess
+
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+SIZES = ['0', '4K', '8K', '64K']
+
+TEMPLATE = """<?php
+$rows = array();
+for ($i = 0; $i < %(rows)d; $i++) {
+    $rows[] = array('id' => $i, 'name' => 'item' . $i, 'price' => $i * 3);
+}
+?>
+<table>
+<?php foreach ($rows as $row) { ?>
+  <tr class="<?= $row['id'] %% 2 ? 'odd' : 'even' ?>">
+    <td><?= $row['id'] ?></td>
+    <td><?= $row['name'] ?></td>
+    <td><?= $row['price'] ?></td>
+  </tr>
+<?php } ?>
+</table>
+"""
+
+
+def have_strace():
+    try:
+        subprocess.call(['strace', '-V'], stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE)
+    except OSError:
+        return False
+    return True
+
+
+def run_once(interpreter, cwd, script, strace):
+    cmd = [interpreter, script]
+    if strace:
+        cmd = ['strace', '-c', '-e', 'trace=write,writev'] + cmd
+    out = tempfile.TemporaryFile()
+    t0 = time.time()
+    p = subprocess.Popen(cmd, cwd=cwd, stdout=out, stderr=subprocess.PIPE)
+    _, stderr = p.communicate()
+    t1 = time.time()
+    if p.returncode:
+        print "%s failed:\n%s" % (script, stderr)
+        sys.exit(1)
+    out.seek(0, 2)
+    size = out.tell()
+    out.close()
+    calls = None
+    if strace:
+        # the last line of the summary: "100.00  <secs>  <usecs>  <calls>"
+        m = re.search(r'^\s*100\.00\s+\S+\s+(?:\S+\s+)?(\d+)\s+(?:\d+\s+)?'
+                      r'total\s*$', stderr, re.M)
+        if m:
+            calls = int(m.group(1))
+    return t1 - t0, size, calls
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option("-i", dest="interpreter",
+                      default=os.path.join(BASE_DIR, "..", "hippy-c"))
+    parser.add_option("-n", dest="rows", type="int", default=50000)
+    parser.add_option("-r", dest="runs", type="int", default=5)
+    options, _ = parser.parse_args()
+    interpreter = os.path.abspath(options.interpreter)
+    strace = have_strace()
+
+    root = tempfile.mkdtemp(prefix="hippy-echo-")
+    try:
+        script = os.path.join(root, 'template.php')
+        with open(script, 'w') as f:
+            f.write(TEMPLATE % {'rows': options.rows})
+        for size in SIZES:
+            workdir = os.path.join(root, 'size_' + size)
+            os.mkdir(workdir)
+            with open(os.path.join(workdir, 'hippy.ini'), 'w') as f:
+                f.write('hippy.output_write_size = %s\n' % size)
+            best = None
+            for i in range(options.runs):
+                t, nbytes, _ = run_once(interpreter, workdir, script, False)
+                if best is None or t < best:
+                    best = t
+            line = "write size %-4s %.3fs, %.1f MB/s" % (
+                size, best, nbytes / best / (1024 * 1024))
+            if strace:
+                _, _, calls = run_once(interpreter, workdir, script, True)
+                if calls is not None:
+                    line += ", %d write/writev syscalls" % calls
+            print line
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+<?
+// HTML escaping as a template engine does it: htmlspecialchars() of short
+// template variables and of typical HTML fragments, htmlentities() of
+// accented text, html_entity_decode() of escaped markup, and all of them
+// on a large string with nothing to escape.  Prints calls per second:
+//   php html_escape.php [<n>]
+
+$n = isset($argv[1]) ? (int)$argv[1] : 200000;
+
+function report($name, $start, $n, $check) {
+    $elapsed = microtime(true) - $start;
+    echo $name . ": " . (int)($n / $elapsed) . " calls/s (" . $check . ")\n";
+}
+
+$variables = array("John Smith", "john@example.com", "42", "Main Street",
+                   "O'Reilly & Sons", "<script>alert(1)</script>");
+$fragments = array(
+    '<p class="intro">Welcome back, <b>John</b>!</p>',
+    '<a href="/search?q=php&amp;page=2">Next page &raquo;</a>',
+    '<li><img src="/img/logo.png" alt="Logo"> Tom & Jerry\'s</li>',
+);
+$accented = "Cr\xc3\xa8me br\xc3\xbbl\xc3\xa9e \xe2\x80\x94 5 \xe2\x82\xac";
+$clean = str_repeat("Lorem ipsum dolor sit amet, consectetur adipiscing " .
+                    "elit, sed do eiusmod tempor incididunt ut labore. ", 1000);
+
+$start = microtime(true);
+$total = 0;
+for ($i = 0; $i < $n; $i++) {
+    $total += strlen(htmlspecialchars($variables[$i % 6]));
+}
+report("htmlspecialchars, template variables", $start, $n, $total);
+
+$start = microtime(true);
+$total = 0;
+for ($i = 0; $i < $n; $i++) {
+    $total += strlen(htmlspecialchars($fragments[$i % 3], ENT_QUOTES));
+}
+report("htmlspecialchars, HTML fragments", $start, $n, $total);
+
+$start = microtime(true);
+$total = 0;
+for ($i = 0; $i < $n; $i++) {
+    $total += strlen(htmlentities($accented));
+}
+report("htmlentities, accented text", $start, $n, $total);
+
+$escaped = array();
+foreach ($fragments as $fragment) {
+    $escaped[] = htmlentities($fragment . " " . $accented, ENT_QUOTES);
+}
+$start = microtime(true);
+$total = 0;
+for ($i = 0; $i < $n; $i++) {
+    $total += strlen(html_entity_decode($escaped[$i % 3], ENT_QUOTES));
+}
+report("html_entity_decode, escaped fragments", $start, $n, $total);
+
+$m = (int)($n / 100);
+$start = microtime(true);
+$total = 0;
+for ($i = 0; $i < $m; $i++) {
+    $total += strlen(htmlspecialchars($clean));
+    $total += strlen(htmlentities($clean));
+    $total += strlen(htmlspecialchars_decode($clean));
+}
+report("large clean string (" . strlen($clean) . " bytes)", $start, $m,
+       $total);
+?>
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+""" ./include_cache.py [-i <hippy binary>] [-n <classes>] [-r <runs>]
+
+Generates an autoload-heavy tree: classes spread over several
+include_path directories, loaded by an spl_autoload_register() autoloader
+with plain 'include' lookups, each class file also require_once-ing a few
+shared files.  The script is run with --bench (several requests in one
+process) with the realpath cache disabled (realpath_cache_size = 0) and
+enabled, and the wall-clock time and, if strace is available, the number
+of stat-like and getcwd system calls are printed for both.
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import tempfile
+import optparse
+import subprocess
+
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+DIRS = 8
+SHARED = 5
+
+SYSCALLS = 'stat,lstat,fstat,newfstatat,statx,access,getcwd'
+
+CLASS_TEMPLATE = """<?php
+%(requires)s
+class Autoloaded%(n)d {
+    public $n = %(n)d;
+    function get() { return $this->n; }
+}
+"""
+
+MAIN_TEMPLATE = """<?php
+set_include_path(%(include_path)s);
+spl_autoload_register(function ($name) {
+    @include $name . '.php';
+});
+$total = 0;
+for ($i = 0; $i < %(count)d; $i++) {
+    $name = 'Autoloaded' . $i;
+    $o = new $name();
+    $total += $o->get();
+}
+echo $total, "\\n";
+"""
+
+
+def generate_tree(root, count):
+    dirs = []
+    for d in range(DIRS):
+        path = os.path.join(root, 'lib%d' % d)
+        os.mkdir(path)
+        dirs.append(path)
+    shared = []
+    for s in range(SHARED):
+        path = os.path.join(dirs[0], 'shared%d.inc' % s)
+        with open(path, 'w') as f:
+            f.write("<?php\n$shared%d = %d;\n" % (s, s))
+        shared.append("require_once 'shared%d.inc';" % s)
+    for n in range(count):
+        # most classes live in the last directories of the include_path
+        path = os.path.join(dirs[DIRS - 1 - n % 3], 'Autoloaded%d.php' % n)
+        with open(path, 'w') as f:
+            f.write(CLASS_TEMPLATE % {'n': n, 'requires': '\n'.join(shared)})
+    main = os.path.join(root, 'main.php')
+    include_path = ' . PATH_SEPARATOR . '.join(["'%s'" % d for d in dirs])
+    with open(main, 'w') as f:
+        f.write(MAIN_TEMPLATE % {'include_path': include_path,
+                                 'count': count})
+    return main
+
+
+def have_strace():
+    try:
+        subprocess.call(['strace', '-V'], stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE)
+    except OSError:
+        return False
+    return True
+
+
+def run_once(interpreter, cwd, main, runs, strace):
+    cmd = [interpreter, '--bench', str(runs), main]
+    if strace:
+        cmd = ['strace', '-f', '-c', '-e', 'trace=' + SYSCALLS] + cmd
+    t0 = time.time()
+    p = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE)
+    stdout, stderr = p.communicate()
+    t1 = time.time()
+    if p.returncode:
+        print "%s failed:\n%s%s" % (main, stdout, stderr)
+        sys.exit(1)
+    calls = None
+    if strace:
+        # the last line of the summary: "100.00  <secs>  <usecs>  <calls>"
+        m = re.search(r'^\s*100\.00\s+\S+\s+(?:\S+\s+)?(\d+)\s+(?:\d+\s+)?'
+                      r'total\s*$', stderr, re.M)
+        if m:
+            calls = int(m.group(1))
+    return t1 - t0, calls
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option("-i", dest="interpreter",
+                      default=os.path.join(BASE_DIR, "..", "hippy-c"))
+    parser.add_option("-n", dest="classes", type="int", default=500)
+    parser.add_option("-r", dest="runs", type="int", default=20)
+    options, _ = parser.parse_args()
+    interpreter = os.path.abspath(options.interpreter)
+    strace = have_strace()
+
+    root = tempfile.mkdtemp(prefix="hippy-include-")
+    try:
+        main = generate_tree(root, options.classes)
+        for name, size in [('no cache', '0'), ('cache', '4M')]:
+            workdir = os.path.join(root, name.replace(' ', '_'))
+            os.mkdir(workdir)
+            with open(os.path.join(workdir, 'hippy.ini'), 'w') as f:
+                f.write('realpath_cache_size = %s\n' % size)
+            t, _ = run_once(interpreter, workdir, main, options.runs, False)
+            line = "%-9s %.3fs for %d requests" % (name, t, options.runs)
+            if strace:
+                _, calls = run_once(interpreter, workdir, main,
+                                    options.runs, True)
+                if calls is not None:
+                    line += ", %d stat/getcwd syscalls" % calls
+            print line
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+<?
+// Log-line formatting throughput: sprintf() with a few constant formats,
+// vsprintf() with an argument array, a format picked from a table at run
+// time, and number_format().  Prints lines per second for each:
+//   php log_format.php [<lines>]
+
+$n = isset($argv[1]) ? (int)$argv[1] : 1000000;
+
+function report($name, $start, $n, $check) {
+    $elapsed = microtime(true) - $start;
+    echo $name . ": " . (int)($n / $elapsed) . " lines/s (" . $check .
+        ")\n";
+}
+
+$levels = array("DEBUG", "INFO", "WARNING", "ERROR");
+$formats = array(
+    "%s [%-7s] request %d took %.3f ms\n",
+    "%s [%-7s] %s: %d bytes from %s\n",
+    "%s [%-7s] cache %s, %05.1f%% hit rate\n",
+);
+
+$start = microtime(true);
+$total = 0;
+for ($i = 0; $i < $n; $i++) {
+    $line = sprintf("%s [%-7s] request %d took %.3f ms\n",
+                    "2014-03-01 12:00:00", $levels[$i & 3], $i, $i / 7.0);
+    $total += strlen($line);
+}
+report("sprintf, constant format", $start, $n, $total);
+
+$start = microtime(true);
+$total = 0;
+for ($i = 0; $i < $n; $i++) {
+    $line = vsprintf('%1$s [%2$-7s] %3$s: %4$d bytes from %5$s' . "\n",
+                     array("2014-03-01 12:00:00", $levels[$i & 3], "GET",
+                           $i * 13, "10.0.0.1"));
+    $total += strlen($line);
+}
+report("vsprintf, positional arguments", $start, $n, $total);
+
+$start = microtime(true);
+$total = 0;
+for ($i = 0; $i < $n; $i++) {
+    $format = $formats[$i % 3];
+    $line = sprintf($format, "2014-03-01 12:00:00", $levels[$i & 3],
+                    "GET", $i, "10.0.0.1");
+    $total += strlen($line);
+}
+report("sprintf, format from a table", $start, $n, $total);
+
+$start = microtime(true);
+$total = 0;
+for ($i = 0; $i < $n; $i++) {
+    $line = number_format($i * 1234.5678, 2) . " bytes\n";
+    $total += strlen($line);
+}
+report("number_format", $start, $n, $total);
+?>
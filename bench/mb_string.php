@@ -0,0 +1,62 @@
+<?
+// mbstring functions on an ASCII corpus and on a multilingual one (Latin
+// with accents, Greek, Cyrillic and CJK text): walking a long document
+// with mb_substr() one chunk at a time, mb_strpos() from increasing
+// offsets, and mb_strlen(), mb_strtoupper(), mb_str_split() and
+// mb_strwidth() of short strings.  Prints calls per second:
+//   php mb_string.php [<n>]
+
+$n = isset($argv[1]) ? (int)$argv[1] : 100000;
+
+function report($corpus, $name, $start, $n, $check) {
+    $elapsed = microtime(true) - $start;
+    echo $corpus . ", " . $name . ": " . (int)($n / $elapsed) .
+        " calls/s (" . $check . ")\n";
+}
+
+$corpora = array(
+    "ascii" => array("The quick brown fox jumps over the lazy dog. ",
+                     "Pack my box with five dozen liquor jugs. "),
+    "multilingual" => array(
+        "Cr\xc3\xa8me br\xc3\xbbl\xc3\xa9e \xc3\xa0 la fran\xc3\xa7aise. ",
+        "\xce\x93\xce\xb5\xce\xb9\xce\xac \xcf\x83\xce\xbf\xcf\x85 " .
+        "\xce\xba\xcf\x8c\xcf\x83\xce\xbc\xce\xb5. ",
+        "\xd0\x9f\xd1\x80\xd0\xb8\xd0\xb2\xd0\xb5\xd1\x82 " .
+        "\xd0\xbc\xd0\xb8\xd1\x80. ",
+        "\xe6\x97\xa5\xe6\x9c\xac\xe8\xaa\x9e\xe3\x81\xae" .
+        "\xe6\x96\x87\xe7\xab\xa0\xe3\x80\x82 "),
+);
+
+foreach ($corpora as $corpus => $sentences) {
+    $document = "";
+    for ($i = 0; $i < 2000; $i++) {
+        $document .= $sentences[$i % count($sentences)];
+    }
+    $length = mb_strlen($document);
+
+    $start = microtime(true);
+    $total = 0;
+    for ($i = 0; $i < $n; $i++) {
+        $total += strlen(mb_substr($document, ($i * 40) % $length, 40));
+    }
+    report($corpus, "mb_substr over a " . strlen($document) .
+           " byte document", $start, $n, $total);
+
+    $start = microtime(true);
+    $total = 0;
+    for ($i = 0; $i < $n; $i++) {
+        $total += mb_strpos($document, ". ", ($i * 40) % ($length - 100));
+    }
+    report($corpus, "mb_strpos with an offset", $start, $n, $total);
+
+    $start = microtime(true);
+    $total = 0;
+    for ($i = 0; $i < $n; $i++) {
+        $sentence = $sentences[$i % count($sentences)];
+        $total += mb_strlen($sentence) + mb_strwidth($sentence);
+        $total += strlen(mb_strtoupper($sentence));
+        $total += count(mb_str_split($sentence, 8));
+    }
+    report($corpus, "short strings", $start, $n, $total);
+}
+?>
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+""" ./multipart_upload.py [-i <hippy binary>] [-r <runs>] [<size in MB> ...]
+
+Posts multipart/form-data bodies with a single file of the given sizes
+(by default 1MB, 50MB and 500MB) to hippy in CGI mode, with the body on
+stdin, and prints the throughput of the upload parsing and the peak
+memory usage reported by memory_get_peak_usage(true).
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import optparse
+import subprocess
+
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+SIZES = [1, 50, 500]
+
+BOUNDARY = '----hippyboundary7MA4YWxkTrZu0gW'
+
+SCRIPT = """<?php
+$f = $_FILES['upload'];
+echo $f['error'], ' ', $f['size'], ' ', memory_get_peak_usage(true), "\\n";
+?>
+"""
+
+INI = """upload_max_filesize = 0
+post_max_size = 0
+"""
+
+
+def write_body(path, size):
+    chunk = ''.join([chr(i % 251) for i in range(1 << 20)])
+    with open(path, 'wb') as f:
+        f.write('--%s\r\n' % BOUNDARY)
+        f.write('Content-Disposition: form-data; name="upload"; '
+                'filename="data.bin"\r\n')
+        f.write('Content-Type: application/octet-stream\r\n\r\n')
+        for i in range(size):
+            f.write(chunk)
+        f.write('\r\n--%s--\r\n' % BOUNDARY)
+    return os.path.getsize(path)
+
+
+def run_once(interpreter, workdir, script, body, length):
+    env = os.environ.copy()
+    env['CONTENT_TYPE'] = 'multipart/form-data; boundary=%s' % BOUNDARY
+    env['CONTENT_LENGTH'] = str(length)
+    env['REQUEST_METHOD'] = 'POST'
+    with open(body, 'rb') as stdin:
+        t0 = time.time()
+        p = subprocess.Popen([interpreter, '--cgi', script], cwd=workdir,
+                             env=env, stdin=stdin, stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
+        stdout, stderr = p.communicate()
+        t1 = time.time()
+    lines = stdout.strip().splitlines()
+    if p.returncode or stderr or not lines:
+        print "upload failed:\n%s%s" % (stdout, stderr)
+        sys.exit(1)
+    error, size, peak = [int(x) for x in lines[-1].split()]
+    return t1 - t0, error, size, peak
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option("-i", dest="interpreter",
+                      default=os.path.join(BASE_DIR, "..", "hippy-c"))
+    parser.add_option("-r", dest="runs", type="int", default=3)
+    options, args = parser.parse_args()
+    interpreter = os.path.abspath(options.interpreter)
+    sizes = [int(arg) for arg in args] or SIZES
+
+    workdir = tempfile.mkdtemp(prefix='hippy-upload-')
+    try:
+        script = os.path.join(workdir, 'upload.php')
+        with open(script, 'w') as f:
+            f.write(SCRIPT)
+        with open(os.path.join(workdir, 'hippy.ini'), 'w') as f:
+            f.write(INI)
+        body = os.path.join(workdir, 'body')
+        for size in sizes:
+            length = write_body(body, size)
+            results = [run_once(interpreter, workdir, script, body, length)
+                       for i in range(options.runs)]
+            t, error, uploaded, peak = min(results)
+            if error != 0 or uploaded != size << 20:
+                print "%dMB: error %d, %d bytes uploaded" % (size, error,
+                                                             uploaded)
+                sys.exit(1)
+            print "%5dMB  %.3fs  %8.1f MB/s  peak memory %.1f MB" % (
+                size, t, length / t / (1 << 20), peak / float(1 << 20))
+            os.unlink(body)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+<?
+// Lists of ints and floats: the memory used per element by a 1M-element
+// list of ints, of floats and, for comparison, of mixed (boxed) values,
+// and the time of a few numeric kernels over such lists.
+
+function mem_per_element($make, $n) {
+    $before = memory_get_usage();
+    $a = $make($n);
+    $after = memory_get_usage();
+    return ($after - $before) / count($a);
+}
+
+function make_ints($n) {
+    $a = array();
+    for ($i = 0; $i < $n; $i++) {
+        $a[] = $i;
+    }
+    return $a;
+}
+
+function make_floats($n) {
+    $a = array();
+    for ($i = 0; $i < $n; $i++) {
+        $a[] = $i * 0.5;
+    }
+    return $a;
+}
+
+function make_mixed($n) {
+    $a = array("first");
+    for ($i = 1; $i < $n; $i++) {
+        $a[] = $i;
+    }
+    return $a;
+}
+
+function dot($a, $b, $n) {
+    $total = 0.0;
+    for ($i = 0; $i < $n; $i++) {
+        $total += $a[$i] * $b[$i];
+    }
+    return $total;
+}
+
+function prefix_sums($a, $n) {
+    for ($i = 1; $i < $n; $i++) {
+        $a[$i] += $a[$i - 1];
+    }
+    return $a;
+}
+
+$n = 1000000;
+echo "bytes per element: ints " . mem_per_element('make_ints', $n) .
+     " floats " . mem_per_element('make_floats', $n) .
+     " mixed " . mem_per_element('make_mixed', $n) . "\n";
+
+$xs = make_floats($n);
+$ys = array_fill(0, $n, 2.0);
+$is = range(1, $n);
+for ($i = 0; $i < 3; $i++) {
+    $start = microtime(true);
+    dot($xs, $ys, $n);
+    $t1 = microtime(true);
+    prefix_sums($is, $n);
+    $t2 = microtime(true);
+    array_sum($xs);
+    $rev = $is;
+    rsort($rev);
+    $t3 = microtime(true);
+    echo "dot: " . ($t1 - $start) . " prefix sums: " . ($t2 - $t1) .
+         " sum and sort: " . ($t3 - $t2) . "\n";
+}
+?>
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+""" ./numeric_arrays.py [-i <hippy binary>] [-b <baseline binary>] [-r <runs>]
+
+Runs the numeric benchmarks (numeric_arrays.php, nbody.php,
+spectral_norm.php, fannkuch.php) with the given hippy and, if given, with
+a baseline hippy built without the unboxed int and float lists, and
+prints the wall-clock time of each and the speedup.  The memory per
+element reported by numeric_arrays.php is printed for both.
+"""
+import os
+import re
+import sys
+import time
+import optparse
+import subprocess
+
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+BENCHMARKS = ['numeric_arrays.php', 'nbody.php', 'spectral_norm.php',
+              'fannkuch.php']
+
+
+def run_once(interpreter, target):
+    t0 = time.time()
+    p = subprocess.Popen([interpreter, target],
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = p.communicate()
+    t1 = time.time()
+    if p.returncode or stderr:
+        print "%s failed:\n%s%s" % (target, stdout, stderr)
+        sys.exit(1)
+    return t1 - t0, stdout
+
+
+def best_time(interpreter, target, runs):
+    best = None
+    output = ''
+    for i in range(runs):
+        t, output = run_once(interpreter, target)
+        if best is None or t < best:
+            best = t
+    return best, output
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option("-i", dest="interpreter",
+                      default=os.path.join(BASE_DIR, "..", "hippy-c"))
+    parser.add_option("-b", dest="baseline", default=None)
+    parser.add_option("-r", dest="runs", type="int", default=3)
+    options, args = parser.parse_args()
+    interpreters = [('unboxed', os.path.abspath(options.interpreter))]
+    if options.baseline:
+        interpreters.append(('baseline', os.path.abspath(options.baseline)))
+    benchmarks = args or [os.path.join(BASE_DIR, name)
+                          for name in BENCHMARKS]
+
+    for target in benchmarks:
+        print os.path.basename(target)
+        times = []
+        for name, interpreter in interpreters:
+            t, output = best_time(interpreter, target, options.runs)
+            times.append(t)
+            print "  %-9s %.3fs" % (name, t)
+            m = re.search(r'^bytes per element: .*$', output, re.M)
+            if m:
+                print "    " + m.group(0)
+        if len(times) == 2:
+            print "  speedup: %.2fx" % (times[1] / times[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+<?
+// Input validation with preg_*() and literal patterns, as form handlers and
+// routers do it: preg_match() of integers, e-mail addresses and dates,
+// preg_replace() to sanitize, preg_split() of tag lists, then the same
+// checks with the patterns held in variables.  Prints calls per second:
+//   php preg_validation.php [<n>]
+
+$n = isset($argv[1]) ? (int)$argv[1] : 200000;
+
+function report($name, $start, $calls, $check) {
+    $elapsed = microtime(true) - $start;
+    echo $name . ": " . (int)($calls / $elapsed) . " calls/s (" . $check .
+        ")\n";
+}
+
+$inputs = array("12345", "john.doe@example.com", "2014-03-01", "not valid",
+                "<b>bold</b> & co", "php, regex ,jit,  bench");
+
+$start = microtime(true);
+$valid = 0;
+for ($i = 0; $i < $n; $i++) {
+    $value = $inputs[$i % 6];
+    $valid += preg_match('/^\d+$/', $value);
+    $valid += preg_match('/^[\w.+-]+@[\w-]+(\.[\w-]+)+$/', $value);
+    $valid += preg_match('/^(\d{4})-(\d{2})-(\d{2})$/', $value);
+}
+report("preg_match, literal patterns", $start, 3 * $n, $valid);
+
+$start = microtime(true);
+$total = 0;
+for ($i = 0; $i < $n; $i++) {
+    $value = $inputs[$i % 6];
+    $total += strlen(preg_replace('/[^\w\s@.-]/', '', $value));
+    $total += count(preg_split('/\s*,\s*/', $value));
+}
+report("preg_replace and preg_split, literal patterns", $start, 2 * $n,
+       $total);
+
+$int_re = '/^\d+$/';
+$email_re = '/^[\w.+-]+@[\w-]+(\.[\w-]+)+$/';
+$date_re = '/^(\d{4})-(\d{2})-(\d{2})$/';
+$start = microtime(true);
+$valid = 0;
+for ($i = 0; $i < $n; $i++) {
+    $value = $inputs[$i % 6];
+    $valid += preg_match($int_re, $value);
+    $valid += preg_match($email_re, $value);
+    $valid += preg_match($date_re, $value);
+}
+report("preg_match, patterns in variables", $start, 3 * $n, $valid);
+?>
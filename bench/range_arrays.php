@@ -0,0 +1,38 @@
+<?
+// Large range() arrays.  Each case runs in a process of its own, see
+// range_arrays.py, so that the peak memory reported is its own:
+//   php range_arrays.php <case> [<n>]
+
+$case = $argv[1];
+$n = isset($argv[2]) ? (int)$argv[2] : 10000000;
+
+$start = microtime(true);
+if ($case == "foreach") {
+    $sum = 0;
+    foreach (range(1, $n) as $i) {
+        $sum += $i;
+    }
+    $check = $sum;
+} elseif ($case == "index") {
+    $a = range(0, 3 * $n, 3);
+    $sum = 0;
+    $count = count($a);
+    for ($i = 0; $i < $count; $i += 7) {
+        $sum += $a[$i];
+    }
+    $check = $sum;
+} elseif ($case == "sum") {
+    $check = array_sum(range($n, 1));
+} elseif ($case == "write") {
+    // the worst case: the first write builds the whole list
+    $a = range(1, $n);
+    $a[0] = 0;
+    $check = count($a);
+} else {
+    echo "unknown case: " . $case . "\n";
+    exit(1);
+}
+echo "time: " . (microtime(true) - $start) . "\n";
+echo "peak memory: " . memory_get_peak_usage() . "\n";
+echo "check: " . $check . "\n";
+?>
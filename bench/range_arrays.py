@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+""" ./range_arrays.py [-i <hippy binary>] [-b <baseline binary>] [-n <size>]
+
+Runs each case of range_arrays.php (a foreach over range(), indexing and
+count() of a range, array_sum() of a range, and writing to a range, which
+builds it) in a process of its own with the given hippy and, if given,
+with a baseline hippy built without the lazy ranges, and prints the time
+and the peak memory of each.
+"""
+import os
+import re
+import sys
+import optparse
+import subprocess
+
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+CASES = ['foreach', 'index', 'sum', 'write']
+
+
+def run_case(interpreter, case, n):
+    target = os.path.join(BASE_DIR, 'range_arrays.php')
+    p = subprocess.Popen([interpreter, target, case, str(n)],
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = p.communicate()
+    if p.returncode or stderr:
+        print "%s %s failed:\n%s%s" % (target, case, stdout, stderr)
+        sys.exit(1)
+    t = float(re.search(r'^time: (.*)$', stdout, re.M).group(1))
+    peak = int(re.search(r'^peak memory: (\d+)$', stdout, re.M).group(1))
+    return t, peak
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option("-i", dest="interpreter",
+                      default=os.path.join(BASE_DIR, "..", "hippy-c"))
+    parser.add_option("-b", dest="baseline", default=None)
+    parser.add_option("-n", dest="size", type="int", default=10000000)
+    options, args = parser.parse_args()
+    interpreters = [('lazy', os.path.abspath(options.interpreter))]
+    if options.baseline:
+        interpreters.append(('baseline', os.path.abspath(options.baseline)))
+
+    for case in args or CASES:
+        print case
+        for name, interpreter in interpreters:
+            t, peak = run_case(interpreter, case, options.size)
+            print "  %-9s %.3fs  %8.1f MB peak" % (name, t,
+                                                  peak / 1024.0 / 1024.0)
+
+
+if __name__ == "__main__":
+    main()
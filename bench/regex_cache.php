@@ -0,0 +1,39 @@
+<?
+// Cost of looking up compiled regexps: a constant pattern in a hot
+// loop, a rotating set of dynamically built patterns that fits in the
+// cache, and one that is larger than pcre.cache_size.
+
+function constant_pattern($n) {
+    $matched = 0;
+    for ($i = 0; $i < $n; $i++) {
+        $matched += preg_match('/^\d+$/', "12345");
+    }
+    return $matched;
+}
+
+function dynamic_patterns($n, $distinct) {
+    $matched = 0;
+    for ($i = 0; $i < $n; $i++) {
+        $matched += preg_match('/^item' . ($i % $distinct) . '$/', "item7");
+    }
+    return $matched;
+}
+
+ini_set('pcre.cache_size', 1024);
+
+for ($i = 0; $i < 3; $i++) {
+    $start = microtime(true);
+    constant_pattern(1000000);
+    $t1 = microtime(true);
+    dynamic_patterns(1000000, 512);
+    $t2 = microtime(true);
+    dynamic_patterns(100000, 4096);
+    $t3 = microtime(true);
+    echo "constant: " . ($t1 - $start) . " dynamic (fits): " . ($t2 - $t1) .
+         " dynamic (thrashing): " . ($t3 - $t2) . "\n";
+}
+
+$stats = hippy_pcre_cache_stats();
+echo "hits: " . $stats['hits'] . " misses: " . $stats['misses'] .
+     " evictions: " . $stats['evictions'] . "\n";
+?>
@@ -0,0 +1,51 @@
+<?
+// sort() and asort() of n ints, floats and strings (1M by default)
+// under each sort flag.  The arrays are built from the same random
+// numbers every time:
+//   php sort_arrays.php [<n>]
+
+$n = isset($argv[1]) ? (int)$argv[1] : 1000000;
+
+function make_items($type, $n) {
+    mt_srand(42);
+    $items = array();
+    for ($i = 0; $i < $n; $i++) {
+        $x = mt_rand(0, 1000000000);
+        if ($type == "ints") {
+            $items[] = $x;
+        } elseif ($type == "floats") {
+            $items[] = $x / 7.0;
+        } else {
+            $items[] = ($x % 2 ? "Item" : "item") . $x;
+        }
+    }
+    return $items;
+}
+
+$flags = array(
+    "SORT_REGULAR" => SORT_REGULAR,
+    "SORT_NUMERIC" => SORT_NUMERIC,
+    "SORT_STRING" => SORT_STRING,
+    "SORT_STRING|SORT_FLAG_CASE" => SORT_STRING | SORT_FLAG_CASE,
+    "SORT_LOCALE_STRING" => SORT_LOCALE_STRING,
+    "SORT_NATURAL" => SORT_NATURAL,
+);
+
+foreach (array("ints", "floats", "strings") as $type) {
+    $items = make_items($type, $n);
+    echo $type . "\n";
+    foreach ($flags as $name => $flag) {
+        $a = $items;
+        $start = microtime(true);
+        sort($a, $flag);
+        $t_sort = microtime(true) - $start;
+
+        $a = $items;
+        $start = microtime(true);
+        asort($a, $flag);
+        $t_asort = microtime(true) - $start;
+        echo "  " . $name . ": sort " . $t_sort . ", asort " . $t_asort .
+            "\n";
+    }
+}
+?>
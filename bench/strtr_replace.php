@@ -0,0 +1,57 @@
+<?
+// strtr() and str_replace() with 10, 100 and 1000 replacement pairs over
+// 1MB of text in which about one word in four is a placeholder.  Every
+// call is repeated, to also time the calls that reuse the compiled table:
+//   php strtr_replace.php [<repeat>]
+
+$repeat = isset($argv[1]) ? (int)$argv[1] : 5;
+
+function make_text($n_patterns, $size) {
+    mt_srand(42);
+    $words = array("lorem", "ipsum", "dolor", "sit", "amet", "consectetur");
+    $parts = array();
+    $length = 0;
+    while ($length < $size) {
+        if (mt_rand(0, 3) == 0) {
+            $word = "{var" . mt_rand(0, $n_patterns - 1) . "}";
+        } else {
+            $word = $words[mt_rand(0, count($words) - 1)];
+        }
+        $parts[] = $word;
+        $length += strlen($word) + 1;
+    }
+    return implode(" ", $parts);
+}
+
+foreach (array(10, 100, 1000) as $n_patterns) {
+    $text = make_text($n_patterns, 1024 * 1024);
+    $table = array();
+    for ($i = 0; $i < $n_patterns; $i++) {
+        $table["{var" . $i . "}"] = "value number " . $i;
+    }
+    $search = array_keys($table);
+    $replace = array_values($table);
+    echo $n_patterns . " patterns\n";
+
+    $start = microtime(true);
+    for ($i = 0; $i < $repeat; $i++) {
+        $result = strtr($text, $table);
+    }
+    echo "  strtr: " . (microtime(true) - $start) / $repeat .
+        " (" . strlen($result) . ")\n";
+
+    $start = microtime(true);
+    for ($i = 0; $i < $repeat; $i++) {
+        $result = str_replace($search, $replace, $text);
+    }
+    echo "  str_replace: " . (microtime(true) - $start) / $repeat .
+        " (" . strlen($result) . ")\n";
+
+    $start = microtime(true);
+    for ($i = 0; $i < $repeat; $i++) {
+        $result = str_ireplace($search, $replace, $text);
+    }
+    echo "  str_ireplace: " . (microtime(true) - $start) / $repeat .
+        " (" . strlen($result) . ")\n";
+}
+?>
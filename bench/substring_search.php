@@ -0,0 +1,84 @@
+<?
+// Substring search by needle length and haystack size: strpos() and
+// stripos() of a needle that only occurs at the very end, substr_count()
+// and str_ireplace() of one that occurs every 4KB.  Each entry is the
+// time per call in microseconds:
+//   php substring_search.php [<repeat>]
+
+$repeat = isset($argv[1]) ? (int)$argv[1] : 20;
+
+function make_haystack($size) {
+    mt_srand(42);
+    $words = array("GET", "/index.php", "HTTP/1.1", "200", "Mozilla/5.0",
+                   "text/html", "gzip", "keep-alive", "127.0.0.1", "-");
+    $parts = array();
+    $length = 0;
+    while ($length < $size) {
+        $word = $words[mt_rand(0, count($words) - 1)];
+        $parts[] = $word;
+        $length += strlen($word) + 1;
+    }
+    return substr(implode(" ", $parts), 0, $size);
+}
+
+function make_needle($length) {
+    return substr(str_repeat("Needle-in-the-log:", 1 + $length / 18), 0,
+                  $length);
+}
+
+function sprinkle($haystack, $needle) {
+    $result = "";
+    for ($i = 0; $i < strlen($haystack); $i += 4096) {
+        $result .= substr($haystack, $i, 4096 - strlen($needle)) . $needle;
+    }
+    return $result;
+}
+
+function time_call($name, $haystack, $needle, $repeat) {
+    $start = microtime(true);
+    for ($i = 0; $i < $repeat; $i++) {
+        if ($name == "strpos") {
+            strpos($haystack, $needle);
+        } elseif ($name == "stripos") {
+            stripos($haystack, $needle);
+        } elseif ($name == "substr_count") {
+            substr_count($haystack, $needle);
+        } else {
+            str_ireplace($needle, "X", $haystack);
+        }
+    }
+    return (microtime(true) - $start) / $repeat * 1000000;
+}
+
+$sizes = array(1024, 65536, 1048576);
+$lengths = array(1, 2, 4, 8, 16, 64, 256);
+foreach (array("strpos", "stripos", "substr_count", "str_ireplace")
+         as $name) {
+    echo $name . "\n";
+    echo str_pad("needle", 8);
+    foreach ($sizes as $size) {
+        echo str_pad($size, 12, " ", STR_PAD_LEFT);
+    }
+    echo "\n";
+    foreach ($lengths as $length) {
+        $needle = make_needle($length);
+        echo str_pad($length, 8);
+        foreach ($sizes as $size) {
+            $haystack = make_haystack($size);
+            if ($name == "strpos" || $name == "stripos") {
+                $haystack = substr($haystack, 0, $size - $length) .
+                    strtoupper($needle);
+                if ($name == "strpos") {
+                    $needle = strtoupper($needle);
+                }
+            } else {
+                $haystack = sprinkle($haystack, $needle);
+            }
+            $t = time_call($name, $haystack, $needle, $repeat);
+            echo str_pad(sprintf("%.1f", $t), 12, " ", STR_PAD_LEFT);
+            $needle = make_needle($length);
+        }
+        echo "\n";
+    }
+}
+?>
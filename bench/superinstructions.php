@@ -0,0 +1,47 @@
+<?
+// Straight-line code made of the sequences that are fused into
+// superinstructions: loop counters compared to a constant or a variable,
+// arithmetic on locals, plain assignments and array reads indexed by a
+// local.
+
+function loops($n) {
+    $total = 0;
+    for ($i = 0; $i < $n; $i++) {
+        $x = $i * 3;
+        $y = $x + $i;
+        $total = $total + $y - $x;
+    }
+    return $total;
+}
+
+function array_reads($a, $n) {
+    $total = 0;
+    $len = count($a);
+    for ($i = 0; $i < $n; $i++) {
+        $j = $i % $len;
+        $total = $total + $a[$j];
+    }
+    return $total;
+}
+
+function concat($n) {
+    $s = '';
+    for ($i = 0; $i < $n; $i++) {
+        $s = $s . 'x';
+    }
+    return strlen($s);
+}
+
+$a = range(0, 999);
+for ($i = 0; $i < 3; $i++) {
+    $start = microtime(true);
+    loops(3000000);
+    $t1 = microtime(true);
+    array_reads($a, 3000000);
+    $t2 = microtime(true);
+    concat(1000000);
+    $t3 = microtime(true);
+    echo "loops: " . ($t1 - $start) . " array reads: " . ($t2 - $t1) .
+         " concat: " . ($t3 - $t2) . "\n";
+}
+?>
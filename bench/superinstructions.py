@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+""" ./superinstructions.py [-i <hippy binary>] [-r <runs>] [<file.php> ...]
+
+Runs the given benchmarks (by default superinstructions.php and the
+benchmarks of runner.py) with and without superinstructions
+(--no-superinstructions), each with the JIT enabled and disabled
+(--jit off), and prints the wall-clock time of every combination.
+"""
+import os
+import sys
+import time
+import optparse
+import subprocess
+
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+BENCHMARKS = ['superinstructions.php', 'fannkuch.php', 'heapsort.php',
+              'richards.php', 'spectral_norm.php', 'nbody.php']
+
+CONFIGS = (
+    ('jit, superinstructions', []),
+    ('jit, plain bytecode', ['--no-superinstructions']),
+    ('no jit, superinstructions', ['--jit', 'off']),
+    ('no jit, plain bytecode', ['--jit', 'off', '--no-superinstructions']),
+)
+
+
+def run_once(interpreter, options, target):
+    t0 = time.time()
+    p = subprocess.Popen([interpreter] + options + [target],
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = p.communicate()
+    t1 = time.time()
+    if p.returncode or stderr:
+        print "%s failed:\n%s%s" % (target, stdout, stderr)
+        sys.exit(1)
+    return t1 - t0
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option("-i", dest="interpreter",
+                      default=os.path.join(BASE_DIR, "..", "hippy-c"))
+    parser.add_option("-r", dest="runs", type="int", default=3)
+    options, args = parser.parse_args()
+    interpreter = os.path.abspath(options.interpreter)
+    benchmarks = args or [os.path.join(BASE_DIR, name)
+                          for name in BENCHMARKS]
+
+    for target in benchmarks:
+        print os.path.basename(target)
+        times = []
+        for name, flags in CONFIGS:
+            t = min([run_once(interpreter, flags, target)
+                     for i in range(options.runs)])
+            times.append(t)
+            print "  %-28s %.3fs" % (name, t)
+        print "  speedup with jit:    %.2fx" % (times[1] / times[0])
+        print "  speedup without jit: %.2fx" % (times[3] / times[2])
+
+
+if __name__ == "__main__":
+    main()
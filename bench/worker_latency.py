@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+""" ./worker_latency.py [-i <hippy binary>] [-n <requests>] [-w <workers>]
+                        [<file.php> ...]
+
+Sends the same request repeatedly to each benchmark (by default
+richards.php and heapsort.php) and prints the median, 90th and 99th
+percentile latencies of a fresh 'hippy --cgi' process per request and of
+a 'hippy --workers' pool answering SCGI requests on a unix socket.
+"""
+import os
+import sys
+import time
+import socket
+import shutil
+import tempfile
+import optparse
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+from hippy.scgi import encode_scgi_request
+
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+BENCHMARKS = ['richards.php', 'heapsort.php']
+
+
+def percentiles(times):
+    times = sorted(times)
+    result = []
+    for p in (50, 90, 99):
+        result.append(times[min(len(times) - 1, len(times) * p // 100)])
+    return result
+
+
+def cgi_request(interpreter, target):
+    t0 = time.time()
+    p = subprocess.Popen([interpreter, '--cgi', target],
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = p.communicate()
+    t1 = time.time()
+    if p.returncode or stderr:
+        print "%s failed:\n%s%s" % (target, stdout, stderr)
+        sys.exit(1)
+    return t1 - t0
+
+
+def worker_request(sock_path, target):
+    t0 = time.time()
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.connect(sock_path)
+    s.sendall(encode_scgi_request({'SCRIPT_FILENAME': target,
+                                   'REQUEST_METHOD': 'GET'}))
+    s.shutdown(socket.SHUT_WR)
+    chunks = []
+    while True:
+        chunk = s.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    s.close()
+    t1 = time.time()
+    response = ''.join(chunks)
+    if response.startswith('Status: 5') or response.startswith('Status: 4'):
+        print "%s failed:\n%s" % (target, response)
+        sys.exit(1)
+    return t1 - t0
+
+
+def start_workers(interpreter, workers, sock_path, extra_args=[]):
+    p = subprocess.Popen([interpreter, '--workers', str(workers),
+                          '--listen', sock_path] + extra_args)
+    for i in range(100):
+        if os.path.exists(sock_path):
+            break
+        time.sleep(0.1)
+    else:
+        p.terminate()
+        print "the workers did not start"
+        sys.exit(1)
+    return p
+
+
+def report(name, times):
+    p50, p90, p99 = percentiles(times)
+    print "  %-10s p50 %8.2fms  p90 %8.2fms  p99 %8.2fms" % (
+        name, p50 * 1000, p90 * 1000, p99 * 1000)
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option("-i", dest="interpreter",
+                      default=os.path.join(BASE_DIR, "..", "hippy-c"))
+    parser.add_option("-n", dest="requests", type="int", default=50)
+    parser.add_option("-w", dest="workers", type="int", default=1)
+    options, args = parser.parse_args()
+    interpreter = os.path.abspath(options.interpreter)
+    benchmarks = [os.path.abspath(arg) for arg in args] or [
+        os.path.join(BASE_DIR, name) for name in BENCHMARKS]
+
+    tmpdir = tempfile.mkdtemp(prefix='hippy-workers-')
+    sock_path = os.path.join(tmpdir, 'sock')
+    p = start_workers(interpreter, options.workers, sock_path)
+    try:
+        for target in benchmarks:
+            print os.path.basename(target)
+            report('cgi', [cgi_request(interpreter, target)
+                           for i in range(options.requests)])
+            report('workers', [worker_request(sock_path, target)
+                               for i in range(options.requests)])
+    finally:
+        p.terminate()
+        p.wait()
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+""" ./worker_memory.py [-i <hippy binary>] [-n <files>] [-w <workers>]
+
+Generates an include tree (as bytecode_cache.py does), serves it with a
+pool of 'hippy --workers', once compiling in every worker and once from
+a bytecode image built with 'hippy --build-image', and prints the
+resident (RSS) and proportional (PSS) memory per worker.  PSS divides
+the pages shared between processes among them, so it shows what every
+additional worker really costs.
+"""
+import os
+import time
+import shutil
+import tempfile
+import optparse
+import subprocess
+
+from bytecode_cache import generate_tree
+from worker_latency import start_workers, worker_request
+
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+
+def worker_pids(master):
+    path = '/proc/%d/task/%d/children' % (master, master)
+    with open(path) as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def memory_kb(pid):
+    """ The RSS and the PSS of 'pid', in kB """
+    rss = pss = 0
+    with open('/proc/%d/smaps' % pid) as f:
+        for line in f:
+            if line.startswith('Rss:'):
+                rss += int(line.split()[1])
+            elif line.startswith('Pss:'):
+                pss += int(line.split()[1])
+    return rss, pss
+
+
+def measure(interpreter, workers, sock_path, main, extra_args):
+    p = start_workers(interpreter, workers, sock_path, extra_args)
+    try:
+        # enough requests for every worker to run the whole tree
+        for i in range(workers * 10):
+            worker_request(sock_path, main)
+        time.sleep(0.5)
+        return [memory_kb(pid) for pid in worker_pids(p.pid)]
+    finally:
+        p.terminate()
+        p.wait()
+
+
+def report(name, results):
+    rss = sum([r for r, p in results]) / len(results)
+    pss = sum([p for r, p in results]) / len(results)
+    print "  %-12s RSS %8.1f MB  PSS %8.1f MB per worker" % (
+        name, rss / 1024.0, pss / 1024.0)
+    return pss
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option("-i", dest="interpreter",
+                      default=os.path.join(BASE_DIR, "..", "hippy-c"))
+    parser.add_option("-n", dest="files", type="int", default=1000)
+    parser.add_option("-w", dest="workers", type="int", default=8)
+    options, _ = parser.parse_args()
+    interpreter = os.path.abspath(options.interpreter)
+
+    root = tempfile.mkdtemp(prefix="hippy-image-")
+    try:
+        main = generate_tree(root, options.files)
+        image = os.path.join(root, 'image.bin')
+        subprocess.check_call([interpreter, '--build-image', image, root],
+                              stdout=subprocess.PIPE)
+        sock_path = os.path.join(root, 'sock')
+        print "include tree: %d files, %d workers" % (options.files,
+                                                     options.workers)
+        plain = report('compiled', measure(interpreter, options.workers,
+                                           sock_path, main, []))
+        shared = report('image', measure(interpreter, options.workers,
+                                         sock_path, main,
+                                         ['--image', image]))
+        print "  PSS saved per worker: %.1f MB" % ((plain - shared) / 1024.0)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import sys, struct
+import sys
 
 from rply.token import BaseBox
 from rply import ParsingError
@@ -8,8 +8,9 @@ from hippy import consts
 from hippy.error import InterpreterError
 from hippy.function import ClosureArgDesc
 from hippy.objects.base import W_Root, W_Object
+from hippy.objects.support import ll_pack_long
 from hippy.objects.reference import W_Reference
-from hippy.objects.strobject import W_ConstStringObject
+from hippy.objects.strobject import W_ConstStringObject, interned_str
 
 
 class ParseError(ParsingError):
@@ -40,6 +41,11 @@ class W_Constant(DelayedObject):
     def eval_static(self, space):
         return space.ec.interpreter.locate_constant(self.name)
 
+    def ll_serialize(self, builder):
+        builder.append("c")
+        ll_pack_long(builder, len(self.name))
+        builder.append(self.name)
+
     def repr(self):
         return self.name
 
@@ -54,7 +60,7 @@ class DelayedArray(DelayedObject):
 
     def ll_serialize(self, builder):
         builder.append("a")
-        builder.append(struct.pack("l", len(self.values)))
+        ll_pack_long(builder, len(self.values))
         for w_v in self.values:
             w_v.ll_serialize(builder)
 
@@ -79,9 +85,12 @@ class DelayedHash(DelayedObject):
 
     def ll_serialize(self, builder):
         builder.append("h")
-        builder.append(struct.pack("l", len(self.pairs)))
+        ll_pack_long(builder, len(self.pairs))
         for k, w_v in self.pairs:
-            k.ll_serialize(builder)
+            if k is None:
+                builder.append("-")
+            else:
+                k.ll_serialize(builder)
             w_v.ll_serialize(builder)
 
     def repr(self):
@@ -162,6 +171,11 @@ class Node(BaseBox):
         self.compile_ptr(ctx, mode=RW)
         ctx.emit(consts.RESOLVE_FOR_WRITING)
 
+    def compile_cond(self, ctx):
+        """Compile the expression as the condition of a jump, which only
+        checks if the result is true and then drops it."""
+        self.compile(ctx)
+
     def compile_unset(self, ctx):
         self.compile_ptr(ctx, mode=UNSET)
         ctx.emit(consts.PTR_UNSET)
@@ -474,7 +488,15 @@ class Assignment(Node):
                                        self.lineno)
 
     def _compile(self, ctx):
-        self.var.compile_ptr(ctx, mode=WRITE)
+        var = self.var
+        if (ctx.superinstructions and isinstance(var, NamedVariable) and
+                not var.is_this() and not self.expr.is_unique_result()):
+            # the pointer to a plain variable can be taken after the
+            # expression is evaluated, which gives STORE_VAR
+            self.expr.compile(ctx)
+            ctx.emit(consts.STORE_VAR, ctx.create_var_name(var.name))
+            return
+        var.compile_ptr(ctx, mode=WRITE)
         self.expr.compile(ctx)
         if self.expr.is_unique_result():
             ctx.emit(consts.STORE_UNIQUE)
@@ -619,7 +641,21 @@ class ConstantStr(Const):
         ctx.emit(consts.LOAD_NAME, ctx.create_name(strval))
 
     def wrap(self, ctx, space):
-        return space.newstr(self.strval)
+        return interned_str(self.strval)
+
+
+class ConstantPattern(ConstantStr):
+    """The literal pattern of a call to one of PATTERN_FUNCTIONS, loaded
+    from the pattern slot of the call site instead of the names."""
+    def __init__(self, strval, slot, lineno=0):
+        ConstantStr.__init__(self, strval, lineno)
+        self.slot = slot
+
+    def repr(self):
+        return "ConstantPattern(%s, %d)" % (self.strval, self.lineno)
+
+    def _compile(self, ctx):
+        ctx.emit(consts.LOAD_PATTERN, self.slot)
 
 class LinkedList(Node):
     def __init__(self, left, right):
@@ -935,6 +971,13 @@ class NamedVariable(Variable):
     def _compile(self, ctx):
         ctx.emit(consts.LOAD_VAR, ctx.create_var_name(self.name))
 
+    def compile_cond(self, ctx):
+        # the value does not escape, so reading it must not cause a
+        # later write to the variable to copy the array it contains
+        if self.lineno != 0:
+            ctx.set_lineno(self.lineno)
+        ctx.emit(consts.LOAD_VAR_TEMP, ctx.create_var_name(self.name))
+
     def compile_ptr(self, ctx, mode=READ):
         if self.name == 'this' and mode == WRITE:
             raise CompilerError("Cannot re-assign $this")
@@ -1120,7 +1163,7 @@ class While(Node):
     def _compile(self, ctx):
         pos = ctx.enter_loop()
         ctx.register_continue_target()
-        self.expr.compile(ctx)
+        self.expr.compile_cond(ctx)
         ctx.emit(consts.JUMP_IF_FALSE, PLACEHOLDER)
         ctx.register_break()
         self.body.compile(ctx)
@@ -1141,7 +1184,7 @@ class DoWhile(Node):
         jmp_pos = ctx.enter_loop()
         ctx.register_continue_target()
         self.body.compile(ctx)
-        self.expr.compile(ctx)
+        self.expr.compile_cond(ctx)
         ctx.emit(consts.JUMP_BACK_IF_TRUE, jmp_pos)
         ctx.leave_loop()
 
@@ -1170,7 +1213,7 @@ class For(Node):
             ctx.emit(consts.DISCARD_TOP)
         pos = ctx.enter_loop()
         if self.cond is not None:
-            self.cond.compile(ctx)
+            self.cond.compile_cond(ctx)
             ctx.emit(consts.JUMP_IF_FALSE, PLACEHOLDER)
             ctx.register_break()
         self.body.compile(ctx)
@@ -1207,7 +1250,7 @@ class If(Node):
                                        elseif, elseclause, self.lineno)
 
     def _compile(self, ctx):
-        self.cond.compile(ctx)
+        self.cond.compile_cond(ctx)
         ctx.emit(consts.JUMP_IF_FALSE, PLACEHOLDER)
         pos = ctx.get_pos()
         self.body.compile(ctx)
@@ -1218,7 +1261,7 @@ class If(Node):
             jump_after_list.append(ctx.get_pos())
             ctx.patch_pos(pos)
             assert isinstance(elem, If)
-            elem.cond.compile(ctx)
+            elem.cond.compile_cond(ctx)
             ctx.emit(consts.JUMP_IF_FALSE, PLACEHOLDER)
             pos = ctx.get_pos()
             elem.body.compile(ctx)
@@ -1245,6 +1288,11 @@ class _BaseCall(Node):
         ctx.emit(consts.REF_PTR)
 
 
+# the builtins whose first argument is a PCRE pattern
+PATTERN_FUNCTIONS = ['preg_match', 'preg_match_all', 'preg_split',
+                     'preg_replace', 'preg_replace_callback', 'preg_filter']
+
+
 class SimpleCall(_BaseCall):
     def __init__(self, name, args, lineno=0):
         self.name = name
@@ -1275,7 +1323,29 @@ class SimpleCall(_BaseCall):
         else:
             name.compile(ctx)
             ctx.emit(consts.GETFUNC)
-        ctx.compile_call(self.args)
+        ctx.compile_call(self.pattern_args(ctx))
+
+    def pattern_args(self, ctx):
+        """The arguments, with a literal pattern of one of the
+        PATTERN_FUNCTIONS turned into a ConstantPattern if it compiles."""
+        args = self.args
+        if not args or not isinstance(args[0], ConstantStr):
+            return args
+        name = self.name
+        if not isinstance(name, NameBase):
+            return args
+        fname = name.as_unqualified()
+        if isinstance(name, AbsoluteName) and len(name.parts) == 1:
+            fname = name.parts[0]
+        if fname is None or fname.lower() not in PATTERN_FUNCTIONS:
+            return args
+        pattern = args[0]
+        assert isinstance(pattern, ConstantStr)
+        slot = ctx.create_pattern(pattern.strval)
+        if slot < 0:
+            return args
+        return [ConstantPattern(pattern.strval, slot, pattern.lineno)] + \
+            args[1:]
 
 
 class DynamicCall(_BaseCall):
@@ -2064,7 +2134,7 @@ class IfExpr(Node):
                                        self.right.repr())
 
     def _compile(self, ctx):
-        self.cond.compile(ctx)
+        self.cond.compile_cond(ctx)
         ctx.emit(consts.JUMP_IF_FALSE, PLACEHOLDER)
         jmp_if_false_pos = ctx.get_pos()
         self.left.compile(ctx)
@@ -5,18 +5,22 @@ from hippy.objects.base import W_Root
 from hippy.objects.intobject import W_IntObject
 from hippy.objects.floatobject import W_FloatObject
 from hippy.objects.interpolate import W_StrInterpolation
+from hippy.objects.strobject import interned_str
 from hippy import consts
 from hippy.bytecode import ByteCode
 from hippy.function import Function
 from rpython.rlib.objectmodel import we_are_translated, enforceargs
 
 class ConstantMarker(W_Root):
-    pass
+    def ll_serialize(self, builder):
+        builder.append("m")
 
-@enforceargs(str, str, None, None, bool)
-def compile_ast(filename, source, mainnode, space, print_exprs=False):
+@enforceargs(str, str, None, None, bool, bool)
+def compile_ast(filename, source, mainnode, space, print_exprs=False,
+                superinstructions=False):
     ctx = CompilerContext(filename, source.split("\n"), 1, space,
-                          print_exprs=print_exprs)
+                          print_exprs=print_exprs,
+                          superinstructions=superinstructions)
     assert isinstance(mainnode, Block)
     try:
         for stmt in mainnode.stmts:
@@ -28,12 +32,9 @@ def compile_ast(filename, source, mainnode, space, print_exprs=False):
     return ctx.create_bytecode()
 
 
-def intern(name, cache={}):
-    try:
-        return cache[name]
-    except KeyError:
-        cache[name] = name
-        return name
+def intern(name):
+    """Names and literal strings are shared by all the compiled files."""
+    return interned_str(name).unwrap()
 
 SUPERGLOBALS = ['GLOBALS', '_SERVER', '_GET', '_POST', "_COOKIE", "_SESSION"]
 SUPERGLOBAL_LOOKUP = {}
@@ -48,7 +49,7 @@ class CompilerContext(object):
 
     def __init__(self, filename, sourcelines, startlineno,
                  space, name='<main>',
-                 print_exprs=False, is_global=True):
+                 print_exprs=False, is_global=True, superinstructions=False):
         self.space = space
         self.filename = filename
         self.sourcelines = sourcelines
@@ -56,6 +57,7 @@ class CompilerContext(object):
         self.consts = []
         self.names = []
         self.names_to_nums = {}
+        self.patterns_w = []
         self.varnames = []
         self.varnames_to_nums = {}
         self.int_cache = {}
@@ -81,6 +83,15 @@ class CompilerContext(object):
         self.current_namespace = []
         self.inside_ns_block = False
         self.use_aliases = {}
+        self.superinstructions = superinstructions
+        # the last two emitted instructions, as candidates for being fused
+        # with the next one (see consts.SUPERINSTRUCTIONS)
+        self.last_pos = -1
+        self.last_bc = 0
+        self.last_arg = -42
+        self.prev_pos = -1
+        self.prev_bc = 0
+        self.prev_arg = -42
 
     def warn(self, msg):
         from hippy.constants import E_HIPPY_WARN
@@ -92,23 +103,71 @@ class CompilerContext(object):
     def set_lineno(self, lineno):
         self.cur_lineno = lineno
 
-    def emit(self, bc, arg=-42):
+    def emit(self, bc, arg=-42, arg2=-42):
+        if self.superinstructions and self.last_pos >= 0:
+            fused = consts.SUPERINSTRUCTIONS.get((self.last_bc, bc), -1)
+            if fused >= 0:
+                self._emit_fused(fused, arg, arg2)
+                return
+        self._emit(bc, arg, arg2)
+
+    def _emit_fused(self, fused, arg, arg2):
+        # replace the last emitted instruction with 'fused', whose
+        # arguments are the ones of the last instruction followed by
+        # 'arg' and 'arg2'.  The result may in turn be fused with the
+        # instruction before.
+        pos = self.last_pos
+        if self.last_arg != -42:
+            assert arg2 == -42
+            arg2 = arg
+            arg = self.last_arg
+        lineno = self.lineno_map[pos]
+        del self.data[pos:]
+        del self.lineno_map[pos:]
+        self.last_pos = self.prev_pos
+        self.last_bc = self.prev_bc
+        self.last_arg = self.prev_arg
+        self.prev_pos = -1
+        saved_lineno = self.cur_lineno
+        self.cur_lineno = lineno
+        self.emit(fused, arg, arg2)
+        self.cur_lineno = saved_lineno
+
+    def _emit(self, bc, arg, arg2):
+        self.prev_pos = self.last_pos
+        self.prev_bc = self.last_bc
+        self.prev_arg = self.last_arg
+        self.last_pos = len(self.data)
+        self.last_bc = bc
+        self.last_arg = arg
         self.lineno_map.append(self.cur_lineno)
         self.data.append(chr(bc))
         if bc >= consts.BYTECODE_HAS_ARG:
             assert arg >= 0
-            a = arg
-            while a >= 0x80:
-                self.data.append(chr((a & 0x7f) | 0x80))
-                self.lineno_map.append(self.cur_lineno)
-                a ^= 0x80
-                a >>= 7
-            self.data.append(chr(a))
-            self.lineno_map.append(self.cur_lineno)
+            self._emit_arg(arg)
+            if bc >= consts.BYTECODE_HAS_ARG2:
+                assert arg2 >= 0
+                self._emit_arg(arg2)
+            else:
+                assert arg2 == -42
         else:
             assert arg == -42
+            assert arg2 == -42
+
+    def _emit_arg(self, a):
+        while a >= 0x80:
+            self.data.append(chr((a & 0x7f) | 0x80))
+            self.lineno_map.append(self.cur_lineno)
+            a ^= 0x80
+            a >>= 7
+        self.data.append(chr(a))
+        self.lineno_map.append(self.cur_lineno)
 
     def get_pos(self):
+        # the position may be recorded as a jump target, so nothing
+        # emitted so far can be fused with what comes next
+        self.last_pos = -1
+        self.prev_pos = -1
         return len(self.data)
 
     def patch_with(self, pos, a):
@@ -254,6 +313,17 @@ class CompilerContext(object):
             self.names.append(name)
             return r
 
+    def create_pattern(self, pattern):
+        """Compile the literal pattern of a preg_*() call and give it a slot
+        of its own.  Return -1 if it does not compile: the call then
+        reports the error when it runs, as it does for other patterns."""
+        from hippy.module.regex.interface import literal_pattern
+        w_pattern = literal_pattern(self.space, pattern)
+        if w_pattern is None:
+            return -1
+        self.patterns_w.append(w_pattern)
+        return len(self.patterns_w) - 1
+
     def create_var_name(self, name):
         name = intern(name)
         try:
@@ -311,7 +381,8 @@ class CompilerContext(object):
                         self.filename, self.sourcelines, self.method_of_class,
                         self.startlineno,
                         self.lineno_map[:], self.name, self.superglobals,
-                        self.this_var_num, self.static_vars)
+                        self.this_var_num, self.static_vars,
+                        self.patterns_w[:])
 
     def compile_call(self, args):
         for i, arg in enumerate(args):
@@ -348,7 +419,8 @@ class CompilerContext(object):
                          returns_reference, body, is_method_of=None,
                          static=False):
         new_context = CompilerContext(self.filename, self.sourcelines, lineno,
-                                      self.space, name, is_global=False)
+                                      self.space, name, is_global=False,
+                                      superinstructions=self.superinstructions)
         new_context.current_namespace = self.current_namespace
         new_context.use_aliases = self.use_aliases
         args = []
@@ -0,0 +1,393 @@
+""" An optimization pass over the AST, run between the parser and
+compile_ast() (see compile_php()).  It only does transformations that
+cannot change the behaviour of the program:
+
+  * arithmetic, concatenation and comparisons whose operands are all
+    literals are computed at compile-time;
+  * 'if', '?:', '&&', '||' and 'while' with a constant condition lose
+    their dead branches;
+  * as a consequence, more array literals become constant and are
+    built only once, as a LOAD_CONST (see Hash._compile()).
+
+Named constants other than true/false/null are only known at run-time,
+so they are left alone.  Anything that could emit a warning (division
+by zero, float-to-string conversion depending on 'precision', ...) is
+left for the interpreter as well.
+"""
+
+import sys
+
+from hippy.ast import (
+    Block, Stmt, Echo, Print, Return, Assignment, InplaceOp, BinOp,
+    InstanceOf, PrefixOp, And, Or, IfExpr, If, While, DoWhile, For, ForEach,
+    ForEachKey, Switch, Case, TryBlock, CatchBlock, FunctionDecl, LambdaDecl,
+    ClassBlock, NamespaceBlock, SimpleCall, Hash, Cast, ConstantInt,
+    ConstantFloat, ConstantStr, NamedConstant, RelativeName, GotoLabel, Goto)
+
+
+ARITHMETIC_OPS = ['+', '-', '*', '/', '%', '<<', '>>', '|', '&', '^']
+COMPARISON_OPS = ['==', '!=', '<>', '<', '>', '<=', '>=', '===', '!==']
+
+
+def optimize_ast(space, mainnode):
+    """Return an optimized version of 'mainnode'.  The tree is modified
+    in-place."""
+    assert isinstance(mainnode, Block)
+    return ASTOptimizer(space).optimize_block(mainnode)
+
+
+def _new_bool(value, lineno):
+    if value:
+        name = 'true'
+    else:
+        name = 'false'
+    return NamedConstant(RelativeName([name], lineno), lineno)
+
+
+class ASTOptimizer(object):
+    def __init__(self, space):
+        self.space = space
+
+    # ____________________________________________________________
+    # statements
+
+    def optimize_block(self, block):
+        assert isinstance(block, Block)
+        block.stmts = [self.optimize_stmt(stmt) for stmt in block.stmts]
+        return block
+
+    def optimize_stmt(self, node):
+        if isinstance(node, Block):
+            return self.optimize_block(node)
+        elif isinstance(node, Return):
+            if node.expr is not None:
+                node.expr = self.optimize_expr(node.expr)
+        elif isinstance(node, Stmt):
+            node.expr = self.optimize_expr(node.expr)
+        elif isinstance(node, Echo):
+            node.exprlist = [self.optimize_expr(expr)
+                             for expr in node.exprlist]
+        elif isinstance(node, If):
+            return self.optimize_if(node)
+        elif isinstance(node, While):
+            node.expr = self.optimize_expr(node.expr)
+            if self.is_false(node.expr) and not self.has_label(node.body):
+                return Block()
+            node.body = self.optimize_stmt(node.body)
+        elif isinstance(node, DoWhile):
+            node.body = self.optimize_stmt(node.body)
+            node.expr = self.optimize_expr(node.expr)
+        elif isinstance(node, For):
+            if node.start is not None:
+                node.start = self.optimize_expr(node.start)
+            if node.cond is not None:
+                node.cond = self.optimize_expr(node.cond)
+            if node.step is not None:
+                node.step = self.optimize_expr(node.step)
+            node.body = self.optimize_stmt(node.body)
+        elif isinstance(node, ForEach):
+            node.expr = self.optimize_expr(node.expr)
+            if node.body is not None:
+                node.body = self.optimize_stmt(node.body)
+        elif isinstance(node, ForEachKey):
+            node.expr = self.optimize_expr(node.expr)
+            node.body = self.optimize_stmt(node.body)
+        elif isinstance(node, Switch):
+            node.expr = self.optimize_expr(node.expr)
+            for case in node.casesblock.getstmtlist():
+                assert isinstance(case, Case)
+                if case.expr is not None:
+                    case.expr = self.optimize_expr(case.expr)
+                case.block = self.optimize_stmt(case.block)
+        elif isinstance(node, TryBlock):
+            node.block = self.optimize_stmt(node.block)
+            for catch_block in node.catch_blocks:
+                assert isinstance(catch_block, CatchBlock)
+                catch_block.block = self.optimize_stmt(catch_block.block)
+        elif isinstance(node, FunctionDecl):   # and MethodBlock
+            if node.body is not None:
+                node.body = self.optimize_stmt(node.body)
+        elif isinstance(node, ClassBlock):
+            for decl in node.body.getstmtlist():
+                self.optimize_stmt(decl)
+        elif isinstance(node, NamespaceBlock):
+            self.optimize_block(node.body)
+        else:
+            return self.optimize_expr(node)
+        return node
+
+    def optimize_if(self, node):
+        node.cond = self.optimize_expr(node.cond)
+        for elem in node.elseiflist:
+            assert isinstance(elem, If)
+            elem.cond = self.optimize_expr(elem.cond)
+        if not self.has_label(node):
+            pruned = self.prune_if(node)
+            if pruned is not node:
+                return self.optimize_stmt(pruned)
+        node.body = self.optimize_stmt(node.body)
+        for elem in node.elseiflist:
+            assert isinstance(elem, If)
+            elem.body = self.optimize_stmt(elem.body)
+        if node.elseclause is not None:
+            node.elseclause = self.optimize_stmt(node.elseclause)
+        return node
+
+    def prune_if(self, node):
+        """Drop the branches of 'node' whose condition is always false,
+        and everything after the first condition that is always true."""
+        branches = [node] + node.elseiflist
+        elseclause = node.elseclause
+        live = []
+        for elem in branches:
+            assert isinstance(elem, If)
+            if self.is_false(elem.cond):
+                continue
+            live.append(elem)
+            if self.is_true(elem.cond):
+                break
+        if live and self.is_true(live[-1].cond):
+            elseclause = live.pop().body
+        if not live:
+            if elseclause is None:
+                return Block()
+            return elseclause
+        if len(live) == len(branches) and elseclause is node.elseclause:
+            return node
+        first = live[0]
+        return If(first.cond, first.body, live[1:], elseclause, node.lineno)
+
+    def has_label(self, node):
+        """Check if there is a 'goto' label somewhere in the statement
+        'node'.  Such code cannot be removed even if it is unreachable
+        from the top, as it can be jumped to."""
+        if isinstance(node, Block):
+            for stmt in node.stmts:
+                if self.has_label(stmt):
+                    return True
+            return False
+        elif isinstance(node, GotoLabel):
+            return not isinstance(node, Goto)
+        elif isinstance(node, If):
+            if self.has_label(node.body):
+                return True
+            for elem in node.elseiflist:
+                if self.has_label(elem):
+                    return True
+            return (node.elseclause is not None and
+                    self.has_label(node.elseclause))
+        elif isinstance(node, While):
+            return self.has_label(node.body)
+        elif isinstance(node, For):
+            return self.has_label(node.body)
+        elif isinstance(node, DoWhile):
+            return self.has_label(node.body)
+        elif isinstance(node, ForEach):
+            return node.body is not None and self.has_label(node.body)
+        elif isinstance(node, ForEachKey):
+            return self.has_label(node.body)
+        elif isinstance(node, Switch):
+            for case in node.casesblock.getstmtlist():
+                assert isinstance(case, Case)
+                if self.has_label(case.block):
+                    return True
+            return False
+        elif isinstance(node, TryBlock):
+            if self.has_label(node.block):
+                return True
+            for catch_block in node.catch_blocks:
+                assert isinstance(catch_block, CatchBlock)
+                if self.has_label(catch_block.block):
+                    return True
+            return False
+        return False
+
+    # ____________________________________________________________
+    # expressions
+
+    def optimize_expr(self, node):
+        if isinstance(node, InstanceOf):
+            return node
+        elif isinstance(node, BinOp):
+            node.left = self.optimize_expr(node.left)
+            node.right = self.optimize_expr(node.right)
+            return self.fold_binop(node)
+        elif isinstance(node, PrefixOp):
+            node.val = self.optimize_expr(node.val)
+            return self.fold_prefixop(node)
+        elif isinstance(node, And):
+            node.left = self.optimize_expr(node.left)
+            node.right = self.optimize_expr(node.right)
+            if self.is_false(node.left):
+                return _new_bool(False, node.lineno)
+            elif self.is_true(node.left):
+                return self.as_bool(node.right, node.lineno)
+            return node
+        elif isinstance(node, Or):
+            node.left = self.optimize_expr(node.left)
+            node.right = self.optimize_expr(node.right)
+            if self.is_true(node.left):
+                return _new_bool(True, node.lineno)
+            elif self.is_false(node.left):
+                return self.as_bool(node.right, node.lineno)
+            return node
+        elif isinstance(node, IfExpr):
+            node.cond = self.optimize_expr(node.cond)
+            node.left = self.optimize_expr(node.left)
+            node.right = self.optimize_expr(node.right)
+            if self.is_true(node.cond):
+                return node.left
+            elif self.is_false(node.cond):
+                return node.right
+            return node
+        elif isinstance(node, Assignment):
+            node.expr = self.optimize_expr(node.expr)
+        elif isinstance(node, InplaceOp):
+            node.expr = self.optimize_expr(node.expr)
+        elif isinstance(node, Print):
+            node.expr = self.optimize_expr(node.expr)
+        elif isinstance(node, Cast):
+            node.expr = self.optimize_expr(node.expr)
+        elif isinstance(node, SimpleCall):
+            node.args = [self.optimize_expr(arg) for arg in node.args]
+        elif isinstance(node, LambdaDecl):
+            if node.body is not None:
+                node.body = self.optimize_stmt(node.body)
+        elif isinstance(node, Hash):
+            initializers = []
+            for key, value in node.initializers:
+                if key is not None:
+                    key = self.optimize_expr(key)
+                initializers.append((key, self.optimize_expr(value)))
+            node.initializers = initializers
+        return node
+
+    def as_bool(self, node, lineno):
+        w_value = self.literal_value(node)
+        if w_value is not None:
+            return _new_bool(self.space.is_true(w_value), lineno)
+        return Cast('bool', node, lineno)
+
+    def literal_value(self, node):
+        """Return the wrapped value of 'node' if it is a scalar literal,
+        or None."""
+        space = self.space
+        if isinstance(node, ConstantInt):
+            return space.newint(node.intval)
+        elif isinstance(node, ConstantFloat):
+            return space.newfloat(node.floatval)
+        elif isinstance(node, ConstantStr):
+            return space.newstr(node.strval)
+        elif isinstance(node, NamedConstant) and node.is_constant():
+            return node.wrap(None, space)
+        return None
+
+    def is_true(self, node):
+        w_value = self.literal_value(node)
+        return w_value is not None and self.space.is_true(w_value)
+
+    def is_false(self, node):
+        w_value = self.literal_value(node)
+        return w_value is not None and not self.space.is_true(w_value)
+
+    def new_literal(self, w_value, lineno):
+        space = self.space
+        if w_value.tp == space.tp_int:
+            return ConstantInt(space.int_w(w_value), lineno)
+        elif w_value.tp == space.tp_float:
+            return ConstantFloat(space.float_w(w_value), lineno)
+        elif w_value.tp == space.tp_str:
+            return ConstantStr(space.str_w(w_value), lineno)
+        elif w_value.tp == space.tp_bool:
+            return _new_bool(space.is_true(w_value), lineno)
+        return None
+
+    def is_number(self, w_value):
+        space = self.space
+        return w_value.tp == space.tp_int or w_value.tp == space.tp_float
+
+    def fold_binop(self, node):
+        w_left = self.literal_value(node.left)
+        if w_left is None:
+            return node
+        w_right = self.literal_value(node.right)
+        if w_right is None:
+            return node
+        w_result = self.compute_binop(node.op.lower(), w_left, w_right)
+        if w_result is None:
+            return node
+        result = self.new_literal(w_result, node.lineno)
+        if result is None:
+            return node
+        return result
+
+    def compute_binop(self, op, w_left, w_right):
+        space = self.space
+        if op in ARITHMETIC_OPS:
+            if not self.is_number(w_left) or not self.is_number(w_right):
+                return None
+            if op == '+':
+                return space.add(w_left, w_right)
+            elif op == '-':
+                return space.sub(w_left, w_right)
+            elif op == '*':
+                return space.mul(w_left, w_right)
+            elif op == '/':
+                if not space.is_true(w_right):
+                    return None     # "Division by zero" at run-time
+                return space.div(w_left, w_right)
+            # the remaining operators work on integers only
+            if w_left.tp != space.tp_int or w_right.tp != space.tp_int:
+                return None
+            if op == '%':
+                if space.int_w(w_right) == 0:
+                    return None
+                return space.mod(w_left, w_right)
+            elif op == '<<':
+                return space.lshift(w_left, w_right)
+            elif op == '>>':
+                return space.rshift(w_left, w_right)
+            elif op == '|':
+                return space.or_(w_left, w_right)
+            elif op == '&':
+                return space.and_(w_left, w_right)
+            elif op == '^':
+                return space.xor(w_left, w_right)
+        elif op == '.':
+            # floats are converted according to the 'precision' setting
+            if (w_left.tp == space.tp_float or
+                    w_right.tp == space.tp_float):
+                return None
+            return space.concat(w_left, w_right)
+        elif op in COMPARISON_OPS:
+            if op == '==':
+                return space.eq(w_left, w_right)
+            elif op == '!=' or op == '<>':
+                return space.ne(w_left, w_right)
+            elif op == '<':
+                return space.lt(w_left, w_right)
+            elif op == '>':
+                return space.gt(w_left, w_right)
+            elif op == '<=':
+                return space.le(w_left, w_right)
+            elif op == '>=':
+                return space.ge(w_left, w_right)
+            elif op == '===':
+                return space.newbool(space.is_w(w_left, w_right))
+            elif op == '!==':
+                return space.newbool(not space.is_w(w_left, w_right))
+        return None
+
+    def fold_prefixop(self, node):
+        w_value = self.literal_value(node.val)
+        if w_value is None:
+            return node
+        if node.op == '!':
+            return _new_bool(not self.space.is_true(w_value), node.lineno)
+        elif node.op == '-':
+            val = node.val
+            if isinstance(val, ConstantInt) and val.intval != -sys.maxint - 1:
+                return ConstantInt(-val.intval, node.lineno)
+            elif isinstance(val, ConstantFloat):
+                return ConstantFloat(-val.floatval, node.lineno)
+        return node
@@ -0,0 +1,244 @@
+""" Bytecode images: the compiled bytecode of a whole include tree in a
+single file, for 'hippy --build-image' and 'hippy --workers --image'.
+
+An image is made of
+
+    'HIPPYIM1' + the length of the index as 8 hex digits
+    the index: compiler version and flags, and for every source file its
+               absolute path, mtime, size, and the offset, length and
+               checksum of its bytecode
+    the bytecode of every file, as written by hippy.bytecode.Serializer
+
+The worker master maps the image read-only and copy-on-write, and loads
+every file from it before forking, so that the workers start with all
+the ByteCode objects in pages shared with the master.  Only the entries
+whose source file did not change since the image was built are used.
+"""
+
+import os
+import stat
+from rpython.rlib import rmmap
+from rpython.rlib.objectmodel import compute_hash
+from rpython.rlib.rarithmetic import intmask
+from hippy.phpcompiler import compile_php
+from hippy.bytecode import (Serializer, Unserializer, SerializerException,
+                            UnserializerException)
+from hippy.bytecode_cache import COMPILER_VERSION, _mtime_key
+from hippy.rpath import abspath, join
+
+IMAGE_MAGIC = 'HIPPYIM1'
+HEADER_SIZE = len(IMAGE_MAGIC) + 8
+SOURCE_EXTENSIONS = ['.php', '.inc']
+
+
+class ImageError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+
+class ImageEntry(object):
+    def __init__(self, path, mtime, size, offset, length, checksum):
+        self.path = path
+        self.mtime = mtime
+        self.size = size
+        self.offset = offset
+        self.length = length
+        self.checksum = checksum
+
+
+def find_sources(paths):
+    """ The absolute paths of the given files, and of the sources found
+    under the given directories, in a stable order
+    """
+    result = []
+    for path in paths:
+        _find_sources(abspath(path), result)
+    return result
+
+
+def _find_sources(path, result):
+    st = os.stat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        result.append(path)
+        return
+    names = os.listdir(path)
+    names.sort()
+    for name in names:
+        if name.startswith('.'):
+            continue
+        full = join(path, [name])
+        if stat.S_ISDIR(os.stat(full).st_mode):
+            _find_sources(full, result)
+            continue
+        for ext in SOURCE_EXTENSIONS:
+            if name.endswith(ext):
+                result.append(full)
+                break
+
+
+def build_image(space, paths, image_path):
+    """ Compile the sources found in 'paths' into the image 'image_path'.
+    Return the number of files in it; the files that don't compile or
+    that cannot be serialized are reported and left out.
+    """
+    index = Serializer(space)
+    bodies = []
+    entries = []
+    offset = 0
+    for path in find_sources(paths):
+        st = os.stat(path)
+        f = open(path)
+        try:
+            data = f.read(-1)
+        finally:
+            f.close()
+        try:
+            bc = compile_php(path, data, space)
+            body = Serializer(space).write_bytecode(bc).finish()
+        except SerializerException:
+            os.write(2, "%s: cannot be stored in an image, skipped\n" % path)
+            continue
+        except Exception as e:
+            os.write(2, "%s: %s, skipped\n" % (path, e))
+            continue
+        entries.append(ImageEntry(path, _mtime_key(st), intmask(st.st_size),
+                                  offset, len(body), compute_hash(body)))
+        bodies.append(body)
+        offset += len(body)
+    index.write_str(COMPILER_VERSION)
+    index.write_int(int(space.optimize_ast))
+    index.write_int(int(space.superinstructions))
+    index.write_int(len(entries))
+    for entry in entries:
+        index.write_str(entry.path)
+        index.write_int(entry.mtime)
+        index.write_int(entry.size)
+        index.write_int(entry.offset)
+        index.write_int(entry.length)
+        index.write_int(entry.checksum)
+    index_data = index.finish()
+    tmppath = '%s.%d.tmp' % (image_path, os.getpid())
+    fd = os.open(tmppath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0644)
+    try:
+        _write_all(fd, '%s%08x' % (IMAGE_MAGIC, len(index_data)))
+        _write_all(fd, index_data)
+        for body in bodies:
+            _write_all(fd, body)
+    finally:
+        os.close(fd)
+    os.rename(tmppath, image_path)
+    return len(entries)
+
+
+def _write_all(fd, data):
+    while data:
+        written = os.write(fd, data)
+        data = data[written:]
+
+
+class BytecodeImage(object):
+    def __init__(self, path):
+        """ Map the image 'path'.  Raises ImageError if it is not an
+        image or if it was built by another compiler or with other flags.
+        """
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.stale = 0
+        try:
+            fd = os.open(path, os.O_RDONLY, 0)
+        except OSError:
+            raise ImageError("cannot open %s" % path)
+        try:
+            size = intmask(os.fstat(fd).st_size)
+            if size < HEADER_SIZE:
+                raise ImageError("%s is not a bytecode image" % path)
+            self.mmap = rmmap.mmap(fd, size, flags=rmmap.MAP_PRIVATE,
+                                   prot=rmmap.PROT_READ)
+        finally:
+            # the mapping stays valid after the file is closed
+            os.close(fd)
+        self.size = size
+        self._read_index()
+
+    def _read_index(self):
+        header = self.mmap.getslice(0, HEADER_SIZE)
+        if header[:len(IMAGE_MAGIC)] != IMAGE_MAGIC:
+            raise ImageError("%s is not a bytecode image" % self.path)
+        try:
+            index_length = int(header[len(IMAGE_MAGIC):], 16)
+        except ValueError:
+            raise ImageError("%s is not a bytecode image" % self.path)
+        self.data_start = HEADER_SIZE + index_length
+        if self.data_start > self.size:
+            raise ImageError("%s is truncated" % self.path)
+        index = Unserializer(self.mmap.getslice(HEADER_SIZE, index_length),
+                             None)
+        try:
+            if index.read_str() != COMPILER_VERSION:
+                raise ImageError("%s was built by another version of hippy"
+                                 % self.path)
+            self.optimize_ast = index.read_int()
+            self.superinstructions = index.read_int()
+            for i in range(index.read_int()):
+                path = index.read_str()
+                entry = ImageEntry(path, index.read_int(), index.read_int(),
+                                   index.read_int(), index.read_int(),
+                                   index.read_int())
+                if (entry.offset < 0 or entry.length < 0 or
+                        self.data_start + entry.offset + entry.length >
+                        self.size):
+                    raise ImageError("%s is truncated" % self.path)
+                self.entries[path] = entry
+        except UnserializerException:
+            raise ImageError("%s has a corrupted index" % self.path)
+
+    def matches(self, space):
+        return (self.optimize_ast == int(space.optimize_ast) and
+                self.superinstructions == int(space.superinstructions))
+
+    def load(self, space, abs_fname, st):
+        """ Return the bytecode of 'abs_fname' from the image, or None if
+        it is not in the image or if the file changed since
+        """
+        try:
+            entry = self.entries[abs_fname]
+        except KeyError:
+            return None
+        if (entry.mtime != _mtime_key(st) or
+                entry.size != intmask(st.st_size)):
+            self.stale += 1
+            return None
+        body = self.mmap.getslice(self.data_start + entry.offset,
+                                  entry.length)
+        if compute_hash(body) != entry.checksum:
+            self.stale += 1
+            return None
+        reader = Unserializer(body, space)
+        try:
+            bc = reader.unserialize()
+        except UnserializerException:
+            self.stale += 1
+            return None
+        self.hits += 1
+        return bc
+
+    def preload(self, space, bytecode_cache):
+        """ Load every up-to-date file of the image into 'bytecode_cache'.
+        Return the number of files loaded.
+        """
+        count = 0
+        for path, entry in self.entries.items():
+            try:
+                st = os.stat(path)
+            except OSError:
+                self.stale += 1
+                continue
+            bc = self.load(space, path, st)
+            if bc is not None:
+                bytecode_cache.cached_files[path] = (bc, st.st_mtime)
+                count += 1
+        return count
+
+    def close(self):
+        self.mmap.close()
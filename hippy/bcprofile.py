@@ -0,0 +1,85 @@
+""" Counts the executed bytecodes, and the pairs and triples of bytecodes
+executed in sequence, for 'hippy --bc-profile <file>'.  The most frequent
+sequences are the candidates for consts.SUPERINSTRUCTIONS; run with
+--no-superinstructions to see the sequences before they are fused.
+"""
+
+import os
+from rpython.rlib.listsort import make_timsort_class
+from hippy.consts import BYTECODE_NAMES, BYTECODE_HAS_ARG2
+
+
+class _Entry(object):
+    def __init__(self, key, count):
+        self.key = key
+        self.count = count
+
+
+_TimSort = make_timsort_class()
+class _CountSort(_TimSort):
+    def lt(self, a, b):
+        if a.count != b.count:
+            return a.count > b.count
+        return a.key < b.key
+
+
+def _sorted_entries(dct):
+    entries = [_Entry(key, count) for key, count in dct.iteritems()]
+    _CountSort(entries).sort()
+    return entries
+
+
+class BytecodeProfile(object):
+    def __init__(self, limit=50):
+        self.limit = limit
+        self.counts = [0] * len(BYTECODE_NAMES)
+        self.pairs = {}
+        self.triples = {}
+        self.frame = None
+        self.next_pc = -1
+        self.prev1 = -1
+        self.prev2 = -1
+
+    def record(self, frame, bytecode, pc, next_pc, opcode):
+        """Called for every instruction, with 'pc' its position and
+        'next_pc' the position after its (first) argument."""
+        self.counts[opcode] += 1
+        if frame is not self.frame or pc != self.next_pc:
+            # a jump, a call or a return: the sequence is broken
+            self.frame = frame
+            self.prev1 = -1
+            self.prev2 = -1
+        if self.prev1 >= 0:
+            key = (self.prev1 << 8) | opcode
+            self.pairs[key] = self.pairs.get(key, 0) + 1
+            if self.prev2 >= 0:
+                key |= self.prev2 << 16
+                self.triples[key] = self.triples.get(key, 0) + 1
+        self.prev2 = self.prev1
+        self.prev1 = opcode
+        if opcode >= BYTECODE_HAS_ARG2:
+            next_pc, _ = bytecode.next_arg(next_pc)
+        self.next_pc = next_pc
+
+    def _format(self, key, length):
+        names = []
+        for i in range(length - 1, -1, -1):
+            names.append(BYTECODE_NAMES[(key >> (8 * i)) & 0xff])
+        return " ".join(names)
+
+    def _dump_section(self, fd, title, dct, length):
+        os.write(fd, "# %s\n" % title)
+        entries = _sorted_entries(dct)
+        for i in range(min(self.limit, len(entries))):
+            entry = entries[i]
+            os.write(fd, "%d %s\n" % (entry.count,
+                                      self._format(entry.key, length)))
+
+    def dump(self, fd):
+        singles = {}
+        for opcode in range(len(self.counts)):
+            if self.counts[opcode]:
+                singles[opcode] = self.counts[opcode]
+        self._dump_section(fd, "bytecodes", singles, 1)
+        self._dump_section(fd, "pairs", self.pairs, 2)
+        self._dump_section(fd, "triples", self.triples, 3)
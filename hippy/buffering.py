@@ -276,3 +276,5 @@ def ob_implicit_flush(interp, args_w):
                     % space.get_type_name(w_implicit_flush.tp))
         return space.w_Null
     interp.implicit_flush = im
+    if im:
+        interp.flush_stdout()
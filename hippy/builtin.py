@@ -199,6 +199,7 @@ class FrameUnwrapper(Unwrapper):
 
 class RegularUnwrapper(Unwrapper):
     stacksize = 1
+    is_borrowed = False
 
     def line_for_arg(self, i, input_i):
         lines = ['    w_arg = args_w[%d].deref_unique()' % (input_i,)]
@@ -210,6 +211,18 @@ class ValueUnwrapper(RegularUnwrapper):
     is_byref = False
 
 
+class BorrowedUnwrapper(ValueUnwrapper):
+    """A value that the function only inspects, without modifying it or
+    keeping it around after the call: the caller can then pass it
+    without marking the variable it was read from as shared."""
+    is_borrowed = True
+
+    def line_for_arg(self, i, input_i):
+        lines = ['    w_arg = args_w[%d].deref_temp()' % (input_i,)]
+        lines += ['    arg%d = w_arg' % (i,)]
+        return lines
+
+
 class RefUnwrapper(RegularUnwrapper):
     is_byref = True
 
@@ -227,6 +240,10 @@ class ParametricUnwrapper(RegularUnwrapper):
     def is_byref(self):
         return self.base.is_byref
 
+    @property
+    def is_borrowed(self):
+        return self.base.is_borrowed
+
     def register_extra_name(self, d, i):
         self.base.register_extra_name(d, i)
 
@@ -546,6 +563,7 @@ def as_unwrapper(unwrapper):
             str: StringArg(),
             'char': CharArg(),
             W_Root: ValueUnwrapper(),
+            'borrowed': BorrowedUnwrapper(),
             'this': ThisUnwrapper(W_InstanceObject),
             'thisclass': ThisClassUnwrapper(),
             'callback': CallbackUnwrapper(),
@@ -567,6 +585,9 @@ class BuiltinSignature(object):
         self.references = [uw.is_byref for uw in self.unwrappers
                            if isinstance(uw, RegularUnwrapper)]
         self.has_references = any(self.references)
+        self.borrowed = [uw.is_borrowed for uw in self.unwrappers
+                         if isinstance(uw, RegularUnwrapper)]
+        self.has_borrowed = any(self.borrowed)
         min_args = 0
         php_indices = []
         curr_index = 0
@@ -876,17 +897,29 @@ class BuiltinFunction(AbstractFunction):
 
 
 class BuiltinFunctionWithReferences(BuiltinFunction):
-    _immutable_fields_ = ['references', 'runner']
+    _immutable_fields_ = ['references', 'borrowed', 'runner']
 
     def __init__(self, signature, funcname, runner):
         BuiltinFunction.__init__(self, funcname, runner)
         self.references = signature.references
+        self.borrowed = signature.borrowed
 
     def needs_ref(self, i):
         if i >= len(self.references):
             return False
         return self.references[i]
 
+    def borrows_value(self, i):
+        if i >= len(self.borrowed):
+            return False
+        return self.borrowed[i]
+
+
+def new_builtin_function(sig, fname, runner):
+    if sig.has_references or sig.has_borrowed:
+        return BuiltinFunctionWithReferences(sig, fname, runner)
+    return BuiltinFunction(fname, runner)
+
 
 BUILTIN_FUNCTIONS = OrderedDict()
 
@@ -929,17 +962,14 @@ def wrap(signature, name=None, aliases=(), error=None,
         fname = name or ll_func.func_name
         runner = make_runner(signature, ll_func, fname, error,
                              error_handler, check_num_args)
-        if sig.has_references:
-            res = BuiltinFunctionWithReferences(sig, fname, runner)
-        else:
-            res = BuiltinFunction(fname, runner)
+        res = new_builtin_function(sig, fname, runner)
         register_builtin_function(fname, res)
         for alias in aliases:
             # not so nice, but allows to raise warinings
             # with funcname set to called alias
             runner = make_runner(signature, ll_func, alias, error,
                                  error_handler, check_num_args)
-            res = BuiltinFunction(alias, runner)
+            res = new_builtin_function(sig, alias, runner)
             register_builtin_function(alias, res)
         return res
     return inner
@@ -949,11 +979,7 @@ def new_function(ll_func, signature, fname, error, error_handler,
     sig = BuiltinSignature(signature)
     runner = make_runner(signature, ll_func, fname, error,
                          error_handler, check_num_args)
-    if sig.has_references:
-        res = BuiltinFunctionWithReferences(sig, fname, runner)
-    else:
-        res = BuiltinFunction(fname, runner)
-    return res
+    return new_builtin_function(sig, fname, runner)
 
 
 def wrap_method(signature, name, error=None, flags=0,
@@ -1261,7 +1287,7 @@ def restore_error_handler(space):
 
 @wrap(['space', 'args_w'])
 def flush(space, args_w):
-    pass
+    space.ec.interpreter.flush_stdout()
 
 
 @wrap(['space', str])
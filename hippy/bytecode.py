@@ -2,20 +2,26 @@
 import struct
 from collections import OrderedDict
 from hippy.consts import BYTECODE_STACK_EFFECTS, ARGVAL, BYTECODE_HAS_ARG,\
-     BYTECODE_NAMES, ARGVAL1, ARGVAL2, _CHECKSTACK
+     BYTECODE_HAS_ARG2, BYTECODE_NAMES, ARGVAL1, ARGVAL2, _CHECKSTACK
 from hippy.error import IllegalInstruction
 from rpython.rlib import jit
 from rpython.rlib.unroll import unrolling_iterable
 from rpython.rlib.objectmodel import we_are_translated
 from rpython.rlib.rstring import StringBuilder
 from rpython.rlib.rstruct.runpack import runpack
+from rpython.rlib.rarithmetic import r_longlong
+from rpython.rlib.longlong2float import longlong2float
+from hippy.objects.support import ll_pack_long
+from hippy.objects.strobject import interned_str
 
 
 class ByteCode(object):
     """ A representation of a single code block
     """
     _immutable_fields_ = ['code', 'consts[*]', 'varnames[*]',
-                          'functions[*]', 'names[*]', 'stackdepth',
+                          'functions[*]', 'names[*]', 'names_w[*]',
+                          'patterns_w[*]',
+                          'stackdepth',
                           'var_to_pos', 'names_to_pos', 'late_declarations[*]',
                           'classes[*]', 'functions[*]',
                           'method_of_class', 'superglobals[*]', 'this_var_num',
@@ -26,14 +32,20 @@ class ByteCode(object):
                  classes, functions,
                  filename, sourcelines, method_of_class=None,
                  startlineno=0, bc_mapping=None, name='<main>',
-                 superglobals=None, this_var_num=-1, static_vars=None):
+                 superglobals=None, this_var_num=-1, static_vars=None,
+                 patterns_w=None):
         self.code = code
         self.name = name      # not necessarily lowercase
         self.filename = filename
         self.startlineno = startlineno
         self.sourcelines = sourcelines
         self.consts = consts
-        self.names = names
+        self.names_w = [interned_str(s) for s in names]
+        self.names = [w_name.unwrap() for w_name in self.names_w]
+        # the literal patterns of preg_*() calls, one per call site
+        if patterns_w is None:
+            patterns_w = []
+        self.patterns_w = patterns_w
         self.varnames = varnames # named variables
         self.stackdepth = self.count_stack_depth()
         self.var_to_pos = {}
@@ -98,6 +110,8 @@ class ByteCode(object):
             stack_eff = BYTECODE_STACK_EFFECTS[c]
             if c >= BYTECODE_HAS_ARG:
                 i, arg = self.next_arg(i)
+                if c >= BYTECODE_HAS_ARG2:
+                    i, _ = self.next_arg(i)
                 if c == _CHECKSTACK:
                     assert counter == arg
             else:
@@ -129,9 +143,25 @@ class ByteCode(object):
             if c >= BYTECODE_HAS_ARG:
                 i, arg = self.next_arg(i)
                 line += " %s" % arg
+                if c >= BYTECODE_HAS_ARG2:
+                    i, arg = self.next_arg(i)
+                    line += " %s" % arg
             lines.append(line)
         return "\n".join(lines)
 
+    def count_instructions(self):
+        i = 0
+        count = 0
+        while i < len(self.code):
+            c = ord(self.code[i])
+            i += 1
+            if c >= BYTECODE_HAS_ARG:
+                i, _ = self.next_arg(i)
+                if c >= BYTECODE_HAS_ARG2:
+                    i, _ = self.next_arg(i)
+            count += 1
+        return count
+
     def serialize(self, space):
         return Serializer(space).write_bytecode(self).finish()
 
@@ -147,25 +177,42 @@ class ByteCode(object):
 
 unroll_k = unrolling_iterable([7, 14, 21, 28])
 
+
+class SerializerException(Exception):
+    """Raised when a piece of compiled code contains something that
+    the Serializer cannot represent"""
+    def __init__(self, msg):
+        self.msg = msg
+
+
 class Serializer(object):
     def __init__(self, space):
         self.builder = StringBuilder()
         self.space = space
 
     def write_int(self, i):
-        self.builder.append(struct.pack("l", i))
+        ll_pack_long(self.builder, i)
 
     def write_char(self, c):
         assert len(c) == 1
         self.builder.append(c)
 
     def write_str(self, s):
+        if s is None:
+            self.write_int(-1)
+            return
         self.write_int(len(s))
         self.builder.append(s)
 
     def write_wrapped_item(self, w_item):
         w_item.ll_serialize(self.builder)
 
+    def write_optional_wrapped_item(self, w_item):
+        if w_item is None:
+            self.write_char("-")
+        else:
+            self.write_wrapped_item(w_item)
+
     def write_wrapped_list(self, lst_w):
         self.write_int(len(lst_w))
         for w_item in lst_w:
@@ -205,20 +252,52 @@ class Serializer(object):
         self.write_bytecode(func.bytecode)
         self.write_list_of_str(func.names)
         self.write_list_of_char(func.types)
-        # closuredecls, defaults_w, typehints are missing
+        self.write_int(len(func.defaults_w))
+        for w_default in func.defaults_w:
+            self.write_optional_wrapped_item(w_default)
+        self.write_int(len(func.typehints))
+        for i, hint, allow_null in func.typehints:
+            self.write_int(i)
+            self.write_str(hint)
+            self.write_int(1 if allow_null else 0)
+        self.write_int(len(func.closuredecls))
+        for decl in func.closuredecls:
+            self.write_str(decl.name)
+            self.write_int(1 if decl.isref else 0)
 
     def write_class(self, klass):
-        # extends_name, property_decl, all_parents, access_flags,
-        # const_decl, constructor_method, constants_w, initial_instance_dct_w,
-        # base_interface_names, identifier, properties, methods
+        from hippy.module.reflections.klass import ReflectionData
+
         self.write_str(klass.name)
+        reflection = klass.reflection
+        if not isinstance(reflection, ReflectionData):
+            raise SerializerException("class %s has no reflection data" %
+                                      klass.name)
+        self.write_str(reflection.filename)
+        self.write_int(reflection.startline)
+        self.write_int(reflection.endline)
+        self.write_str(reflection.doc)
         self.write_int(klass.lineno)
+        self.write_int(klass.access_flags)
+        self.write_str(klass.extends_name)
+        if klass.base_interface_names is None:
+            self.write_list_of_str([])
+        else:
+            self.write_list_of_str(klass.base_interface_names)
+        self.write_int(len(klass.constants_w))
+        for name, w_value in klass.constants_w.iteritems():
+            self.write_str(name)
+            self.write_wrapped_item(w_value)
+        self.write_int(len(klass.property_decl))
+        for name, prop in klass.property_decl.iteritems():
+            self.write_str(name)
+            self.write_int(prop.access_flags)
+            self.write_wrapped_item(prop.value)
         self.write_int(len(klass.method_decl))
-        for decl in klass.method_decl.itervalues():
-            self.write_str(decl.func.name)
+        for meth_id, decl in klass.method_decl.iteritems():
+            self.write_str(meth_id)
             self.write_int(decl.access_flags)
             self.write_function(decl.func)
-        # XXX
 
     def write_bytecode(self, bc):
         self.write_str(bc.code)
@@ -235,8 +314,21 @@ class Serializer(object):
         self.write_list_of_functions(bc.classes[:])
         self.write_list_of_functions(bc.functions[:])
         self.write_list_of_int(bc.bc_mapping[:])
+        self.write_list_of_str([w_pattern.unwrap()
+                                for w_pattern in bc.patterns_w])
+        self.write_int(len(bc.static_vars))
+        for cm, w_value in bc.static_vars.iteritems():
+            self.write_int(self._const_index(bc, cm))
+            self.write_wrapped_item(w_value)
+        self.write_int(0 if bc.method_of_class is None else 1)
         return self
 
+    def _const_index(self, bc, w_const):
+        for i in range(len(bc.consts)):
+            if bc.consts[i] is w_const:
+                return i
+        raise SerializerException("static variable marker not in consts")
+
     def finish(self):
         return self.builder.build()
 
@@ -251,6 +343,7 @@ class Unserializer(object):
         self.pos = 0
         self.lgt = len(repr)
         self.space = space
+        self.class_stack = []
 
     def read_char(self):
         if self.pos + 1 > self.lgt:
@@ -295,13 +388,23 @@ class Unserializer(object):
         lgt = self.read_int()
         items = []
         for i in range(lgt):
-            items.append((self.read_wrapped_item(), self.read_wrapped_item()))
+            w_key = self.read_optional_wrapped_item()
+            w_value = self.read_wrapped_item()
+            items.append((w_key, w_value))
         return DelayedHash(items)
 
     def read_wrapped_str(self):
-        from hippy.objects.strobject import W_ConstStringObject
+        return interned_str(self.read_str())
 
-        return W_ConstStringObject(self.read_str())
+    def read_pattern(self, pattern):
+        from hippy.module.regex.interface import literal_pattern
+
+        # compiled again, as the call site would be; if that fails, the
+        # call site gets a plain string and reports the error when it runs
+        w_pattern = literal_pattern(self.space, pattern)
+        if w_pattern is None:
+            return interned_str(pattern)
+        return w_pattern
 
     def read_wrapped_interpolation(self):
         from hippy.objects.interpolate import W_StrInterpolation
@@ -325,9 +428,35 @@ class Unserializer(object):
             return self.read_wrapped_hash()
         elif type == "p":
             return self.read_wrapped_interpolation()
+        elif type == "d":
+            return self.space.newfloat(
+                longlong2float(r_longlong(self.read_int())))
+        elif type == "T":
+            return self.space.w_True
+        elif type == "F":
+            return self.space.w_False
+        elif type == "N":
+            return self.space.w_Null
+        elif type == "c":
+            from hippy.ast import W_Constant
+            return W_Constant(self.read_str())
+        elif type == "k":
+            from hippy.klass import DelayedClassConstant
+            cls_name = self.read_str()
+            name = self.read_str()
+            return DelayedClassConstant(cls_name, name)
+        elif type == "m":
+            from hippy.astcompiler import ConstantMarker
+            return ConstantMarker()
         else:
             raise UnserializerException("unknown type %s" % (type,))
 
+    def read_optional_wrapped_item(self):
+        if self.pos < self.lgt and self.repr[self.pos] == "-":
+            self.pos += 1
+            return None
+        return self.read_wrapped_item()
+
     def read_wrapped_list(self):
         lgt = self.read_int()
         lst_w = [None] * lgt
@@ -364,20 +493,44 @@ class Unserializer(object):
         return lst
 
     def read_class(self):
-        from hippy.klass import ClassDeclaration, MethodDeclaration
+        from hippy.klass import (ClassDeclaration, MethodDeclaration,
+                                 PropertyDeclaration)
+        from hippy.module.reflections.klass import ReflectionData
 
         name = self.read_str()
-        cls = ClassDeclaration(name)
+        filename = self.read_str()
+        startline = self.read_int()
+        endline = self.read_int()
+        doc = self.read_str()
+        cls = ClassDeclaration(name, ReflectionData(filename, startline,
+                                                    endline, doc))
         cls.lineno = self.read_int()
+        cls.access_flags = self.read_int()
+        cls.extends_name = self.read_str()
+        cls.base_interface_names = self.read_list_of_str()
+        no_of_constants = self.read_int()
+        for i in range(no_of_constants):
+            const_name = self.read_str()
+            cls.constants_w[const_name] = self.read_wrapped_item()
+        no_of_properties = self.read_int()
+        for i in range(no_of_properties):
+            prop_name = self.read_str()
+            access_flags = self.read_int()
+            w_value = self.read_wrapped_item()
+            cls.property_decl[prop_name] = PropertyDeclaration(
+                prop_name, access_flags, w_value)
         no_of_methods = self.read_int()
         methods = OrderedDict()
-        for i in range(no_of_methods):
-            name = self.read_str()
-            access_flags = self.read_int()
-            func = self.read_function()
-            func.bytecode.method_of_class = cls
-            decl = MethodDeclaration(func, access_flags, cls)
-            methods[func.name] = decl
+        self.class_stack.append(cls)
+        try:
+            for i in range(no_of_methods):
+                meth_id = self.read_str()
+                access_flags = self.read_int()
+                func = self.read_function()
+                decl = MethodDeclaration(func, access_flags, cls)
+                methods[meth_id] = decl
+        finally:
+            self.class_stack.pop()
         cls.method_decl = methods
         cls._init_constructor()
         return cls
@@ -385,13 +538,33 @@ class Unserializer(object):
     def read_function(self):
         from hippy.function import Function
 
+        from hippy.function import ClosureArgDesc
+
         bytecode = self.unserialize()
         names = self.read_list_of_str()
         types = self.read_list_of_chars()
         if len(names) != len(types):
             raise UnserializerException
-        args = [(types[i], names[i], None) for i in range(len(names))]
-        return Function(args, [], [], bytecode)
+        if self.read_int() != len(names):
+            raise UnserializerException
+        args = []
+        for i in range(len(names)):
+            w_default = self.read_optional_wrapped_item()
+            args.append((types[i], names[i], w_default))
+        no_of_typehints = self.read_int()
+        typehints = []
+        for i in range(no_of_typehints):
+            arg_no = self.read_int()
+            hint = self.read_str()
+            allow_null = self.read_int() != 0
+            typehints.append((arg_no, hint, allow_null))
+        no_of_closuredecls = self.read_int()
+        closuredecls = []
+        for i in range(no_of_closuredecls):
+            decl_name = self.read_str()
+            closuredecls.append(ClosureArgDesc(decl_name,
+                                               self.read_int() != 0))
+        return Function(args, closuredecls, typehints, bytecode)
 
     def read_callable(self):
         c = self.read_char()
@@ -417,11 +590,29 @@ class Unserializer(object):
         classes = self.read_list_of_functions()[:]
         functions = self.read_list_of_functions()[:]
         bc_mapping = self.read_list_of_int()[:]
-        return ByteCode(code, consts_w, names, varnames, late_declarations,
-                        classes, functions, filename,
-                        sourcelines, name=name, startlineno=startlineno,
-                        superglobals=superglobals, this_var_num=this_var_num,
-                        bc_mapping=bc_mapping)
+        patterns_w = [self.read_pattern(pattern)
+                      for pattern in self.read_list_of_str()]
+        static_vars = []
+        no_of_static_vars = self.read_int()
+        for i in range(no_of_static_vars):
+            const_no = self.read_int()
+            if not 0 <= const_no < len(consts_w):
+                raise UnserializerException
+            static_vars.append((consts_w[const_no], self.read_wrapped_item()))
+        method_of_class = None
+        if self.read_int():
+            if not self.class_stack:
+                raise UnserializerException
+            method_of_class = self.class_stack[-1]
+        bc = ByteCode(code, consts_w, names, varnames, late_declarations,
+                      classes, functions, filename,
+                      sourcelines, method_of_class=method_of_class,
+                      name=name, startlineno=startlineno,
+                      superglobals=superglobals, this_var_num=this_var_num,
+                      bc_mapping=bc_mapping, patterns_w=patterns_w)
+        for cm, w_value in static_vars:
+            bc.static_vars[cm] = w_value
+        return bc
 
 def unserialize(bytecode_as_str, space):
     return Unserializer(bytecode_as_str, space).unserialize()
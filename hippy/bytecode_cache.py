@@ -1,33 +1,195 @@
-
 import os, sys, time
 from hippy.phpcompiler import compile_php
-from hippy.rpath import abspath
+from hippy.bytecode import (Serializer, Unserializer, SerializerException,
+                            UnserializerException)
+from hippy.rpath import abspath, dirname, exists, join
+from rpython.rlib.objectmodel import compute_hash
+from rpython.rlib.rarithmetic import intmask
+from rpython.rlib.longlong2float import float2longlong
 
 TIMEOUT = 1.0
+# files modified less than that many seconds ago are not written to the
+# on-disk cache: they might still be in the middle of being edited
+FILE_UPDATE_PROTECTION = 2.0
+DISK_CACHE_MAGIC = 'HIPPYBC1'
+
+
+def _compute_compiler_version():
+    """NOT_RPYTHON: a hash of the sources of the compiler and of the
+    objects that end up in the constant pool.  Bytecode written by a
+    different build is never loaded."""
+    import hashlib
+    h = hashlib.md5()
+    hippydir = os.path.dirname(os.path.abspath(__file__))
+    for subdir in ['', 'objects']:
+        d = os.path.join(hippydir, subdir)
+        for name in sorted(os.listdir(d)):
+            if name.endswith('.py'):
+                h.update(name)
+                h.update(open(os.path.join(d, name)).read())
+    return h.hexdigest()[:16]
+
+COMPILER_VERSION = _compute_compiler_version()
+
+
+def _mtime_key(st):
+    return intmask(float2longlong(st.st_mtime))
+
+
+def _makedirs(path):
+    if not path or exists(path):
+        return
+    _makedirs(dirname(path))
+    try:
+        os.mkdir(path, 0755)
+    except OSError:
+        if not exists(path):    # lost a race with another process?
+            raise
+
 
 class BytecodeCache(object):
     def __init__(self, timeout=TIMEOUT):
         self.cached_files = {}
         self.timeout = timeout
+        # on-disk cache, disabled unless 'hippy.bytecode_cache_dir' is set
+        self.cache_dir = None
+        self.file_update_protection = FILE_UPDATE_PROTECTION
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self.disk_writes = 0
+        # a hippy.bcimage.BytecodeImage, for 'hippy --workers --image'
+        self.image = None
+
+    def set_cache_dir(self, cache_dir):
+        """Enable the on-disk cache under 'cache_dir'.  An empty or None
+        'cache_dir' disables it.  Entries live in a subdirectory named
+        after COMPILER_VERSION, mirroring the absolute path of the
+        source file."""
+        if not cache_dir:
+            self.cache_dir = None
+        else:
+            self.cache_dir = join(abspath(cache_dir), [COMPILER_VERSION])
+
+    def _disk_path(self, abs_fname):
+        assert self.cache_dir is not None
+        return self.cache_dir + abs_fname + '.bin'
+
+    def _load_from_disk(self, space, abs_fname, st):
+        """Return the cached bytecode of 'abs_fname', or None if there is
+        no entry or if it is stale: the entry records the magic, the
+        compiler version and flags, the absolute path, the mtime and the
+        size of the source file, plus a checksum of the payload, and all
+        of them have to match."""
+        try:
+            f = open(self._disk_path(abs_fname))
+            try:
+                data = f.read(-1)
+            finally:
+                f.close()
+        except (IOError, OSError):
+            self.disk_misses += 1
+            return None
+        header = Unserializer(data, space)
+        try:
+            if (header.read_str() != DISK_CACHE_MAGIC or
+                    header.read_str() != COMPILER_VERSION or
+                    header.read_int() != int(space.optimize_ast) or
+                    header.read_int() != int(space.superinstructions) or
+                    header.read_str() != abs_fname or
+                    header.read_int() != _mtime_key(st) or
+                    header.read_int() != intmask(st.st_size)):
+                self.disk_misses += 1
+                return None
+            checksum = header.read_int()
+            body = header.read_str()
+            if body is None or compute_hash(body) != checksum:
+                self.disk_misses += 1
+                return None
+            reader = Unserializer(body, space)
+            bc = reader.unserialize()
+            if reader.pos != reader.lgt:
+                raise UnserializerException("trailing data")
+        except UnserializerException:
+            self.disk_misses += 1
+            return None
+        self.disk_hits += 1
+        return bc
+
+    def _store_on_disk(self, space, abs_fname, st, bc):
+        if time.time() - st.st_mtime < self.file_update_protection:
+            return
+        try:
+            body = Serializer(space).write_bytecode(bc).finish()
+        except SerializerException:
+            return    # not representable, this file is always compiled
+        s = Serializer(space)
+        s.write_str(DISK_CACHE_MAGIC)
+        s.write_str(COMPILER_VERSION)
+        s.write_int(int(space.optimize_ast))
+        s.write_int(int(space.superinstructions))
+        s.write_str(abs_fname)
+        s.write_int(_mtime_key(st))
+        s.write_int(intmask(st.st_size))
+        s.write_int(compute_hash(body))
+        s.write_str(body)
+        data = s.finish()
+        path = self._disk_path(abs_fname)
+        # write to a private file first and rename it into place, so
+        # that concurrent readers never see a half-written entry
+        tmppath = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            _makedirs(dirname(path))
+            fd = os.open(tmppath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         0644)
+        except OSError:
+            return    # read-only cache directory: not fatal
+        try:
+            try:
+                pos = 0
+                while pos < len(data):
+                    pos += os.write(fd, data[pos:])
+            finally:
+                os.close(fd)
+            os.rename(tmppath, path)
+        except OSError:
+            # full cache directory: not fatal, but don't leave the
+            # partial file behind
+            try:
+                os.unlink(tmppath)
+            except OSError:
+                pass
+            return
+        self.disk_writes += 1
 
     # again, abs_filename is None for stdin
     def _really_compile(self, space, abs_fname):
 
         if abs_fname is None:
             f = os.fdopen(0)  # open stdin
-            abs_fname = '<stdin>'  # PHP uses '-' in that case
-        else:
-            f = open(abs_fname)
+            data = f.read(-1)
+            return compile_php('<stdin>', data, space)  # PHP uses '-'
 
-        data = f.read(-1)
+        f = open(abs_fname)
+        try:
+            st = os.stat(abs_fname)
+            if self.image is not None:
+                bc = self.image.load(space, abspath(abs_fname), st)
+                if bc is not None:
+                    self.cached_files[abs_fname] = (bc, st.st_mtime)
+                    return bc
+            if self.cache_dir is not None:
+                bc = self._load_from_disk(space, abspath(abs_fname), st)
+                if bc is not None:
+                    self.cached_files[abs_fname] = (bc, st.st_mtime)
+                    return bc
+            data = f.read(-1)
+        finally:
+            f.close()
 
         bc = compile_php(abs_fname, data, space)
-
-        if abs_fname != '<stdin>':  # if not stdin, cache bytecode
-            f.close()  # also don't close if stdin
-            tstamp = os.stat(abs_fname).st_mtime
-            self.cached_files[abs_fname] = (bc, tstamp)
-
+        self.cached_files[abs_fname] = (bc, st.st_mtime)
+        if self.cache_dir is not None:
+            self._store_on_disk(space, abspath(abs_fname), st, bc)
         return bc
 
     # pass fname as None for stdin
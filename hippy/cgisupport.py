@@ -2,9 +2,10 @@
 from collections import OrderedDict
 from rpython.rlib.rsre.rsre_re import search
 import os
-from rpython.rlib.rstring import assert_str0
+import errno
+from rpython.rlib.rstring import assert_str0, StringBuilder
 from hippy.module.url import _urldecode
-from rpython.rlib.rStringIO import RStringIO
+from hippy.config import parse_ini_size
 
 
 class CGIConfig(object):
@@ -14,6 +15,17 @@ class CGIConfig(object):
         self.w_files = w_files
         self.initial_server_dict = initial_server_dict
         self.cookie = cookie
+        self.uploaded_files = []
+
+    def remove_uploaded_files(self):
+        # like PHP, uploaded files that were not moved away by the script
+        # are removed at the end of the request
+        for tmpname in self.uploaded_files:
+            try:
+                os.unlink(tmpname)
+            except OSError:
+                pass
+        self.uploaded_files = []
 
 
 def unpack_query(dct, query, space):
@@ -38,86 +50,345 @@ def all_keys_from(params):
     return params.keys()
 
 
-def parse_header(fp):
-    line = fp.readline().strip()
+# multipart/form-data bodies are read in chunks of this size; file parts
+# are written to their temporary file as the chunks arrive, so neither
+# the body nor an uploaded file is ever held in memory as a whole
+CHUNK_SIZE = 65536
+MAX_HEADER_LINE = 8192
+
+UPLOAD_ERR_OK = 0
+UPLOAD_ERR_INI_SIZE = 1
+UPLOAD_ERR_FORM_SIZE = 2
+UPLOAD_ERR_PARTIAL = 3
+UPLOAD_ERR_NO_FILE = 4
+UPLOAD_ERR_CANT_WRITE = 7
+
+
+class MultipartError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+
+def _get_ini_size(interp, key):
+    # 0 or a negative number mean no limit
+    w_value = interp.config.get_ini_w(key)
+    if w_value is None:
+        return 0
+    return parse_ini_size(interp.space.str_w(w_value))
+
+
+def parse_part_headers(lines):
+    """ Turn the header lines of a part into a dict with lowercase keys:
+    the header values themselves and the parameters that follow them,
+    e.g. 'content-disposition', 'name' and 'filename'
+    """
     d = {}
-    while line != '':
-        line = line.strip()
-        parts = line.split(';')
-        for p in parts:
-            if ':' in p:
-                k, v = p.split(':')
-                d[k.strip()] = v.strip()
-            if '=' in p:
-                k, v = p.split('=')
-                v = v.strip()
-                d[k.strip()] = v.strip('"')
-        line = fp.readline().strip()
-        if line == '':
-            return d
+    for line in lines:
+        for p in line.split(';'):
+            p = p.strip()
+            i = p.find(':')
+            j = p.find('=')
+            if i > 0 and (j < 0 or i < j):
+                d[p[:i].strip().lower()] = p[i + 1:].strip()
+            elif j > 0:
+                v = p[j + 1:].strip()
+                if len(v) >= 2 and v[0] == '"' and v[-1] == '"':
+                    v = v[1:-1]
+                d[p[:j].strip().lower()] = v
     return d
 
 
-def read_until(fp, delimiter, sofar):
-    sofar += fp.read(5)
-    assert sofar is not None
-    m = sofar.find(delimiter)
-    if m > 0:
-        act = fp.tell()
-        fp.seek(act - (len(sofar) - m))
-        assert m > 0
-        data = sofar[:m]
-        return data
-    else:
-        return read_until(fp, delimiter, sofar)
+def _basename(filename):
+    i = max(filename.rfind('/'), filename.rfind('\\'))
+    if i >= 0:
+        return filename[i + 1:]
+    return filename
+
 
+class PartSink(object):
+    def write(self, buf, start, end):
+        raise NotImplementedError
 
-def parse_multipart(space, fp, boundary, data, files):
-    line = fp.readline().strip()
-    if line == '--' + boundary:
+
+class DiscardSink(PartSink):
+    def write(self, buf, start, end):
         pass
-    elif line == '--' + boundary + '--':
-        return data, files
-    elif line == '':
-        return parse_multipart(space, fp, boundary, data, files)
-    else:
-        print line
-        raise ValueError()
-    headers = parse_header(fp)
-    content_disp = None
-    content_type = None
-    if 'Content-Type' in headers:
-        content_type = headers['Content-Type']
-
-    if 'Content-Disposition' in headers:
-        content_disp = headers['Content-Disposition']
-    else:
-        raise ValueError('missing Content-Disposition')
-    if content_disp == 'form-data' and not content_type:
-        # simple filed
-        name = headers['name']
-        value = read_until(fp, '--' + boundary, "")
-        data[name] = space.wrap(value.strip())
-        parse_multipart(space, fp, boundary, data, files)
-    if content_disp == 'form-data' and content_type:
-        # file filed
-        name = headers['name']
-        filename = headers['filename']
-        tmpname = os.tmpnam()
-        fd = open(tmpname, 'w')
-        fd.write(read_until(fp, '--' + boundary, ""))
+
+
+class StringSink(PartSink):
+    def __init__(self):
+        self.builder = StringBuilder()
+
+    def write(self, buf, start, end):
+        self.builder.append_slice(buf, start, end)
+
+    def build(self):
+        return self.builder.build()
+
+
+class FileSink(PartSink):
+    """ Writes a file part straight to its temporary file, up to 'limit'
+    bytes; past that the file is removed and the rest is discarded
+    """
+    def __init__(self, tmpname, fd, limit, error):
+        self.tmpname = tmpname
+        self.fd = fd
+        self.limit = limit
+        self.size = 0
+        self.error = UPLOAD_ERR_OK
+        self.limit_error = error
+
+    def write(self, buf, start, end):
+        if self.error != UPLOAD_ERR_OK:
+            return
+        self.size += end - start
+        if self.limit > 0 and self.size > self.limit:
+            self._fail(self.limit_error)
+            return
+        data = buf[start:end]
+        try:
+            while data:
+                written = os.write(self.fd, data)
+                data = data[written:]
+        except OSError:
+            self._fail(UPLOAD_ERR_CANT_WRITE)
+
+    def _fail(self, error):
+        self.error = error
+        self.close()
+        try:
+            os.unlink(self.tmpname)
+        except OSError:
+            pass
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class MultipartParser(object):
+    """ A streaming multipart/form-data parser.  The body is read from
+    'stream' in chunks of CHUNK_SIZE, at most 'length' bytes of it, after
+    the already known bytes 'data' (if 'stream' is None, 'data' is the
+    whole body).  Only a chunk and the tail of the previous one, which
+    could hold the start of a boundary, are kept in memory.
+    """
+    def __init__(self, space, stream, length, boundary, data='',
+                 tmp_dir='/tmp', upload_max_filesize=0):
+        self.space = space
+        self.stream = stream
+        self.remaining = length
+        # a part ends at a newline followed by the boundary; the '\r' of
+        # a CRLF is stripped from the part.  The leading newline matches
+        # the first boundary at the very start of the body.
+        self.delimiter = '\n--' + boundary
+        self.buf = '\n' + data
+        self.pos = 0
+        self.tmp_dir = tmp_dir
+        self.upload_max_filesize = upload_max_filesize
+        self.max_form_size = 0
+        self.tmp_counter = 0
+        self.uploaded_files = []
+
+    def _fill(self):
+        """ Read the next chunk, dropping what was already consumed.
+        Return False at the end of the body.
+        """
+        if self.stream is None or self.remaining == 0:
+            return False
+        size = CHUNK_SIZE
+        if 0 < self.remaining < size:
+            size = self.remaining
+        data = self.stream.read(size)
+        if not data:
+            self.remaining = 0
+            return False
+        if self.remaining > 0:
+            self.remaining -= len(data)
+        pos = self.pos
+        assert pos >= 0
+        self.buf = self.buf[pos:] + data
+        self.pos = 0
+        return True
+
+    def _ensure(self, n):
+        while len(self.buf) - self.pos < n:
+            if not self._fill():
+                return False
+        return True
+
+    def readline(self):
+        """ Return the next line without its line ending, or None at the
+        end of the body
+        """
+        while True:
+            start = self.pos
+            assert start >= 0
+            i = self.buf.find('\n', start)
+            if i >= 0:
+                self.pos = i + 1
+                if i > start and self.buf[i - 1] == '\r':
+                    i -= 1
+                return self.buf[start:i]
+            if len(self.buf) - start > MAX_HEADER_LINE:
+                raise MultipartError("Part header line too long")
+            if not self._fill():
+                if start == len(self.buf):
+                    return None
+                self.pos = len(self.buf)
+                return self.buf[start:]
+
+    def read_part(self, sink):
+        """ Pass the data up to the next boundary to 'sink', in as large
+        slices as possible.  Return False if the body ends first.
+        """
+        delimiter = self.delimiter
+        while True:
+            start = self.pos
+            assert start >= 0
+            i = self.buf.find(delimiter, start)
+            if i >= 0:
+                self.pos = i + len(delimiter)
+                if i > start and self.buf[i - 1] == '\r':
+                    i -= 1
+                sink.write(self.buf, start, i)
+                return True
+            # keep the tail that could be the start of the boundary,
+            # together with the '\r' that may precede it
+            end = len(self.buf) - len(delimiter)
+            if end > start:
+                sink.write(self.buf, start, end)
+                self.pos = end
+            if not self._fill():
+                end = len(self.buf)
+                if end > self.pos:
+                    sink.write(self.buf, self.pos, end)
+                    self.pos = end
+                return False
+
+    def _after_boundary(self):
+        """ Consume the rest of a boundary line.  Return False if it was
+        the closing boundary.
+        """
+        if self._ensure(2) and self.buf[self.pos] == '-' and \
+                self.buf[self.pos + 1] == '-':
+            self.pos += 2
+            return False
+        return self.readline() is not None
+
+    def _open_tmpfile(self):
+        pid = os.getpid()
+        while True:
+            self.tmp_counter += 1
+            tmpname = "%s/php%d_%d" % (self.tmp_dir, pid, self.tmp_counter)
+            try:
+                fd = os.open(tmpname, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                             0600)
+            except OSError, e:
+                if e.errno == errno.EEXIST:
+                    continue
+                return tmpname, -1
+            return tmpname, fd
+
+    def _file_entry(self, filename, content_type, tmpname, error, size):
+        space = self.space
         rdct = OrderedDict()
         rdct['name'] = space.wrap(filename)
         rdct['type'] = space.wrap(content_type)
         rdct['tmp_name'] = space.wrap(tmpname)
-        rdct['error'] = space.wrap(0)
-        rdct['size'] = space.wrap(fd.tell())
-        files['name'] = space.new_array_from_rdict(rdct)
-        fd.close()
-        parse_multipart(space, fp, boundary, data, files)
-    elif content_disp == 'file':
-        raise NotImplementedError()
-    return data, files
+        rdct['error'] = space.wrap(error)
+        rdct['size'] = space.wrap(size)
+        return space.new_array_from_rdict(rdct)
+
+    def _read_file(self, name, filename, content_type, files):
+        if not filename:
+            self.read_part(DiscardSink())
+            files[name] = self._file_entry('', '', '', UPLOAD_ERR_NO_FILE, 0)
+            return
+        limit = self.upload_max_filesize
+        limit_error = UPLOAD_ERR_INI_SIZE
+        if self.max_form_size > 0 and (limit <= 0 or
+                                       self.max_form_size < limit):
+            limit = self.max_form_size
+            limit_error = UPLOAD_ERR_FORM_SIZE
+        tmpname, fd = self._open_tmpfile()
+        sink = FileSink(tmpname, fd, limit, limit_error)
+        if fd < 0:
+            sink.error = UPLOAD_ERR_CANT_WRITE
+        complete = self.read_part(sink)
+        sink.close()
+        error = sink.error
+        if error == UPLOAD_ERR_OK and not complete:
+            error = UPLOAD_ERR_PARTIAL
+            try:
+                os.unlink(tmpname)
+            except OSError:
+                pass
+        if error != UPLOAD_ERR_OK:
+            files[name] = self._file_entry(filename, content_type, '',
+                                           error, 0)
+            return
+        self.uploaded_files.append(tmpname)
+        files[name] = self._file_entry(filename, content_type, tmpname,
+                                       UPLOAD_ERR_OK, sink.size)
+
+    def parse(self, data, files):
+        """ Fill the 'data' and 'files' dicts with the fields and the
+        uploaded files of the body
+        """
+        if not self.read_part(DiscardSink()):   # the preamble
+            return
+        while self._after_boundary():
+            lines = []
+            while True:
+                line = self.readline()
+                if line is None:
+                    return
+                if not line:
+                    break
+                lines.append(line)
+            headers = parse_part_headers(lines)
+            if headers.get('content-disposition', '') != 'form-data':
+                raise MultipartError("Missing Content-Disposition")
+            name = headers.get('name', '')
+            if 'filename' in headers:
+                self._read_file(name, _basename(headers['filename']),
+                                headers.get('content-type', ''), files)
+                continue
+            sink = StringSink()
+            complete = self.read_part(sink)
+            value = sink.build()
+            if name == 'MAX_FILE_SIZE':
+                try:
+                    self.max_form_size = int(value.strip())
+                except ValueError:
+                    pass
+            data[name] = self.space.wrap(value)
+            if not complete:
+                return
+
+
+def _parse_multipart(interp, boundary, length, post_data, post, files):
+    """ Parse a multipart/form-data body into 'post' and 'files', and
+    return the list of temporary files created.  The body is streamed
+    from stdin unless it is given as 'post_data'.
+    """
+    tmp_dir = interp.config.get_ini_str('upload_tmp_dir')
+    if not tmp_dir:
+        tmp_dir = '/tmp'
+    if post_data is None:
+        parser = MultipartParser(interp.space, interp.open_stdin_stream(),
+                                 length, boundary, tmp_dir=tmp_dir)
+    else:
+        parser = MultipartParser(interp.space, None, 0, boundary,
+                                 data=post_data, tmp_dir=tmp_dir)
+    parser.upload_max_filesize = _get_ini_size(interp, 'upload_max_filesize')
+    try:
+        parser.parse(post, files)
+    except MultipartError, e:
+        interp.warn("%s, ignoring the rest of the post" % e.msg)
+    return parser.uploaded_files
 
 
 def setup_cgi(interp, params, argv, post_data=None):
@@ -138,6 +409,7 @@ def setup_cgi(interp, params, argv, post_data=None):
     content_type_set = get_param(params, 'CONTENT_TYPE')
     content_type = ""
     boundary = ""
+    uploaded_files = []
     for k in all_keys_from(params):
         initial_server_dict[k] = space.wrap(get_param(params, k))
     if content_type_set is not None and content_length is not None:
@@ -150,31 +422,40 @@ def setup_cgi(interp, params, argv, post_data=None):
         else:
             content_type = content_type_set.lower()
 
-        if (content_type == 'x-www-form-urlencoded' or
-            content_type == 'application/x-www-form-urlencoded'):
-            content_length = int(content_length)
+        try:
+            length = int(content_length)
+        except ValueError:
+            interp.warn("Invalid CONTENT_LENGTH: %s, ignoring post" %
+                        content_length)
+            length = 0
+        post_max_size = _get_ini_size(interp, 'post_max_size')
+        if post_max_size > 0 and length > post_max_size:
+            # refuse the body before reading any of it
+            interp.warn("POST Content-Length of %d bytes exceeds the limit "
+                        "of %d bytes" % (length, post_max_size))
+        elif (content_type == 'x-www-form-urlencoded' or
+              content_type == 'application/x-www-form-urlencoded'):
             if post_data is None:
                 stdin = interp.open_stdin_stream()
-                post_data = stdin.read(content_length)
+                post_data = stdin.read(length)
             unpack_query(post, post_data, space)
         elif content_type == 'multipart/form-data':
             m = search("boundary", content_type_set)
             if m:
                 end = m.end(0)
                 assert end >= 0
-                boundary = content_type_set[end + 1:]
+                boundary = content_type_set[end + 1:].strip('"')
             if not boundary:
                 interp.warn("Missing boundary, ignoring post")
-            fp = RStringIO()
-            fp.write(post_data)
-            fp.seek(0)
-            post, files = parse_multipart(space, fp, boundary,
-                                          OrderedDict(), OrderedDict())
-            fp.close()
+            else:
+                uploaded_files = _parse_multipart(interp, boundary, length,
+                                                  post_data, post, files)
         else:
             interp.warn("Unknown content type: %s, ignoring post" %
                         content_type)
-    return CGIConfig(space.new_array_from_rdict(get),
-                     space.new_array_from_rdict(post),
-                     space.new_array_from_rdict(files),
-                     initial_server_dict, cookie)
+    config = CGIConfig(space.new_array_from_rdict(get),
+                       space.new_array_from_rdict(post),
+                       space.new_array_from_rdict(files),
+                       initial_server_dict, cookie)
+    config.uploaded_files = uploaded_files
+    return config
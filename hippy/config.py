@@ -1,3 +1,4 @@
+import os
 from rpython.rlib.rsre.rsre_re import compile, M, IGNORECASE
 
 from rply import ParserGenerator
@@ -6,16 +7,43 @@ from rply.token import BaseBox, SourcePosition
 from hippy.constants import E_ALL
 from hippy.lexer import Token, BaseLexer
 from hippy.sourceparser import BaseParser
+from hippy.module.regex.cache import DEFAULT_CACHE_SIZE
+from hippy.pathcache import DEFAULT_CACHE_TTL
 
 EXTENSIONS = ['session', 'standard', 'mysql', 'pcre', 'posix', 'Core',
               'xml', 'ctype', 'hash', 'spl', 'mbstring', 'mcrypt', 'bz2',
               'zlib']
 
 
+def parse_ini_size(s):
+    """ Parse an ini size such as '8M' or '512K' into a number of bytes,
+    or 0 if it is not a size
+    """
+    s = s.strip()
+    if not s:
+        return 0
+    multiplier = 1
+    last = s[-1].lower()
+    if last == 'k':
+        multiplier = 1024
+    elif last == 'm':
+        multiplier = 1024 * 1024
+    elif last == 'g':
+        multiplier = 1024 * 1024 * 1024
+    if multiplier != 1:
+        s = s[:-1]
+    try:
+        return int(s) * multiplier
+    except ValueError:
+        return 0
+
+
 class Config(object):
 
-    def __init__(self, space):
+    def __init__(self, space, stdout=None):
         self.space = space
+        # the output writer of the interpreter that owns this config
+        self.stdout = stdout
         self.precision = 14
         self.ini = {
             'php_version': space.wrap("5.4.17"),
@@ -44,7 +72,17 @@ class Config(object):
             'session.save_handler': space.wrap("files"),
             'register_argc_argv': space.wrap(1),
             'error_reporting': space.wrap(E_ALL),
-            'default_socket_timeout': space.wrap(60)
+            'default_socket_timeout': space.wrap(60),
+            'post_max_size': space.wrap('8M'),
+            'upload_max_filesize': space.wrap('2M'),
+            'upload_tmp_dir': space.wrap(''),
+            'hippy.bytecode_cache_dir': space.wrap(''),
+            'hippy.ast_optimizer': space.wrap(1),
+            'hippy.superinstructions': space.wrap(1),
+            'pcre.cache_size': space.wrap(DEFAULT_CACHE_SIZE),
+            'realpath_cache_size': space.wrap('16K'),
+            'realpath_cache_ttl': space.wrap(DEFAULT_CACHE_TTL),
+            'hippy.output_write_size': space.wrap('8K'),
             }
 
     def set_precision(self, prec):
@@ -72,7 +110,23 @@ class Config(object):
             # we can set this only once
             if self.ini.get(key, None):
                 return
+        if key == 'pcre.cache_size':
+            self.space.regex_cache.set_capacity(self.space.int_w(w_value))
         self.ini[key] = w_value
+        if key == 'realpath_cache_size' or key == 'realpath_cache_ttl':
+            self.configure_realpath_cache()
+        elif key == 'hippy.output_write_size' and self.stdout is not None:
+            self.configure_output_writer(self.stdout)
+
+    def configure_realpath_cache(self):
+        space = self.space
+        space.realpath_cache.configure(
+            parse_ini_size(self.get_ini_str('realpath_cache_size')),
+            space.int_w(self.get_ini_w('realpath_cache_ttl')))
+
+    def configure_output_writer(self, writer):
+        writer.set_size(parse_ini_size(
+            self.get_ini_str('hippy.output_write_size')))
 
 RULES = [
     ('\[.*', "T_SECTION"),
@@ -275,3 +329,34 @@ def load_ini(interp, buf):
     ini_reader = IniReader(interp)
     ini_lexer.input(buf)
     ini_reader.parser.parse(ini_lexer, ini_reader)
+
+
+def read_ini_file(fname='hippy.ini'):
+    """ The content of the ini file situated in the current directory, or
+    None if there is none
+    """
+    try:
+        return open(fname).read(-1)
+    except (OSError, IOError):
+        return None
+
+
+def load_ini_data(interp, ini_data):
+    if ini_data is not None:
+        try:
+            load_ini(interp, ini_data)
+        except:
+            os.write(2, "error reading `hippy.ini`")
+
+
+def configure_space(interp, ast_opt=True, superinstructions=True):
+    """ Apply the settings of 'interp' that belong to the space, and so
+    to all the interpreters that run on it
+    """
+    space = interp.space
+    space.bytecode_cache.set_cache_dir(
+        interp.config.get_ini_str('hippy.bytecode_cache_dir'))
+    space.optimize_ast = ast_opt and space.is_true(
+        interp.config.get_ini_w('hippy.ast_optimizer'))
+    space.superinstructions = superinstructions and space.is_true(
+        interp.config.get_ini_w('hippy.superinstructions'))
@@ -24,6 +24,7 @@ E_HIPPY_WARN = 30768
 CGI_NONE = 0
 CGI_SIMPLE = 1
 CGI_FASTCGI = 2
+CGI_SCGI = 3
 
 E_ALL = (E_ERROR | E_RECOVERABLE_ERROR | E_WARNING | E_PARSE | E_NOTICE |
          E_STRICT | E_DEPRECATED | E_CORE_ERROR | E_CORE_WARNING |
@@ -23,8 +23,10 @@ BYTECODES = [
     ('LOAD_NAMED_CONSTANT', 1, +1),
     ('GETCONSTANT_NS', 0, -1),
     ('LOAD_NAME', 1, +1),
+    ('LOAD_PATTERN', 1, +1),
     ('LOAD_VAR', 1, +1),
     ('LOAD_VAR_SWAP', 1, +1),
+    ('LOAD_VAR_TEMP', 1, +1),
     ('LOAD_VAR_INDIRECT', 0, 0),
     ('LOAD_VAR_ITEM_PTR', 1, 0), # -1+1
     ('LOAD_NULL', 0, +1),
@@ -137,33 +139,88 @@ BYTECODES = [
     ('PRINT_EXPR', 0, -1),
     ('POPEN', 0, 0),
     ('EVAL', 1, 0),
+
+    # superinstructions: see SUPERINSTRUCTIONS below
+    ('STORE_DISCARD', 0, -1), # -1
+    ('STORE_VAR', 1, 0),
+    ('STORE_VAR_DISCARD', 1, -1),
+    ('LOAD_VAR_GETITEM', 1, 0),
+    ('GETITEM_VAR_VAR', 2, +1),
 ]
 # (*) the stack effect of BREAK_CONTINUE_POP is not really 0: it
 # pops 'arg' items.  But for the simple bytecode.count_stack_depth()
 # we need to say 0, as it appears in the middle of a loop, just
 # before a JUMP_xx that implements 'break;' or 'continue;'
 
+BINOP_COMPARISON_LIST = ['le', 'ge', 'lt', 'gt', 'eq', 'ne']
+BINOP_BITWISE = ['or_', 'and_', 'xor']
+BINOP_LIST = ['add', 'mul', 'sub', 'mod', 'div'] + BINOP_COMPARISON_LIST
+
+# the binary operations that get fused with the loads of their arguments:
+# VAR_BINARY_xx n           is  LOAD_VAR_SWAP n; BINARY_xx
+# CONST_VAR_BINARY_xx c, n  is  LOAD_CONST c; LOAD_VAR_SWAP n; BINARY_xx
+# VAR_VAR_BINARY_xx m, n    is  LOAD_VAR m; LOAD_VAR_SWAP n; BINARY_xx
+SUPERINSTR_BINOPS = ['add', 'sub', 'mul', 'concat'] + BINOP_COMPARISON_LIST
+
+for _name in SUPERINSTR_BINOPS:
+    BYTECODES.append(('VAR_BINARY_' + _name.upper(), 1, 0))
+    BYTECODES.append(('CONST_VAR_BINARY_' + _name.upper(), 2, +1))
+    BYTECODES.append(('VAR_VAR_BINARY_' + _name.upper(), 2, +1))
+
 assert len(BYTECODES) < 256
-BYTECODES.sort(key=lambda t: t[1])   # first the no-arg, then the one-arg
+# first the no-arg, then the one-arg, then the two-args
+BYTECODES.sort(key=lambda t: t[1])
 
 BYTECODE_HAS_ARG = 0
 while BYTECODES[BYTECODE_HAS_ARG][1] == 0:
     BYTECODE_HAS_ARG += 1
+BYTECODE_HAS_ARG2 = BYTECODE_HAS_ARG
+while BYTECODES[BYTECODE_HAS_ARG2][1] == 1:
+    BYTECODE_HAS_ARG2 += 1
 BYTECODE_NAMES = []
 BYTECODE_STACK_EFFECTS = []
 
-BINOP_COMPARISON_LIST = ['le', 'ge', 'lt', 'gt', 'eq', 'ne']
-BINOP_BITWISE = ['or_', 'and_', 'xor']
-BINOP_LIST = ['add', 'mul', 'sub', 'mod', 'div'] + BINOP_COMPARISON_LIST
-
 def _setup():
     for i, (bc, numargs, stack_effect) in enumerate(BYTECODES):
         globals()[bc] = i
-        assert numargs == (i >= BYTECODE_HAS_ARG)
+        assert numargs == (i >= BYTECODE_HAS_ARG) + (i >= BYTECODE_HAS_ARG2)
         BYTECODE_NAMES.append(bc)
         BYTECODE_STACK_EFFECTS.append(stack_effect)
 _setup()
 
+# Superinstructions: CompilerContext.emit() replaces the pair of the
+# previously emitted instruction and the new one with the fused
+# instruction, whose arguments are the arguments of the pair, in order.
+# A triple is fused in two steps, through an intermediate superinstruction.
+# The sequences are the most frequent ones reported by 'hippy --bc-profile'.
+SUPERINSTRUCTIONS = {
+    (STORE, DISCARD_TOP): STORE_DISCARD,
+    (VAR_PTR, STORE): STORE_VAR,
+    (STORE_VAR, DISCARD_TOP): STORE_VAR_DISCARD,
+    (LOAD_VAR, GETITEM): LOAD_VAR_GETITEM,
+    (LOAD_VAR, GETITEM_VAR): GETITEM_VAR_VAR,
+}
+
+def _setup_superinstructions():
+    g = globals()
+    for name in SUPERINSTR_BINOPS:
+        name = name.upper()
+        SUPERINSTRUCTIONS[LOAD_VAR_SWAP, g['BINARY_' + name]] = (
+            g['VAR_BINARY_' + name])
+        SUPERINSTRUCTIONS[LOAD_CONST, g['VAR_BINARY_' + name]] = (
+            g['CONST_VAR_BINARY_' + name])
+        SUPERINSTRUCTIONS[LOAD_VAR, g['VAR_BINARY_' + name]] = (
+            g['VAR_VAR_BINARY_' + name])
+    for (first, second), fused in SUPERINSTRUCTIONS.items():
+        assert first < BYTECODE_HAS_ARG2
+        numargs = (first >= BYTECODE_HAS_ARG) + (first >= BYTECODE_HAS_ARG2)
+        numargs += (second >= BYTECODE_HAS_ARG) + (second >= BYTECODE_HAS_ARG2)
+        assert numargs == BYTECODES[fused][1]
+        assert (BYTECODE_STACK_EFFECTS[first] +
+                BYTECODE_STACK_EFFECTS[second] ==
+                BYTECODE_STACK_EFFECTS[fused])
+_setup_superinstructions()
+
 BIN_OP_TO_BC = {'+': BINARY_ADD, '*': BINARY_MUL, '-': BINARY_SUB,
                 '|': BINARY_OR_, '&': BINARY_AND_, '^': BINARY_XOR,
                 'xor': LOGICAL_XOR,
@@ -70,6 +70,11 @@ class AbstractFunction(W_Root):
     def needs_ref(self, i):
         raise NotImplementedError("abstract base class")
 
+    def borrows_value(self, i):
+        """True if the i'th argument, passed by value, is only looked at
+        during the call and not kept afterwards."""
+        return False
+
     def call_args(self, interp, args_w, w_this=None, thisclass=None,
                   closureargs=None):
         raise NotImplementedError("abstract base class")
@@ -0,0 +1,149 @@
+""" Memory and garbage collector statistics, for memory_get_usage(),
+memory_get_peak_usage() and hippy_gc_stats().
+
+When translated with a GC and an RPython that support rgc.get_stats()
+(incminimark), the sizes come from the GC itself: the memory used by
+GC objects and raw-malloced memory they own, or, for 'real' usage, what
+was allocated from the system for them.  Otherwise they fall back to
+the resident set size of the process, as reported by /proc/self/status.
+
+Collection counts and pause times are recorded by the GC hooks
+returned by get_gchooks() in targethippy.py, if the RPython has them.
+The hooks get durations in units of rpython.rlib.rtimer.read_timestamp(),
+whose rate depends on the machine; they are converted to milliseconds
+by comparing the timestamps with the wall clock since start_clock(),
+which the entry point calls.
+"""
+
+import os
+import time
+from rpython.rlib.objectmodel import we_are_translated
+from rpython.rlib.rarithmetic import intmask
+from rpython.rlib.rtimer import read_timestamp
+
+try:
+    from rpython.rlib.rgc import (get_stats, TOTAL_MEMORY,
+        TOTAL_ALLOCATED_MEMORY, PEAK_MEMORY, PEAK_ALLOCATED_MEMORY,
+        NURSERY_SIZE, TOTAL_GC_TIME)
+    HAS_GC_STATS = True
+except ImportError:
+    HAS_GC_STATS = False
+
+try:
+    from rpython.rlib.rgc import GcHooks
+    HAS_GC_HOOKS = True
+except ImportError:
+    GcHooks = object
+    HAS_GC_HOOKS = False
+
+
+class HippyGcHooks(GcHooks):
+    def __init__(self):
+        self.minor_collections = 0
+        self.minor_pause_total = 0
+        self.minor_pause_max = 0
+        self.major_collections = 0
+        self.major_steps = 0
+        self.major_pause_total = 0
+        self.major_pause_max = 0
+        self.clock_time = 0.0
+        self.clock_ticks = 0.0
+
+    def start_clock(self):
+        self.clock_time = time.time()
+        self.clock_ticks = float(read_timestamp())
+
+    def ticks_to_ms(self, ticks):
+        """Convert a duration reported by the GC to milliseconds"""
+        return self._scale(ticks, time.time(), float(read_timestamp()))
+
+    def _scale(self, ticks, now, now_ticks):
+        seconds = now - self.clock_time
+        elapsed_ticks = now_ticks - self.clock_ticks
+        if self.clock_time == 0.0 or seconds <= 0.0 or elapsed_ticks <= 0.0:
+            return 0.0
+        return ticks * (seconds * 1000.0 / elapsed_ticks)
+
+    def is_gc_minor_enabled(self):
+        return True
+
+    def is_gc_collect_step_enabled(self):
+        return True
+
+    def is_gc_collect_enabled(self):
+        return True
+
+    def on_gc_minor(self, duration, total_memory_used, pinned_objects):
+        duration = intmask(duration)
+        self.minor_collections += 1
+        self.minor_pause_total += duration
+        if duration > self.minor_pause_max:
+            self.minor_pause_max = duration
+
+    def on_gc_collect_step(self, duration, oldstate, newstate):
+        # a major collection is incremental: every step is a pause
+        duration = intmask(duration)
+        self.major_steps += 1
+        self.major_pause_total += duration
+        if duration > self.major_pause_max:
+            self.major_pause_max = duration
+
+    def on_gc_collect(self, num_major_collects, *args):
+        # the other arguments (arena and raw-malloced memory before and
+        # after) vary between RPython versions
+        self.major_collections = intmask(num_major_collects)
+
+gchooks = HippyGcHooks()
+
+
+def _read_proc_status(field):
+    """Return the value of 'field' (e.g. 'VmRSS') of /proc/self/status,
+    in bytes, or 0 if it cannot be read."""
+    try:
+        fd = os.open('/proc/self/status', os.O_RDONLY, 0)
+    except OSError:
+        return 0
+    try:
+        data = os.read(fd, 8192)
+    finally:
+        os.close(fd)
+    prefix = field + ':'
+    for line in data.split('\n'):
+        if line.startswith(prefix):
+            digits = []
+            for c in line[len(prefix):]:
+                if '0' <= c <= '9':
+                    digits.append(c)
+            if digits and line.endswith('kB'):
+                return int(''.join(digits)) * 1024
+            break
+    return 0
+
+
+def memory_usage(real_usage):
+    if we_are_translated() and HAS_GC_STATS:
+        if real_usage:
+            return get_stats(TOTAL_ALLOCATED_MEMORY)
+        return get_stats(TOTAL_MEMORY)
+    return _read_proc_status('VmRSS')
+
+
+def peak_memory_usage(real_usage):
+    if we_are_translated() and HAS_GC_STATS:
+        if real_usage:
+            return get_stats(PEAK_ALLOCATED_MEMORY)
+        return get_stats(PEAK_MEMORY)
+    return _read_proc_status('VmHWM')
+
+
+def nursery_size():
+    if we_are_translated() and HAS_GC_STATS:
+        return get_stats(NURSERY_SIZE)
+    return 0
+
+
+def total_gc_time():
+    """The time spent in the GC, in milliseconds"""
+    if we_are_translated() and HAS_GC_STATS:
+        return get_stats(TOTAL_GC_TIME)
+    return 0
@@ -4,7 +4,7 @@ from collections import OrderedDict
 from hippy.hippyoption import is_optional_extension_enabled
 
 from hippy.consts import BYTECODE_HAS_ARG, BYTECODE_NAMES,\
-    BINOP_LIST, BINOP_BITWISE, RETURN
+    BINOP_LIST, BINOP_BITWISE, SUPERINSTR_BINOPS, RETURN
 from hippy.function import AbstractFunction
 from hippy.error import (IllegalInstruction, FatalError, Throw,
                          ExplicitExitException, VisibilityError, SignalReceived)
@@ -26,6 +26,7 @@ from hippy.function import Function
 from hippy.frame import Frame, CatchBlock, Unsilence
 from hippy.vars import W_GlobalVars
 from hippy.config import Config
+from hippy.outbuf import StdoutWriter
 from hippy import constants
 from hippy import pointer
 from hippy.sourceparser import parse
@@ -39,9 +40,11 @@ from rpython.rlib import jit
 from rpython.rlib import rsignal
 from rpython.rlib.unroll import unrolling_iterable
 from rpython.rlib.rfile import create_popen_file
-from hippy.rpath import exists, dirname, join, abspath
+from hippy.rpath import dirname, join
 
 from hippy.module.session import Session
+from hippy.module.standard.strings.multireplace import ReplacerCache
+from hippy.module.mbstring.utf8 import Utf8IndexCache
 
 # side-effect of registering functions
 import hippy.module.standard.array.funcs
@@ -150,10 +153,11 @@ class Interpreter(object):
     """ Interpreter keeps the state of the current run. There will be a new
     interpreter instance per run of script
     """
-    _immutable_fields_ = ['debugger?', 'globals']
+    _immutable_fields_ = ['debugger?', 'bc_profile?', 'globals']
     cgi = 0
     web_config = None
     debugger = None
+    bc_profile = None    # a hippy.bcprofile.BytecodeProfile
     allow_direct_class_access = False
     last_strtok_str = None
     last_strtok_pos = 0
@@ -165,10 +169,13 @@ class Interpreter(object):
         space.global_constant_cache.reset()
         space.global_function_cache.reset()
         space.global_class_cache.reset()
+        space.array_copy_stats.reset()
 
         self.error_level = 0xffffff
         self.topframeref = jit.vref_None
         self.error_handler = None
+        self.replacer_cache = ReplacerCache()
+        self.utf8_index_cache = Utf8IndexCache()
         space.ec.interpreter = self  # one interpreter at a time
         self._autoloading = {}
         self.autoload_stack = []
@@ -176,7 +183,8 @@ class Interpreter(object):
         self.constants = OrderedDict()
         self.globals = W_GlobalVars(space)
         self.w_globals_ref = W_Reference(self.globals)
-        self.config = Config(space)
+        self.stdout = StdoutWriter()
+        self.config = Config(space, self.stdout)
         self.cached_files = OrderedDict()
         self.session = Session(self)
         self.w_exception_handler = None
@@ -293,6 +301,10 @@ class Interpreter(object):
 
         self.error_level = space.int_w(self.config.get_ini_w(
             'error_reporting'))
+        space.regex_cache.set_capacity(space.int_w(self.config.get_ini_w(
+            'pcre.cache_size')))
+        self.config.configure_realpath_cache()
+        self.config.configure_output_writer(self.stdout)
         self._setup = True
         self.setup_globals(space, argv)
         self.setup_stdxx(space, cgi)
@@ -318,17 +330,22 @@ class Interpreter(object):
             self.debugger.run_debugger_loop(self)
 
     def shutdown(self):
-        # this is mostly important for tests
-        self.flush_buffers()
-        if self.session is not None:
-            self.session.write_close(self)
-        for i, func in enumerate(self.shutdown_functions):
-            func.call_args(self, self.shutdown_arguments[i])
-        for _,  mysql_link in self.mysql_links.items():
-            if not mysql_link.persistent:
-                mysql_link.close()
-        for _, fd in self.open_fd.items():
-            fd.close()
+        try:
+            # this is mostly important for tests
+            self.flush_buffers()
+            if self.session is not None:
+                self.session.write_close(self)
+            for i, func in enumerate(self.shutdown_functions):
+                func.call_args(self, self.shutdown_arguments[i])
+            for _,  mysql_link in self.mysql_links.items():
+                if not mysql_link.persistent:
+                    mysql_link.close()
+            for _, fd in self.open_fd.items():
+                fd.close()
+        finally:
+            if self.web_config is not None:
+                self.web_config.remove_uploaded_files()
+            self.flush_stdout()
 
     def _get_server_env(self):
         if self.web_config is None:
@@ -578,10 +595,6 @@ class Interpreter(object):
     def writestr(self, str, buffer=True):
         if not str:
             return
-        if self.implicit_flush:
-            if self.output_buffer:
-                self.output_buffer.flush()
-                return
         if buffer and self.output_buffer is not None:
             self.output_buffer.write(str)
         else:
@@ -591,11 +604,20 @@ class Interpreter(object):
                 self.any_output = True
             assert str is not None
             self._writestr(str)
+            if self.implicit_flush:
+                self.flush_stdout()
 
     def _writestr(self, string):
-        os.write(1, string)
+        self.stdout.write(string)
+
+    def flush_stdout(self):
+        """ Write the output collected by the stdout writer, before
+        something else can write to the same terminal or socket
+        """
+        self.stdout.flush()
 
     def err_write(self, string):
+        self.flush_stdout()
         os.write(2, string)
 
     def send_headers(self):
@@ -840,6 +862,9 @@ class Interpreter(object):
                 pc, arg = bytecode.next_arg(pc)
             else:
                 arg = 0  # don't make it negative
+            if self.bc_profile is not None:
+                self.bc_profile.record(frame, bytecode, frame.next_instr, pc,
+                                       next_instr)
             if next_instr == RETURN:
                 #assert frame.stackpos == 1 -- not if 'return;' appears
                 # inside a 'foreach'
@@ -1033,7 +1058,11 @@ class Interpreter(object):
         return pc
 
     def LOAD_NAME(self, bytecode, frame, space, arg, pc):
-        frame.push(space.newstr(bytecode.names[arg]))
+        frame.push(bytecode.names_w[arg])
+        return pc
+
+    def LOAD_PATTERN(self, bytecode, frame, space, arg, pc):
+        frame.push(bytecode.patterns_w[arg])
         return pc
 
     def LOAD_VAR(self, bytecode, frame, space, arg, pc):
@@ -1046,6 +1075,11 @@ class Interpreter(object):
         frame.push(w_other)
         return pc
 
+    def LOAD_VAR_TEMP(self, bytecode, frame, space, arg, pc):
+        # only for conditions: the value is tested and popped at once
+        frame.push(frame.lookup_deref_temp(arg, give_notice=True))
+        return pc
+
     def LOAD_VAR_INDIRECT(self, bytecode, frame, space, arg, pc):
         w_name = frame.pop()
         name = space.str_w(w_name)
@@ -1085,6 +1119,24 @@ class Interpreter(object):
         frame.push(p.store(self, w_value, unique_item=True))
         return pc
 
+    def STORE_DISCARD(self, bytecode, frame, space, arg, pc):
+        p = frame.pop_ptr()
+        w_value = frame.pop().deref()
+        p.store(self, w_value)
+        return pc
+
+    def STORE_VAR(self, bytecode, frame, space, arg, pc):
+        # same as VAR_PTR; STORE
+        w_value = frame.pop().deref()
+        frame.store_variable(arg, w_value, False)
+        frame.push(w_value)
+        return pc
+
+    def STORE_VAR_DISCARD(self, bytecode, frame, space, arg, pc):
+        w_value = frame.pop().deref()
+        frame.store_variable(arg, w_value, False)
+        return pc
+
     def STORE_REF(self, bytecode, frame, space, arg, pc):
         p = frame.pop_ptr()
         w_ref = frame.pop()
@@ -1373,7 +1425,9 @@ class Interpreter(object):
         ptr_argument = frame.pop_ptr()
         func = frame.pop()
         assert isinstance(func, AbstractFunction)
-        if func.needs_value(arg):
+        if func.borrows_value(arg):
+            w_argument = ptr_argument.deref_temp(self, give_notice=True)
+        elif func.needs_value(arg):
             w_argument = ptr_argument.deref(self, give_notice=True)
         else:
             if func.needs_ref(arg) and not ptr_argument.isref:
@@ -1424,6 +1478,24 @@ class Interpreter(object):
         frame.push(space.getitem(w_obj, w_item, give_notice=True))
         return pc
 
+    def LOAD_VAR_GETITEM(self, bytecode, frame, space, arg, pc):
+        w_item = frame.lookup_deref(arg, give_notice=True)
+        w_obj = frame.pop()
+        frame.push(space.getitem(w_obj, w_item, give_notice=True))
+        return pc
+
+    def GETITEM_VAR_VAR(self, bytecode, frame, space, arg, pc):
+        # same as LOAD_VAR arg; GETITEM_VAR arg2
+        pc, arg2 = bytecode.next_arg(pc)
+        w_item = frame.lookup_deref(arg, give_notice=True)
+        w_obj = frame.lookup_variable_temp(arg2)
+        if w_obj is None:
+            self.notice("Undefined variable: %s" % (
+                bytecode.varnames[arg2],))
+            w_obj = space.w_Null
+        frame.push(space.getitem(w_obj, w_item, give_notice=True))
+        return pc
+
     def ITEM_PTR(self, bytecode, frame, space, arg, pc):
         p_base = frame.pop_ptr()
         w_item = frame.pop()
@@ -1768,27 +1840,47 @@ class Interpreter(object):
     def find_file(self, fname):
         """Resolve a file name relative to the include_path and to
         the location of the current code"""
+        cache = self.space.realpath_cache
         for path in self.include_path:
-            if exists(join(path, [fname])):
-                return abspath(join(path, [fname]))
+            entry = cache.lookup(join(path, [fname]))
+            if entry.exists:
+                return entry.abspath
         code_dir = dirname(self.get_frame().bytecode.filename)
-        if exists(join(code_dir, [fname])):
-            return abspath(join(code_dir, [fname]))
-        return abspath(fname)
+        entry = cache.lookup(join(code_dir, [fname]))
+        if entry.exists:
+            return entry.abspath
+        return cache.abspath(fname)
 
-    def _include(self, frame, func_name, require=False, once=False):
-        name = self.space.str_w(frame.pop())
+    def _resolve_include(self, name):
         use_path = not (name.startswith('/') or name.startswith('./') or
                         name.startswith('../'))
         if use_path:
-            fname = self.find_file(name)
-        else:
-            fname = abspath(name)
+            return self.find_file(name)
+        return self.space.realpath_cache.abspath(name)
+
+    def _forget_include(self, name):
+        cache = self.space.realpath_cache
+        for path in self.include_path:
+            cache.forget(join(path, [name]))
+        cache.forget(join(dirname(self.get_frame().bytecode.filename),
+                          [name]))
+        cache.forget(name)
+
+    def _include(self, frame, func_name, require=False, once=False):
+        name = self.space.str_w(frame.pop())
+        fname = self._resolve_include(name)
         if once is True and fname in self.cached_files:
             frame.push(self.space.newint(1))
             return
         try:
-            bc = self.compile_file(fname)
+            try:
+                bc = self.compile_file(fname)
+            except (OSError, IOError):
+                # the file may have been created, moved or removed since
+                # it was resolved: try again without the cache
+                self._forget_include(name)
+                fname = self._resolve_include(name)
+                bc = self.compile_file(fname)
         except OSError as exc:
             self._report_include_warning(frame, func_name, name, exc,
                                          require)
@@ -1877,4 +1969,40 @@ for _name in BINOP_LIST + BINOP_BITWISE + ['concat', 'instanceof',
                                            'lshift', 'rshift']:
     setattr(Interpreter, *_new_binop(_name))
 
+
+def _new_superinstr_binops(name):
+    # the superinstructions ending with BINARY_xx; the two-args ones
+    # decode their second argument themselves
+    def VAR_BINARY(self, bytecode, frame, space, arg, pc):
+        w_right = frame.pop().deref()
+        w_left = frame.lookup_deref(arg, give_notice=True)
+        frame.push(getattr(space, name)(w_left, w_right))
+        return pc
+
+    def CONST_VAR_BINARY(self, bytecode, frame, space, arg, pc):
+        pc, arg2 = bytecode.next_arg(pc)
+        w_right = bytecode.consts[arg].eval_static(space)
+        w_left = frame.lookup_deref(arg2, give_notice=True)
+        frame.push(getattr(space, name)(w_left, w_right))
+        return pc
+
+    def VAR_VAR_BINARY(self, bytecode, frame, space, arg, pc):
+        pc, arg2 = bytecode.next_arg(pc)
+        w_right = frame.lookup_deref(arg, give_notice=True)
+        w_left = frame.lookup_deref(arg2, give_notice=True)
+        frame.push(getattr(space, name)(w_left, w_right))
+        return pc
+
+    result = []
+    for prefix, func in [('VAR_BINARY_', VAR_BINARY),
+                         ('CONST_VAR_BINARY_', CONST_VAR_BINARY),
+                         ('VAR_VAR_BINARY_', VAR_VAR_BINARY)]:
+        func.func_name = prefix + name.upper()
+        result.append((func.func_name, func))
+    return result
+
+for _name in SUPERINSTR_BINOPS:
+    for _new_name, _func in _new_superinstr_binops(_name):
+        setattr(Interpreter, _new_name, _func)
+
 unrolling_bc = unrolling_iterable(enumerate(BYTECODE_NAMES))
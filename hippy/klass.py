@@ -6,6 +6,7 @@ from hippy.objects.instanceobject import (
     W_InstanceObject, LOOKUP_SETATTR, LOOKUP_GETATTR, LOOKUP_HASATTR,
     LOOKUP_DELATTR, SpecialPropertyReturn)
 from hippy.objects.strobject import W_StringObject
+from hippy.objects.support import ll_pack_long
 from hippy import consts
 from hippy.objects.nullobject import w_Null
 from hippy.mapdict import Terminator, Attribute
@@ -1031,6 +1032,12 @@ class DelayedClassConstant(DelayedObject):
         w_result = w_cls.lookup_w_constant(space, self.name)
         return w_result
 
+    def ll_serialize(self, builder):
+        builder.append("k")
+        for s in [self.cls_name, self.name]:
+            ll_pack_long(builder, len(s))
+            builder.append(s)
+
 
 class ClassMember(AccessMixin):
     _immutable_fields_ = ['access_flags']
@@ -6,7 +6,7 @@ from rpython.rlib.rlocale import (setlocale as rsetlocale, LocaleError,
                                   nl_langinfo as rnl_langinfo)
 from rpython.rlib import rlocale
 from rpython.rtyper.lltypesystem.rffi import charp2str
-from rpython.rtyper.lltypesystem import rffi
+from rpython.rtyper.lltypesystem import rffi, lltype
 from rpython.rlib.rstring import StringBuilder
 
 from hippy.builtin import wrap
@@ -26,6 +26,22 @@ def lower(string):
     return builder.build()
 
 
+class _LowerTable(object):
+    table = None
+
+_lower_table = _LowerTable()
+
+
+def lower_table():
+    """Return the 256 characters, lowercased in the current locale: the
+    table that case-insensitive searches fold characters through."""
+    table = _lower_table.table
+    if table is None:
+        table = lower(''.join([chr(i) for i in range(256)]))
+        _lower_table.table = table
+    return table
+
+
 def upper_char(c):
     """Return the uppercase version of the character in the current locale."""
     return chr(_toupper(ord(c)))
@@ -43,6 +59,7 @@ def _setlocale(space, category, locale):
     if locale == '0':
         locale = None
     result = rsetlocale(category, locale)
+    _lower_table.table = None
     return space.newstr(result)
 
 
@@ -124,6 +141,20 @@ _strcoll = rlocale.external('strcoll', [rffi.CCHARP, rffi.CCHARP], rffi.INT)
 def strcoll_u(str1, str2):
     return _strcoll(rffi.str2charp(str1), rffi.str2charp(str2))
 
+_strxfrm = rlocale.external('strxfrm', [rffi.CCHARP, rffi.CCHARP,
+                                        rffi.SIZE_T], rffi.SIZE_T)
+
+def strxfrm_u(string):
+    """The string whose byte order against other such strings is the
+    strcoll() order of 'string'"""
+    with rffi.scoped_str2charp(string) as ll_string:
+        size = rffi.cast(lltype.Signed, _strxfrm(
+            lltype.nullptr(rffi.CCHARP.TO), ll_string, 0)) + 1
+        with rffi.scoped_alloc_buffer(size) as buf:
+            length = rffi.cast(lltype.Signed, _strxfrm(
+                buf.raw, ll_string, size))
+            return buf.str(min(length, size - 1))
+
 
 @wrap(['space', str, str])
 def strcoll(space, str1, str2):
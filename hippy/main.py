@@ -1,7 +1,13 @@
 #!/usr/bin/env python
 """ Hippy VM. Execute by typing
 
-hippy [--gcdump dumpfile] [--cgi] [--server port] [--jit jit_param] [<file.php>] [php program options]
+hippy [--gcdump dumpfile] [--cgi] [--server port] [--jit jit_param] [--no-ast-opt]
+      [--no-superinstructions] [--bc-profile dumpfile] [<file.php>] [php program options]
+
+hippy --workers n --listen socket_path [--max-requests n] [--jit jit_param]
+      [--image image_file] [<file.php> ...]
+
+hippy --build-image image_file <file.php or directory> ...
 
 and enjoy
 """
@@ -17,14 +23,19 @@ if __name__ == '__main__': # untranslated
 
 from hippy.phpcompiler import compile_php
 from hippy.interpreter import Interpreter
+from hippy.bcprofile import BytecodeProfile
+from hippy.worker import WorkerServer
+from hippy.bcimage import BytecodeImage, ImageError, build_image
 from hippy.objspace import getspace
 from hippy.error import ExplicitExitException, InterpreterError, SignalReceived
-from hippy.config import load_ini
+from hippy.config import read_ini_file, load_ini_data, configure_space
 from hippy.sourceparser import ParseError
 from hippy.lexer import LexerError
+from rpython.rlib import rgc
 from rpython.rlib.rgc import dump_rpy_heap
 from rpython.rlib.objectmodel import we_are_translated
 from hippy import rpath
+from hippy import gcstats
 
 # Needs to be a separate func so flowspace doesn't say import cannot succeed
 # when there is no fastcgi module source around.
@@ -34,6 +45,7 @@ def _run_fastcgi_server(server_port):
     return run_fcgi_server(port=server_port)
 
 def entry_point(argv):
+    gcstats.gchooks.start_clock()
     i = 1
     fname = None
     gcdump = None
@@ -44,6 +56,14 @@ def entry_point(argv):
     debugger_pipes = (-1, -1)
     server_port = 9000
     jit_param = None
+    ast_opt = True
+    superinstructions = True
+    bc_profile = None
+    workers = 0
+    listen_path = None
+    max_requests = 0
+    image = None
+    build_image_path = None
     while i < len(argv):
         arg = argv[i]
         if arg.startswith('-'):
@@ -79,6 +99,46 @@ def entry_point(argv):
                     return 1
                 i += 1
                 jit_param = argv[i]
+            elif arg == '--no-ast-opt':
+                ast_opt = False
+            elif arg == '--no-superinstructions':
+                superinstructions = False
+            elif arg == '--bc-profile':
+                if i == len(argv) - 1:
+                    print "--bc-profile requires an argument"
+                    return 1
+                i += 1
+                bc_profile = argv[i]
+            elif arg == '--workers':
+                if i == len(argv) - 1:
+                    print "--workers requires an int"
+                    return 1
+                i += 1
+                workers = int(argv[i])
+            elif arg == '--listen':
+                if i == len(argv) - 1:
+                    print "--listen requires a socket path"
+                    return 1
+                i += 1
+                listen_path = argv[i]
+            elif arg == '--max-requests':
+                if i == len(argv) - 1:
+                    print "--max-requests requires an int"
+                    return 1
+                i += 1
+                max_requests = int(argv[i])
+            elif arg == '--image':
+                if i == len(argv) - 1:
+                    print "--image requires an argument"
+                    return 1
+                i += 1
+                image = argv[i]
+            elif arg == '--build-image':
+                if i == len(argv) - 1:
+                    print "--build-image requires an argument"
+                    return 1
+                i += 1
+                build_image_path = argv[i]
             else:
                 print __doc__
                 print "Unknown parameter %s" % arg
@@ -100,29 +160,92 @@ def entry_point(argv):
             return 1
         else:
             return _run_fastcgi_server(server_port)
+    if build_image_path is not None:
+        return run_build_image(build_image_path, argv[i:], ast_opt,
+                               superinstructions)
+    if workers > 0 or listen_path is not None:
+        if workers <= 0 or listen_path is None:
+            print "--workers and --listen go together"
+            return 1
+        if bench_mode or cgi:
+            print "can't specify --bench or --cgi with --workers"
+            return 1
+        return run_workers(listen_path, workers, max_requests, argv[i:],
+                           image, ast_opt, superinstructions)
     rest_of_args = []
     for k in range(i + 1, len(argv)):
         s = argv[k]
         assert s is not None
         rest_of_args.append(s)
     return main(fname, rest_of_args, cgi, gcdump, debugger_pipes,
-                bench_mode, bench_no)
+                bench_mode, bench_no, ast_opt, superinstructions, bc_profile)
 
-def main(filename, rest_of_args, cgi, gcdump, debugger_pipes=(-1, -1),
-         bench_mode=False, bench_no=-1):
+def run_build_image(image_path, paths, ast_opt=True, superinstructions=True):
+    if not paths:
+        print "--build-image requires files or directories to compile"
+        return 1
     space = getspace()
     interp = Interpreter(space)
-
+    load_ini_data(interp, read_ini_file())
+    configure_space(interp, ast_opt, superinstructions)
     try:
-        ini_data = open('hippy.ini').read(-1)
-    except (OSError, IOError):
-        ini_data = None
+        count = build_image(space, paths, image_path)
+    except OSError as e:
+        print 'Could not build %s: %s' % (image_path, os.strerror(e.errno))
+        return 2
+    print "%d files compiled into %s" % (count, image_path)
+    return 0
 
-    if ini_data is not None:
+def run_workers(listen_path, workers, max_requests, preload, image=None,
+                ast_opt=True, superinstructions=True):
+    """ Serve SCGI requests on the unix socket 'listen_path' with
+    'workers' pre-forked processes.  The files of the bytecode 'image'
+    and the scripts in 'preload' are loaded before forking, so that every
+    worker starts with them, in memory shared with the master.
+    """
+    space = getspace()
+    interp = Interpreter(space)
+    ini_data = read_ini_file()
+    load_ini_data(interp, ini_data)
+    configure_space(interp, ast_opt, superinstructions)
+    if image is not None:
         try:
-            load_ini(interp, ini_data)
-        except:
-            os.write(2, "error reading `hippy.ini`")
+            bc_image = BytecodeImage(image)
+        except ImageError as e:
+            print e.msg
+            return 2
+        if not bc_image.matches(space):
+            print "%s was built with other compiler options" % image
+            return 2
+        space.bytecode_cache.image = bc_image
+        bc_image.preload(space, space.bytecode_cache)
+    for filename in preload:
+        try:
+            space.bytecode_cache.compile_file(filename, space)
+        except Exception as e:
+            print 'Could not preload %s: %s' % (filename, e)
+            return 2
+    # move everything loaded so far out of the nursery, so that the
+    # workers don't each end up copying it
+    rgc.collect()
+    server = WorkerServer(space, listen_path, workers, max_requests,
+                          ini_data)
+    return server.serve()
+
+def main(filename, rest_of_args, cgi, gcdump, debugger_pipes=(-1, -1),
+         bench_mode=False, bench_no=-1, ast_opt=True, superinstructions=True,
+         bc_profile=None):
+    space = getspace()
+    interp = Interpreter(space)
+    if bc_profile is not None:
+        profile = BytecodeProfile()
+        interp.bc_profile = profile
+    else:
+        profile = None
+
+    ini_data = read_ini_file()
+    load_ini_data(interp, ini_data)
+    configure_space(interp, ast_opt, superinstructions)
 
     try:
         bc = space.bytecode_cache.compile_file(filename, space)
@@ -190,15 +313,16 @@ def main(filename, rest_of_args, cgi, gcdump, debugger_pipes=(-1, -1),
             return exitcode
         if i < no - 1:
             interp = Interpreter(space)
-            if ini_data is not None:
-                try:
-                    load_ini(interp, ini_data)
-                except:
-                    os.write(2, "error reading `hippy.ini`")
+            interp.bc_profile = profile
+            load_ini_data(interp, ini_data)
     if gcdump is not None:
         f = os.open(gcdump, os.O_CREAT | os.O_WRONLY, 0777)
         dump_rpy_heap(f)
         os.close(f)
+    if profile is not None:
+        f = os.open(bc_profile, os.O_CREAT | os.O_TRUNC | os.O_WRONLY, 0644)
+        profile.dump(f)
+        os.close(f)
     return exitcode
 
 if __name__ == '__main__':
@@ -5,10 +5,12 @@ from hippy.objects.instanceobject import W_InstanceObject, demangle_property
 from hippy.objects.resources.resource import W_Resource
 from rpython.rlib.rarithmetic import intmask
 from rpython.rlib.rstring import StringBuilder
+from rpython.rlib import rgc
 from hippy.module import serialize as serialize_mod
 from hippy.phpcompiler import compile_php
 from hippy.constants import get_const
 from hippy.config import EXTENSIONS
+from hippy import gcstats
 import os
 import time
 
@@ -365,9 +367,13 @@ def dl():
     raise NotImplementedError()
 
 
-def gc_collect_cycles():
+@wrap(['space'])
+def gc_collect_cycles(space):
     """ Forces collection of any existing garbage cycles"""
-    raise NotImplementedError()
+    # the GC does not count cycles: report none, like PHP when it
+    # finds nothing to collect
+    rgc.collect()
+    return space.newint(0)
 
 
 def gc_disable():
@@ -567,13 +573,48 @@ def main():
 @wrap(['interp',  Optional(bool)])
 def memory_get_peak_usage(interp, real_usage=False):
     """ Returns the peak of memory allocated by PHP"""
-    return interp.space.newint(0)
+    return interp.space.newint(gcstats.peak_memory_usage(real_usage))
 
 
 @wrap(['interp',  Optional(bool)])
 def memory_get_usage(interp, real_usage=False):
     """ Returns the amount of memory allocated to PHP"""
-    return interp.space.newint(0)
+    return interp.space.newint(gcstats.memory_usage(real_usage))
+
+
+@wrap(['space'])
+def hippy_gc_stats(space):
+    """ Returns the collection counts, pause times and memory sizes
+    of the garbage collector (see hippy/gcstats.py); times are in
+    milliseconds"""
+    hooks = gcstats.gchooks
+    return space.new_array_from_pairs([
+        (space.newstr('minor_collections'),
+         space.newint(hooks.minor_collections)),
+        (space.newstr('minor_pause_total_ms'),
+         space.newfloat(hooks.ticks_to_ms(hooks.minor_pause_total))),
+        (space.newstr('minor_pause_max_ms'),
+         space.newfloat(hooks.ticks_to_ms(hooks.minor_pause_max))),
+        (space.newstr('major_collections'),
+         space.newint(hooks.major_collections)),
+        (space.newstr('major_steps'), space.newint(hooks.major_steps)),
+        (space.newstr('major_pause_total_ms'),
+         space.newfloat(hooks.ticks_to_ms(hooks.major_pause_total))),
+        (space.newstr('major_pause_max_ms'),
+         space.newfloat(hooks.ticks_to_ms(hooks.major_pause_max))),
+        (space.newstr('total_gc_time_ms'),
+         space.newfloat(float(gcstats.total_gc_time()))),
+        (space.newstr('nursery_size'), space.newint(gcstats.nursery_size())),
+        (space.newstr('memory_usage'),
+         space.newint(gcstats.memory_usage(False))),
+        (space.newstr('memory_usage_real'),
+         space.newint(gcstats.memory_usage(True))),
+        (space.newstr('peak_memory_usage'),
+         space.newint(gcstats.peak_memory_usage(False))),
+        (space.newstr('peak_memory_usage_real'),
+         space.newint(gcstats.peak_memory_usage(True))),
+        (space.newstr('gc_hooks'), space.newbool(gcstats.HAS_GC_HOOKS)),
+    ])
 
 
 def php_ini_loaded_file():
@@ -1,28 +1,122 @@
+from rpython.rlib.unicodedata import unicodedb_6_2_0 as unicodedb
 
 from hippy.builtin import wrap, Optional
+from hippy.objects.base import W_Root
+from hippy.module.mbstring import utf8
 
 
-@wrap(['interp', str, Optional(str)], error=False)
-def mb_strlen(interp, s, encoding='utf-8'):
+def _check_encoding(interp, fname, encoding):
     encoding = encoding.lower()
     if encoding != 'utf-8' and encoding != 'utf8':
-        interp.warn('mb_strlen(): Unsupported encoding "%s"' % encoding)
+        interp.warn('%s(): Unsupported encoding "%s"' % (fname, encoding))
+        return False
+    return True
+
+
+@wrap(['interp', str, Optional(str)], error=False)
+def mb_strlen(interp, s, encoding='utf-8'):
+    if not _check_encoding(interp, 'mb_strlen', encoding):
         return interp.space.w_False
-    #
-    # special-case logic to handle UTF-8 the fast way
-    length = end = len(s)
-    i = 0
-    while i < end:
-        c = s[i]
-        if ord(c) < 0xc0:
-            i += 1
-        elif ord(c) < 0xe0:
-            length -= 1
-            i += 2
-        elif ord(c) < 0xf0:
-            length -= 2
-            i += 3
+    return interp.space.wrap(utf8.get_index(interp, s).length)
+
+
+@wrap(['interp', str, int, Optional(W_Root), Optional(str)], error=False)
+def mb_substr(interp, s, start, w_length=None, encoding='utf-8'):
+    space = interp.space
+    if not _check_encoding(interp, 'mb_substr', encoding):
+        return space.w_False
+    index = utf8.get_index(interp, s)
+    n = index.length
+    if start < 0:
+        start = max(n + start, 0)
+    if start > n:
+        return space.newstr('')
+    if w_length is None or space.is_null(w_length):
+        end = n
+    else:
+        length = space.int_w(w_length)
+        if length < 0:
+            end = n + length
+            if end < start:
+                return space.newstr('')
         else:
-            length -= 3
-            i += 4
-    return interp.space.wrap(length)
+            end = min(start + length, n)
+    return space.newstr(index.substring(start, end))
+
+
+@wrap(['interp', str, str, Optional(int), Optional(str)], error=False)
+def mb_strpos(interp, haystack, needle, offset=0, encoding='utf-8'):
+    space = interp.space
+    if not _check_encoding(interp, 'mb_strpos', encoding):
+        return space.w_False
+    index = utf8.get_index(interp, haystack)
+    if offset < 0 or offset > index.length:
+        interp.warn('mb_strpos(): Offset not contained in string')
+        return space.w_False
+    if not needle:
+        interp.warn('mb_strpos(): Empty delimiter')
+        return space.w_False
+    pos = haystack.find(needle, index.byte_offset(offset))
+    if pos < 0:
+        return space.w_False
+    return space.wrap(index.char_index(pos))
+
+
+def _tolower(code):
+    return unicodedb.tolower(code)
+
+
+def _toupper(code):
+    return unicodedb.toupper(code)
+
+
+@wrap(['interp', str, Optional(str)], error=False)
+def mb_strtolower(interp, s, encoding='utf-8'):
+    if not _check_encoding(interp, 'mb_strtolower', encoding):
+        return interp.space.w_False
+    if utf8.is_ascii(s):
+        return interp.space.newstr(s.lower())
+    res = utf8.change_case(s, _tolower)
+    if res is None:
+        return interp.space.newstr(s)
+    return interp.space.newstr(res)
+
+
+@wrap(['interp', str, Optional(str)], error=False)
+def mb_strtoupper(interp, s, encoding='utf-8'):
+    if not _check_encoding(interp, 'mb_strtoupper', encoding):
+        return interp.space.w_False
+    if utf8.is_ascii(s):
+        return interp.space.newstr(s.upper())
+    res = utf8.change_case(s, _toupper)
+    if res is None:
+        return interp.space.newstr(s)
+    return interp.space.newstr(res)
+
+
+@wrap(['interp', str, Optional(int), Optional(str)], error=False)
+def mb_str_split(interp, s, split_length=1, encoding='utf-8'):
+    space = interp.space
+    if split_length < 1:
+        interp.warn('mb_str_split(): The length of each segment must be '
+                    'greater than zero')
+        return space.w_False
+    if not _check_encoding(interp, 'mb_str_split', encoding):
+        return space.w_False
+    index = utf8.get_index(interp, s)
+    chunks_w = []
+    start = 0
+    while start < index.length:
+        end = min(start + split_length, index.length)
+        chunks_w.append(space.newstr(index.substring(start, end)))
+        start = end
+    return space.new_array_from_list(chunks_w)
+
+
+@wrap(['interp', str, Optional(str)], error=False)
+def mb_strwidth(interp, s, encoding='utf-8'):
+    if not _check_encoding(interp, 'mb_strwidth', encoding):
+        return interp.space.w_False
+    if utf8.is_ascii(s):
+        return interp.space.wrap(len(s))
+    return interp.space.wrap(utf8.width(s))
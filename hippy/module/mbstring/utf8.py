@@ -0,0 +1,252 @@
+""" The UTF-8 engine of the mb_*() functions.  A character is a lead byte
+followed by as many bytes as the lead byte announces, whatever they are,
+and a stray continuation byte is a character on its own; this is how
+mb_strlen() and the PCRE module count.  Strings are scanned once for
+non-ASCII bytes: on a pure-ASCII string characters are bytes.  Otherwise a
+Utf8Index records where every INDEX_STEP-th character starts, so that
+finding any character offset costs at most INDEX_STEP steps, and the
+index of a long string is kept in a small cache on the interpreter, so
+that calls like mb_substr() in a loop over one document do not rescan it.
+"""
+
+from rpython.rlib.objectmodel import specialize
+from rpython.rlib.rstring import StringBuilder
+
+INDEX_STEP = 32
+CACHE_MIN_LENGTH = 256
+DEFAULT_CACHE_SIZE = 16
+
+
+def char_size(c):
+    """The number of bytes of the character whose first byte is 'c'."""
+    if c < 0xc0:
+        return 1
+    elif c < 0xe0:
+        return 2
+    elif c < 0xf0:
+        return 3
+    else:
+        return 4
+
+
+def is_ascii(s):
+    for c in s:
+        if ord(c) >= 0x80:
+            return False
+    return True
+
+
+def decode_char(s, i):
+    """The code point of the character at s[i], or -1 if it is not valid
+    UTF-8 (including overlong forms and surrogates)."""
+    c = ord(s[i])
+    size = char_size(c)
+    if size == 1:
+        if c >= 0x80:
+            return -1
+        return c
+    if i + size > len(s):
+        return -1
+    if size == 2:
+        code = c & 0x1f
+    elif size == 3:
+        code = c & 0x0f
+    else:
+        code = c & 0x07
+    for k in range(i + 1, i + size):
+        b = ord(s[k])
+        if b & 0xc0 != 0x80:
+            return -1
+        code = (code << 6) | (b & 0x3f)
+    if (size == 2 and code < 0x80 or size == 3 and code < 0x800 or
+            size == 4 and (code < 0x10000 or code > 0x10ffff) or
+            0xd800 <= code <= 0xdfff):
+        return -1
+    return code
+
+
+def encode_char(builder, code):
+    if code < 0x80:
+        builder.append(chr(code))
+    elif code < 0x800:
+        builder.append(chr(0xc0 | (code >> 6)))
+        builder.append(chr(0x80 | (code & 0x3f)))
+    elif code < 0x10000:
+        builder.append(chr(0xe0 | (code >> 12)))
+        builder.append(chr(0x80 | ((code >> 6) & 0x3f)))
+        builder.append(chr(0x80 | (code & 0x3f)))
+    else:
+        builder.append(chr(0xf0 | (code >> 18)))
+        builder.append(chr(0x80 | ((code >> 12) & 0x3f)))
+        builder.append(chr(0x80 | ((code >> 6) & 0x3f)))
+        builder.append(chr(0x80 | (code & 0x3f)))
+
+
+class Utf8Index(object):
+    """The characters of the string 's'.  'offsets[k]' is the byte offset
+    of character number k * INDEX_STEP; it is empty for an 'ascii'
+    string."""
+    _immutable_fields_ = ['s', 'ascii', 'length', 'offsets[*]']
+
+    def __init__(self, s):
+        self.s = s
+        self.ascii = is_ascii(s)
+        if self.ascii:
+            self.length = len(s)
+            self.offsets = []
+            return
+        offsets = []
+        length = 0
+        i = 0
+        while i < len(s):
+            if length % INDEX_STEP == 0:
+                offsets.append(i)
+            i += char_size(ord(s[i]))
+            length += 1
+        self.length = length
+        self.offsets = offsets[:]
+
+    def byte_offset(self, index):
+        """The byte offset where character number 'index' starts, or the
+        length of the string for 'index' >= length."""
+        if self.ascii:
+            return min(index, len(self.s))
+        if index >= self.length:
+            return len(self.s)
+        i = self.offsets[index // INDEX_STEP]
+        for k in range(index % INDEX_STEP):
+            i += char_size(ord(self.s[i]))
+        return i
+
+    def char_index(self, offset):
+        """The number of the character that contains the byte at
+        'offset'."""
+        if self.ascii:
+            return offset
+        lo = 0
+        hi = len(self.offsets)
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self.offsets[mid] <= offset:
+                lo = mid
+            else:
+                hi = mid
+        index = lo * INDEX_STEP
+        i = self.offsets[lo]
+        while True:
+            i += char_size(ord(self.s[i]))
+            if i > offset:
+                return index
+            index += 1
+
+    def substring(self, start, end):
+        """The characters from number 'start' up to 'end'."""
+        i = self.byte_offset(start)
+        j = self.byte_offset(end)
+        assert 0 <= i <= j
+        return self.s[i:j]
+
+
+class Utf8IndexCache(object):
+    """The indexes of the last few long strings, keyed by the string.  When
+    it is full it simply starts afresh, like ReplacerCache."""
+    def __init__(self, capacity=DEFAULT_CACHE_SIZE):
+        self._contents = {}
+        self.capacity = capacity
+
+    def get(self, s):
+        return self._contents.get(s, None)
+
+    def set(self, s, index):
+        if len(self._contents) >= self.capacity:
+            self._contents.clear()
+        self._contents[s] = index
+
+
+def get_index(interp, s):
+    if len(s) < CACHE_MIN_LENGTH:
+        return Utf8Index(s)
+    cache = interp.utf8_index_cache
+    index = cache.get(s)
+    if index is None:
+        index = Utf8Index(s)
+        cache.set(s, index)
+    return index
+
+
+@specialize.arg(1)
+def change_case(s, convert):
+    """Map the code points of the valid characters of 's' through
+    'convert', keeping the other bytes as they are.  Return None if that
+    changes nothing."""
+    builder = StringBuilder(len(s))
+    start = 0
+    i = 0
+    while i < len(s):
+        size = char_size(ord(s[i]))
+        code = decode_char(s, i)
+        if code >= 0:
+            new_code = convert(code)
+            if new_code != code:
+                builder.append_slice(s, start, i)
+                encode_char(builder, new_code)
+                start = i + size
+        i += size
+    if start == 0:
+        return None
+    if start < len(s):
+        builder.append_slice(s, start, len(s))
+    return builder.build()
+
+
+# the ranges of East Asian wide and fullwidth characters, as in mbfl
+_WIDE_RANGES = [
+    (0x1100, 0x115f), (0x11a3, 0x11a7), (0x11fa, 0x11ff), (0x2329, 0x232a),
+    (0x2e80, 0x2e99), (0x2e9b, 0x2ef3), (0x2f00, 0x2fd5), (0x2ff0, 0x2ffb),
+    (0x3000, 0x303e), (0x3041, 0x3096), (0x3099, 0x30ff), (0x3105, 0x312d),
+    (0x3131, 0x318e), (0x3190, 0x31ba), (0x31c0, 0x31e3), (0x31f0, 0x321e),
+    (0x3220, 0x3247), (0x3250, 0x32fe), (0x3300, 0x4dbf), (0x4e00, 0xa48c),
+    (0xa490, 0xa4c6), (0xa960, 0xa97c), (0xac00, 0xd7a3), (0xd7b0, 0xd7c6),
+    (0xd7cb, 0xd7fb), (0xf900, 0xfaff), (0xfe10, 0xfe19), (0xfe30, 0xfe52),
+    (0xfe54, 0xfe66), (0xfe68, 0xfe6b), (0xff01, 0xff60), (0xffe0, 0xffe6),
+    (0x1b000, 0x1b001), (0x1f200, 0x1f202), (0x1f210, 0x1f23a),
+    (0x1f240, 0x1f248), (0x1f250, 0x1f251), (0x20000, 0x2fffd),
+    (0x30000, 0x3fffd),
+]
+_WIDE_FIRST = [first for first, last in _WIDE_RANGES]
+_WIDE_LAST = [last for first, last in _WIDE_RANGES]
+
+
+def char_width(code):
+    """The width of a character: 2 if it is wide, 1 otherwise."""
+    if code < _WIDE_FIRST[0]:
+        return 1
+    lo = 0
+    hi = len(_WIDE_FIRST)
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if _WIDE_FIRST[mid] <= code:
+            lo = mid
+        else:
+            hi = mid
+    if code <= _WIDE_LAST[lo]:
+        return 2
+    return 1
+
+
+def width(s):
+    total = 0
+    i = 0
+    while i < len(s):
+        c = ord(s[i])
+        if c < 0x80:
+            total += 1
+            i += 1
+            continue
+        code = decode_char(s, i)
+        if code < 0:
+            total += 1
+        else:
+            total += char_width(code)
+        i += char_size(c)
+    return total
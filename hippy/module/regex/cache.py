@@ -1,12 +1,95 @@
+DEFAULT_CACHE_SIZE = 4096     # the same as PCRE_CACHE_SIZE in Zend
+
+
+class _CacheEntry(object):
+    def __init__(self, pattern, compiled_regexp):
+        self.pattern = pattern
+        self.compiled_regexp = compiled_regexp
+        self.prev = None
+        self.next = None
 
 
 class RegexpCache(object):
-    # TODO: this should use an LRU cache, and be elidable for the JIT.
-    def __init__(self, space):
+    """A size-bounded LRU cache of compiled regexps, keyed by the full
+    pattern string (delimiters and modifiers included).
+
+    Entries are kept in a doubly-linked list, most recently used first,
+    so that both lookups and evictions are O(1).  The hit/miss/eviction
+    counters only account for lookups done by the interpreter: patterns
+    that are constant in a JIT trace are kept apart by set_constant()
+    and their lookup is folded away.
+    """
+    def __init__(self, space, capacity=DEFAULT_CACHE_SIZE):
         self._contents = {}
+        self._constants = {}
+        self._head = _CacheEntry(None, None)    # sentinel
+        self._head.prev = self._head
+        self._head.next = self._head
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def size(self):
+        return len(self._contents)
+
+    def _unlink(self, entry):
+        entry.prev.next = entry.next
+        entry.next.prev = entry.prev
+
+    def _link_first(self, entry):
+        head = self._head
+        entry.prev = head
+        entry.next = head.next
+        head.next.prev = entry
+        head.next = entry
 
     def get(self, pattern):
-        return self._contents.get(pattern, None)
+        try:
+            entry = self._contents[pattern]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self._head.next is not entry:
+            self._unlink(entry)
+            self._link_first(entry)
+        return entry.compiled_regexp
 
     def set(self, pattern, compiled_regexp):
-        self._contents[pattern] = compiled_regexp
+        try:
+            entry = self._contents[pattern]
+        except KeyError:
+            pass
+        else:
+            self._unlink(entry)
+        entry = _CacheEntry(pattern, compiled_regexp)
+        self._contents[pattern] = entry
+        self._link_first(entry)
+        self._shrink()
+
+    def _shrink(self):
+        # a capacity of 0 or less disables caching altogether
+        while len(self._contents) > max(self.capacity, 0):
+            last = self._head.prev
+            self._unlink(last)
+            del self._contents[last.pattern]
+            self.evictions += 1
+
+    def set_capacity(self, capacity):
+        self.capacity = capacity
+        self._shrink()
+
+    def get_constant(self, pattern):
+        """Only for patterns that are constants in the JIT: those are
+        bounded by the program text, so they are never evicted (which
+        would break the elidability of the lookup)."""
+        return self._constants.get(pattern, None)
+
+    def set_constant(self, pattern, compiled_regexp):
+        self._constants[pattern] = compiled_regexp
+
+    def clear(self):
+        self._contents.clear()
+        self._head.prev = self._head
+        self._head.next = self._head
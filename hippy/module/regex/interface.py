@@ -1,10 +1,13 @@
 
+from rpython.rlib import jit
 from rpython.rlib.rstring import StringBuilder
 from rpython.rtyper.lltypesystem import lltype, rffi
 from rpython.rtyper.lltypesystem.rstr import copy_string_to_raw
 from rpython.rtyper.annlowlevel import llstr
 
-from hippy.builtin import Optional, ExitFunctionWithError, wrap, W_Root
+from hippy.builtin import (
+    Optional, ExitFunctionWithError, wrap, W_Root, StringArg)
+from hippy.objects.strobject import W_ConstStringObject
 from hippy.module.regex import _pcre
 from hippy.constants import CONSTS
 
@@ -25,14 +28,18 @@ PREG_SPLIT_OFFSET_CAPTURE = CONSTS['pcre']['PREG_SPLIT_OFFSET_CAPTURE']
 
 
 class PCE(object):
+    _immutable_fields_ = ['re', 'extra', 'poptions', 'coptions',
+                          'capturecount', 'subpat_names[*]', 'study_failed']
+
     def __init__(self, re, extra, poptions, coptions, capturecount,
-                 subpat_names):
+                 subpat_names, study_failed=False):
         self.re = re
         self.extra = extra
         self.poptions = poptions
         self.coptions = coptions
         self.capturecount = capturecount
         self.subpat_names = subpat_names
+        self.study_failed = study_failed
 
     def utf8size(self, subject, position):
         # Return the number of bytes taken by the character starting
@@ -95,10 +102,79 @@ def make_subpats_table(capturecount, re, extra):
     return subpat_names
 
 def get_compiled_regex_cache(interp, regex):
-    pce = interp.space.regex_cache.get(regex)
-    if pce is not None:
-        return pce
+    cache = interp.space.regex_cache
+    if jit.isconstant(regex):
+        pce = _get_constant_pce(jit.promote(cache), regex)
+        if not pce.study_failed:
+            return pce
+        # warn the way the path below does, the first time only
+    pce = cache.get(regex)
+    if pce is None:
+        pce = compile_regex(regex)
+        if pce.study_failed:
+            interp.warn("Error while studying pattern")
+        cache.set(regex, pce)
+    return pce
+
+
+@jit.elidable
+def _get_constant_pce(cache, regex):
+    # Memoizing: once a pattern is known, this always returns the same PCE
+    pce = cache.get_constant(regex)
+    if pce is None:
+        pce = compile_regex(regex)
+        cache.set_constant(regex, pce)
+    return pce
+
+
+class W_PatternStringObject(W_ConstStringObject):
+    """The literal pattern of a preg_*() call site, as LOAD_PATTERN pushes
+    it, together with the PCE compiled for it along with the code.  The
+    bytecode holds it in a slot of its own, so the PCE is a constant in
+    the traces of the call site."""
+    _immutable_ = True
+
+    def __init__(self, strval, pce):
+        W_ConstStringObject.__init__(self, strval)
+        self.pce = pce
+
+
+def literal_pattern(space, pattern):
+    """The W_PatternStringObject for the literal 'pattern' of a call site,
+    or None if the pattern does not compile or study: calls with it then
+    report the error every time, as before.  The PCE is the one kept
+    with the constant patterns of the cache."""
+    try:
+        pce = _get_constant_pce(space.regex_cache, pattern)
+    except ExitFunctionWithError:
+        return None
+    if pce.study_failed:
+        return None
+    return W_PatternStringObject(pattern, pce)
 
+
+def get_pattern_pce(interp, w_pattern):
+    if isinstance(w_pattern, W_PatternStringObject):
+        return w_pattern.pce
+    return get_compiled_regex_cache(interp, interp.space.str_w(w_pattern))
+
+
+class PatternArg(StringArg):
+    """A pattern argument, unwrapped to its PCE like a string argument to
+    its string."""
+    def line_for_arg(self, i, input_i):
+        lines = StringArg.line_for_arg(self, i, input_i)
+        lines[-1] = '    arg%d = get_pattern_pce%d(interp, w_arg)' % (i, i)
+        return lines
+
+    def register_extra_name(self, d, i):
+        assert 'get_pattern_pce%d' % i not in d
+        d['get_pattern_pce%d' % i] = get_pattern_pce
+
+
+def compile_regex(regex):
+    """Parse the delimiters and modifiers of 'regex' and compile it.
+    Raises ExitFunctionWithError if the pattern is invalid."""
     if '\x00' in regex:
         raise ExitFunctionWithError("Null byte in regex")
 
@@ -229,6 +305,7 @@ def get_compiled_regex_cache(interp, regex):
     # If study option was specified, study the pattern and
     # store the result in extra for passing to pcre_exec.
     extra = lltype.nullptr(_pcre.pcre_extra)
+    study_failed = False
     if do_study:
         soptions = 0
         #if _pcre.PCRE_STUDY_JIT_COMPILE is not None:
@@ -238,7 +315,7 @@ def get_compiled_regex_cache(interp, regex):
         error = p_error[0]
         lltype.free(p_error, flavor='raw')
         if error:
-            interp.warn("Error while studying pattern")
+            study_failed = True
     if not extra:
         extra = _pcre.hippy_pcre_extra_malloc()
     rffi.setintfield(extra, 'c_flags',
@@ -251,11 +328,8 @@ def get_compiled_regex_cache(interp, regex):
 
     subpat_names = make_subpats_table(capturecount, re, extra)
 
-    pce = PCE(re, extra, poptions, coptions,    # XXX also locale and tables
-              capturecount, subpat_names)
-
-    interp.space.regex_cache.set(regex, pce)
-    return pce
+    return PCE(re, extra, poptions, coptions,    # XXX also locale and tables
+               capturecount, subpat_names, study_failed)
 
 
 def handle_exec_error(interp, code):
@@ -485,10 +559,9 @@ def match_impl(interp, pce, subject, w_matches, start_offset,
         return space.w_False
 
 
-@wrap(['interp', str, str, Optional('reference'), Optional(int),
+@wrap(['interp', PatternArg(), str, Optional('reference'), Optional(int),
        Optional(int)], error=False)
-def preg_match(interp, pattern, subject, w_matches=None, flags=0, offset=0):
-    pce = get_compiled_regex_cache(interp, pattern)
+def preg_match(interp, pce, subject, w_matches=None, flags=0, offset=0):
     offset_capture = (flags & PREG_OFFSET_CAPTURE) != 0
     if flags & 0xff:
         raise ExitFunctionWithError("Invalid flags specified")
@@ -497,12 +570,10 @@ def preg_match(interp, pattern, subject, w_matches=None, flags=0, offset=0):
                       flags=PREG_SPLIT_OFFSET_CAPTURE if offset_capture else 0)
 
 
-@wrap(['interp', str, str, Optional('reference'), Optional(int),
+@wrap(['interp', PatternArg(), str, Optional('reference'), Optional(int),
        Optional(int)], error=False)
-def preg_match_all(interp, pattern, subject, w_matches=None, flags=-909,
+def preg_match_all(interp, pce, subject, w_matches=None, flags=-909,
                    offset=0):
-    pce = get_compiled_regex_cache(interp, pattern)
-
     offset_capture = False
     subpats_order = PREG_PATTERN_ORDER
     if flags != -909:
@@ -752,7 +823,7 @@ def replace_in_subject(interp, w_regex, w_replace, is_callback_replace,
         return space.newstr(subject), replace_count
 
     else:
-        pce = get_compiled_regex_cache(interp, space.str_w(w_regex))
+        pce = get_pattern_pce(interp, w_regex)
         return replace_impl(interp, pce, replace_obj, subject, limit)
 
 
@@ -767,7 +838,8 @@ def preg_replace_impl(interp, funcname, w_regex, w_replace, w_subject, limit,
                         "a string while replacement is an array" % funcname)
             return space.w_False
 
-    if not space.is_array(w_regex):
+    if not space.is_array(w_regex) and not isinstance(w_regex,
+                                                     W_PatternStringObject):
         w_regex = space.newstr(space.str_w(w_regex))
 
     if space.is_array(w_subject):
@@ -803,7 +875,7 @@ def preg_replace_impl(interp, funcname, w_regex, w_replace, w_subject, limit,
 
 def replace_fastcase(interp, w_regex, replace_obj, w_subject, limit, w_count):
     space = interp.space
-    pce = get_compiled_regex_cache(interp, space.str_w(w_regex))
+    pce = get_pattern_pce(interp, w_regex)
     subject = space.str_w(w_subject)
     w_result, replcount = replace_impl(interp, pce, replace_obj, subject,
                                        limit)
@@ -880,9 +952,9 @@ def preg_quote(space, arg, delimiter=None):
 
 # ____________________________________________________________
 
-@wrap(['interp', str, str, Optional(int), Optional(int)], error=False)
-def preg_split(interp, pattern, subject, limit=-1, flags=0):
-    pce = get_compiled_regex_cache(interp, pattern)
+@wrap(['interp', PatternArg(), str, Optional(int), Optional(int)],
+      error=False)
+def preg_split(interp, pce, subject, limit=-1, flags=0):
     limit -= 1
     w_matches = interp.space.empty_ref()
     match_impl(interp, pce, subject, w_matches, 0,
@@ -900,6 +972,20 @@ def preg_last_error(interp):
     return interp.space.wrap(interp.regexp_error_code)
 
 
+@wrap(['space'])
+def hippy_pcre_cache_stats(space):
+    """ Returns the size and the hit/miss/eviction counters of the cache
+    of compiled regular expressions"""
+    cache = space.regex_cache
+    return space.new_array_from_pairs([
+        (space.newstr('size'), space.newint(cache.size())),
+        (space.newstr('capacity'), space.newint(cache.capacity)),
+        (space.newstr('hits'), space.newint(cache.hits)),
+        (space.newstr('misses'), space.newint(cache.misses)),
+        (space.newstr('evictions'), space.newint(cache.evictions)),
+    ])
+
+
 # ____________________________________________________________
 
 from rpython.rtyper.lltypesystem import rstr, llmemory
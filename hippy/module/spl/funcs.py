@@ -55,7 +55,7 @@ def _spl_autoload(interp, class_name, file_extensions_list):
     for extension in file_extensions_list:
         for path in interp.include_path:
             fname = rpath.join(path, ["%s%s" % (class_id, extension)])
-            if rpath.exists(fname):
+            if interp.space.realpath_cache.exists(fname):
                 bc = interp.compile_file(fname)
                 interp.run_include(bc, interp.global_frame)
 
@@ -3,7 +3,8 @@ from rpython.rlib import jit
 
 from hippy.objects.base import W_Root
 from hippy.objects.reference import W_Reference
-from hippy.objects.arrayobject import new_rdict, W_ArrayObject
+from hippy.objects.arrayobject import (new_rdict, W_ArrayObject,
+                                       W_ListArrayObject)
 from hippy.objects.instanceobject import W_InstanceObject
 from hippy.objects.nullobject import W_NullObject
 from hippy.builtin import (
@@ -14,7 +15,7 @@ from rpython.rlib.rrandom import Random
 from rpython.rlib.objectmodel import newlist_hint
 from hippy.sort import (
     KEY, VALUE, _sort, SUPPORTED_SORT_TYPES, SORT_REGULAR,
-    SORT_DESC, SORT_ASC, _multisort)
+    SORT_DESC, SORT_ASC, _multisort, sort_unboxed)
 import sys
 from collections import OrderedDict
 from hippy.objects.arrayobject import try_convert_str_to_int
@@ -124,19 +125,34 @@ def array_diff_assoc(space, args_w):
                           "is not an array" % (i + 1))
             return space.w_Null
     w_arr = args_w[0]
-    rdict = space.get_rdict_from_array(w_arr)
     args_w = args_w[1:]
+    d = new_rdict()
     with space.iter(w_arr) as w_iter:
         while not w_iter.done():
             w_key, w_val = w_iter.next_item(space)
-            for w_arg in args_w:
-                with space.iter(w_arg) as w_arg_iter:
-                    while not w_arg_iter.done():
-                        w_arg_key, w_arg_val = w_arg_iter.next_item(space)
-                        if space.is_w(space.as_string(w_key), space.as_string(w_arg_key)) and \
-                                space.is_w(space.as_string(w_val), space.as_string(w_arg_val)):
-                            space.rdict_remove(rdict, w_arg_key)
-    return space.new_array_from_rdict(rdict)
+            if not _has_same_item(space, args_w, w_key, space.str_w(w_val)):
+                d[space.str_w(w_key)] = w_val
+    return space.new_array_from_rdict(d)
+
+
+def _has_same_item(space, args_w, w_key, value):
+    """Whether one of the arrays 'args_w' has the key 'w_key' with a
+    value whose string form is 'value'"""
+    for w_arg in args_w:
+        if (w_arg.isset_index(space, w_key) and
+                space.str_w(space.getitem(w_arg, w_key)) == value):
+            return True
+    return False
+
+
+def _collect_string_values(space, w_arr, values):
+    """Add the string forms of the values of 'w_arr' to the dict 'values'.
+    array_diff() and friends compare values as strings, so probing this
+    set gives the same result as comparing with every value in turn."""
+    with space.iter(w_arr) as w_iter:
+        while not w_iter.done():
+            _, w_val = w_iter.next_item(space)
+            values[space.str_w(w_val)] = True
 
 
 @wrap(['space', 'args_w'])
@@ -254,18 +270,16 @@ def array_diff(space, args_w):
         if w_arg.tp != space.tp_array:
             raise _not_an_array(i + 1)
     w_arr = args_w[0]
-    rdict = space.get_rdict_from_array(w_arr)
-    args_w = [space.as_array(w_arg) for w_arg in args_w[1:]]
-    with space.iter(w_arr) as w_df_iter:
-        while not w_df_iter.done():
-            w_df_key, w_df_val = w_df_iter.next_item(space)
-            for w_arg in args_w:
-                with space.iter(w_arg) as w_iter:
-                    while not w_iter.done():
-                        _, w_val = w_iter.next_item(space)
-                        if space.str_eq(w_df_val, w_val):
-                            space.rdict_remove(rdict, w_df_key)
-    return space.new_array_from_rdict(rdict)
+    values = {}
+    for w_arg in args_w[1:]:
+        _collect_string_values(space, w_arg, values)
+    d = new_rdict()
+    with space.iter(w_arr) as w_iter:
+        while not w_iter.done():
+            w_key, w_val = w_iter.next_item(space)
+            if space.str_w(w_val) not in values:
+                d[space.str_w(w_key)] = w_val
+    return space.new_array_from_rdict(d)
 
 
 @wrap(['space', ArrayArg(None), W_Root])
@@ -287,6 +301,11 @@ def array_fill(space, sidx, num, w_value):
         return space.w_False
 
     if sidx == 0:
+        if w_value.tp == space.tp_int:
+            return space.new_array_from_ints([space.int_w(w_value)] * num)
+        if w_value.tp == space.tp_float:
+            return space.new_array_from_floats(
+                [space.float_w(w_value)] * num)
         return space.new_array_from_list([w_value] * num)
 
     d = new_rdict()
@@ -366,12 +385,11 @@ def array_intersect_assoc(space, args_w):
         while not w_arr_iter.done():
             w_arr_key, w_arr_val = w_arr_iter.next_item(space)
             exists = 0
+            value = space.str_w(w_arr_val)
             for w_arg in args_w:
-                if w_arg.isset_index(space, w_arr_key):
-                    w_one = space.as_string(w_arr_val)
-                    w_two = space.as_string(space.getitem(w_arg, w_arr_key))
-                    if space.str_eq(w_one, w_two):
-                        exists += 1
+                if (w_arg.isset_index(space, w_arr_key) and
+                        space.str_w(space.getitem(w_arg, w_arr_key)) == value):
+                    exists += 1
             if exists < len(args_w):
                 space.rdict_remove(rdict, w_arr_key)
     return space.new_array_from_rdict(rdict)
@@ -501,22 +519,22 @@ def array_intersect(space, args_w):
         if w_arg.tp != space.tp_array:
             raise _not_an_array(i + 1)
     w_arr = args_w[0]
-    rdict = space.get_rdict_from_array(w_arr)
-    args_w = args_w[1:]
-
-    with space.iter(w_arr) as w_arr_iter:
-        while not w_arr_iter.done():
-            w_arr_key, w_arr_val = w_arr_iter.next_item(space)
-            exists = 0
-            for i, w_arg in enumerate(args_w):
-                with space.iter(w_arg) as w_iter:
-                    while not w_iter.done():
-                        _, w_val = w_iter.next_item(space)
-                        if space.str_eq(w_arr_val, w_val):
-                            exists += 1
-            if exists < len(args_w):
-                space.rdict_remove(rdict, w_arr_key)
-    return space.new_array_from_rdict(rdict)
+    value_sets = []
+    for w_arg in args_w[1:]:
+        values = {}
+        _collect_string_values(space, w_arg, values)
+        value_sets.append(values)
+    d = new_rdict()
+    with space.iter(w_arr) as w_iter:
+        while not w_iter.done():
+            w_key, w_val = w_iter.next_item(space)
+            value = space.str_w(w_val)
+            for values in value_sets:
+                if value not in values:
+                    break
+            else:
+                d[space.str_w(w_key)] = w_val
+    return space.new_array_from_rdict(d)
 
 
 @wrap(['interp', 'space', W_Root, W_Root], aliases=["key_exists"])
@@ -860,6 +878,16 @@ def array_product(space, w_arr):
     """ Calculate the product of values in an array """
     if space.arraylen(w_arr) == 0:
         return space.newint(1)
+    if isinstance(w_arr, W_ListArrayObject):
+        w_arr._materialize_range()
+        w_arr._compact_shifted()
+        if w_arr.ints is not None:
+            return _product_ints(space, w_arr.ints)
+        if w_arr.floats is not None:
+            fres = 1.0
+            for f in w_arr.floats:
+                fres *= f
+            return space.newfloat(fres)
     res = 1
     with space.iter(w_arr) as itr:
         while not itr.done():
@@ -872,6 +900,19 @@ def array_product(space, w_arr):
     return space.wrap(res)
 
 
+def _product_ints(space, ints):
+    res = 1
+    for i in range(len(ints)):
+        try:
+            res = ovfcheck(res * ints[i])
+        except OverflowError:
+            fres = float(res)
+            for j in range(i, len(ints)):
+                fres *= ints[j]
+            return space.newfloat(fres)
+    return space.newint(res)
+
+
 @wrap(['space', UniqueArray(accept_instance=False), W_Root, 'args_w'])
 def array_push(space, w_arr, w_value1, args_w):
     """ Push one or more elements onto the end of array """
@@ -1014,24 +1055,20 @@ def array_search(space, w_needle, w_haystack, strict=False):
 @wrap(['space', 'reference'])
 def array_shift(space, w_ref):
     """ Shift an element off the beginning of array """
-    w_arr = w_ref.deref()
+    w_arr = w_ref.deref_temp()
     if w_arr.tp != space.tp_array:
         space.ec.warn("array_shift() expects parameter 1 "
                       "to be array, %s given" %
                       space.get_type_name(w_arr.tp))
         return space.w_Null
-    new_arr = space.new_array_from_list([])
-    first = True
-    w_res = space.w_Null
-    with space.iter(w_arr) as itr:
-        while not itr.done():
-            w_key, w_val = itr.next_item(space)
-            if first:
-                w_res = w_val
-                first = False
-                continue
-            new_arr = new_arr.packitem_maybe_inplace(space, w_key, w_val)
-    w_ref.store(new_arr, unique=True)
+    if w_arr.arraylen() == 0:
+        return space.w_Null
+    # shift in-place when possible: this is O(1) for lists and for hashes
+    # without integer keys
+    w_arr = w_ref.deref_unique()
+    new_arr, w_res = w_arr._shift_maybe_inplace(space)
+    if new_arr is not w_arr:
+        w_ref.store(new_arr, unique=True)
     return w_res
 
 
@@ -1104,6 +1141,18 @@ def _splice_add(space, new_arr, w_subs):
 @wrap(['space', ArrayArg(None)])
 def array_sum(space, w_arr):
     """ Calculate the sum of values in an array """
+    if isinstance(w_arr, W_ListArrayObject):
+        w_arr._compact_shifted()
+        if w_arr.ints is not None:
+            return _sum_ints(space, w_arr.ints)
+        if w_arr.floats is not None:
+            fres = 0.0
+            for f in w_arr.floats:
+                fres += f
+            return space.newfloat(fres)
+        if w_arr._is_range():
+            return _sum_range(space, w_arr.range_start, w_arr.range_step,
+                              w_arr.range_len)
     res = 0
     is_float = False
     with space.iter(w_arr) as itr:
@@ -1120,6 +1169,32 @@ def array_sum(space, w_arr):
     return space.newint(int(res))
 
 
+def _sum_ints(space, ints):
+    res = 0
+    for i in range(len(ints)):
+        try:
+            res = ovfcheck(res + ints[i])
+        except OverflowError:
+            fres = float(res)
+            for j in range(i, len(ints)):
+                fres += ints[j]
+            return space.newfloat(fres)
+    return space.newint(res)
+
+
+def _sum_range(space, start, step, length):
+    res = 0
+    for i in range(length):
+        try:
+            res = ovfcheck(res + (start + i * step))
+        except OverflowError:
+            fres = float(res)
+            for j in range(i, length):
+                fres += start + j * step
+            return space.newfloat(fres)
+    return space.newint(res)
+
+
 @wrap(['space', 'args_w'])
 def array_udiff_assoc(space, args_w):
     """ Computes the difference of arrays with additional index check,
@@ -1557,7 +1632,7 @@ def _count_recursive(space, w_arr, references=None):
 
     return _len
 
-@wrap(['interp', W_Root, Optional(int)], aliases=['sizeof'])
+@wrap(['interp', 'borrowed', Optional(int)], aliases=['sizeof'])
 def count(interp, w_arr, recursive=0):
     """Count all elements in an array, or something in an object"""
     if isinstance(w_arr, W_InstanceObject):
@@ -1605,11 +1680,7 @@ def each(space, w_arr):
 @wrap(['space', 'unique_array'])
 def end(space, w_arr):
     """ Set the internal pointer of an array to its last element """
-    length = w_arr.arraylen()
-    if length == 0:
-        return space.w_False
-    w_arr.current_idx = length - 1
-    return w_arr._current()
+    return w_arr.end(space)
 
 
 @wrap(['space', 'frame', ArrayArg(None), Optional(W_Root), Optional(str)])
@@ -1792,12 +1863,7 @@ def next(space, w_arr):
 @wrap(['space', 'unique_array'])
 def prev(space, w_arr):
     """ Rewind the internal array pointer """
-    length = w_arr.arraylen()
-    current_idx = min(w_arr.current_idx, length) - 1
-    if current_idx < 0:
-        return space.w_False
-    w_arr.current_idx = current_idx
-    return w_arr._current()
+    return w_arr.prev(space)
 
 
 def _xrange(start, end, inc):
@@ -1855,17 +1921,31 @@ def _range(space, w_start, w_end, step=None):
         if step == 0:
             space.ec.warn("range(): step exceeds the specified range")
             return space.w_False
+    # ints and floats make unboxed lists, see W_ListArrayObject, and
+    # ranges of ints are not even built
+    range_start = range_step = range_len = 0
+    ints = None
+    floats = None
+    l = None
     if w_start.tp == w_end.tp == space.tp_float:
         s = space.float_w(w_start)
         e = space.float_w(w_end)
-        l = [space.wrap(x) for x in _xrange(s, e, step)]
+        floats = [float(x) for x in _xrange(s, e, step)]
     elif w_start.tp == w_end.tp == space.tp_int:
         s = space.int_w(w_start)
         e = space.int_w(w_end)
-        if step == int(step):
-            l = [space.wrap(int(x)) for x in _xrange(s, e, step)]
+        if step == int(step) and step > 0:
+            range_step = int(step)
+            range_len = abs(e - s) // range_step + 1
+            range_start = s
+            if s > e:
+                # like _xrange(), which counts up from 'e' and reverses
+                range_start = e + (range_len - 1) * range_step
+                range_step = -range_step
+        elif step == int(step):
+            ints = [int(x) for x in _xrange(s, e, step)]
         else:
-            l = [space.wrap(x) for x in _xrange(s, e, step)]
+            floats = [float(x) for x in _xrange(s, e, step)]
     elif w_start.tp == w_end.tp == space.tp_str:
         is_str, s, e = _range_prepare_str_params(space, w_start, w_end)
         if is_str:
@@ -1892,6 +1972,12 @@ def _range(space, w_start, w_end, step=None):
     if abs(s - e) < step and abs(s - e) != 0:
         space.ec.warn("range(): step exceeds the specified range")
         return space.w_False
+    if range_len > 0:
+        return space.new_array_from_range(range_start, range_step, range_len)
+    if ints is not None:
+        return space.new_array_from_ints(ints)
+    if floats is not None:
+        return space.new_array_from_floats(floats)
     return space.new_array_from_list(l)
 
 
@@ -1911,7 +1997,11 @@ def rsort(space, w_ref, sort_type=0):
                       "to be array, %s given"
                       % space.get_type_name(w_arr.tp))
         return space.w_False
-    values = w_arr._values(space)
+    w_sorted = sort_unboxed(space, w_arr, sort_type, reverse=True)
+    if w_sorted is not None:
+        w_ref.store(w_sorted)
+        return space.w_True
+    values = list(w_arr._values(space))
     _sort(space, values, sort_type=sort_type)
     values.reverse()
     w_ref.store(space.new_array_from_list(values))
@@ -1953,6 +2043,10 @@ def sort(space, w_ref, sort_type=0):
                       "to be array, %s given"
                       % space.get_type_name(w_arr.tp))
         return space.w_False
+    w_sorted = sort_unboxed(space, w_arr, sort_type)
+    if w_sorted is not None:
+        w_ref.store(w_sorted)
+        return space.w_True
     values = list(w_arr._values(space))
     _sort(space, values, sort_type=sort_type)
     w_ref.store(space.new_array_from_list(values))
@@ -2003,3 +2097,14 @@ def usort(space, w_ref, w_callback):
     _sort(space, values, cmp=w_callback)
     w_ref.store(space.new_array_from_list(values))
     return space.w_True
+
+
+@wrap(['space'])
+def hippy_array_copy_stats(space):
+    """ Returns the number of array copies made by the current request,
+    and how many of them had to duplicate the array when written to"""
+    stats = space.array_copy_stats
+    return space.new_array_from_pairs([
+        (space.newstr('copies'), space.newint(stats.copies)),
+        (space.newstr('materialized'), space.newint(stats.materialized)),
+    ])
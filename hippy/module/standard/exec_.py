@@ -33,6 +33,7 @@ def exec_(interp, cmd, r_output=None, r_return_var=None):
         w_output = r_output.deref_unique()
     else:
         w_output = None
+    interp.flush_stdout()
     try:
         pfile = create_popen_file(cmd, 'r')
     except OSError:
@@ -56,6 +57,7 @@ def passthru(interp, cmd, r_return_var=None):
     space = interp.space
     if not cmd:
         raise ExitFunctionWithError('Cannot execute a blank command')
+    interp.flush_stdout()
     try:
         pfile = create_popen_file(cmd, 'r')
     except OSError:
@@ -77,6 +79,7 @@ def system(interp, cmd, r_return_var=None):
     space = interp.space
     if not cmd:
         raise ExitFunctionWithError('Cannot execute a blank command')
+    interp.flush_stdout()
     try:
         pfile = create_popen_file(cmd, 'r')
     except OSError:
@@ -96,6 +99,7 @@ def system(interp, cmd, r_return_var=None):
 
 @wrap(['interp', str])
 def shell_exec(interp, cmd):
+    interp.flush_stdout()
     try:
         r_pfile = create_popen_file(cmd, 'r')
     except OSError:
@@ -9,7 +9,7 @@ from hippy.objects.resources.dir_resource import W_DirResource
 from hippy.objects.resources.stream_context import W_StreamContext
 from hippy.sort import _sort
 from rpython.rlib.rstring import StringBuilder
-from rpython.rlib.objectmodel import we_are_translated
+from rpython.rlib.objectmodel import we_are_translated, compute_hash
 from rpython.rlib import rfile # for side effects
 from hippy import rpath
 from rpython.rlib.rfile import create_popen_file
@@ -87,7 +87,12 @@ def chown(space, fname, uid):
 @wrap(['space', Optional(bool), Optional(str)])
 def clearstatcache(space, clear_realpath_cache=False, fname=None):
     """ clearstatcache - Clears file status cache """
-    pass
+    # the realpath cache also records which files exist, so it is
+    # emptied in any case; only a single entry is dropped if asked to
+    if clear_realpath_cache and fname:
+        space.realpath_cache.forget(fname)
+    else:
+        space.realpath_cache.clear()
 
 
 @wrap(['space', str, str, Optional(Nullable(StreamContextArg(None)))], name="copy")
@@ -1349,6 +1354,7 @@ def pclose(space, w_res):
 @wrap(['space', str, str])
 def popen(space, command, mode):
     """ popen - Opens process file pointer """
+    space.ec.interpreter.flush_stdout()
     try:
         r_pfile = create_popen_file(command, mode)
         w_res = W_FileResource(space, '<proc>', 'w+')
@@ -1408,8 +1414,39 @@ def readlink(space, linkname):
         space.ec.warn("readlink(): %s" % os.strerror(e.errno))
         return space.w_False
 
-""" realpath_cache_get - Get realpath cache entries """
-""" realpath_cache_size - Get realpath cache size """
+@wrap(['space'])
+def realpath_cache_get(space):
+    """ realpath_cache_get - Get realpath cache entries """
+    pairs = []
+    for entry in space.realpath_cache.entries():
+        pairs.append((space.newstr(entry.path), space.new_array_from_pairs([
+            (space.newstr('key'), space.newint(compute_hash(entry.path))),
+            (space.newstr('is_dir'), space.newbool(entry.is_dir)),
+            (space.newstr('realpath'), space.newstr(entry.abspath)),
+            (space.newstr('expires'), space.newint(int(entry.expires))),
+        ])))
+    return space.new_array_from_pairs(pairs)
+
+
+@wrap(['space'])
+def realpath_cache_size(space):
+    """ realpath_cache_size - Get realpath cache size """
+    return space.newint(space.realpath_cache.used)
+
+
+@wrap(['space'])
+def hippy_realpath_cache_stats(space):
+    """ Returns the size, the limits and the hit/miss counters of the
+    realpath cache"""
+    cache = space.realpath_cache
+    return space.new_array_from_pairs([
+        (space.newstr('entries'), space.newint(cache.count())),
+        (space.newstr('size'), space.newint(cache.used)),
+        (space.newstr('size_limit'), space.newint(cache.size_limit)),
+        (space.newstr('ttl'), space.newint(cache.ttl)),
+        (space.newstr('hits'), space.newint(cache.hits)),
+        (space.newstr('misses'), space.newint(cache.misses)),
+    ])
 
 
 @wrap(['space', FilenameArg(None)])
@@ -1671,6 +1708,7 @@ def _chdir(space, dname):
         if not os.path.isdir(dname):
             space.ec.warn("chdir(): Not a directory (errno 20)")
         os.chdir(dname)
+        space.realpath_cache.clear()
         return space.w_True
     except OSError:
         return space.w_False
@@ -1686,6 +1724,7 @@ def chroot(space, dname):
         assert path is not None
         w_res = space.wrap(os.chroot(path))
         os.chdir('/')
+        space.realpath_cache.clear()
         return w_res
     except OSError:
         return space.w_False
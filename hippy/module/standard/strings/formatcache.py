@@ -0,0 +1,190 @@
+""" The format strings of the printf() family, compiled once into a list of
+conversion specs, each with the literal text that comes before it.
+"""
+
+from rpython.rlib import jit
+from rpython.rlib.rstring import StringBuilder
+
+DEFAULT_CACHE_SIZE = 1024
+
+
+class FormatSpec(object):
+    """One '%' conversion of a format string.  'conv' is the conversion
+    character, 'consumes' tells if the conversion takes the next argument
+    (only '%%' does not), and 'percent' if it starts its output with '%'.
+    A 'truncated' spec is one that the end of the format string cuts
+    short: formatting stops there."""
+    _immutable_ = True
+
+    def __init__(self, literal, conv='\x00', consumes=False, percent=False,
+                 has_argnum=False, argnum=0, is_literal=False, to_left=False,
+                 plus_sign=False, pad_char=' ', width=0, precision=0, prec_adjust=False,
+                 truncated=False):
+        self.literal = literal
+        self.conv = conv
+        self.consumes = consumes
+        self.percent = percent
+        self.has_argnum = has_argnum
+        self.argnum = argnum          # from '%n$', counting from 0
+        self.is_literal = is_literal  # the 'L' modifier: output 'conv'
+        self.to_left = to_left
+        self.plus_sign = plus_sign
+        self.pad_char = pad_char
+        self.width = width
+        self.precision = precision
+        self.prec_adjust = prec_adjust
+        self.truncated = truncated
+
+
+class CompiledFormat(object):
+    _immutable_fields_ = ['specs[*]', 'tail', 'size_hint']
+
+    def __init__(self, specs, tail, size_hint):
+        self.specs = specs
+        self.tail = tail
+        self.size_hint = size_hint
+
+
+def _char_at(format, i):
+    if i >= len(format):
+        raise IndexError
+    return format[i]
+
+
+def _parse_spec(format, i, literal):
+    """Parse the conversion spec after the '%' at format[i - 1], which is
+    not the last character.  Return the spec and the index after it."""
+    next = format[i]
+    i += 1
+    consumes = next != '%'
+    while next == ' ':
+        next = _char_at(format, i)
+        i += 1
+    percent = next == '%'
+    has_argnum = False
+    argnum = 0
+    if next.isdigit() and _char_at(format, i) == '$':
+        has_argnum = True
+        argnum = ord(next) - ord('0') - 1
+        i += 1
+        next = _char_at(format, i)
+        i += 1
+    if next in 'LIlzjt':
+        is_literal = next == 'L'
+        next = _char_at(format, i)
+        if next == 'l' or next == 'h':
+            is_literal = False
+            i += 1
+        i += 1
+        if is_literal:
+            return FormatSpec(literal, next, consumes, percent, has_argnum,
+                              argnum, is_literal=True), i
+    to_left = False
+    plus_sign = False
+    pad_char = ' '
+    if next == '-':
+        to_left = True
+        next = _char_at(format, i)
+        i += 1
+    if next == '+':
+        plus_sign = True
+        next = _char_at(format, i)
+        i += 1
+    if next == '0':
+        pad_char = '0'
+        next = _char_at(format, i)
+        i += 1
+    if next == '\'':
+        pad_char = _char_at(format, i)
+        next = _char_at(format, i + 1)
+        i += 2
+    width = 0
+    while next.isdigit():
+        width = width * 10 + ord(next) - ord('0')
+        next = _char_at(format, i)
+        i += 1
+    precision = 0
+    prec_adjust = False
+    if next == '.':
+        next = _char_at(format, i)
+        i += 1
+        while next.isdigit():
+            precision = precision * 10 + ord(next) - ord('0')
+            prec_adjust = True
+            next = _char_at(format, i)
+            i += 1
+    return FormatSpec(literal, next, consumes, percent, has_argnum, argnum,
+                      False, to_left, plus_sign, pad_char, width, precision,
+                      prec_adjust), i
+
+
+def compile_format(format):
+    specs = []
+    literal = StringBuilder()
+    i = 0
+    while i < len(format):
+        c = format[i]
+        i += 1
+        if c != '%':
+            literal.append(c)
+            continue
+        if i == len(format):
+            break    # a trailing '%' is ignored
+        try:
+            spec, i = _parse_spec(format, i, literal.build())
+        except IndexError:
+            # report the missing argument if there is one, then stop
+            specs.append(FormatSpec(literal.build(),
+                                    consumes=format[i] != '%',
+                                    truncated=True))
+            literal = StringBuilder()
+            break
+        specs.append(spec)
+        literal = StringBuilder()
+    return CompiledFormat(specs[:], literal.build(),
+                          len(format) + 5 * format.count('%'))
+
+
+class FormatCache(object):
+    """A size-bounded cache of compiled formats, keyed by the format
+    string.  When it is full it simply starts afresh, except for the
+    formats that are constants in a JIT trace, which are kept apart and
+    never evicted, like in RegexpCache."""
+    def __init__(self, capacity=DEFAULT_CACHE_SIZE):
+        self._contents = {}
+        self._constants = {}
+        self.capacity = capacity
+
+    def get(self, format):
+        return self._contents.get(format, None)
+
+    def set(self, format, compiled):
+        if len(self._contents) >= self.capacity:
+            self._contents.clear()
+        self._contents[format] = compiled
+
+    def get_constant(self, format):
+        return self._constants.get(format, None)
+
+    def set_constant(self, format, compiled):
+        self._constants[format] = compiled
+
+
+def get_compiled_format(space, format):
+    cache = space.format_cache
+    if jit.isconstant(format):
+        return _get_constant_format(jit.promote(cache), format)
+    compiled = cache.get(format)
+    if compiled is None:
+        compiled = compile_format(format)
+        cache.set(format, compiled)
+    return compiled
+
+
+@jit.elidable
+def _get_constant_format(cache, format):
+    compiled = cache.get_constant(format)
+    if compiled is None:
+        compiled = compile_format(format)
+        cache.set_constant(format, compiled)
+    return compiled
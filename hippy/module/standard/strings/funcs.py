@@ -8,6 +8,7 @@ from rpython.rlib import rmd5
 from rpython.rlib.objectmodel import newlist_hint
 from rpython.rlib.objectmodel import specialize
 from rpython.rlib.rsha import sha
+from rpython.rlib.runicode import str_decode_utf_8
 
 from hippy.objspace import ObjSpace, getspace, PHP_WHITESPACE
 from hippy.builtin import (
@@ -25,6 +26,12 @@ from rpython.rlib.rarithmetic import intmask, ovfcheck
 from rpython.rlib.rrandom import Random
 from hippy.module.standard.math.funcs import _bin
 from hippy.module.url import _urldecode
+from hippy.module.standard.strings.multireplace import (
+    MultiReplacer, table_key)
+from hippy.module.standard.strings.formatcache import get_compiled_format
+from hippy.module.standard.strings import search
+from hippy.module.standard.strings.htmlentities import (
+    UTF8, ENTITY_TRIE, utf8_char)
 
 # Side-effect: register the functions defined there:
 from hippy import localemodule as locale
@@ -128,45 +135,33 @@ def _apply_charmap(string, charmap, alloc):
     return s
 
 
-def _pairs_from_array(space, w_replacements):
-    pairs = {}
+def _get_replacer(space, kind, needles, replacements, seen=None):
+    """Return the MultiReplacer for these needles, from the cache of the
+    current request if possible.  For str_replace(), 'seen' is what the
+    needles see of the replacements."""
+    cache = space.ec.interpreter.replacer_cache
+    key = table_key(kind, needles, replacements)
+    replacer = cache.get(key)
+    if replacer is None:
+        replacer = MultiReplacer(needles, replacements)
+        if seen is not None:
+            replacer.check_one_pass(seen)
+        cache.set(key, replacer)
+    return replacer
+
+
+def _strtr_replacer(space, w_replacements):
+    needles = []
+    replacements = []
     with space.iter(w_replacements) as w_iter:
         while not w_iter.done():
             w_key, w_val = w_iter.next_item(space)
             key = space.str_w(w_key)
             if len(key) == 0:
                 raise ValidationError
-            val = space.str_w(w_val)
-            pairs.setdefault(len(key), {})[key] = val
-    return pairs
-
-
-def _apply_replacement(pairs, string):
-    if not pairs:
-        return string
-    minlen = sys.maxint
-    maxlen = 0
-    for pair in pairs:
-        minlen = min(minlen, pair)
-        maxlen = max(maxlen, pair)
-    builder = StringBuilder(len(string))
-    i = 0
-    while i < len(string):
-        j = min(maxlen, len(string) - i)
-        while j >= minlen:
-            substr = string[i:i + j]
-            try:
-                builder.append(pairs[j][substr])
-                i += j
-                break
-            except KeyError:
-                pass
-            j -= 1
-        else:
-            builder.append(string[i])
-            i += 1
-    s = builder.build()
-    return s
+            needles.append(key)
+            replacements.append(space.str_w(w_val))
+    return _get_replacer(space, 't', needles, replacements)
 
 
 def charmask(space, char_list, caller):
@@ -698,126 +693,93 @@ def hex2bin(space, data):
     return space.newstr(builder.build())
 
 
-@wrap(['space',   str,   Optional(int),   Optional(str)])
-def html_entity_decode(space,   html,   flags=2,   encoding='UTF-8'):
-    """Convert all HTML entities to their applicable characters."""
-    single = flags & 1 != 0
-    double = flags & 2 != 0
-    xml = flags & 16 != 0
-    xhtml = flags & 32 != 0
-    html5 = flags & 48 != 0
-    acc = None
-    orig_acc = None
-    got_entity = False
-    res = ""
-    for c in html:
-        if acc is None and c == "&":
-            got_entity = True
-            acc = ""
-            orig_acc = ""
-        if got_entity:
-            if acc == "&#" and c == "0":
-                orig_acc += c
-                continue
-            acc += c
-            orig_acc += c
-        if got_entity and (c == ";" or c == " "):
-            got_entity = False
-            if acc == "&lt;" or acc == "&#60;" or \
-               acc == "&#x3C;":
-                res += "<"
-            elif acc == "&gt;" or acc == "&#62;" or \
-                 acc == "&#x3E;":
-                res += ">"
-            elif acc == "&amp;" or acc == "&#38;" or \
-                 acc == "&#x26;":
-                res += "&"
-            elif single and (acc == "&apos;" or
-                             acc == "&#39;" or
-                             acc == "&#x27;"):
-                if acc == "&apos;":
-                    if xml or xhtml or html5:
-                        res += "\'"
-                    else:
-                        res += acc
-                else:
-                        res += "\'"
-
-            elif double and (acc == "&quot;" or
-                             acc == "&#34;" or
-                             acc == "&#x22;"):
-                res += "\""
-            else:
-                res += orig_acc
-            acc = None
-            continue
-        if not got_entity:
-            res += c
-    return space.wrap(res)
-
-#@wrap(['space', 'args_w'])
-#def html_entity_decode(space, args_w):
-#    """Convert all HTML entities to their applicable characters."""
-#    raise NotImplementedError()
-
-#
-#@wrap(['space', 'args_w'])
-#def htmlentities(space, args_w):
-#    """Convert all applicable characters to HTML entities."""
-#    raise NotImplementedError()
-
-
-@wrap(['interp',  str,  Optional(int),  Optional(str),  Optional(bool)])
-def htmlentities(interp,  html,  flags=1, encoding='UTF8',
-                 double_encode=True):
-    """Convert all applicable characters to HTML entities."""
-
-    from rpython.rlib.runicode import str_decode_utf_8
-    from hippy.module.standard.strings.htmlentities import UTF8
-    outstr = StringBuilder()
-    s,  l = str_decode_utf_8(html,  len(html),  'ignore')
-    for c in s:
-        try:
-            outstr.append(UTF8[ord(c)])
-        except KeyError:
-            outstr.append(str(c))
-    return interp.space.newstr(outstr.build())
-
+def _match_numeric_entity(html, i):
+    """Match the digits and ';' of a numeric entity at html[i:], just after
+    its '&#'.  Return the index after the ';' and the code point, or
+    (-1, 0)."""
+    base = 10
+    if i < len(html) and (html[i] == 'x' or html[i] == 'X'):
+        base = 16
+        i += 1
+    code = 0
+    digits = 0
+    while i < len(html) and code <= 0x10FFFF:
+        c = html[i]
+        if c == ';':
+            if digits == 0:
+                break
+            return i + 1, code
+        if base == 16 and is_hexdigit(c):
+            code = code * 16 + hexdigit(c)
+        elif '0' <= c <= '9':
+            code = code * 10 + ord(c) - ord('0')
+        else:
+            break
+        digits += 1
+        i += 1
+    return -1, 0
 
-def _htmlspecialchars_decode(space, html, flags):
 
+def _html_decode(html, flags, all_entities):
+    """Decode the entities of 'html' in one pass, or return None if there
+    are none to decode.  With 'all_entities' false, only those of the
+    characters that htmlspecialchars() escapes are decoded."""
+    i = html.find('&')
+    if i < 0:
+        return None
     single = flags & 1 != 0
     double = flags & 2 != 0
+    apos = single and flags & 48 != 0    # not an HTML 4.01 entity
+    builder = StringBuilder(len(html))
+    start = 0
+    while i >= 0:
+        value = None
+        if i + 1 < len(html) and html[i + 1] == '#':
+            end, code = _match_numeric_entity(html, i + 2)
+            if end >= 0 and (all_entities or code < 128 and
+                             len(CHAR_REPLACE_TABLE[7][code]) > 1):
+                if code == ord("'"):
+                    if single:
+                        value = "'"
+                elif code == ord('"'):
+                    if double:
+                        value = '"'
+                elif 0 < code <= 0x10FFFF and not 0xD800 <= code <= 0xDFFF:
+                    value = utf8_char(code)
+        else:
+            end, value = ENTITY_TRIE.match(html, i + 1)
+            if value is not None:
+                if value == "'":
+                    if not apos:
+                        value = None
+                elif value == '"':
+                    if not double:
+                        value = None
+                elif not all_entities and len(value) == 1:
+                    if len(CHAR_REPLACE_TABLE[7][ord(value[0])]) == 1:
+                        value = None
+                elif not all_entities:
+                    value = None
+        if value is None:
+            i = html.find('&', i + 1)
+            continue
+        builder.append_slice(html, start, i)
+        builder.append(value)
+        start = end
+        i = html.find('&', end)
+    if start == 0:
+        return None
+    builder.append_slice(html, start, len(html))
+    return builder.build()
 
-    acc = None
-    got_entity = False
-    res = ""
-
-    subs = {
-        "&lt;": "<",
-        "&gt;": ">",
-        "&amp;": "&",
-    }
 
-    if single:
-        subs["&#039;"] = "\'"
-    if double:
-        subs["&quot;"] = "\""
-
-    for c in html:
-        if acc is None and c == "&":
-            got_entity = True
-            acc = ""
-        if got_entity:
-            acc += c
-        if got_entity and c == ";":
-            got_entity = False
-            res += subs.get(acc, acc)
-            acc = None
-            continue
-        if not got_entity:
-            res += c
-    return space.wrap(res)
+@wrap(['space', str, Optional(int), Optional(str)])
+def html_entity_decode(space, html, flags=2, encoding='UTF-8'):
+    """Convert all HTML entities to their applicable characters."""
+    res = _html_decode(html, flags, True)
+    if res is None:
+        return space.newstr(html)
+    return space.newstr(res)
 
 
 @wrap(['space', StringArg(), Optional(int)])
@@ -831,62 +793,10 @@ def htmlspecialchars_decode(space, html, flags=2):
        'ENT_XHTML': 32,
        'ENT_HTML5': 48,
     """
-
-    single = flags & 1 != 0
-    double = flags & 2 != 0
-    xml = flags & 16 != 0
-    xhtml = flags & 32 != 0
-    html5 = flags & 48 != 0
-
-    acc = None
-    orig_acc = None
-    got_entity = False
-    res = ""
-
-    for c in html:
-        if acc is None and c == "&":
-            got_entity = True
-            acc = ""
-            orig_acc = ""
-        if got_entity:
-            if acc == "&#" and c == "0":
-                orig_acc += c
-                continue
-            acc += c
-            orig_acc += c
-        if got_entity and (c == ";" or c == " "):
-            got_entity = False
-            if acc == "&lt;" or acc == "&#60;" or \
-               acc == "&#x3C;":
-                res += "<"
-            elif acc == "&gt;" or acc == "&#62;" or \
-                 acc == "&#x3E;":
-                res += ">"
-            elif acc == "&amp;" or acc == "&#38;" or \
-                 acc == "&#x26;":
-                res += "&"
-            elif single and (acc == "&apos;" or
-                             acc == "&#39;" or
-                             acc == "&#x27;"):
-                if acc == "&apos;":
-                    if xml or xhtml or html5:
-                        res += "\'"
-                    else:
-                        res += acc
-                else:
-                        res += "\'"
-
-            elif double and (acc == "&quot;" or
-                             acc == "&#34;" or
-                             acc == "&#x22;"):
-                res += "\""
-            else:
-                res += orig_acc
-            acc = None
-            continue
-        if not got_entity:
-            res += c
-    return space.wrap(res)
+    res = _html_decode(html, flags, False)
+    if res is None:
+        return space.newstr(html)
+    return space.newstr(res)
 
 
 def _new_chars_to_replace(double_encode, single, double):
@@ -910,6 +820,86 @@ for double_encode in (True, False):
               _new_chars_to_replace(double_encode, single, double)
 
 
+def _html_escape(html, table):
+    """Replace the characters of 'html' that 'table' maps to an entity, in
+    one pass, or return None if there are none."""
+    i = 0
+    while i < len(html) and len(table[ord(html[i])]) == 1:
+        i += 1
+    if i == len(html):
+        return None
+    builder = StringBuilder(len(html) + 16)
+    start = 0
+    while i < len(html):
+        entity = table[ord(html[i])]
+        if len(entity) > 1:
+            builder.append_slice(html, start, i)
+            builder.append(entity)
+            start = i + 1
+        i += 1
+    builder.append_slice(html, start, len(html))
+    return builder.build()
+
+
+def _html_escape_all(html, table):
+    """Like _html_escape(), but also replace the non-ASCII characters that
+    have a named entity.  A run of non-ASCII bytes is decoded as UTF-8,
+    dropping what is not valid, and copied as it is when that leaves it
+    unchanged and none of its characters has an entity."""
+    builder = StringBuilder(len(html) + 16)
+    start = 0
+    i = 0
+    while i < len(html):
+        c = html[i]
+        if ord(c) < 0x80:
+            entity = table[ord(c)]
+            if len(entity) > 1:
+                builder.append_slice(html, start, i)
+                builder.append(entity)
+                start = i + 1
+            i += 1
+            continue
+        j = i + 1
+        while j < len(html) and ord(html[j]) >= 0x80:
+            j += 1
+        u, _ = str_decode_utf_8(html[i:j], j - i, 'ignore')
+        size = 0
+        unchanged = True
+        for uc in u:
+            code = ord(uc)
+            if code in UTF8:
+                unchanged = False
+            size += len(utf8_char(code))
+        if not unchanged or size != j - i:
+            builder.append_slice(html, start, i)
+            for uc in u:
+                code = ord(uc)
+                entity = UTF8.get(code, None)
+                if entity is None:
+                    entity = utf8_char(code)
+                builder.append(entity)
+            start = j
+        i = j
+    if start == 0:
+        return None
+    builder.append_slice(html, start, len(html))
+    return builder.build()
+
+
+@wrap(['interp', StringArg(), Optional(int), Optional(StringArg()),
+       Optional(BoolArg())])
+def htmlentities(interp, html, flags=2, encoding='UTF-8',
+                 double_encode=True):
+    """Convert all applicable characters to HTML entities."""
+    single = flags & 1 != 0
+    double = flags & 2 != 0
+    table = CHAR_REPLACE_TABLE[double_encode * 4 + single * 2 + double]
+    res = _html_escape_all(html, table)
+    if res is None:
+        return interp.space.newstr(html)
+    return interp.space.newstr(res)
+
+
 @wrap(['space', StringArg(), Optional(int), Optional(StringArg()),
        Optional(BoolArg())])
 def htmlspecialchars(space, html, flags=2, encoding='UTF-8',
@@ -919,13 +909,10 @@ def htmlspecialchars(space, html, flags=2, encoding='UTF-8',
     single = flags & 1 != 0
     double = flags & 2 != 0
     table = CHAR_REPLACE_TABLE[double_encode * 4 + single * 2 + double]
-    lgt = 0
-    for c in html:
-        lgt += len(table[ord(c)])
-    s = StringBuilder(lgt)
-    for c in html:
-        s.append(table[ord(c)])
-    return space.wrap(s.build())
+    res = _html_escape(html, table)
+    if res is None:
+        return space.newstr(html)
+    return space.newstr(res)
 
 
 def _implode(space, string, w_arr):
@@ -1114,18 +1101,16 @@ def number_format(interp, num_args, number, decimals=0, dec_point='.',
         else:
             rest = s_dec[2:] + "0" * (decimals - len(s_dec) + 2)
     s = str(ino)
-    res = []
-    i = 0
-    while i < len(s):
-        res.append(s[i])
+    builder = StringBuilder(len(s) + len(s) // 3 * len(thousands_sep) +
+                            len(dec_point) + len(rest))
+    for i in range(len(s)):
+        builder.append(s[i])
         if s[i] != '-' and i != len(s) - 1 and (len(s) - i - 1) % 3 == 0:
-            for item in thousands_sep:
-                res.append(item)
-        i += 1
+            builder.append(thousands_sep)
     if decimals > 0:
-        for item in dec_point:
-            res.append(item)
-    return interp.space.wrap("".join(res) + rest)
+        builder.append(dec_point)
+    builder.append(rest)
+    return interp.space.newstr(builder.build())
 
 @wrap(['space', str], name='ord')
 def ord_(space, string):
@@ -1188,257 +1173,164 @@ def format_str(_str, width=0, to_left=False,
 
 
 def _printf(space, format, args_w, caller):
-    no = 0
-    bits = 31 if sys.maxint == 2 ** 31 - 1 else 63
-    MASK = (2 << bits) - 1
-    # improve the estimate
-    builder = StringBuilder(len(format) + 5 * format.count('%'))
-    i = 0
-    while i < len(format):
-        c = format[i]
-        i += 1
-        res = ''
-        tmp = ''
-        if c == '%':
-            plus_sign = False
-            modifier = None
-            addjust_width = 0
-            precision = 0
-            prec_adjust = False
-            to_left = False
-            pad_char = ' '
-            w_arg = space.w_Null
-            e = 0
-
-            try:
-                next = format[i]
-                warn_if_unknown = True
-                i += 1
-            except IndexError:
-                next = '\x00'
-                warn_if_unknown = False
-                continue
-                # msg = "%s(): Trailing '%%' character" % caller
-                # if no < len(args_w):
-                #     msg += ", the next argument is going to be ignored"
-                # space.ec.hippy_warn(msg)
-
-            if next != '%':
-                if no == len(args_w):
-                    raise ValidationError("Too few arguments")
-                w_arg = args_w[no]
-                no += 1
-
-            while next == ' ':
-                next = format[i]
-                i += 1
-
-            if next == '%':
-                res = '%'
-
-            if next.isdigit() and format[i] == '$':
-                try:
-                    w_arg = args_w[int(next) - 1]
-                except IndexError:
-                    raise ValidationError("Too few arguments")
+    compiled = get_compiled_format(space, format)
+    return _format_compiled(space, compiled, args_w, caller)
 
-                i += 1
-                next = format[i]
-                i += 1
-                no -= 1
-
-            if next in ['L', 'I', 'l', 'z', 'j', 't']:
-                modifier = next
-                next = format[i]
-                if next in ['l', 'h']:
-                    modifier += next
-                    i += 1
-                i += 1
 
-            if modifier == 'L':
-                builder.append(next)
-                continue
+@jit.look_inside_iff(lambda space, compiled, args_w, caller:
+                     jit.isconstant(compiled))
+def _format_compiled(space, compiled, args_w, caller):
+    no = 0
+    builder = StringBuilder(compiled.size_hint)
+    for spec in compiled.specs:
+        builder.append(spec.literal)
+        w_arg = space.w_Null
+        if spec.consumes:
+            if no == len(args_w):
+                raise ValidationError("Too few arguments")
+            w_arg = args_w[no]
+            no += 1
+        if spec.truncated:
+            return builder.build()
+        if spec.has_argnum:
+            if spec.argnum < 0:
+                raise ValidationError(
+                    "Argument number must be greater than zero")
+            if spec.argnum >= len(args_w):
+                raise ValidationError("Too few arguments")
+            w_arg = args_w[spec.argnum]
+            no -= 1
+        _format_spec(space, builder, spec, w_arg, caller)
+    builder.append(compiled.tail)
+    return builder.build()
 
-            # if next in ['h']:
-            #     next = format[i]
-            #     i += 1
 
-            if next == '-':
-                to_left = True
-                next = format[i]
-                i += 1
-            if next == '+':
-                plus_sign = True
-                next = format[i]
-                i += 1
-            # if next == '#':
-            #     # XXXX missing tests
-            #     next = format[i]
-            #     i += 1
-            if next == '0':
-                pad_char = '0'
-                next = format[i]
-                i += 1
+def _format_spec(space, builder, spec, w_arg, caller):
+    bits = 31 if sys.maxint == 2 ** 31 - 1 else 63
+    MASK = (2 << bits) - 1
+    next = spec.conv
+    if spec.is_literal:
+        builder.append(next)
+        return
+    addjust_width = spec.width
+    precision = spec.precision
+    if spec.percent:
+        res = '%'
+    else:
+        res = ''
 
-            if next == '\'':
-                next = format[i]
-                i += 1
-                pad_char = next
-                next = format[i]
-                i += 1
+    if spec.plus_sign and space.float_w(w_arg) >= 0:
+        res = '+'
+    # binary
+    if next == 'b':
+        int_val = space.force_int(w_arg)
+        res = _bin(r_uint(int_val))
+
+    # char
+    if next == 'c':
+        int_val = space.int_w(w_arg)
+        builder.append(chr(int_val % 256))
+        return
+    # decimal
+    if next == 'd':
+        int_val = space.int_w(w_arg)
 
-            if next.isdigit():
-                p = ""
-                while next.isdigit():
-                    p += next
-                    next = format[i]
-                    i += 1
-                addjust_width = int(p)
-            # elif next == '*':
-            #     # XXXX missing tests
-            #     pass
-            if next == '.':
-                next = format[i]
-                i += 1
-                p = ""
-                while next.isdigit():
-                    p += next
-                    next = format[i]
-                    i += 1
-                try:
-                    precision = int(p)
-                    prec_adjust = True
-                except ValueError:
-                    pass
-
-            if plus_sign and space.float_w(w_arg) >= 0:
-                res = '+'
-            # binary
-            if next == 'b':
-                int_val = space.force_int(w_arg)
-                if int_val > 0:
-                    tmp = int_val
-                else:
-                    tmp = int_val & MASK
-                res = _bin(r_uint(int_val))
-
-            # char
-            if next == 'c':
-                int_val = space.int_w(w_arg)
-
-                try:
-                    builder.append(chr(int_val % 256))
-                    continue
-                except ValueError:
-                    pass
-            # decimal
-            if next == 'd':
-                int_val = space.int_w(w_arg)
-
-                if to_left and pad_char == '0':
-                    addjust_width = 0
-                res += str(int_val)
-            # exponant
-            if next == 'e' or next == 'E':
-                if not prec_adjust:
-                    precision = 6
-                f = space.float_w(w_arg)
-                _str, _ = double_to_string(f, next, precision,
-                                               DTSF_CUT_EXP_0)
-                res += _str
-            # unsigned
-            if next == 'u':
-                res = ''
-                try:
-                    int_val = intmask(int(space.float_w(w_arg)))
-                    if abs(int_val - space.float_w(w_arg)) > 1.0:
-                        int_val = 0
-                except OverflowError:
-                    int_val = 0
-                ui = r_uint(int_val)
-                res += str(ui)
-
-            # float
-            if next == 'f' or next == 'F':
-                f = space.float_w(w_arg)
-                if not prec_adjust:
-                    precision = 6
-                _str, _ = double_to_string(f, next, precision,
-                                           DTSF_CUT_EXP_0)
-                res += _str
-            # science
-            if next == 'g' or next == 'G':
-                if not prec_adjust:
-                    precision = 6
-                else:
-                    if precision == 0:
-                        precision = 1
-                f = space.float_w(w_arg)
-                _str, _ = double_to_string(f, next, precision,
-                                           DTSF_CUT_EXP_0)
-                if next == 'g':
-                    if 'e' in _str and '.' not in _str:
-                        a, b = _str.split('e')
-                        _str = a + '.0e' + b
-                else:
-                    if 'E' in _str and '.' not in _str:
-                        a, b = _str.split('E')
-                        _str = a + '.0E' + b
-                res += _str
-            # oct
-            if next == 'o':
-                int_val = space.int_w(w_arg)
-                _o = oct(int_val & MASK)
-                if int_val == 0:
-                    tmp = "0"
-                else:
-                    e = len(_o) - 1
-                    assert e >= 0
-                    tmp = _o[1:e]
-                if prec_adjust:
-                    tmp = ""
-                res = tmp
-            # string
-            if next == 's':
-                res = space.str_w(w_arg, quiet=True)
-            # hex
-            if next == 'x' or next == 'X':
-                int_val = space.int_w(w_arg)
-                if w_arg.tp == space.tp_str:
-                    int_val, _ = strtol(space.str_w(w_arg))
-
-                _h = hex(int_val & MASK)
-                e = len(_h) - 1
-                assert e >= 0
-
-                tmp = _h[2:e]
-                if next == 'X':
-                    tmp = tmp.upper()
-                if prec_adjust:
-                    tmp = ""
-                res = tmp
-
-            if res is not None and next != ' ':
-                cutoff = 0
-                if next == 's':
-                    cutoff = precision
-                res = format_str(res,
-                                 width=addjust_width,
-                                 to_left=to_left,
-                                 pad_char=pad_char,
-                                 cutoff=cutoff)
-                builder.append(res)
-                continue
-            elif warn_if_unknown:
-                space.ec.hippy_warn("%s(): Unknown format char %%%s, "
-                        "ignoring corresponding argument" % (caller, next))
+        if spec.to_left and spec.pad_char == '0':
+            addjust_width = 0
+        res += str(int_val)
+    # exponant
+    if next == 'e' or next == 'E':
+        if not spec.prec_adjust:
+            precision = 6
+        f = space.float_w(w_arg)
+        _str, _ = double_to_string(f, next, precision,
+                                       DTSF_CUT_EXP_0)
+        res += _str
+    # unsigned
+    if next == 'u':
+        res = ''
+        try:
+            int_val = intmask(int(space.float_w(w_arg)))
+            if abs(int_val - space.float_w(w_arg)) > 1.0:
+                int_val = 0
+        except OverflowError:
+            int_val = 0
+        ui = r_uint(int_val)
+        res += str(ui)
+
+    # float
+    if next == 'f' or next == 'F':
+        f = space.float_w(w_arg)
+        if not spec.prec_adjust:
+            precision = 6
+        _str, _ = double_to_string(f, next, precision,
+                                   DTSF_CUT_EXP_0)
+        res += _str
+    # science
+    if next == 'g' or next == 'G':
+        if not spec.prec_adjust:
+            precision = 6
         else:
-            builder.append(c)
-    # if no < len(args_w):
-    #     space.ec.hippy_warn("%s(): Too many arguments passed, "
-    #             "ignoring the %d extra" % (caller, len(args_w) - no,))
-    s = builder.build()
-    return s
+            if precision == 0:
+                precision = 1
+        f = space.float_w(w_arg)
+        _str, _ = double_to_string(f, next, precision,
+                                   DTSF_CUT_EXP_0)
+        if next == 'g':
+            if 'e' in _str and '.' not in _str:
+                a, b = _str.split('e')
+                _str = a + '.0e' + b
+        else:
+            if 'E' in _str and '.' not in _str:
+                a, b = _str.split('E')
+                _str = a + '.0E' + b
+        res += _str
+    # oct
+    if next == 'o':
+        int_val = space.int_w(w_arg)
+        _o = oct(int_val & MASK)
+        if int_val == 0:
+            tmp = "0"
+        else:
+            e = len(_o) - 1
+            assert e >= 0
+            tmp = _o[1:e]
+        if spec.prec_adjust:
+            tmp = ""
+        res = tmp
+    # string
+    if next == 's':
+        res = space.str_w(w_arg, quiet=True)
+    # hex
+    if next == 'x' or next == 'X':
+        int_val = space.int_w(w_arg)
+        if w_arg.tp == space.tp_str:
+            int_val, _ = strtol(space.str_w(w_arg))
+
+        _h = hex(int_val & MASK)
+        e = len(_h) - 1
+        assert e >= 0
+
+        tmp = _h[2:e]
+        if next == 'X':
+            tmp = tmp.upper()
+        if spec.prec_adjust:
+            tmp = ""
+        res = tmp
+
+    if next != ' ':
+        cutoff = 0
+        if next == 's':
+            cutoff = precision
+        res = format_str(res,
+                         width=addjust_width,
+                         to_left=spec.to_left,
+                         pad_char=spec.pad_char,
+                         cutoff=cutoff)
+        builder.append(res)
+    else:
+        space.ec.hippy_warn("%s(): Unknown format char %%%s, "
+                "ignoring corresponding argument" % (caller, next))
 
 
 @wrap(['space', W_Root, 'args_w'], error=False)
@@ -1751,53 +1643,60 @@ def str_repeat(space, s, repeat):
     return space.newstr(s * repeat)
 
 
-# XXX: specialize
-def _do_replace(search, replace, subject, case_insensitive):
-    if len(search) == 0:
+def _do_replace(needle, replace, subject, case_insensitive):
+    if len(needle) == 0:
         return subject, 0
+    fold = None
     if case_insensitive:
-        search = locale.lower(search)
-        normalize = locale.lower_char
-    else:
-        normalize = lambda s: s
+        needle = locale.lower(needle)
+        fold = locale.lower_table()
     s = StringBuilder(len(subject))
     i = 0
-    j = 0
     count = 0
-    while i < len(subject):
-        i0 = i
-        j = 0
-        while j < len(search):
-            if i >= len(subject):
-                s.append(subject[i0:])
-                break
-            if normalize(subject[i]) == search[j]:
-                i += 1
-                j += 1
-                continue
-            else:
-                s.append(subject[i0])
-                i = i0 + 1
-                break
-        else:
-            s.append(replace)
-            count += 1
-            j = 0
+    while True:
+        pos = search.find(subject, needle, i, len(subject), fold)
+        if pos < 0:
+            break
+        s.append_slice(subject, i, pos)
+        s.append(replace)
+        count += 1
+        i = pos + len(needle)
+    if count == 0:
+        return subject, 0
+    s.append_slice(subject, i, len(subject))
     return s.build(), count
 
 
+def _str_xreplace_replacer(space, w_search, w_replace, case_insensitive):
+    search_iter = space.create_iter(w_search)
+    n_search = space.arraylen(w_search)
+    needles = []
+    for i in range(n_search):
+        _, w_val = search_iter.next_item(space)
+        needles.append(space.str_w(w_val))
+    repls = _broadcast_as_list(space, w_replace, n_search, "", space.str_w)
+    if case_insensitive:
+        needles = [locale.lower(needle) for needle in needles]
+        return _get_replacer(space, 'i', needles, repls,
+                             [locale.lower(repl) for repl in repls])
+    return _get_replacer(space, 's', needles, repls, repls)
+
+
 def _str_xreplace_item(space, w_search, w_replace, subject, w_count,
         case_insensitive):
     if w_search.tp == space.tp_array:
+        replacer = _str_xreplace_replacer(space, w_search, w_replace,
+                                          case_insensitive)
+        if replacer.one_pass:
+            if case_insensitive:
+                return replacer.replace(subject, locale.lower_table())
+            return replacer.replace(subject)
         count = 0
         s = subject
-        search_iter = space.create_iter(w_search)
-        n_search = space.arraylen(w_search)
-        repls = _broadcast_as_list(space, w_replace, n_search, "", space.str_w)
-        for i in range(n_search):
-            _, w_val = search_iter.next_item(space)
-            search = space.str_w(w_val)
-            s, _count = _do_replace(search, repls[i], s, case_insensitive)
+        for i in range(len(replacer.needles)):
+            s, _count = _do_replace(replacer.needles[i],
+                                    replacer.replacements[i], s,
+                                    case_insensitive)
             count += _count
         return s, count
     else:
@@ -1955,7 +1854,8 @@ def stripos(space, haystack, w_needle, offset=0):
     if len(needle) == 0:
         return space.w_False
 
-    result = locale.lower(haystack).find(locale.lower(needle), offset)
+    result = search.find(haystack, locale.lower(needle), offset,
+                         len(haystack), locale.lower_table())
     if result == -1:
         return space.w_False
     return space.newint(result)
@@ -1972,9 +1872,8 @@ def stristr(space, haystack, w_needle, before_needle=False):
     if len(needle) == 0:
         space.ec.warn("stristr(): Empty needle")
         return space.w_False
-    needle = locale.lower(needle)
-    hay_lower = locale.lower(haystack)
-    pos = hay_lower.find(needle)
+    pos = search.find(haystack, locale.lower(needle), 0, len(haystack),
+                      locale.lower_table())
     if pos < 0:
         return space.w_False
     if before_needle:
@@ -2224,14 +2123,14 @@ def strripos(space, haystack, w_needle, offset=0):
     needle = unwrap_needle(space, w_needle)
     if len(needle) == 0:
         return space.w_False
-    haystack = locale.lower(haystack)
     needle = locale.lower(needle)
+    fold = locale.lower_table()
     if offset >= 0:
-        result = haystack.rfind(needle, offset)
+        result = search.rfind(haystack, needle, offset, len(haystack), fold)
     else:
         end = len(haystack) + offset + 1
         assert end >= 0
-        result = haystack.rfind(needle, 0, end)
+        result = search.rfind(haystack, needle, 0, end, fold)
     if result == -1:
         return space.w_False
     return space.newint(result)
@@ -2359,10 +2258,11 @@ def strtr(space, string, w_from, to=None):
         if not string:
             return space.newstr(string)
         try:
-            pairs = _pairs_from_array(space, w_from)
+            replacer = _strtr_replacer(space, w_from)
         except ValidationError:
             return space.w_False
-        return space.newstr(_apply_replacement(pairs, string))
+        s, _ = replacer.replace(string)
+        return space.newstr(s)
     else:
         if not string:
             return space.newstr(string)
@@ -2415,7 +2315,7 @@ def substr_count(space, haystack, needle, num_args, offset=0,
                 'Offset value %d exceeds string length' % offset)
         return space.w_False
     if num_args <= 3:
-        return space.newint(haystack[offset:].count(needle))
+        return space.newint(haystack.count(needle, offset, len(haystack)))
     elif length <= 0:
         space.ec.warn('substr_count(): '
                 'Length should be greater than 0')
@@ -2425,7 +2325,7 @@ def substr_count(space, haystack, needle, num_args, offset=0,
         space.ec.warn('substr_count(): '
                 'Length value %d exceeds string length' % length)
         return space.w_False
-    return space.newint(haystack[offset:end].count(needle))
+    return space.newint(haystack.count(needle, offset, end))
 
 
 def _substr_replace(string, replacement, start, length):
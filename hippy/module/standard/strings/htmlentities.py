@@ -255,3 +255,61 @@ UTF8 = {
     9829: '&hearts;',
     9830: '&diams;',
 }
+
+
+def utf8_char(code):
+    """The UTF-8 encoding of the code point 'code'."""
+    if code < 0x80:
+        return chr(code)
+    if code < 0x800:
+        return chr(0xC0 | (code >> 6)) + chr(0x80 | (code & 0x3F))
+    if code < 0x10000:
+        return (chr(0xE0 | (code >> 12)) + chr(0x80 | ((code >> 6) & 0x3F)) +
+                chr(0x80 | (code & 0x3F)))
+    return (chr(0xF0 | (code >> 18)) + chr(0x80 | ((code >> 12) & 0x3F)) +
+            chr(0x80 | ((code >> 6) & 0x3F)) + chr(0x80 | (code & 0x3F)))
+
+
+class EntityTrie(object):
+    """The named entities of a table like UTF8, as a trie on their
+    characters after the '&', up to and including the ';'.  Node 0 is the
+    root, a child is found in 'children' under 'node * 256 + ord(c)', and
+    'values' holds the UTF-8 character of the entity that ends at a node,
+    if any."""
+    _immutable_fields_ = ['children', 'values[*]']
+
+    def __init__(self, table):
+        children = {}
+        values = [None]
+        for code, entity in table.items():
+            node = 0
+            for c in entity[1:]:
+                key = node * 256 + ord(c)
+                child = children.get(key, -1)
+                if child < 0:
+                    child = len(values)
+                    values.append(None)
+                    children[key] = child
+                node = child
+            values[node] = utf8_char(code)
+        self.children = children
+        self.values = values
+
+    def match(self, s, start):
+        """Match the entity at s[start:], just after an '&'.  Return the
+        index after its ';' and the character it stands for, or
+        (-1, None)."""
+        node = 0
+        i = start
+        while i < len(s):
+            node = self.children.get(node * 256 + ord(s[i]), -1)
+            if node < 0:
+                break
+            i += 1
+            value = self.values[node]
+            if value is not None:
+                return i, value
+        return -1, None
+
+
+ENTITY_TRIE = EntityTrie(UTF8)
@@ -0,0 +1,259 @@
+""" Replacing many substrings at once, for strtr() and str_replace() with
+arrays.  The needles are compiled into an Aho-Corasick automaton which finds,
+in a single pass over the subject, the same matches as strtr() would by
+trying every needle at every position: the match that starts first, and
+the longest one if several start at the same position.
+"""
+
+from rpython.rlib.rstring import StringBuilder
+
+ROOT = 0
+CACHE_SIZE = 64
+
+
+class MultiReplacer(object):
+    """The automaton for a list of needles and their replacements.
+
+    Nodes are numbers, the root is 0.  The transitions of the trie live in
+    a single dict keyed by ``node * 256 + char``, except for the root,
+    which has a full table since most characters of the subject start
+    from there.  Empty needles are ignored and when a needle appears
+    several times, its first replacement wins.
+    """
+    # only computed for str_replace(): whether a single pass gives the
+    # same result as replacing the needles one after the other
+    one_pass = False
+
+    def __init__(self, needles, replacements):
+        assert len(needles) == len(replacements)
+        self.needles = needles
+        self.replacements = replacements
+        self.children = {}
+        self.root_table = [ROOT] * 256
+        self.edges = [[]]
+        self.depth = [0]
+        self.terminal = [-1]       # first needle ending at this node
+        self.last_terminal = [-1]  # last needle ending at this node
+        self.first_prefix = [-1]   # first needle going through this node
+        self.last_prefix = [-1]    # last needle going through this node
+        self.owner = [-1]          # the node of the only needle going
+                                   # through this node, or -2 if several
+        for i in range(len(needles)):
+            needle = needles[i]
+            if not needle:
+                continue
+            node = ROOT
+            for c in needle:
+                key = node * 256 + ord(c)
+                child = self.children.get(key, -1)
+                if child < 0:
+                    child = len(self.depth)
+                    self.children[key] = child
+                    self.edges[node].append(ord(c))
+                    self.edges.append([])
+                    self.depth.append(self.depth[node] + 1)
+                    self.terminal.append(-1)
+                    self.last_terminal.append(-1)
+                    self.first_prefix.append(i)
+                    self.last_prefix.append(-1)
+                    self.owner.append(-1)
+                    if node == ROOT:
+                        self.root_table[ord(c)] = child
+                node = child
+                self.last_prefix[node] = i
+            if self.terminal[node] < 0:
+                self.terminal[node] = i
+            self.last_terminal[node] = i
+            end = node
+            node = ROOT
+            for c in needle:
+                node = self.children[node * 256 + ord(c)]
+                if self.owner[node] == -1:
+                    self.owner[node] = end
+                elif self.owner[node] != end:
+                    self.owner[node] = -2
+        self._link()
+
+    def _link(self):
+        """Compute the failure links in breadth-first order, together with
+        what they give access to: for every node, the longest needle that
+        ends there, and the first and last needles ending there or going
+        through the node or one of its suffixes."""
+        n = len(self.depth)
+        none = len(self.needles)
+        self.fail = [ROOT] * n
+        self.match = [-1] * n
+        self.out_min = [none] * n
+        self.out_max = [-1] * n
+        self.prefix_min = [none] * n
+        self.prefix_max = [-1] * n
+        queue = [ROOT]
+        k = 0
+        while k < len(queue):
+            node = queue[k]
+            k += 1
+            for c in self.edges[node]:
+                child = self.children[node * 256 + c]
+                if node == ROOT:
+                    fail = ROOT
+                else:
+                    fail = self.step(self.fail[node], c)
+                self.fail[child] = fail
+                if self.terminal[child] >= 0:
+                    self.match[child] = child
+                    self.out_min[child] = self.terminal[child]
+                else:
+                    self.match[child] = self.match[fail]
+                    self.out_min[child] = self.out_min[fail]
+                self.prefix_min[child] = min(self.first_prefix[child],
+                                             self.prefix_min[fail])
+                self.out_max[child] = max(self.last_terminal[child],
+                                          self.out_max[fail])
+                self.prefix_max[child] = max(self.last_prefix[child],
+                                             self.prefix_max[fail])
+                queue.append(child)
+
+    def step(self, state, c):
+        while state != ROOT:
+            child = self.children.get(state * 256 + c, -1)
+            if child >= 0:
+                return child
+            state = self.fail[state]
+        return self.root_table[c]
+
+    def replace(self, subject, fold=None):
+        """Replace the needles found in 'subject'.  For case-insensitive
+        matching, the needles are lowercase and 'fold' is the table of
+        localemodule.lower_table().  Return the new string and the number
+        of replacements done."""
+        n = len(subject)
+        builder = StringBuilder(n)
+        count = 0
+        pos = 0
+        j = 0
+        state = ROOT
+        # the best match found so far: the first to start, then the longest
+        best = -1
+        best_start = 0
+        best_end = 0
+        while True:
+            if j < n:
+                c = subject[j]
+                if fold is not None:
+                    c = fold[ord(c)]
+                state = self.step(state, ord(c))
+                j += 1
+                found = self.match[state]
+                if found >= 0:
+                    start = j - self.depth[found]
+                    if best < 0 or start <= best_start:
+                        best = found
+                        best_start = start
+                        best_end = j
+                # as long as the current state goes back to best_start or
+                # before it, a better match may still show up
+                if best < 0 or j - self.depth[state] <= best_start:
+                    continue
+            elif best < 0:
+                break
+            builder.append_slice(subject, pos, best_start)
+            builder.append(self.replacements[self.terminal[best]])
+            count += 1
+            pos = j = best_end
+            state = ROOT
+            best = -1
+        builder.append_slice(subject, pos, n)
+        return builder.build(), count
+
+    def check_one_pass(self, replacements):
+        """Set 'one_pass' if replacing all the needles in one go gives the
+        same result as str_replace(), which replaces every needle in the
+        result of replacing the previous ones.  That is the case when the
+        occurrences of different needles can never overlap and the later
+        needles can never match any part of a replacement, nor a part of
+        the subject that a replacement made adjacent.  'replacements' are
+        what the later needles see of the replacements (lowercased for
+        str_ireplace()).
+        """
+        self.one_pass = self._can_do_one_pass(replacements)
+
+    def _can_do_one_pass(self, replacements):
+        needles = self.needles
+        last = -1
+        for i in range(len(needles)):
+            if needles[i]:
+                last = i
+        # the replacements, to find which ones start inside a needle
+        seen = MultiReplacer(replacements, replacements)
+        for i in range(len(needles)):
+            needle = needles[i]
+            if not needle:
+                continue
+            # no other needle may be part of this one...
+            state = ROOT
+            for k in range(len(needle) - 1):
+                state = self.step(state, ord(needle[k]))
+                if self.match[state] >= 0:
+                    return False
+            state = self.step(state, ord(needle[len(needle) - 1]))
+            if self.match[self.fail[state]] >= 0:
+                return False
+            # ...nor start with one of its suffixes
+            node = self.fail[state]
+            while node != ROOT:
+                if self.owner[node] != state:
+                    return False
+                node = self.fail[node]
+            # no earlier replacement may match the needle after its
+            # first character, or begin with the end of the needle
+            state = ROOT
+            for k in range(1, len(needle)):
+                state = seen.step(state, ord(needle[k]))
+                if seen.out_min[state] < i:
+                    return False
+            if seen.prefix_min[state] < i:
+                return False
+            if i >= last:
+                continue
+            # no later needle may match in the replacement or begin with
+            # its end
+            replacement = replacements[i]
+            if not replacement:
+                return False
+            state = ROOT
+            for c in replacement:
+                state = self.step(state, ord(c))
+                if self.out_max[state] > i:
+                    return False
+            if self.prefix_max[state] > i:
+                return False
+        return True
+
+
+def table_key(kind, needles, replacements):
+    builder = StringBuilder()
+    builder.append(kind)
+    for i in range(len(needles)):
+        builder.append(str(len(needles[i])))
+        builder.append(':')
+        builder.append(needles[i])
+        builder.append(str(len(replacements[i])))
+        builder.append(':')
+        builder.append(replacements[i])
+    return builder.build()
+
+
+class ReplacerCache(object):
+    """The automatons built during a request, keyed by table_key().  This
+    is bounded by simply starting afresh when it gets full."""
+    def __init__(self, capacity=CACHE_SIZE):
+        self._contents = {}
+        self.capacity = capacity
+
+    def get(self, key):
+        return self._contents.get(key, None)
+
+    def set(self, key, replacer):
+        if len(self._contents) >= self.capacity:
+            self._contents.clear()
+        self._contents[key] = replacer
@@ -0,0 +1,67 @@
+""" Substring search for the string functions.  Exact searches go to the
+string methods, which RPython implements with its fast search (a
+Boyer-Moore-Horspool variant with a bloom filter of the needle, and a
+plain scan for single characters).  Case-insensitive searches use
+Horspool as well, on characters folded through the table of
+localemodule.lower_table(), so that the haystack is never lowercased as
+a whole.  For those, the needle must already be lowercase.
+"""
+
+
+def find(haystack, needle, start, end, fold=None):
+    """The index of the first occurrence of 'needle' that lies within
+    haystack[start:end], or -1."""
+    if fold is None:
+        return haystack.find(needle, start, end)
+    m = len(needle)
+    last = end - m
+    if m <= 1:
+        if m == 0:
+            return start if start <= end else -1
+        c = needle[0]
+        for i in range(start, last + 1):
+            if fold[ord(haystack[i])] == c:
+                return i
+        return -1
+    # how far the window can move on, given its last character
+    skip = [m] * 256
+    for k in range(m - 1):
+        skip[ord(needle[k])] = m - 1 - k
+    tail = needle[m - 1]
+    i = start
+    while i <= last:
+        c = fold[ord(haystack[i + m - 1])]
+        if c == tail:
+            k = 0
+            while k < m - 1 and fold[ord(haystack[i + k])] == needle[k]:
+                k += 1
+            if k == m - 1:
+                return i
+        i += skip[ord(c)]
+    return -1
+
+
+def rfind(haystack, needle, start, end, fold=None):
+    """The index of the last occurrence of 'needle' that lies within
+    haystack[start:end], or -1."""
+    if fold is None:
+        return haystack.rfind(needle, start, end)
+    m = len(needle)
+    if m == 0:
+        return end if start <= end else -1
+    # the same as find(), moving the window backwards on its first character
+    skip = [m] * 256
+    for k in range(m - 1, 0, -1):
+        skip[ord(needle[k])] = k
+    head = needle[0]
+    i = end - m
+    while i >= start:
+        c = fold[ord(haystack[i])]
+        if c == head:
+            k = 1
+            while k < m and fold[ord(haystack[i + k])] == needle[k]:
+                k += 1
+            if k == m:
+                return i
+        i -= skip[ord(c)]
+    return -1
@@ -1,10 +1,11 @@
-from hippy.objects.arrayobject import wrap_array_key, _CellDictCell
+from hippy.objects.arrayobject import (wrap_array_key, _CellDictCell,
+        W_IntDictArrayObject, W_RDictArrayObject)
 from hippy.objects.iterator import BaseIterator
 
 class ListArrayIterator(BaseIterator):
 
-    def __init__(self, storage_w):
-        self.storage_w = storage_w
+    def __init__(self, w_array):
+        self.w_array = w_array
         self.index = 0
 
     def next(self, space):
@@ -22,10 +23,9 @@ class ListArrayIterator(BaseIterator):
         return w_index, w_value
 
     def current(self, interp):
-        try:
-            return self.storage_w[self.index]
-        except IndexError:
-            return None
+        if self.index < self.w_array.arraylen():
+            return self.w_array._getvalue(self.index)
+        return None
 
     def key(self, interp):
         return interp.space.wrap(self.index)
@@ -34,7 +34,7 @@ class ListArrayIterator(BaseIterator):
         self.index = 0
 
     def valid(self, interp):
-        return self.index < len(self.storage_w)
+        return self.index < self.w_array.arraylen()
 
     def done(self):
         return not self.valid(None)
@@ -73,28 +73,35 @@ class RDictArrayIterator(BaseIterator):
         self.w_array = w_array
         self.rewind(None)
 
-    def _current_index(self):
-        keylist = self.w_array._getkeylist()
-        try:
-            return keylist[self.index]
-        except IndexError:
-            return None
+    def _current_slot(self):
+        # the array is not supposed to change while we iterate over it,
+        # but if its storage was replaced, go on from the same item
+        dct_w = self.w_array.dct_w
+        if dct_w is not self.dct_w:
+            self.slot = self.dct_w.remap_slot(self.slot, dct_w)
+            self.dct_w = dct_w
+        self.slot = dct_w.live_slot(self.slot)
+        return self.slot
 
     def current(self, interp):
-        key = self._current_index()
-        if key is None:
+        slot = self._current_slot()
+        if slot >= self.dct_w.end():
             return None
-        return self.w_array.dct_w.get(key, None)
+        return self.dct_w.values_w[slot]
 
     def key(self, interp):
-        key = self._current_index()
-        if key is None:
+        slot = self._current_slot()
+        if slot >= self.dct_w.end():
             return None
-        return wrap_array_key(interp.space, key)
+        return wrap_array_key(interp.space, self.dct_w.keys_list[slot])
+
+    def _advance(self):
+        if self.slot < self.dct_w.end():
+            self.slot += 1
 
     def next(self, space):
         w_value = self.current(None)
-        self.index += 1
+        self._advance()
         self.finished = not self.valid(None)
         return w_value
 
@@ -104,57 +111,216 @@ class RDictArrayIterator(BaseIterator):
         w_key = self.key(interp)
         if w_key is None:
             return None, None
-        self.index += 1
+        self._advance()
         self.finished = not self.valid(interp)
         return w_key, w_value
 
     def rewind(self, interp):
-        self.index = 0
+        self.dct_w = self.w_array.dct_w
+        self.slot = 0
         self.finished = not self.valid(interp)
 
     def valid(self, interp):
-        return self.index < self.w_array.arraylen()
+        return self._current_slot() < self.dct_w.end()
 
 
 class RDictArrayIteratorRef(BaseIterator):
     def __init__(self, space, r_array):
         self.r_array = r_array
-        self.index = 0
+        w_array = r_array.deref_temp()
+        assert isinstance(w_array, W_RDictArrayObject)
+        self.dct_w = w_array.dct_w
+        self.slot = 0
         self.finished = self.is_finished()
 
-    def get_current_value(self):
-        key = self._current_index()
+    def _current_slot(self):
+        # NB: the array must be deref'd every time, in case it's been mutated
+        # between two calls to next()/next_item().  Items added meanwhile
+        # are found at the end of the storage; if the storage was replaced,
+        # go on from the same item.  Returns -1 if it is not a hash any more.
+        w_array = self.r_array.deref_temp()
+        if not isinstance(w_array, W_RDictArrayObject):
+            return -1
+        dct_w = w_array.dct_w
+        if dct_w is not self.dct_w:
+            self.slot = self.dct_w.remap_slot(self.slot, dct_w)
+            self.dct_w = dct_w
+        self.slot = dct_w.live_slot(self.slot)
+        if self.slot >= dct_w.end():
+            return -1
+        return self.slot
+
+    def _current_item(self, space):
+        slot = self._current_slot()
+        if slot < 0:
+            return None, None
+        key = self.dct_w.keys_list[slot]
         w_array = self.r_array.deref()
-        return w_array._getitem_str(key)
+        return wrap_array_key(space, key), w_array._getitem_str(key)
 
-    def _current_index(self):
+    def is_finished(self):
+        return self._current_slot() < 0
+
+    def next(self, space):
+        _, r_value = self._current_item(space)
+        if r_value is not None:
+            self.slot += 1
+        self.finished = self.is_finished()
+        return r_value
+
+    def next_item(self, space):
+        w_key, r_value = self._current_item(space)
+        if w_key is None:
+            return None, None
+        self.slot += 1
+        self.finished = self.is_finished()
+        return w_key, r_value
+
+class IntDictArrayIterator(BaseIterator):
+    def __init__(self, w_array):
+        self.w_array = w_array
+        self.rewind(None)
+
+    def _current_slot(self):
+        # see RDictArrayIterator
+        dct_w = self.w_array.dct_w
+        if dct_w is not self.dct_w:
+            self.slot = self.dct_w.remap_slot(self.slot, dct_w)
+            self.dct_w = dct_w
+        self.slot = dct_w.live_slot(self.slot)
+        return self.slot
+
+    def current(self, interp):
+        slot = self._current_slot()
+        if slot >= self.dct_w.end():
+            return None
+        return self.dct_w.values_w[slot]
+
+    def key(self, interp):
+        slot = self._current_slot()
+        if slot >= self.dct_w.end():
+            return None
+        return interp.space.newint(self.dct_w.keys_list[slot])
+
+    def _advance(self):
+        if self.slot < self.dct_w.end():
+            self.slot += 1
+
+    def next(self, space):
+        w_value = self.current(None)
+        self._advance()
+        self.finished = not self.valid(None)
+        return w_value
+
+    def next_item(self, space):
+        interp = space.ec.interpreter
+        w_value = self.current(interp)
+        w_key = self.key(interp)
+        if w_key is None:
+            return None, None
+        self._advance()
+        self.finished = not self.valid(interp)
+        return w_key, w_value
+
+    def rewind(self, interp):
+        self.dct_w = self.w_array.dct_w
+        self.slot = 0
+        self.finished = not self.valid(interp)
+
+    def valid(self, interp):
+        return self._current_slot() < self.dct_w.end()
+
+
+FINISHED, INT_HASH, STR_HASH = range(3)
+
+
+def _remap_int_slot(int_dct_w, slot, dct_w):
+    """The slot in the string hash 'dct_w' of the first item at or after
+    'slot' in 'int_dct_w' which is still in 'dct_w'"""
+    end = int_dct_w.end()
+    slot = int_dct_w.live_slot(slot)
+    while slot < end:
+        if int_dct_w.values_w[slot] is not None:
+            other_slot = dct_w.slot_of(str(int_dct_w.keys_list[slot]))
+            if other_slot >= 0:
+                return other_slot
+        slot += 1
+    return min(end, dct_w.end())
+
+
+class IntDictArrayIteratorRef(BaseIterator):
+    def __init__(self, space, r_array):
+        self.r_array = r_array
+        w_array = r_array.deref_temp()
+        assert isinstance(w_array, W_IntDictArrayObject)
+        self.int_dct_w = w_array.dct_w
+        self.dct_w = None
+        self.slot = 0
+        self.finished = self.is_finished()
+
+    def _find_item(self):
+        """Move to the item to visit now.  Returns INT_HASH if it is at
+        'slot' in 'int_dct_w', STR_HASH if it is at 'slot' in 'dct_w',
+        or FINISHED.
+        """
         # NB: the array must be deref'd every time, in case it's been mutated
-        # between two calls to next()/next_item().
+        # between two calls to next()/next_item().  Setting a string key
+        # in the loop body may also have turned it into a string hash.
         w_array = self.r_array.deref_temp()
-        keylist = w_array._getkeylist()
-        try:
-            return keylist[self.index]
-        except IndexError:
-            return None
+        if isinstance(w_array, W_IntDictArrayObject):
+            if self.int_dct_w is None:
+                return FINISHED
+            int_dct_w = w_array.dct_w
+            if int_dct_w is not self.int_dct_w:
+                self.slot = self.int_dct_w.remap_slot(self.slot, int_dct_w)
+                self.int_dct_w = int_dct_w
+            self.slot = int_dct_w.live_slot(self.slot)
+            if self.slot < int_dct_w.end():
+                return INT_HASH
+        elif isinstance(w_array, W_RDictArrayObject):
+            dct_w = w_array.dct_w
+            if self.int_dct_w is not None:
+                self.slot = _remap_int_slot(self.int_dct_w, self.slot, dct_w)
+                self.int_dct_w = None
+                self.dct_w = dct_w
+            elif dct_w is not self.dct_w:
+                self.slot = self.dct_w.remap_slot(self.slot, dct_w)
+                self.dct_w = dct_w
+            self.slot = dct_w.live_slot(self.slot)
+            if self.slot < dct_w.end():
+                return STR_HASH
+        return FINISHED
+
+    def _current_item(self, space):
+        found = self._find_item()
+        if found == INT_HASH:
+            key = self.int_dct_w.keys_list[self.slot]
+            w_array = self.r_array.deref()
+            return space.newint(key), w_array._getitem_int(key)
+        elif found == STR_HASH:
+            key = self.dct_w.keys_list[self.slot]
+            w_array = self.r_array.deref()
+            return wrap_array_key(space, key), w_array._getitem_str(key)
+        return None, None
 
     def is_finished(self):
-        w_array = self.r_array.deref_temp()
-        return self.index == w_array.arraylen()
+        return self._find_item() == FINISHED
 
     def next(self, space):
-        r_value = self.get_current_value()
-        self.index += 1
+        _, r_value = self._current_item(space)
+        if r_value is not None:
+            self.slot += 1
         self.finished = self.is_finished()
         return r_value
 
     def next_item(self, space):
-        r_value = self.get_current_value()
-        key = self._current_index()
-        if key is None:
+        w_key, r_value = self._current_item(space)
+        if w_key is None:
             return None, None
-        self.index += 1
+        self.slot += 1
         self.finished = self.is_finished()
-        return wrap_array_key(space, key), r_value
+        return w_key, r_value
+
 
 class RCellDictArrayIterator(BaseIterator):
     def __init__(self, w_array):
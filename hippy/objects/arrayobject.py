@@ -8,16 +8,45 @@ from hippy.objects.base import W_Object, W_Root
 from hippy.objects.reference import W_Reference, VirtualReference
 from hippy.objects.convert import force_float_to_int_in_any_way
 from hippy.objects.strobject import string_var_export
+from hippy.objects.intobject import W_IntObject
+from hippy.objects.floatobject import W_FloatObject
 from hippy.objects.boolobject import w_False
+from hippy.objects.orderedhash import StrOrderedHash, IntOrderedHash
 from hippy.error import ConvertError
 from collections import OrderedDict
 from rpython.rlib.rstring import StringBuilder
 
 
+# a list compacts its storage after array_shift() only past that many
+# shifted items
+MIN_SHIFTED_ITEMS = 16
+
+
 class CannotConvertToIndex(Exception):
     pass
 
 
+class CopyOnWrite(object):
+    """The storage shared by an array and its lazy copies.  'sharers' is
+    the number of arrays that may still use it; it is never decremented
+    when one of them dies, so it can only be too large, which costs at
+    most a useless copy.
+    """
+    def __init__(self):
+        self.sharers = 1
+
+
+class ArrayCopyStats(object):
+    """How many array copies were made, and how many of them had to
+    duplicate their storage because one side was written to"""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.copies = 0
+        self.materialized = 0
+
+
 def new_rdict():
     return OrderedDict()
 
@@ -106,16 +135,32 @@ class W_ArrayObject(W_Object):
 
     @staticmethod
     def new_array_from_list(space, lst_w):
-        return W_ListArrayObject(space, lst_w)
+        return W_ListArrayObject.from_list(space, lst_w)
+
+    @staticmethod
+    def new_array_from_ints(space, ints):
+        return W_ListArrayObject(space, None, ints=ints)
+
+    @staticmethod
+    def new_array_from_floats(space, floats):
+        return W_ListArrayObject(space, None, floats=floats)
+
+    @staticmethod
+    def new_array_from_range(space, start, step, length):
+        return W_ListArrayObject.from_range(space, start, step, length)
 
     @staticmethod
     def new_array_from_rdict(space, dct_w):
-        return W_RDictArrayObject(space, dct_w, compute_next_idx(dct_w))
+        return W_RDictArrayObject(space, StrOrderedHash.from_rdict(dct_w),
+                                  compute_next_idx(dct_w))
 
     @staticmethod
     @jit.look_inside_iff(lambda space, pairs_ww, allow_bogus : jit.isvirtual(pairs_ww))
     def new_array_from_pairs(space, pairs_ww, allow_bogus):
-        rdct_w = new_rdict()
+        # integer keys are collected in 'idct_w' until we see the first
+        # string key; from then on everything goes to 'rdct_w'
+        idct_w = IntOrderedHash()
+        rdct_w = None
         next_idx = 0
         for w_key, w_value in pairs_ww:
             if w_key is not None:
@@ -138,14 +183,54 @@ class W_ArrayObject(W_Object):
             if as_str is None:
                 if as_int >= next_idx:
                     next_idx = as_int + 1
+                if rdct_w is None:
+                    idct_w.setitem(as_int, w_value)
+                    continue
                 as_str = str(as_int)
-            rdct_w[as_str] = w_value
-
+            elif rdct_w is None:
+                rdct_w = StrOrderedHash()
+                for key, w_v in idct_w.items():
+                    rdct_w.append(str(key), w_v)
+            rdct_w.setitem(as_str, w_value)
+
+        if rdct_w is None:
+            return W_IntDictArrayObject(space, idct_w, next_idx=next_idx)
         return W_RDictArrayObject(space, rdct_w, next_idx=next_idx)
 
+    _cow = None      # a CopyOnWrite if the storage may be shared
+
     def copy_item(self):
         return self.copy()
 
+    def copy(self):
+        """Return a copy that shares the storage with 'self' until one of
+        the two is written to"""
+        cow = self._cow
+        if cow is None:
+            cow = CopyOnWrite()
+            self._cow = cow
+        cow.sharers += 1
+        self.space.array_copy_stats.copies += 1
+        return self._shared_copy(cow)
+
+    def _shared_copy(self, cow):
+        raise NotImplementedError("abstract")
+
+    def _prepare_write(self):
+        """Must be called before changing the storage in-place: if it is
+        still shared with copies, make a private copy of it first"""
+        cow = self._cow
+        if cow is not None:
+            self._cow = None
+            if cow.sharers > 1:
+                cow.sharers -= 1
+                self._note_making_a_copy()
+                self.space.array_copy_stats.materialized += 1
+                self._copy_storage()
+
+    def _copy_storage(self):
+        raise NotImplementedError("abstract")
+
     def is_true(self, space):
         return self.arraylen() > 0
 
@@ -306,6 +391,35 @@ class W_ArrayObject(W_Object):
         self.current_idx = current_idx
         return self._current()
 
+    def prev(self, space):
+        current_idx = min(self.current_idx, self.arraylen()) - 1
+        if current_idx < 0:
+            return w_False
+        self.current_idx = current_idx
+        return self._current()
+
+    def end(self, space):
+        length = self.arraylen()
+        if length == 0:
+            return w_False
+        self.current_idx = length - 1
+        return self._current()
+
+    def _shift_maybe_inplace(self, space):
+        """Remove the first item, which must exist, and renumber the
+        integer keys, for array_shift().  Returns the resulting array,
+        possibly 'self', and the removed item."""
+        new_arr = space.new_array_from_list([])
+        w_first = None
+        with space.iter(self) as itr:
+            while not itr.done():
+                w_key, w_val = itr.next_item(space)
+                if w_first is None:
+                    w_first = w_val
+                    continue
+                new_arr = new_arr.packitem_maybe_inplace(space, w_key, w_val)
+        assert w_first is not None
+        return new_arr, w_first
 
     def _key(self, space):
         raise NotImplementedError("abstract")
@@ -395,49 +509,223 @@ class ListItemVRef(VirtualReference):
         self.index = index
 
     def deref(self):
-        return self.w_array.lst_w[self.index]
+        return self.w_array._getvalue(self.index)
 
     def store(self, w_value, unique=False):
-        self.w_array.lst_w[self.index] = w_value
+        self.w_array._setvalue(self.index, w_value)
 
     def __repr__(self):
         return '<ListItemVRef>'
 
 
+@jit.look_inside_iff(lambda lst_w: jit.isvirtual(lst_w))
+def _unbox_ints(lst_w):
+    ints = [0] * len(lst_w)
+    for i in range(len(lst_w)):
+        w_item = lst_w[i]
+        if not isinstance(w_item, W_IntObject):
+            return None
+        ints[i] = w_item.intval
+    return ints
+
+
+@jit.look_inside_iff(lambda lst_w: jit.isvirtual(lst_w))
+def _unbox_floats(lst_w):
+    floats = [0.0] * len(lst_w)
+    for i in range(len(lst_w)):
+        w_item = lst_w[i]
+        if not isinstance(w_item, W_FloatObject):
+            return None
+        floats[i] = w_item.floatval
+    return floats
+
+
 class W_ListArrayObject(W_ArrayObject):
+    """An array whose keys are exactly 0, 1, ..., n-1, in this order.
+    The items are stored unboxed in 'ints' if they are all ints, unboxed
+    in 'floats' if they are all floats, and in 'lst_w' otherwise; exactly
+    one of the three is not None.  Storing anything else in an unboxed
+    list turns it, in-place, into a list of wrapped objects.  An empty
+    list takes the storage of the first item appended to it.
+
+    The lists made by range() have no storage at all at first: when the
+    three are None, the items are the 'range_len' ints 'range_start',
+    'range_start + range_step', ...  They are computed when read, and
+    the list is turned into 'ints' by the first change other than
+    removing items at either end.
+
+    array_shift() doesn't move the items: the first 'shifted' items of the
+    storage are just not part of the array any more, until there are more
+    of them than of items left, or until _compact_shifted() is called.
+    """
     _has_string_keys = False
 
-    def __init__(self, space, lst_w, current_idx=0):
+    def __init__(self, space, lst_w, current_idx=0, ints=None, floats=None):
         self.space = space
         self.lst_w = lst_w
+        self.ints = ints
+        self.floats = floats
+        self.range_start = 0
+        self.range_step = 0
+        self.range_len = 0
+        self.shifted = 0
         self.current_idx = current_idx
 
-    def as_unique_arraylist(self):
-        self._note_making_a_copy()
-        lst_w = [item.copy_item() for item in self.lst_w]
-        return W_ListArrayObject(self.space, lst_w, current_idx=self.current_idx)
+    @staticmethod
+    def from_list(space, lst_w, current_idx=0):
+        if lst_w:
+            w_first = lst_w[0]
+            if isinstance(w_first, W_IntObject):
+                ints = _unbox_ints(lst_w)
+                if ints is not None:
+                    return W_ListArrayObject(space, None, current_idx,
+                                             ints=ints)
+            elif isinstance(w_first, W_FloatObject):
+                floats = _unbox_floats(lst_w)
+                if floats is not None:
+                    return W_ListArrayObject(space, None, current_idx,
+                                             floats=floats)
+        return W_ListArrayObject(space, lst_w, current_idx)
+
+    @staticmethod
+    def from_range(space, start, step, length):
+        w_arr = W_ListArrayObject(space, None)
+        w_arr.range_start = start
+        w_arr.range_step = step
+        w_arr.range_len = length
+        return w_arr
+
+    def _is_range(self):
+        return self.lst_w is None and self.ints is None and self.floats is None
+
+    def _materialize_range(self):
+        """Turn a lazy range into a list of unboxed ints.  Does nothing
+        on other lists."""
+        if not self._is_range():
+            return
+        start = self.range_start
+        step = self.range_step
+        self.ints = [start + i * step for i in range(self.range_len)]
+
+    def _getvalue(self, index):
+        """The item at 'index', which must be in range, wrapped"""
+        index += self.shifted
+        if self.ints is not None:
+            return self.space.newint(self.ints[index])
+        if self.floats is not None:
+            return self.space.newfloat(self.floats[index])
+        if self.lst_w is None:
+            return self.space.newint(self.range_start +
+                                     index * self.range_step)
+        return self.lst_w[index]
+
+    def _setvalue(self, index, w_value):
+        """Store 'w_value' at 'index', which must be in range"""
+        self._prepare_write()
+        index += self.shifted
+        self._materialize_range()
+        if self.ints is not None:
+            if isinstance(w_value, W_IntObject):
+                self.ints[index] = w_value.intval
+                return
+            self._box_items()
+        elif self.floats is not None:
+            if isinstance(w_value, W_FloatObject):
+                self.floats[index] = w_value.floatval
+                return
+            self._box_items()
+        self.lst_w[index] = w_value
+
+    def _box_items(self):
+        """Switch to a list of wrapped objects"""
+        space = self.space
+        self._materialize_range()
+        if self.ints is not None:
+            self.lst_w = [space.newint(i) for i in self.ints]
+            self.ints = None
+        elif self.floats is not None:
+            self.lst_w = [space.newfloat(f) for f in self.floats]
+            self.floats = None
+
+    def _compact_shifted(self):
+        """Remove the items shifted off by array_shift() from the storage.
+        Must be called before using 'ints' or 'floats' as a whole."""
+        shifted = self.shifted
+        if shifted == 0:
+            return
+        if self.ints is not None:
+            self.ints = self.ints[shifted:]
+        elif self.floats is not None:
+            self.floats = self.floats[shifted:]
+        elif self.lst_w is not None:
+            self.lst_w = self.lst_w[shifted:]
+        else:
+            self.range_start += shifted * self.range_step
+            self.range_len -= shifted
+        self.shifted = 0
+
+    def _shift_maybe_inplace(self, space):
+        w_value = self._getvalue(0)
+        self.shifted += 1
+        if (self.shifted > MIN_SHIFTED_ITEMS and
+                self.shifted > self.arraylen()):
+            self._compact_shifted()
+        self.current_idx = 0
+        return self, w_value
+
+    def _popvalue(self):
+        self._prepare_write()
+        if self.ints is not None:
+            return self.space.newint(self.ints.pop())
+        if self.floats is not None:
+            return self.space.newfloat(self.floats.pop())
+        if self.lst_w is None:
+            self.range_len -= 1
+            return self.space.newint(self.range_start +
+                                     self.range_len * self.range_step)
+        return self.lst_w.pop()
 
     def as_list_w(self):
-        return self.lst_w[:]
+        if self.lst_w is not None:
+            return self.lst_w[self.shifted:]
+        return [self._getvalue(i) for i in range(self.arraylen())]
 
     def as_pair_list(self, space):
-        return [(space.newint(i), values)
-                for i, values in enumerate(self.lst_w)]
+        return [(space.newint(i), self._getvalue(i))
+                for i in range(self.arraylen())]
 
     def as_unique_arraydict(self):
         self._note_making_a_copy()
-        d = self.as_rdict()   # make a fresh dictionary
+        d = StrOrderedHash()   # make a fresh dictionary
+        for i in range(self.arraylen()):
+            d.append(str(i), self._getvalue(i).copy_item())
         return W_RDictArrayObject(self.space, d,
-                                  next_idx=len(self.lst_w),
+                                  next_idx=self.arraylen(),
                                   current_idx=self.current_idx)
 
+    def as_unique_arrayintdict(self):
+        self._note_making_a_copy()
+        d = IntOrderedHash()
+        length = self.arraylen()
+        for i in range(length):
+            d.append(i, self._getvalue(i).copy_item())
+        return W_IntDictArrayObject(self.space, d,
+                                    next_idx=length,
+                                    current_idx=self.current_idx)
+
     def arraylen(self):
-        return len(self.lst_w)
+        if self.ints is not None:
+            return len(self.ints) - self.shifted
+        if self.floats is not None:
+            return len(self.floats) - self.shifted
+        if self.lst_w is None:
+            return self.range_len - self.shifted
+        return len(self.lst_w) - self.shifted
 
     def as_rdict(self):
         d = new_rdict()
-        for i in range(len(self.lst_w)):
-            d[str(i)] = self.lst_w[i].copy_item()
+        for i in range(self.arraylen()):
+            d[str(i)] = self._getvalue(i).copy_item()
         return d
 
     def get_rdict_from_array(self):
@@ -445,29 +733,25 @@ class W_ListArrayObject(W_ArrayObject):
 
     def _current(self):
         index = self.current_idx
-        if 0 <= index < len(self.lst_w):
-            return self.lst_w[index]
+        if 0 <= index < self.arraylen():
+            return self._getvalue(index)
         else:
             return w_False
 
     def _key(self, space):
         index = self.current_idx
-        if 0 <= index < len(self.lst_w):
+        if 0 <= index < self.arraylen():
             return space.newint(index)
         else:
             return space.w_Null
 
     def _getitem_int(self, index):
-        if index >= 0:
-            try:
-                res = self.lst_w[index]
-            except IndexError:
-                pass
-            else:
+        if 0 <= index < self.arraylen():
+            if self.lst_w is not None:
+                res = self.lst_w[index + self.shifted]
                 if isinstance(res, W_Reference):
                     return res
-                else:
-                    return ListItemVRef(self, index)
+            return ListItemVRef(self, index)
         return None
 
     def _getitem_str(self, key):
@@ -478,6 +762,29 @@ class W_ListArrayObject(W_ArrayObject):
         return self._getitem_int(i)
 
     def _appenditem(self, w_obj, as_ref=False):
+        self._prepare_write()
+        self._materialize_range()
+        if self.ints is not None:
+            if isinstance(w_obj, W_IntObject):
+                self.ints.append(w_obj.intval)
+                return
+            self._box_items()
+        elif self.floats is not None:
+            if isinstance(w_obj, W_FloatObject):
+                self.floats.append(w_obj.floatval)
+                return
+            self._box_items()
+        elif self.arraylen() == 0:
+            if isinstance(w_obj, W_IntObject):
+                self.lst_w = None
+                self.ints = [w_obj.intval]
+                self.shifted = 0
+                return
+            if isinstance(w_obj, W_FloatObject):
+                self.lst_w = None
+                self.floats = [w_obj.floatval]
+                self.shifted = 0
+                return
         self.lst_w.append(w_obj)
 
     def _setitem_int(self, index, w_value, as_ref, unique_item=False):
@@ -485,20 +792,26 @@ class W_ListArrayObject(W_ArrayObject):
         if index >= length:
             if index > length:
                 return self._convert_and_setitem_int(index, w_value)
-            self.lst_w.append(w_value)
+            self._appenditem(w_value)
             return self
         #
         if index < 0:
             return self._convert_and_setitem_int(index, w_value)
         #
+        if self.lst_w is None:
+            if not as_ref:
+                self._setvalue(index, w_value)
+                return self
+            self._box_items()
         # If overwriting an existing W_Reference object, we only update
         # the value in the reference.  Else we need to update 'lst_w'.
         if not as_ref:
-            w_old = self.lst_w[index]
+            w_old = self.lst_w[index + self.shifted]
             if isinstance(w_old, W_Reference):
                 w_old.store(w_value, unique_item)
                 return self
-        self.lst_w[index] = w_value
+        self._prepare_write()
+        self.lst_w[index + self.shifted] = w_value
         return self
 
     def _setitem_str(self, key, w_value, as_ref, unique_item=False):
@@ -510,7 +823,7 @@ class W_ListArrayObject(W_ArrayObject):
             return self._setitem_int(i, w_value, as_ref, unique_item)
 
     def _convert_and_setitem_int(self, index, w_value):
-        res = self.as_unique_arraydict()
+        res = self.as_unique_arrayintdict()
         return res._setitem_int(index, w_value, False)
 
     def _convert_and_setitem_str(self, key, w_value):
@@ -518,15 +831,16 @@ class W_ListArrayObject(W_ArrayObject):
         return res._setitem_str(key, w_value, False)
 
     def _unsetitem_int(self, index):
-        if index < 0 or index >= self.arraylen():
+        length = self.arraylen()
+        if index < 0 or index >= length:
             return self
-        if index == self.arraylen() - 1:
-            del self.lst_w[index]
-            if self.current_idx > len(self.lst_w):
-                self.current_idx = len(self.lst_w)
+        if index == length - 1:
+            self._popvalue()
+            if self.current_idx > index:
+                self.current_idx = index
             return self
         else:
-            return self.as_unique_arraydict()._unsetitem_int(index)
+            return self.as_unique_arrayintdict()._unsetitem_int(index)
 
     def _unsetitem_str(self, key):
         try:
@@ -549,31 +863,55 @@ class W_ListArrayObject(W_ArrayObject):
 
     def create_iter(self, space, contextclass=None):
         from hippy.objects.arrayiter import ListArrayIterator
-        return ListArrayIterator(self.lst_w)
+        return ListArrayIterator(self)
 
     def create_iter_ref(self, space, r_self, contextclass=None):
         from hippy.objects.arrayiter import ListArrayIteratorRef
         return ListArrayIteratorRef(space, r_self)
 
-    def copy(self):
-        return self.as_unique_arraylist()
+    def _shared_copy(self, cow):
+        w_copy = W_ListArrayObject(self.space, self.lst_w, self.current_idx,
+                                   ints=self.ints, floats=self.floats)
+        w_copy.range_start = self.range_start
+        w_copy.range_step = self.range_step
+        w_copy.range_len = self.range_len
+        w_copy.shifted = self.shifted
+        w_copy._cow = cow
+        return w_copy
+
+    def _copy_storage(self):
+        shifted = self.shifted
+        if self.ints is not None:
+            self.ints = self.ints[shifted:]
+        elif self.floats is not None:
+            self.floats = self.floats[shifted:]
+        elif self.lst_w is not None:
+            self.lst_w = [self.lst_w[i].copy_item()
+                          for i in range(shifted, len(self.lst_w))]
+        else:
+            # a lazy range has nothing to copy
+            self.range_start += shifted * self.range_step
+            self.range_len -= shifted
+        self.shifted = 0
 
     def _inplace_pop(self, space):
         self.current_idx = 0
-        return self.lst_w.pop()
+        return self._popvalue()
 
     def _values(self, space):
-        return self.lst_w
+        if self.lst_w is not None and self.shifted == 0:
+            return self.lst_w
+        return self.as_list_w()
 
     def serialize(self, space, builder, memo):
         # performance-enhanced version
         builder.append("a:")
-        lst_w = self.lst_w
-        builder.append(str(len(lst_w)))
+        length = self.arraylen()
+        builder.append(str(length))
         builder.append(":{")
         memo.add_counter()
         counting = ['i', ':', '0', ';']
-        for i in range(len(lst_w)):
+        for i in range(length):
             for c in counting:
                 builder.append(c)
             # increment the counting list
@@ -587,7 +925,7 @@ class W_ListArrayObject(W_ArrayObject):
             else:
                 counting = ['i', ':', '1'] + counting[2:]
             #
-            if lst_w[i].serialize(space, builder, memo):
+            if self._getvalue(i).serialize(space, builder, memo):
                 memo.add_counter()
         builder.append("}")
         return False  # counted above already
@@ -599,38 +937,50 @@ class DictItemVRef(VirtualReference):
         self.index = index
 
     def deref(self):
-        return self.w_array.dct_w[self.index]
+        return self.w_array.dct_w.lookup(self.index)
 
     def store(self, w_value, unique=False):
-        self.w_array.dct_w[self.index] = w_value
+        self.w_array._prepare_write()
+        self.w_array.dct_w.setitem(self.index, w_value)
 
 
 class W_RDictArrayObject(W_ArrayObject):
+    """A hash with string keys, stored in a StrOrderedHash.  The internal
+    pointer 'current_idx' is a slot of it, not the position of the item
+    in the array, so that removing items doesn't need to update it.
+    """
     _has_string_keys = True
     strategy_name = 'hash'
 
-    _keylist = None
-
     def __init__(self, space, dct_w, next_idx, current_idx=0):
         if not we_are_translated():
-            assert isinstance(dct_w, OrderedDict)
+            assert isinstance(dct_w, StrOrderedHash)
         self.space = space
         self.dct_w = dct_w
         self.next_idx = next_idx
         self.current_idx = current_idx
 
     def as_rdict(self):
-        new_dict = OrderedDict()
-        for key, w_value in self.dct_w.iteritems():
-            new_dict[key] = w_value.copy_item()
+        new_dict = new_rdict()
+        dct_w = self.dct_w
+        for slot in range(dct_w.first, dct_w.end()):
+            w_value = dct_w.values_w[slot]
+            if w_value is not None:
+                new_dict[dct_w.keys_list[slot]] = w_value.copy_item()
         return new_dict
 
     def get_rdict_from_array(self):
-        return self.dct_w.copy()
+        new_dict = new_rdict()
+        dct_w = self.dct_w
+        for slot in range(dct_w.first, dct_w.end()):
+            w_value = dct_w.values_w[slot]
+            if w_value is not None:
+                new_dict[dct_w.keys_list[slot]] = w_value
+        return new_dict
 
     def as_unique_arraydict(self):
         self._note_making_a_copy()
-        return W_RDictArrayObject(self.space, self.as_rdict(),
+        return W_RDictArrayObject(self.space, self.dct_w.copy(),
                                   next_idx=self.next_idx,
                                   current_idx=self.current_idx)
 
@@ -638,49 +988,73 @@ class W_RDictArrayObject(W_ArrayObject):
         return self.dct_w.values()
 
     def as_pair_list(self, space):
-        keylist = self._getkeylist()
         result = []
-        for key in keylist:
-            w_key = wrap_array_key(space, key)
-            result.append((w_key, self.dct_w[key]))
+        dct_w = self.dct_w
+        for slot in range(dct_w.first, dct_w.end()):
+            w_value = dct_w.values_w[slot]
+            if w_value is not None:
+                w_key = wrap_array_key(space, dct_w.keys_list[slot])
+                result.append((w_key, w_value))
         return result
 
     def _getkeylist(self):
-        keylist = self._keylist
-        if keylist is None:
-            keylist = self.dct_w.keys()
-            self._keylist = keylist
-        return keylist
+        "NOT_RPYTHON: for tests only"
+        return self.dct_w.keys()
 
-    def _keylist_changed(self):
-        self._keylist = None
+    def _current_slot(self):
+        # move the internal pointer past the removed items
+        slot = self.dct_w.live_slot(self.current_idx)
+        self.current_idx = slot
+        return slot
 
     def _current(self):
-        keylist = self._getkeylist()
-        index = self.current_idx
-        if 0 <= index < len(keylist):
-            return self.dct_w[keylist[index]]
+        slot = self._current_slot()
+        if slot < self.dct_w.end():
+            return self.dct_w.values_w[slot]
         else:
             return w_False
 
     def _key(self, space):
-        keylist = self._getkeylist()
-        index = self.current_idx
-        if 0 <= index < len(keylist):
-            return wrap_array_key(space, keylist[index])
+        slot = self._current_slot()
+        if slot < self.dct_w.end():
+            return wrap_array_key(space, self.dct_w.keys_list[slot])
         else:
             return space.w_Null
 
+    def next(self, space):
+        dct_w = self.dct_w
+        slot = self._current_slot()
+        if slot < dct_w.end():
+            slot = dct_w.live_slot(slot + 1)
+            self.current_idx = slot
+        if slot >= dct_w.end():
+            return w_False
+        return dct_w.values_w[slot]
+
+    def prev(self, space):
+        dct_w = self.dct_w
+        slot = dct_w.prev_live_slot(self.current_idx)
+        if slot < 0:
+            return w_False
+        self.current_idx = slot
+        return dct_w.values_w[slot]
+
+    def end(self, space):
+        dct_w = self.dct_w
+        if dct_w.length() == 0:
+            return w_False
+        self.current_idx = dct_w.last_slot()
+        return dct_w.values_w[self.current_idx]
+
     def arraylen(self):
-        return len(self.dct_w)
+        return self.dct_w.length()
 
     def _getitem_int(self, index):
         return self._getitem_str(str(index))
 
     def _getitem_str(self, key):
-        try:
-            res = self.dct_w[key]
-        except KeyError:
+        res = self.dct_w.lookup(key)
+        if res is None:
             return None
         if isinstance(res, W_Reference):
             return res
@@ -698,17 +1072,18 @@ class W_RDictArrayObject(W_ArrayObject):
         # If overwriting an existing W_Reference object, we only update
         # the value in the reference and return 'self'.
         if not as_ref:
-            try:
-                w_old = self.dct_w[key]
-            except KeyError:
-                w_old = None
+            w_old = self.dct_w.lookup(key)
             if isinstance(w_old, W_Reference):   # and is not None
                 w_old.store(w_value, unique_item)
                 return self
         # Else update the 'dct_w'.
-        if self._keylist is not None and key not in self.dct_w:
-            self._keylist_changed()
-        self.dct_w[key] = w_value
+        self._prepare_write()
+        dct_w = self.dct_w
+        slot = dct_w.slot_of(key)
+        if slot >= 0:
+            dct_w.values_w[slot] = w_value
+        else:
+            dct_w.append(key, w_value)
         # Blah
         try:
             i = try_convert_str_to_int(key)
@@ -723,40 +1098,28 @@ class W_RDictArrayObject(W_ArrayObject):
         return self._unsetitem_str(str(index))
 
     def _unsetitem_str(self, key):
-        if key not in self.dct_w:
+        if not self.dct_w.contains(key):
             return self
-        # XXX slow hacks to know if we must decrement current_idx or not:
-        # this is if and only if the removed item is before current_idx.
-        current_idx = self.current_idx
-        if current_idx > 0:
-            keylist = self._getkeylist()
-            length = len(self.dct_w)
-            if current_idx <= length // 2:
-                # look on the left of current_idx
-                for i in range(current_idx):
-                    if keylist[i] == key:
-                        # found: decrement current_idx
-                        self.current_idx = current_idx - 1
-                        break
-            else:
-                # look on the right of current_idx
-                for i in range(current_idx, length):
-                    if keylist[i] == key:
-                        # found: don't decrement current_idx
-                        break
-                else:
-                    # not found: decrement current_idx
-                    self.current_idx = current_idx - 1
-        #
-        del self.dct_w[key]
-        self._keylist_changed()
+        self._prepare_write()
+        self.dct_w.delitem(key)
+        self._items_removed()
         return self
 
+    def _items_removed(self):
+        dct_w = self.dct_w
+        if dct_w.needs_compaction():
+            new_dct_w = dct_w.compacted()
+            self.current_idx = dct_w.remap_slot(self.current_idx, new_dct_w)
+            self.dct_w = new_dct_w
+        elif self.current_idx > dct_w.end():
+            # pop_last() dropped the tombstones at the end
+            self.current_idx = dct_w.end()
+
     def _isset_int(self, index):
         return self._isset_str(str(index))
 
     def _isset_str(self, key):
-        return key in self.dct_w
+        return self.dct_w.contains(key)
 
     def create_iter(self, space, contextclass=None):
         from hippy.objects.arrayiter import RDictArrayIterator
@@ -766,17 +1129,334 @@ class W_RDictArrayObject(W_ArrayObject):
         from hippy.objects.arrayiter import RDictArrayIteratorRef
         return RDictArrayIteratorRef(space, r_self)
 
-    def copy(self):
-        return self.as_unique_arraydict()
+    def _shared_copy(self, cow):
+        w_copy = W_RDictArrayObject(self.space, self.dct_w,
+                                    next_idx=self.next_idx,
+                                    current_idx=self.current_idx)
+        w_copy._cow = cow
+        return w_copy
+
+    def _copy_storage(self):
+        self.dct_w = self.dct_w.copy()
 
     def _inplace_pop(self, space):
-        key, w_value = self.dct_w.popitem()
-        self._keylist_changed()
+        self._prepare_write()
+        key, w_value = self.dct_w.pop_last()
         if key == str(self.next_idx - 1):
             self.next_idx -= 1
         self.current_idx = 0
         return w_value
 
+    def _shift_maybe_inplace(self, space):
+        self._prepare_write()
+        dct_w = self.dct_w
+        slot = dct_w.live_slot(0)
+        w_value = dct_w.values_w[slot]
+        dct_w.delitem(dct_w.keys_list[slot])
+        self.current_idx = 0
+        if self.next_idx > 0:
+            # there may be integer keys, which must be renumbered
+            return self._renumbered(), w_value
+        self._items_removed()
+        return self, w_value
+
+    def _renumbered(self):
+        """The array with its integer keys renumbered from 0, as a list if
+        all its keys are integers"""
+        old_dct_w = self.dct_w
+        dct_w = StrOrderedHash()
+        lst_w = []
+        next_idx = 0
+        for slot in range(old_dct_w.first, old_dct_w.end()):
+            w_value = old_dct_w.values_w[slot]
+            if w_value is None:
+                continue
+            key = old_dct_w.keys_list[slot]
+            try:
+                try_convert_str_to_int(key)
+            except ValueError:
+                lst_w = None
+            else:
+                key = str(next_idx)
+                next_idx += 1
+                if lst_w is not None:
+                    lst_w.append(w_value)
+            dct_w.append(key, w_value)
+        if lst_w is not None:
+            return W_ListArrayObject.from_list(self.space, lst_w)
+        self.dct_w = dct_w
+        self.next_idx = next_idx
+        return self
+
+    def _values(self, space):
+        return self.dct_w.values()
+
+    def var_export(self, space, indent, recursion, suffix):
+        return array_var_export(self.as_rdict(), space, indent, recursion,
+                                self, suffix)
+
+
+class IntDictItemVRef(VirtualReference):
+    def __init__(self, w_array, index):
+        self.w_array = w_array
+        self.index = index
+
+    def deref(self):
+        return self.w_array.dct_w.lookup(self.index)
+
+    def store(self, w_value, unique=False):
+        self.w_array._prepare_write()
+        self.w_array.dct_w.setitem(self.index, w_value)
+
+
+class W_IntDictArrayObject(W_ArrayObject):
+    """A hash whose keys are all integers, e.g. a sparse array or a list
+    with holes.  The keys are stored as ints, so that accessing it does
+    not need to go through str(index) and back.  Setting a key that is
+    a non-numeric string turns it into a W_RDictArrayObject.  As there,
+    'current_idx' is a slot of the IntOrderedHash 'dct_w'.
+    """
+    _has_string_keys = False
+    strategy_name = 'int_hash'
+
+    def __init__(self, space, dct_w, next_idx, current_idx=0):
+        if not we_are_translated():
+            assert isinstance(dct_w, IntOrderedHash)
+        self.space = space
+        self.dct_w = dct_w
+        self.next_idx = next_idx
+        self.current_idx = current_idx
+
+    def as_rdict(self):
+        new_dict = new_rdict()
+        dct_w = self.dct_w
+        for slot in range(dct_w.first, dct_w.end()):
+            w_value = dct_w.values_w[slot]
+            if w_value is not None:
+                new_dict[str(dct_w.keys_list[slot])] = w_value.copy_item()
+        return new_dict
+
+    def get_rdict_from_array(self):
+        new_dict = new_rdict()
+        dct_w = self.dct_w
+        for slot in range(dct_w.first, dct_w.end()):
+            w_value = dct_w.values_w[slot]
+            if w_value is not None:
+                new_dict[str(dct_w.keys_list[slot])] = w_value
+        return new_dict
+
+    def as_unique_arrayintdict(self):
+        self._note_making_a_copy()
+        return W_IntDictArrayObject(self.space, self.dct_w.copy(),
+                                    next_idx=self.next_idx,
+                                    current_idx=self.current_idx)
+
+    def as_unique_arraydict(self):
+        self._note_making_a_copy()
+        old_dct_w = self.dct_w
+        dct_w = StrOrderedHash()
+        for slot in range(old_dct_w.first, old_dct_w.end()):
+            w_value = old_dct_w.values_w[slot]
+            if w_value is not None:
+                dct_w.append(str(old_dct_w.keys_list[slot]),
+                             w_value.copy_item())
+        # the new hash has no tombstone: its slots are positions
+        return W_RDictArrayObject(self.space, dct_w,
+                                  next_idx=self.next_idx,
+                                  current_idx=old_dct_w.rank(self.current_idx))
+
+    def as_list_w(self):
+        return self.dct_w.values()
+
+    def as_pair_list(self, space):
+        result = []
+        dct_w = self.dct_w
+        for slot in range(dct_w.first, dct_w.end()):
+            w_value = dct_w.values_w[slot]
+            if w_value is not None:
+                result.append((space.newint(dct_w.keys_list[slot]), w_value))
+        return result
+
+    def _getkeylist(self):
+        "NOT_RPYTHON: for tests only"
+        return self.dct_w.keys()
+
+    def _current_slot(self):
+        # move the internal pointer past the removed items
+        slot = self.dct_w.live_slot(self.current_idx)
+        self.current_idx = slot
+        return slot
+
+    def _current(self):
+        slot = self._current_slot()
+        if slot < self.dct_w.end():
+            return self.dct_w.values_w[slot]
+        else:
+            return w_False
+
+    def _key(self, space):
+        slot = self._current_slot()
+        if slot < self.dct_w.end():
+            return space.newint(self.dct_w.keys_list[slot])
+        else:
+            return space.w_Null
+
+    def next(self, space):
+        dct_w = self.dct_w
+        slot = self._current_slot()
+        if slot < dct_w.end():
+            slot = dct_w.live_slot(slot + 1)
+            self.current_idx = slot
+        if slot >= dct_w.end():
+            return w_False
+        return dct_w.values_w[slot]
+
+    def prev(self, space):
+        dct_w = self.dct_w
+        slot = dct_w.prev_live_slot(self.current_idx)
+        if slot < 0:
+            return w_False
+        self.current_idx = slot
+        return dct_w.values_w[slot]
+
+    def end(self, space):
+        dct_w = self.dct_w
+        if dct_w.length() == 0:
+            return w_False
+        self.current_idx = dct_w.last_slot()
+        return dct_w.values_w[self.current_idx]
+
+    def arraylen(self):
+        return self.dct_w.length()
+
+    def _getitem_int(self, index):
+        res = self.dct_w.lookup(index)
+        if res is None:
+            return None
+        if isinstance(res, W_Reference):
+            return res
+        else:
+            return IntDictItemVRef(self, index)
+
+    def _getitem_str(self, key):
+        try:
+            i = try_convert_str_to_int(key)
+        except ValueError:
+            return None
+        return self._getitem_int(i)
+
+    def _appenditem(self, w_obj, as_ref=False):
+        res = self._setitem_int(self.next_idx, w_obj, as_ref)
+        assert res is self
+
+    def _setitem_int(self, index, w_value, as_ref, unique_item=False):
+        # If overwriting an existing W_Reference object, we only update
+        # the value in the reference and return 'self'.
+        if not as_ref:
+            w_old = self.dct_w.lookup(index)
+            if isinstance(w_old, W_Reference):   # and is not None
+                w_old.store(w_value, unique_item)
+                return self
+        # Else update the 'dct_w'.
+        self._prepare_write()
+        dct_w = self.dct_w
+        slot = dct_w.slot_of(index)
+        if slot >= 0:
+            dct_w.values_w[slot] = w_value
+        else:
+            dct_w.append(index, w_value)
+        if self.next_idx <= index:
+            self.next_idx = index + 1
+        return self
+
+    def _setitem_str(self, key, w_value, as_ref, unique_item=False):
+        try:
+            i = try_convert_str_to_int(key)
+        except ValueError:
+            res = self.as_unique_arraydict()
+            return res._setitem_str(key, w_value, False)
+        else:
+            return self._setitem_int(i, w_value, as_ref, unique_item)
+
+    def _unsetitem_int(self, index):
+        if not self.dct_w.contains(index):
+            return self
+        self._prepare_write()
+        self.dct_w.delitem(index)
+        self._items_removed()
+        return self
+
+    def _items_removed(self):
+        dct_w = self.dct_w
+        if dct_w.needs_compaction():
+            new_dct_w = dct_w.compacted()
+            self.current_idx = dct_w.remap_slot(self.current_idx, new_dct_w)
+            self.dct_w = new_dct_w
+        elif self.current_idx > dct_w.end():
+            # pop_last() dropped the tombstones at the end
+            self.current_idx = dct_w.end()
+
+    def _unsetitem_str(self, key):
+        try:
+            i = try_convert_str_to_int(key)
+        except ValueError:
+            return self     # str key, so not in the array at all
+        else:
+            return self._unsetitem_int(i)
+
+    def _isset_int(self, index):
+        return self.dct_w.contains(index)
+
+    def _isset_str(self, key):
+        try:
+            i = try_convert_str_to_int(key)
+        except ValueError:
+            return False
+        else:
+            return self.dct_w.contains(i)
+
+    def create_iter(self, space, contextclass=None):
+        from hippy.objects.arrayiter import IntDictArrayIterator
+        return IntDictArrayIterator(self)
+
+    def create_iter_ref(self, space, r_self, contextclass=None):
+        from hippy.objects.arrayiter import IntDictArrayIteratorRef
+        return IntDictArrayIteratorRef(space, r_self)
+
+    def _shared_copy(self, cow):
+        w_copy = W_IntDictArrayObject(self.space, self.dct_w,
+                                      next_idx=self.next_idx,
+                                      current_idx=self.current_idx)
+        w_copy._cow = cow
+        return w_copy
+
+    def _copy_storage(self):
+        self.dct_w = self.dct_w.copy()
+
+    def _inplace_pop(self, space):
+        self._prepare_write()
+        key, w_value = self.dct_w.pop_last()
+        if key == self.next_idx - 1:
+            self.next_idx -= 1
+        self.current_idx = 0
+        return w_value
+
+    def _shift_maybe_inplace(self, space):
+        # all the keys are renumbered, so what is left is a list
+        dct_w = self.dct_w
+        lst_w = []
+        w_first = None
+        for slot in range(dct_w.first, dct_w.end()):
+            w_value = dct_w.values_w[slot]
+            if w_value is None:
+                continue
+            if w_first is None:
+                w_first = w_value
+            else:
+                lst_w.append(w_value)
+        assert w_first is not None
+        return W_ListArrayObject.from_list(self.space, lst_w), w_first
+
     def _values(self, space):
         return self.dct_w.values()
 
@@ -844,7 +1524,8 @@ class W_RCellDictArrayObject(W_ArrayObject):
 
     def as_unique_arraydict(self):
         self._note_making_a_copy()
-        return W_RDictArrayObject(self.space, self.as_rdict(),
+        return W_RDictArrayObject(self.space,
+                                  StrOrderedHash.from_rdict(self.as_rdict()),
                                   next_idx=self.next_idx,
                                   current_idx=self.current_idx)
 
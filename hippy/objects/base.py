@@ -23,6 +23,12 @@ class W_Root(object):
         """Evaluate for use as a default value"""
         raise TypeError("This object cannot be used as a default value")
 
+    def ll_serialize(self, builder):
+        """Low-level serialization used for the bytecode constant pool"""
+        from hippy.bytecode import SerializerException
+        raise SerializerException("cannot serialize %s" %
+                                  self.__class__.__name__)
+
     def _note_making_a_copy(self):
         pass       # for test_refcount
 
@@ -57,6 +57,9 @@ class W_BoolObject(W_Object):
         builder.append(["b:0;", "b:1;"][self.boolval])
         return True
 
+    def ll_serialize(self, builder):
+        builder.append(["F", "T"][self.boolval])
+
     def uplusplus(self, space):
         return self
 
@@ -1,8 +1,9 @@
 import sys
 from hippy.objects.base import W_Object
-from hippy.objects.support import _new_binop
+from hippy.objects.support import _new_binop, ll_pack_long
 from hippy.consts import BINOP_LIST, BINOP_COMPARISON_LIST
 from rpython.rlib.rarithmetic import intmask, ovfcheck
+from rpython.rlib.longlong2float import float2longlong
 from rpython.rlib.rfloat import isnan, isinf, double_to_string, DTSF_CUT_EXP_0
 
 
@@ -140,6 +141,10 @@ class W_FloatObject(W_Object):
         builder.append(";")
         return True
 
+    def ll_serialize(self, builder):
+        builder.append("d")
+        ll_pack_long(builder, intmask(float2longlong(self.floatval)))
+
 
 for _name in BINOP_LIST:
     if hasattr(W_FloatObject, _name):
@@ -1,6 +1,5 @@
-import struct
-
 from hippy.objects.base import W_Object
+from hippy.objects.support import ll_pack_long
 from rpython.rlib import jit
 
 
@@ -12,12 +11,12 @@ class W_StrInterpolation(W_Object):
 
     def ll_serialize(self, builder):
         builder.append("p")
-        builder.append(struct.pack("l", len(self.strings)))
+        ll_pack_long(builder, len(self.strings))
         for string in self.strings:
             if string is None:
-                builder.append(struct.pack("l", -1))
+                ll_pack_long(builder, -1)
             else:
-                builder.append(struct.pack("l", len(string)))
+                ll_pack_long(builder, len(string))
                 builder.append(string)
 
     @jit.unroll_safe
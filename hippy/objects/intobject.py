@@ -1,8 +1,8 @@
-import sys, struct
+import sys
 from rpython.rlib import jit
 from rpython.rlib.rarithmetic import ovfcheck, intmask
 from hippy.objects.base import W_Object
-from hippy.objects.support import _new_binop
+from hippy.objects.support import _new_binop, ll_pack_long
 from hippy.consts import BINOP_LIST, BINOP_COMPARISON_LIST
 
 SYS_MAXINT_PLUS_1 = float(sys.maxint+1)
@@ -162,7 +162,7 @@ class W_IntObject(W_Object):
 
     def ll_serialize(self, builder):
         builder.append("i")
-        builder.append(struct.pack("l", self.intval))
+        ll_pack_long(builder, self.intval)
 
     def eval_static(self, space):
         return self
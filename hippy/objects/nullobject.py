@@ -44,4 +44,7 @@ class W_NullObject(W_Object):
         builder.append("N;")
         return True
 
+    def ll_serialize(self, builder):
+        builder.append("N")
+
 w_Null = W_NullObject()
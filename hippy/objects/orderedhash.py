@@ -0,0 +1,226 @@
+""" The ordered hash tables behind W_RDictArrayObject (string keys) and
+W_IntDictArrayObject (int keys).
+
+Every entry stays in the slot where it was inserted: 'keys_list' and
+'values_w' are indexed by slot, and 'index' maps a key to its slot.  Deleting an entry
+only leaves a tombstone in its slot, a None value, so it is O(1) and the
+other entries don't move: the internal pointer of an array can be kept as
+a slot, and so can the position of an iterator.  A slot is never reused
+for another entry, except by pop_last().  The tombstones at the start are
+skipped thanks to 'first', and they are all squeezed out by compacted()
+when they outnumber the live entries.  compacted() returns a new table and links
+the old one to it: whoever holds a slot of the old one finds its place
+in the current one with remap_slot().
+"""
+
+# don't bother compacting fewer tombstones than that
+MIN_TOMBSTONES = 16
+
+
+def make_ordered_hash(name, null_key):
+    class OrderedHash(object):
+        def __init__(self):
+            self.index = {}       # key -> slot
+            self.keys_list = []   # slot -> key, or 'null_key'
+            self.values_w = []    # slot -> value, or None for a tombstone
+            self.first = 0        # all the slots before it are tombstones
+            # the table compacted() made out of this one
+            self.successor = None
+
+        @staticmethod
+        def from_rdict(dct_w):
+            storage = OrderedHash()
+            for key, w_value in dct_w.iteritems():
+                storage.append(key, w_value)
+            return storage
+
+        def length(self):
+            return len(self.index)
+
+        def end(self):
+            """One past the last slot in use"""
+            return len(self.keys_list)
+
+        def slot_of(self, key):
+            return self.index.get(key, -1)
+
+        def lookup(self, key):
+            slot = self.index.get(key, -1)
+            if slot < 0:
+                return None
+            return self.values_w[slot]
+
+        def contains(self, key):
+            return key in self.index
+
+        def setitem(self, key, w_value):
+            slot = self.index.get(key, -1)
+            if slot >= 0:
+                self.values_w[slot] = w_value
+            else:
+                self.append(key, w_value)
+
+        def append(self, key, w_value):
+            """Add an entry for a 'key' which is not in the table"""
+            self.index[key] = len(self.keys_list)
+            self.keys_list.append(key)
+            self.values_w.append(w_value)
+
+        def delitem(self, key):
+            """Remove 'key' and return the slot it had, or -1"""
+            slot = self.index.get(key, -1)
+            if slot < 0:
+                return -1
+            del self.index[key]
+            self.keys_list[slot] = null_key
+            self.values_w[slot] = None
+            if slot == self.first:
+                self.first = self.live_slot(slot + 1)
+            return slot
+
+        def last_slot(self):
+            """The slot of the last entry, or -1"""
+            return self.prev_live_slot(len(self.keys_list))
+
+        def pop_last(self):
+            """Remove the last entry, which must exist, and return it.  The
+            tombstones after the entries left are dropped."""
+            slot = self.last_slot()
+            assert slot >= 0
+            key = self.keys_list[slot]
+            w_value = self.values_w[slot]
+            del self.index[key]
+            self.keys_list[slot] = null_key
+            self.values_w[slot] = None
+            self._trim()
+            return key, w_value
+
+        def _trim(self):
+            end = len(self.keys_list)
+            while end > self.first and self.values_w[end - 1] is None:
+                end -= 1
+            if end == self.first:
+                # nothing is left
+                end = 0
+                self.first = 0
+            del self.keys_list[end:]
+            del self.values_w[end:]
+
+        def live_slot(self, slot):
+            """The first live slot at or after 'slot', or end()"""
+            if slot < self.first:
+                slot = self.first
+            end = len(self.keys_list)
+            while slot < end and self.values_w[slot] is None:
+                slot += 1
+            return slot
+
+        def prev_live_slot(self, slot):
+            """The last live slot before 'slot', or -1"""
+            slot = min(slot, len(self.keys_list)) - 1
+            while slot >= self.first and self.values_w[slot] is None:
+                slot -= 1
+            if slot < self.first:
+                return -1
+            return slot
+
+        def rank(self, slot):
+            """The number of live entries before 'slot'"""
+            count = 0
+            for i in range(self.first, min(slot, len(self.keys_list))):
+                if self.values_w[i] is not None:
+                    count += 1
+            return count
+
+        def needs_compaction(self):
+            tombstones = len(self.keys_list) - len(self.index)
+            return (tombstones > MIN_TOMBSTONES and
+                    tombstones > len(self.index))
+
+        def compacted(self):
+            """A new table with the same entries and no tombstone.  This
+            table must not be modified any more."""
+            storage = OrderedHash()
+            for i in range(self.first, len(self.keys_list)):
+                w_value = self.values_w[i]
+                if w_value is not None:
+                    storage.append(self.keys_list[i], w_value)
+            self.successor = storage
+            return storage
+
+        def remap_slot(self, slot, other):
+            """The slot in 'other' of the first entry at or after 'slot'.
+            Following the compacted() tables is exact; otherwise it is the
+            first entry which is still in 'other'."""
+            table = self
+            while table is not other and table.successor is not None:
+                # the entries kept their order and lost their tombstones
+                slot = table.rank(table.live_slot(slot))
+                table = table.successor
+            if table is other:
+                return slot
+            return table._remap_by_key(slot, other)
+
+        def _remap_by_key(self, slot, other):
+            end = len(self.keys_list)
+            slot = self.live_slot(slot)
+            while slot < end:
+                if self.values_w[slot] is not None:
+                    other_slot = other.slot_of(self.keys_list[slot])
+                    if other_slot >= 0:
+                        return other_slot
+                slot += 1
+            # all gone: a copy() has the same slots, and the entries after
+            # them were added since
+            return min(end, other.end())
+
+        def copy(self):
+            """A copy with the same slots, whose values are copy_item()'d"""
+            storage = OrderedHash()
+            storage.index = self.index.copy()
+            storage.keys_list = self.keys_list[:]
+            values_w = self.values_w[:]
+            for i in range(self.first, len(values_w)):
+                w_value = values_w[i]
+                if w_value is not None:
+                    values_w[i] = w_value.copy_item()
+            storage.values_w = values_w
+            storage.first = self.first
+            return storage
+
+        def keys(self):
+            return [self.keys_list[i]
+                    for i in range(self.first, len(self.keys_list))
+                    if self.values_w[i] is not None]
+
+        def values(self):
+            return [w_value
+                    for w_value in self.values_w
+                    if w_value is not None]
+
+        def items(self):
+            return [(self.keys_list[i], self.values_w[i])
+                    for i in range(self.first, len(self.keys_list))
+                    if self.values_w[i] is not None]
+
+        def iteritems(self):
+            "NOT_RPYTHON: for tests only"
+            return iter(self.items())
+
+        def __len__(self):
+            "NOT_RPYTHON: for tests only"
+            return self.length()
+
+        def __getitem__(self, key):
+            "NOT_RPYTHON: for tests only"
+            w_value = self.lookup(key)
+            if w_value is None:
+                raise KeyError(key)
+            return w_value
+
+    OrderedHash.__name__ = name
+    return OrderedHash
+
+
+StrOrderedHash = make_ordered_hash('StrOrderedHash', '')
+IntOrderedHash = make_ordered_hash('IntOrderedHash', 0)
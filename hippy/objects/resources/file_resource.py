@@ -110,7 +110,13 @@ class W_FileResource(W_Resource):
                                             line_break, last_end=False)
         return data
 
+    def _flush_before_read(self):
+        if self.filename == 'php://stdin':
+            # a prompt has to be visible before waiting for the answer
+            self.space.ec.interpreter.flush_stdout()
+
     def read(self, size=1024):
+        self._flush_before_read()
         data = self.resource.read(size)
         assert data is not None
         data = self.do_filter(data, READ)
@@ -118,19 +124,34 @@ class W_FileResource(W_Resource):
             self.eof = True
         return data
 
+    def is_std_stream(self):
+        return (self.filename == 'php://stdout' or
+                self.filename == 'php://output' or
+                self.filename == 'php://stderr')
+
+    def _write(self, data):
+        if self.is_std_stream():
+            # keep the order with the output of echo, which the
+            # interpreter collects before writing it
+            self.space.ec.interpreter.flush_stdout()
+            self.resource.write(data)
+            self.resource.flush()
+        else:
+            self.resource.write(data)
+
     @enforceargs(None, str, int)
     def write(self, data, length):
         if length <= 0:
             return 0
         towrite = self.do_filter(data[:length], WRITE)
-        self.resource.write(towrite)
+        self._write(towrite)
         self.cur_line_no += towrite.count(os.linesep)
         return min(length, len(data))
 
     @enforceargs(None, str)
     def writeall(self, data):
         towrite = self.do_filter(data, WRITE)
-        self.resource.write(towrite)
+        self._write(towrite)
         return len(data)
 
     def passthru(self):
@@ -154,6 +175,7 @@ class W_FileResource(W_Resource):
         return self.resource.tell()
 
     def readline(self, drop_nl=False):
+        self._flush_before_read()
         data = self.resource.readline()
         to_add = 0
         if self.cur_line:
@@ -1,9 +1,8 @@
-import struct
-
 from rpython.rlib.objectmodel import compute_hash
 from rpython.rlib.rstring import StringBuilder, replace
 from hippy.objects.base import W_Object
 from hippy.objects.reference import VirtualReference
+from hippy.objects.support import ll_pack_long
 from hippy.objects.convert import convert_string_to_number, strtol
 from hippy.error import ConvertError, OffsetError
 
@@ -39,7 +38,6 @@ class W_StringObject(W_Object):
         return W_ConstStringObject(s)
 
     def hash(self, space):
-        # XXX improve
         return compute_hash(self.unwrap())
 
     def as_string(self, space, quiet=False):
@@ -262,7 +260,7 @@ class StringMixin(object):
 
     def ll_serialize(self, builder):
         builder.append("s")
-        builder.append(struct.pack("l", self.strlen()))
+        ll_pack_long(builder, self.strlen())
         self.append_to_builder(builder)
 
     def is_true(self, space):
@@ -325,6 +323,10 @@ class W_ConstStringObject(StringMixin, W_StringObject):
     def unwrap(self):
         return self._strval
 
+    def hash(self, space):
+        # an RPython string computes its hash once and stores it
+        return compute_hash(self._strval)
+
     def append_to_builder(self, builder):
         builder.append(self._strval)
 
@@ -339,6 +341,22 @@ class W_ConstStringObject(StringMixin, W_StringObject):
         return self
 
 
+_interned_w = {}
+
+
+def interned_str(s):
+    """Return the W_ConstStringObject shared by all the literals 's' of the
+    program.  Its unwrap() is the same RPython string for all of them, so
+    dict lookups with literal keys find it by identity and with the hash
+    stored in the string."""
+    try:
+        return _interned_w[s]
+    except KeyError:
+        w_s = W_ConstStringObject(s)
+        _interned_w[s] = w_s
+        return w_s
+
+
 class W_MutableStringObject(StringMixin, W_StringObject):
 
     def __init__(self, val):
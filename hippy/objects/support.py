@@ -12,3 +12,11 @@ def _new_binop(cls, name, vfield, is_comparison):
         return cls(v)
     func.func_name = name
     return func
+
+
+def ll_pack_long(builder, value):
+    """Append 'value' to 'builder' in the same layout as struct.pack('l'),
+    which is what the bytecode Unserializer reads back with runpack().
+    Only little-endian 64-bit targets are supported."""
+    for i in range(8):
+        builder.append(chr((value >> (i * 8)) & 0xff))
@@ -17,7 +17,7 @@ from hippy.objects.nullobject import W_NullObject, w_Null
 from hippy.objects.intobject import W_IntObject
 from hippy.objects.floatobject import W_FloatObject
 from hippy.objects.strobject import W_StringObject, W_ConstStringObject
-from hippy.objects.arrayobject import W_ArrayObject
+from hippy.objects.arrayobject import W_ArrayObject, ArrayCopyStats
 from hippy.objects.resources.resource import W_Resource
 from hippy.objects.instanceobject import W_InstanceObject
 from hippy.objects.resources.file_resource import W_FileResource
@@ -25,8 +25,10 @@ from hippy.objects.resources.dir_resource import W_DirResource
 from hippy.objects.resources.stream_context import W_StreamContext
 from hippy.objects.convert import convert_string_to_number
 from hippy.module.regex.cache import RegexpCache
+from hippy.module.standard.strings.formatcache import FormatCache
 from hippy.builtin_klass import k_stdClass
 from hippy.bytecode_cache import BytecodeCache
+from hippy.pathcache import RealpathCache
 from hippy.constants import get_constants_by_module
 from hippy.immut_cache import GlobalImmutCache
 from hippy.builtin import BUILTIN_FUNCTIONS
@@ -128,8 +130,16 @@ class ObjSpace(object):
 
     def __init__(self):
         self.regex_cache = RegexpCache(self)
+        self.format_cache = FormatCache()
         self.ec = ExecutionContext(self)
         self.bytecode_cache = BytecodeCache()
+        self.realpath_cache = RealpathCache()
+        self.array_copy_stats = ArrayCopyStats()
+        # run hippy.astoptimizer on compiled files; see --no-ast-opt
+        self.optimize_ast = True
+        # emit the superinstructions of consts.SUPERINSTRUCTIONS; see
+        # --no-superinstructions
+        self.superinstructions = True
         self.setup_constants()
         self.setup_functions()
         self.setup_classes()
@@ -354,6 +364,15 @@ class ObjSpace(object):
     def new_array_from_list(self, lst_w):
         return W_ArrayObject.new_array_from_list(self, lst_w)
 
+    def new_array_from_ints(self, ints):
+        return W_ArrayObject.new_array_from_ints(self, ints)
+
+    def new_array_from_floats(self, floats):
+        return W_ArrayObject.new_array_from_floats(self, floats)
+
+    def new_array_from_range(self, start, step, length):
+        return W_ArrayObject.new_array_from_range(self, start, step, length)
+
     def new_array_from_rdict(self, rdict_w):
         return W_ArrayObject.new_array_from_rdict(self, rdict_w)
 
@@ -0,0 +1,149 @@
+""" The stdout writer of the interpreter.
+
+Without an ob_start() buffer, every echo used to be a write() of its own.
+StdoutWriter collects the output instead, and writes it when there is
+more than 'size' bytes of it (the 'hippy.output_write_size' ini setting,
+0 to write every piece at once), joined in a single write() or, when a
+large piece would have to be copied, with writev().
+
+The pending output has to be written before anything else can appear on
+the same terminal or socket, so Interpreter.flush_stdout() is called before
+the headers, before writing to stderr or to php://stdout and php://output,
+before reading php://stdin, before running a command, on flush() and
+ob_implicit_flush(), and at shutdown.
+"""
+
+import errno
+import os
+from rpython.rtyper.lltypesystem import lltype, rffi
+from rpython.rtyper.tool import rffi_platform as platform
+from rpython.translator.tool.cbuild import ExternalCompilationInfo
+
+DEFAULT_WRITE_SIZE = 8192
+# pieces at least that long are not copied into the batch, but written
+# together with it by writev()
+WRITEV_THRESHOLD = 4096
+
+eci = ExternalCompilationInfo(includes=['sys/types.h', 'sys/uio.h',
+                                        'limits.h'])
+
+
+class CConfig(object):
+    _compilation_info_ = eci
+
+    iovec = platform.Struct('struct iovec', [('iov_base', rffi.CCHARP),
+                                             ('iov_len', rffi.SIZE_T)])
+    IOV_MAX = platform.DefinedConstantInteger('IOV_MAX')
+
+config = platform.configure(CConfig)
+IOVEC = config['iovec']
+IOVECARRAY = rffi.CArray(IOVEC)
+IOV_MAX = config['IOV_MAX'] or 16
+
+c_writev = rffi.llexternal('writev',
+                           [rffi.INT, lltype.Ptr(IOVECARRAY), rffi.INT],
+                           rffi.SSIZE_T, compilation_info=eci,
+                           save_err=rffi.RFFI_SAVE_ERRNO)
+
+
+def writev(fd, chunks):
+    """ Write 'chunks' with a single writev(), return the number of bytes
+    written
+    """
+    count = len(chunks)
+    iov = lltype.malloc(IOVECARRAY, count, flavor='raw')
+    bufs = [lltype.nullptr(rffi.CCHARP.TO)] * count
+    flags = ['\x00'] * count
+    try:
+        for i in range(count):
+            bufs[i], flags[i] = rffi.get_nonmovingbuffer(chunks[i])
+            rffi.setintfield(iov[i], 'c_iov_len', len(chunks[i]))
+            iov[i].c_iov_base = bufs[i]
+        res = rffi.cast(lltype.Signed, c_writev(fd, iov, count))
+    finally:
+        for i in range(count):
+            if flags[i] != '\x00':
+                rffi.free_nonmovingbuffer(chunks[i], bufs[i], flags[i])
+        lltype.free(iov, flavor='raw')
+    if res < 0:
+        raise OSError(rffi.get_saved_errno(), "writev failed")
+    return res
+
+
+class StdoutWriter(object):
+    def __init__(self, fd=1, size=DEFAULT_WRITE_SIZE):
+        self.fd = fd
+        self.size = size
+        self.chunks = []
+        self.pending = 0
+        self.syscalls = 0
+        self.broken = False
+
+    def set_size(self, size):
+        self.flush()
+        if size < 0:
+            size = 0
+        self.size = size
+
+    def write(self, data):
+        if not data:
+            return
+        if self.size <= 0:
+            self._write([data])
+            return
+        if len(data) >= WRITEV_THRESHOLD:
+            self.chunks.append(data)
+            self.flush()
+            return
+        self.chunks.append(data)
+        self.pending += len(data)
+        if self.pending >= self.size:
+            self.flush()
+
+    def flush(self):
+        if not self.chunks:
+            return
+        chunks = self.chunks
+        self.chunks = []
+        self.pending = 0
+        self._write(chunks)
+
+    def _write(self, chunks):
+        if self.broken:
+            # like php, output to a closed pipe is silently dropped
+            return
+        try:
+            if len(chunks) == 1:
+                self._write_all(chunks[0])
+            elif len(chunks) > IOV_MAX or not self._has_large(chunks):
+                self._write_all(''.join(chunks))
+            else:
+                self._writev_all(chunks)
+        except OSError, e:
+            if e.errno != errno.EPIPE:
+                raise
+            self.broken = True
+
+    def _has_large(self, chunks):
+        for chunk in chunks:
+            if len(chunk) >= WRITEV_THRESHOLD:
+                return True
+        return False
+
+    def _write_all(self, data):
+        while data:
+            self.syscalls += 1
+            written = os.write(self.fd, data)
+            data = data[written:]
+
+    def _writev_all(self, chunks):
+        self.syscalls += 1
+        written = writev(self.fd, chunks)
+        # a short write: write the rest in the usual way
+        for i in range(len(chunks)):
+            chunk = chunks[i]
+            if written >= len(chunk):
+                written -= len(chunk)
+                continue
+            self._write_all(chunk[written:])
+            written = 0
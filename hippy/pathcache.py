@@ -0,0 +1,105 @@
+""" The realpath cache: what resolving include and require names asks of
+the file system, that is the absolute form of a path and whether it
+exists, remembered for 'realpath_cache_ttl' seconds.
+
+Like PHP's, the cache belongs to the process, not to a request, and its
+size is bounded by 'realpath_cache_size' bytes, counted as the length of
+the paths plus a fixed overhead per entry; a size of 0 disables it.  It
+is emptied by clearstatcache() and chdir().  Paths that don't exist are
+cached too, since probing the include_path mostly finds nothing.
+"""
+
+import os
+import stat
+import time
+from hippy.rpath import abspath
+
+DEFAULT_CACHE_SIZE = 16 * 1024    # as in PHP 5.4
+DEFAULT_CACHE_TTL = 120
+ENTRY_OVERHEAD = 64
+
+
+class PathEntry(object):
+    def __init__(self, path, abspath, exists, is_dir, expires):
+        self.path = path
+        self.abspath = abspath
+        self.exists = exists
+        self.is_dir = is_dir
+        self.expires = expires
+        self.size = ENTRY_OVERHEAD + len(path) + len(abspath)
+
+
+class RealpathCache(object):
+    def __init__(self, size_limit=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self._entries = {}
+        self.size_limit = size_limit
+        self.ttl = ttl
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, size_limit, ttl):
+        self.size_limit = size_limit
+        self.ttl = ttl
+        if self.used > size_limit:
+            self.clear()
+
+    def clear(self):
+        self._entries.clear()
+        self.used = 0
+
+    def forget(self, path):
+        try:
+            entry = self._entries[path]
+        except KeyError:
+            return
+        del self._entries[path]
+        self.used -= entry.size
+
+    def count(self):
+        return len(self._entries)
+
+    def entries(self):
+        return self._entries.values()
+
+    def _purge_expired(self, now):
+        for entry in self._entries.values():
+            if entry.expires <= now:
+                self.forget(entry.path)
+
+    def lookup(self, path):
+        """ The PathEntry of 'path', from the cache or from the file
+        system """
+        now = time.time()
+        try:
+            entry = self._entries[path]
+        except KeyError:
+            pass
+        else:
+            if entry.expires > now:
+                self.hits += 1
+                return entry
+            self.forget(path)
+        self.misses += 1
+        try:
+            st = os.stat(path)
+        except OSError:
+            exists = False
+            is_dir = False
+        else:
+            exists = True
+            is_dir = stat.S_ISDIR(st.st_mode)
+        entry = PathEntry(path, abspath(path), exists, is_dir,
+                          now + self.ttl)
+        if self.used + entry.size > self.size_limit:
+            self._purge_expired(now)
+        if self.used + entry.size <= self.size_limit:
+            self._entries[path] = entry
+            self.used += entry.size
+        return entry
+
+    def exists(self, path):
+        return self.lookup(path).exists
+
+    def abspath(self, path):
+        return self.lookup(path).abspath
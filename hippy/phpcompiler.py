@@ -1,6 +1,7 @@
 from rply.token import SourcePosition
 from hippy.sourceparser import SourceParser, LexerWrapper, ParseError, get_lexer
 from hippy.astcompiler import compile_ast
+from hippy.astoptimizer import optimize_ast
 
 from rpython.rlib.objectmodel import we_are_translated
 
@@ -148,5 +149,8 @@ def compile_php(filename, source, space, interp=None):
         phplexerwrapper = iter(lst + [None])
     parser = SourceParser(space, None, filename=filename)
     tokens = parser.parser.parse(phplexerwrapper, state=parser)
-    bc = compile_ast(filename, source, tokens, space)
+    if space.optimize_ast:
+        tokens = optimize_ast(space, tokens)
+    bc = compile_ast(filename, source, tokens, space,
+                     superinstructions=space.superinstructions)
     return bc
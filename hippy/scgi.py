@@ -0,0 +1,87 @@
+""" The SCGI protocol (http://python.ca/scgi/protocol.txt), as spoken by
+the request workers of 'hippy --workers'.
+
+A request starts with its headers as a netstring,
+
+    <length>:CONTENT_LENGTH<NUL>27<NUL>SCRIPT_FILENAME<NUL>/a.php<NUL>...,
+
+followed by CONTENT_LENGTH bytes of body.  The response is the output
+of the script as a CGI script would produce it, headers included.
+"""
+
+import os
+
+MAX_HEADERS_SIZE = 1024 * 1024
+
+
+class ScgiError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+
+def parse_scgi_headers(data):
+    """ Turn the content of the header netstring into a dict """
+    items = data.split('\0')
+    # every name and value is followed by a NUL, so the last item is empty
+    if len(items) % 2 != 1 or items[-1] != '':
+        raise ScgiError("Malformed headers")
+    params = {}
+    for i in range(0, len(items) - 1, 2):
+        if not items[i]:
+            raise ScgiError("Empty header name")
+        params[items[i]] = items[i + 1]
+    if 'CONTENT_LENGTH' not in params:
+        raise ScgiError("Missing CONTENT_LENGTH")
+    return params
+
+
+def read_exactly(fd, n):
+    chunks = []
+    while n > 0:
+        data = os.read(fd, n)
+        if not data:
+            raise ScgiError("Connection closed")
+        chunks.append(data)
+        n -= len(data)
+    return ''.join(chunks)
+
+
+def read_scgi_request(fd):
+    """ Read the headers of a request from 'fd', leaving the body unread,
+    so that the script can stream it from there
+    """
+    digits = []
+    while True:
+        c = os.read(fd, 1)
+        if not c:
+            raise ScgiError("Connection closed")
+        if c == ':':
+            break
+        if not '0' <= c <= '9' or len(digits) > 8:
+            raise ScgiError("Malformed netstring length")
+        digits.append(c)
+    if not digits:
+        raise ScgiError("Malformed netstring length")
+    length = int(''.join(digits))
+    if length > MAX_HEADERS_SIZE:
+        raise ScgiError("Headers too large")
+    data = read_exactly(fd, length + 1)
+    if data[length] != ',':
+        raise ScgiError("Malformed netstring")
+    return parse_scgi_headers(data[:length])
+
+
+def write_all(fd, data):
+    while data:
+        written = os.write(fd, data)
+        data = data[written:]
+
+
+def encode_scgi_request(params, body=''):
+    """ NOT_RPYTHON: build a request, for tests and benchmarks """
+    items = ['CONTENT_LENGTH', str(len(body))]
+    for key, value in sorted(params.items()):
+        if key != 'CONTENT_LENGTH':
+            items.extend([key, value])
+    headers = ''.join([item + '\0' for item in items])
+    return '%d:%s,%s' % (len(headers), headers, body)
@@ -1,8 +1,13 @@
 from rpython.rlib.listsort import make_timsort_class
+from rpython.rlib.rfloat import isnan
 from rpython.rlib.objectmodel import specialize
 from rpython.rlib.unroll import unrolling_iterable
 from hippy.module.standard.strings.funcs import _strnatcmp
-from hippy.localemodule import strcoll_u
+from hippy.localemodule import strcoll_u, strxfrm_u
+from hippy.objects.arrayobject import W_ListArrayObject
+from hippy.objects.convert import convert_string_to_number
+from hippy.objects.floatobject import W_FloatObject
+from hippy.objects.intobject import W_IntObject
 
 NONE, KEY, VALUE = range(3)
 
@@ -38,6 +43,16 @@ def _get_key_func(sort_type):
 def default_cmp(space, w_a, w_b):
     return space._compare(w_a, w_b)
 
+def string_cmp(space, w_a, w_b):
+    # like strcmp(), even when both strings are numeric
+    a = space.str_w(w_a)
+    b = space.str_w(w_b)
+    if a < b:
+        return -1
+    elif a > b:
+        return 1
+    return 0
+
 def natcmp(space, w_a, w_b):
     return _strnatcmp(space.str_w(w_a), space.str_w(w_b))
 
@@ -47,7 +62,7 @@ def locale_cmp(space, w_a, w_b):
 cmp_funcs = {
     SORT_REGULAR: default_cmp, SORT_REGULAR | SORT_FLAG_CASE: default_cmp,
     SORT_NUMERIC: default_cmp, SORT_NUMERIC | SORT_FLAG_CASE: default_cmp,
-    SORT_STRING: default_cmp, SORT_STRING | SORT_FLAG_CASE: default_cmp,
+    SORT_STRING: string_cmp, SORT_STRING | SORT_FLAG_CASE: string_cmp,
     SORT_LOCALE_STRING: locale_cmp, SORT_LOCALE_STRING | SORT_FLAG_CASE: locale_cmp,
     SORT_NATURAL: natcmp, SORT_NATURAL | SORT_FLAG_CASE: natcmp,
 }
@@ -132,6 +147,8 @@ def _sort(space, values, cmp=None, sort_type=0, elem=NONE, reverse=False):
     if sort_type not in SUPPORTED_SORT_TYPES:
         space.ec.hippy_warn("unknown sort type")
         sort_type = 0
+    if cmp is None and _sort_by_keys(space, values, sort_type, elem, reverse):
+        return
     for type in all_sort_types:
         if sort_type == type:
             if cmp is None:
@@ -145,6 +162,215 @@ def _sort(space, values, cmp=None, sort_type=0, elem=NONE, reverse=False):
     raise Exception("unreachable code")
 
 
+IntSort = make_timsort_class()
+FloatSort = make_timsort_class()
+
+
+def sort_unboxed(space, w_arr, sort_type=0, reverse=False):
+    """ Sort a list of unboxed ints or floats (see W_ListArrayObject)
+    without wrapping its items.  Return the sorted array, or None if
+    'w_arr' is not such a list or if 'sort_type' does not compare the
+    items as numbers.
+    """
+    if not isinstance(w_arr, W_ListArrayObject):
+        return None
+    if sort_type & ~SORT_FLAG_CASE not in (SORT_REGULAR, SORT_NUMERIC):
+        return None
+    w_arr._materialize_range()
+    w_arr._compact_shifted()
+    if w_arr.ints is not None:
+        ints = w_arr.ints[:]
+        IntSort(ints).sort()
+        if reverse:
+            ints.reverse()
+        return space.new_array_from_ints(ints)
+    if w_arr.floats is not None:
+        floats = w_arr.floats[:]
+        for f in floats:
+            if isnan(f):
+                return None     # php's order, if any, is not '<'
+        FloatSort(floats).sort()
+        if reverse:
+            floats.reverse()
+        return space.new_array_from_floats(floats)
+    return None
+
+
+# Sorting on unwrapped keys: when all the items compare in the same way,
+# for example because they are all ints, or all strings of which at most
+# one is numeric, _sort() computes the key of each item once, sorts the
+# indices of the items by key with a direct comparison, and then puts the
+# items in that order.
+
+def _make_key_sort(key_lt):
+    KeyTimSort = make_timsort_class()
+
+    class KeySort(KeyTimSort):
+        def __init__(self, order, keys, reverse):
+            KeyTimSort.__init__(self, order)
+            self.keys = keys
+            self.reverse = reverse
+
+        def lt(self, a, b):
+            if self.reverse:
+                a, b = b, a
+            return key_lt(self.keys[a], self.keys[b])
+    return KeySort
+
+IntKeySort = _make_key_sort(lambda a, b: a < b)
+FloatKeySort = _make_key_sort(lambda a, b: a < b)
+StrKeySort = _make_key_sort(lambda a, b: a < b)
+NaturalKeySort = _make_key_sort(lambda a, b: _strnatcmp(a, b) < 0)
+
+
+@specialize.arg(1)
+def _get_elem(item, elem):
+    if elem == KEY:
+        return item[0].deref()
+    elif elem == VALUE:
+        return item[1].deref()
+    return item.deref()
+
+
+@specialize.arg(2)
+def _int_keys(space, values, elem):
+    ints = [0] * len(values)
+    for i in range(len(values)):
+        w_obj = _get_elem(values[i], elem)
+        if not isinstance(w_obj, W_IntObject):
+            return None
+        ints[i] = w_obj.intval
+    return ints
+
+
+@specialize.arg(2)
+def _float_keys(space, values, elem):
+    floats = [0.0] * len(values)
+    for i in range(len(values)):
+        w_obj = _get_elem(values[i], elem)
+        if not isinstance(w_obj, W_FloatObject) or isnan(w_obj.floatval):
+            return None
+        floats[i] = w_obj.floatval
+    return floats
+
+
+def _is_scalar(space, w_obj):
+    tp = w_obj.tp
+    return (tp == space.tp_int or tp == space.tp_float or
+            tp == space.tp_str or tp == space.tp_bool or tp == space.tp_null)
+
+
+@specialize.arg(2)
+def _numeric_keys(space, values, elem):
+    # SORT_NUMERIC compares the float_w() of the items
+    floats = [0.0] * len(values)
+    for i in range(len(values)):
+        w_obj = _get_elem(values[i], elem)
+        if not _is_scalar(space, w_obj):
+            return None
+        f = space.float_w(w_obj)
+        if isnan(f):
+            return None
+        floats[i] = f
+    return floats
+
+
+@specialize.arg(2)
+def _string_keys(space, values, elem, as_string, fold_case):
+    strs = [''] * len(values)
+    for i in range(len(values)):
+        w_obj = _get_elem(values[i], elem)
+        if w_obj.tp == space.tp_str:
+            s = space.str_w(w_obj)
+        elif as_string and _is_scalar(space, w_obj):
+            s = space.str_w(space.as_string(w_obj))
+        else:
+            return None
+        if fold_case:
+            s = s.lower()
+        strs[i] = s
+    return strs
+
+
+def _bytewise(strs):
+    """ Whether comparing the strings 'strs' two by two with _compare()
+    just compares the bytes: it compares two numeric strings as numbers.
+    """
+    numeric = 0
+    for s in strs:
+        _, valid = convert_string_to_number(s)
+        if valid:
+            numeric += 1
+            if numeric > 1:
+                return False
+    return True
+
+
+@specialize.argtype(0)
+def _put_in_order(values, order):
+    items = [values[i] for i in order]
+    for i in range(len(items)):
+        values[i] = items[i]
+
+
+@specialize.arg(3)
+def _sort_by_keys(space, values, sort_type, elem, reverse):
+    """ Sort 'values' like _sort() without a callback does, but on
+    unwrapped keys, if it gives the same order.  Return False, without
+    changing 'values', if it would not.
+    """
+    if len(values) < 2:
+        return False
+    base_type = sort_type & ~SORT_FLAG_CASE
+    fold_case = sort_type & SORT_FLAG_CASE != 0
+    order = range(len(values))
+    if base_type == SORT_REGULAR:
+        w_first = _get_elem(values[0], elem)
+        if isinstance(w_first, W_IntObject):
+            ints = _int_keys(space, values, elem)
+            if ints is None:
+                return False
+            IntKeySort(order, ints, reverse).sort()
+        elif isinstance(w_first, W_FloatObject):
+            floats = _float_keys(space, values, elem)
+            if floats is None:
+                return False
+            FloatKeySort(order, floats, reverse).sort()
+        elif w_first.tp == space.tp_str:
+            strs = _string_keys(space, values, elem, False, False)
+            if strs is None or not _bytewise(strs):
+                return False
+            StrKeySort(order, strs, reverse).sort()
+        else:
+            return False
+    elif base_type == SORT_NUMERIC:
+        floats = _numeric_keys(space, values, elem)
+        if floats is None:
+            return False
+        FloatKeySort(order, floats, reverse).sort()
+    elif base_type == SORT_STRING:
+        strs = _string_keys(space, values, elem, True, fold_case)
+        if strs is None:
+            return False
+        StrKeySort(order, strs, reverse).sort()
+    elif base_type == SORT_LOCALE_STRING:
+        strs = _string_keys(space, values, elem, True, False)
+        if strs is None:
+            return False
+        # strcoll() on the strings is strcmp() on their strxfrm()
+        keys = [strxfrm_u(s) for s in strs]
+        StrKeySort(order, keys, reverse).sort()
+    elif base_type == SORT_NATURAL:
+        strs = _string_keys(space, values, elem, True, fold_case)
+        if strs is None:
+            return False
+        NaturalKeySort(order, strs, reverse).sort()
+    else:
+        return False
+    _put_in_order(values, order)
+    return True
+
+
 _TimSort = make_timsort_class()
 class MultiSort(_TimSort):
     def __init__(self, space, list, key_funcs, cmp_funcs, signs):
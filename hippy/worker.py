@@ -0,0 +1,194 @@
+""" Pre-fork request workers, for 'hippy --workers <n> --listen <socket>'.
+
+The master process listens on a unix socket and forks the workers, which
+accept SCGI requests (see hippy/scgi.py) on it.  Every request runs in a
+fresh Interpreter, but on the same space: the compiled bytecode, the
+regex cache, the JIT traces and the cells of the GlobalImmutCaches (which
+Interpreter.__init__ merely resets) stay warm from one request to the
+next.  The master replaces the workers that exit, after --max-requests
+requests or because they crashed, and stops them on SIGINT or SIGTERM.
+"""
+
+import os
+import signal
+from rpython.rlib import rsignal
+from rpython.rlib.rsocket import (RSocket, UNIXAddress, SocketError,
+                                  AF_UNIX, SOCK_STREAM, SHUT_WR)
+from hippy import constants
+from hippy.interpreter import Interpreter
+from hippy.config import load_ini_data
+from hippy.error import ExplicitExitException, InterpreterError, SignalReceived
+from hippy.scgi import ScgiError, read_scgi_request, write_all
+from hippy.sourceparser import ParseError
+from hippy.lexer import LexerError
+
+LISTEN_BACKLOG = 128
+
+
+def get_script_filename(params):
+    filename = params.get('SCRIPT_FILENAME', '')
+    if not filename:
+        filename = (params.get('DOCUMENT_ROOT', '') +
+                    params.get('SCRIPT_NAME', ''))
+    return filename
+
+
+class WorkerServer(object):
+    def __init__(self, space, path, workers, max_requests=0, ini_data=None):
+        self.space = space
+        self.path = path
+        self.workers = workers
+        self.max_requests = max_requests
+        self.ini_data = ini_data
+        self.sock = None
+        self.pids = {}
+        self.requests_handled = 0
+
+    def serve(self):
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        sock = RSocket(AF_UNIX, SOCK_STREAM)
+        sock.bind(UNIXAddress(self.path))
+        sock.listen(LISTEN_BACKLOG)
+        self.sock = sock
+        rsignal.pypysig_setflag(signal.SIGINT)
+        rsignal.pypysig_setflag(signal.SIGTERM)
+        for i in range(self.workers):
+            self.spawn_worker()
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, 0)
+            except OSError:
+                pid = -1    # interrupted by a signal
+            if rsignal.pypysig_poll() >= 0:
+                break
+            if pid in self.pids:
+                del self.pids[pid]
+                self.spawn_worker()
+        self.stop_workers()
+        sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        return 0
+
+    def spawn_worker(self):
+        pid = os.fork()
+        if pid == 0:
+            exitcode = 1
+            try:
+                rsignal.pypysig_default(signal.SIGTERM)
+                exitcode = self.run_worker()
+            finally:
+                os._exit(exitcode)
+        self.pids[pid] = True
+
+    def stop_workers(self):
+        for pid in self.pids.keys():
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        for pid in self.pids.keys():
+            try:
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        self.pids.clear()
+
+    def run_worker(self):
+        while (self.max_requests <= 0 or
+               self.requests_handled < self.max_requests):
+            try:
+                fd, _ = self.sock.accept()
+            except SocketError:
+                continue
+            try:
+                self.handle_connection(fd)
+            finally:
+                os.close(fd)
+            self.requests_handled += 1
+        return 0
+
+    def handle_connection(self, fd):
+        try:
+            params = read_scgi_request(fd)
+        except ScgiError, e:
+            write_all(fd, "Status: 400 Bad Request\r\n"
+                          "Content-Type: text/plain\r\n\r\n%s\n" % e.msg)
+            self.discard_input(fd)
+            return
+        # the script reads the body from stdin and writes to stdout, as a
+        # CGI script would
+        saved_stdin = os.dup(0)
+        saved_stdout = os.dup(1)
+        os.dup2(fd, 0)
+        os.dup2(fd, 1)
+        try:
+            self.run_request(params)
+        finally:
+            os.dup2(saved_stdin, 0)
+            os.dup2(saved_stdout, 1)
+            os.close(saved_stdin)
+            os.close(saved_stdout)
+
+    def discard_input(self, fd):
+        """ Closing a socket with unread input in it resets the connection,
+        which can lose the response we just wrote.  Tell the client that the
+        response is complete, then read what is left of its request.
+        """
+        sock = RSocket(AF_UNIX, SOCK_STREAM, fd=fd)
+        try:
+            sock.shutdown(SHUT_WR)
+        except SocketError:
+            sock.detach()
+            return
+        sock.detach()
+        try:
+            while os.read(fd, 65536):
+                pass
+        except OSError:
+            pass
+
+    def run_request(self, params):
+        space = self.space
+        filename = get_script_filename(params)
+        interp = Interpreter(space)
+        load_ini_data(interp, self.ini_data)
+        try:
+            bc = space.bytecode_cache.compile_file(filename, space)
+        except ParseError as e:
+            self._internal_error('Parse error:  %s' % e)
+            return
+        except LexerError as e:
+            self._internal_error('Parse error:  %s on line %d' % (
+                e.message, e.source_pos + 1))
+            return
+        except (IOError, OSError):
+            write_all(1, "Status: 404 Not Found\r\n"
+                         "Content-Type: text/plain\r\n\r\n"
+                         "No input file specified.\n")
+            return
+        if bc is None:
+            self._internal_error('Could not compile %s' % filename)
+            return
+        interp.setup(constants.CGI_SCGI, cgi_params=params, argv=[filename])
+        interp.cached_files[filename] = bc
+        try:
+            try:
+                interp.run_main(space, bc, top_main=True)
+            finally:
+                interp.shutdown()
+        except InterpreterError, e:
+            os.write(2, "Fatal interpreter error %s\n" % e.msg)
+        except ExplicitExitException, e:
+            write_all(1, e.message)
+        except SignalReceived:
+            pass
+
+    def _internal_error(self, msg):
+        write_all(1, "Status: 500 Internal Server Error\r\n"
+                     "Content-Type: text/plain\r\n\r\n%s\n" % msg)
@@ -27,6 +27,12 @@ def target(driver, args):
     from hippy.main import entry_point
     return entry_point, None
 
+def get_gchooks():
+    from hippy.gcstats import gchooks, HAS_GC_HOOKS
+    if HAS_GC_HOOKS:
+        return gchooks
+    return None
+
 def jitpolicy(driver):
     from rpython.jit.codewriter.policy import JitPolicy
     return JitPolicy()
@@ -1,6 +1,7 @@
 import py, sys
 from rpython.rlib.rfloat import INFINITY, NAN, isnan
 
+from hippy.interpreter import Interpreter
 from testing.test_interpreter import BaseTestInterpreter
 
 
@@ -136,7 +137,8 @@ class TestArrayObject(BaseTestInterpreter):
             assert not w_array._has_string_keys
             w_array = dounset_not_inplace(space, w_array, w_0)
             assert w_array.as_dict() == {"1": w_y}
-            assert w_array._has_string_keys   # for now
+            assert not w_array._has_string_keys
+            assert w_array.strategy_name == 'int_hash'
 
     def test_unsetitem_hash(self):
         space = self.space
@@ -208,7 +210,11 @@ class TestArrayObject(BaseTestInterpreter):
                                      "100": w_y,
                                      "102": w_y,
                                      '256': w_y}
-        doset(space, w_array, space.newstr("monday"), w_y)
+        # a string key moves the int-keyed hash to the generic hash
+        assert w_array.strategy_name == 'int_hash'
+        w_array = doset_not_inplace(space, w_array, space.newstr("monday"),
+                                    w_y)
+        assert w_array.strategy_name == 'hash'
         doappend(space, w_array, w_y)
         assert w_array.as_dict() == {"0": w_x, "1": w_x, "2": w_x, "99": w_y,
                                      "100": w_y, "102": w_y, '256': w_y,
@@ -321,3 +327,289 @@ class TestArrayObject(BaseTestInterpreter):
         w_item2 = space.newstr("bok2")
         doappend(space, w_array, w_item2)
         assert w_array.as_dict() == {"-5": w_item, "0": w_item2}
+
+    def test_int_hash_from_pairs(self):
+        space = self.space
+        w_x = space.newstr("x")
+        w_y = space.newstr("y")
+        w_array = space.new_array_from_pairs([(space.newint(1000), w_x),
+                                              (space.newstr("7"), w_y)])
+        assert w_array.strategy_name == 'int_hash'
+        assert w_array._getkeylist() == [1000, 7]
+        assert w_array.as_dict() == {"1000": w_x, "7": w_y}
+        assert space.getitem(w_array, space.newstr("1000")) is w_x
+        assert space.getitem(w_array, space.newint(7)) is w_y
+        assert w_array.isset_index(space, space.newstr("7"))
+        assert not w_array.isset_index(space, space.newstr("07"))
+        doappend(space, w_array, w_x)
+        assert w_array._getkeylist() == [1000, 7, 1001]
+        #
+        w_array = space.new_array_from_pairs([(space.newint(3), w_x),
+                                              (space.newstr("a"), w_y),
+                                              (None, w_x)])
+        assert w_array.strategy_name == 'hash'
+        assert w_array._getkeylist() == ['3', 'a', '4']
+
+    def test_int_hash_to_hash(self):
+        space = self.space
+        w_x = space.newstr("x")
+        w_y = space.newstr("y")
+        w_array = space.new_array_from_pairs([(space.newint(-5), w_x)])
+        doset(space, w_array, space.newint(12), w_y)
+        doset(space, w_array, space.newstr("12"), w_x)
+        assert w_array.strategy_name == 'int_hash'
+        w_array2 = doset_not_inplace(space, w_array, space.newstr("z"), w_y)
+        assert w_array2.strategy_name == 'hash'
+        assert w_array2._getkeylist() == ['-5', '12', 'z']
+        assert w_array.as_dict() == {"-5": w_x, "12": w_x}
+        dounset(space, w_array, space.newstr("-5"))
+        dounset(space, w_array, space.newstr("z"))
+        assert w_array.as_dict() == {"12": w_x}
+        assert w_array.next_idx == 13
+
+    def test_int_hash_iter(self):
+        space = self.space
+        w_array = space.new_array_from_pairs([(space.newint(10), space.newint(1)),
+                                              (space.newint(5), space.newint(2))])
+        Interpreter(space)    # the iterators need space.ec.interpreter
+        with space.iter(w_array) as w_iter:
+            items = []
+            while not w_iter.done():
+                w_key, w_value = w_iter.next_item(space)
+                items.append((space.int_w(w_key), space.int_w(w_value)))
+        assert items == [(10, 1), (5, 2)]
+
+    def test_int_list(self):
+        space = self.space
+        w_array = space.new_array_from_list([space.newint(1),
+                                             space.newint(2)])
+        assert w_array.ints == [1, 2]
+        assert w_array.lst_w is None
+        doset(space, w_array, space.newint(0), space.newint(5))
+        doappend(space, w_array, space.newint(7))
+        assert w_array.ints == [5, 2, 7]
+        assert space.int_w(space.getitem(w_array, space.newstr("2"))) == 7
+        w_copy = w_array.copy()
+        assert w_copy.ints is w_array.ints    # until one of them changes
+        # anything but an int turns it into a list of objects, in-place
+        w_x = space.newstr("x")
+        doset(space, w_array, space.newint(1), w_x)
+        assert w_array.ints is None
+        assert w_array.lst_w[1] is w_x
+        assert space.int_w(w_array.lst_w[2]) == 7
+        assert w_copy.ints == [5, 2, 7]
+
+    def test_float_list(self):
+        space = self.space
+        w_array = space.new_array_from_list([])
+        doappend(space, w_array, space.newfloat(1.5))
+        doappend(space, w_array, space.newfloat(2.5))
+        assert w_array.floats == [1.5, 2.5]
+        assert space.float_w(w_array._inplace_pop(space)) == 2.5
+        doappend(space, w_array, space.newint(3))
+        assert w_array.floats is None
+        assert w_array.as_list_w() == [space.newfloat(1.5), space.newint(3)]
+        # an int and a float don't make an unboxed list
+        w_array = space.new_array_from_list([space.newint(1),
+                                             space.newfloat(2.0)])
+        assert w_array.ints is None and w_array.floats is None
+
+    def test_int_list_to_hash(self):
+        space = self.space
+        w_array = space.new_array_from_ints([10, 20, 30])
+        dounset(space, w_array, space.newint(2))
+        assert w_array.ints == [10, 20]
+        w_array2 = dounset_not_inplace(space, w_array, space.newint(0))
+        assert w_array2.strategy_name == 'int_hash'
+        assert w_array2.as_dict() == {"1": space.newint(20)}
+        w_array2 = doset_not_inplace(space, w_array, space.newstr("a"),
+                                     space.newint(1))
+        assert w_array2.strategy_name == 'hash'
+        assert w_array.ints == [10, 20]
+
+    def test_range_list(self):
+        space = self.space
+        w_array = space.new_array_from_range(10, -3, 1000000)
+        assert w_array.arraylen() == 1000000
+        assert space.int_w(space.getitem(w_array, space.newint(3))) == 1
+        assert space.int_w(w_array._inplace_pop(space)) == 10 - 3 * 999999
+        w_array, w_value = w_array._shift_maybe_inplace(space)
+        assert space.int_w(w_value) == 10
+        assert w_array.arraylen() == 999998
+        assert w_array.ints is None and w_array.lst_w is None
+        w_copy = w_array.copy()
+        doset(space, w_array, space.newint(0), space.newint(5))
+        assert w_array.ints[:3] == [5, 4, 1]
+        assert w_copy.ints is None
+        assert space.int_w(space.getitem(w_copy, space.newint(0))) == 7
+        w_array = space.new_array_from_range(1, 1, 2)
+        doappend(space, w_array, space.newstr("x"))
+        assert w_array.as_list_w() == [space.newint(1), space.newint(2),
+                                       space.newstr("x")]
+
+    def test_int_list_iter(self):
+        space = self.space
+        w_array = space.new_array_from_ints([4, 5])
+        Interpreter(space)    # the iterators need space.ec.interpreter
+        with space.iter(w_array) as w_iter:
+            items = []
+            while not w_iter.done():
+                w_key, w_value = w_iter.next_item(space)
+                items.append((space.int_w(w_key), space.int_w(w_value)))
+        assert items == [(0, 4), (1, 5)]
+
+    def test_copy_on_write(self):
+        space = self.space
+        stats = space.array_copy_stats
+        stats.reset()
+        w_array = space.new_array_from_list([space.newstr("a"),
+                                             space.newstr("b")])
+        w_copy1 = w_array.copy()
+        w_copy2 = w_array.copy()
+        assert w_copy1.lst_w is w_array.lst_w
+        assert w_copy2.lst_w is w_array.lst_w
+        assert (stats.copies, stats.materialized) == (2, 0)
+        doappend(space, w_copy1, space.newstr("c"))
+        assert w_copy1.lst_w is not w_array.lst_w
+        assert w_array.arraylen() == 2
+        doset(space, w_array, space.newint(0), space.newstr("z"))
+        assert space.str_w(space.getitem(w_copy2, space.newint(0))) == "a"
+        assert (stats.copies, stats.materialized) == (2, 2)
+        # the last array that shares the storage writes to it in-place
+        lst_w = w_copy2.lst_w
+        dounset(space, w_copy2, space.newint(1))
+        assert w_copy2.lst_w is lst_w
+        assert w_copy2.arraylen() == 1
+        assert stats.materialized == 2
+
+    def test_copy_on_write_hash(self):
+        space = self.space
+        w_array = space.new_array_from_pairs([
+            (space.newstr("a"), space.newint(1)),
+            (space.newstr("b"), space.new_array_from_list([space.newint(2)])),
+        ])
+        w_copy = w_array.copy()
+        assert w_copy.dct_w is w_array.dct_w
+        dounset(space, w_array, space.newstr("a"))
+        assert w_copy.dct_w is not w_array.dct_w
+        assert w_copy.arraylen() == 2
+        assert w_array.arraylen() == 1
+        # the nested array is copied lazily too
+        w_nested = w_array.dct_w["b"]
+        assert w_nested is not w_copy.dct_w["b"]
+        assert w_nested.ints is w_copy.dct_w["b"].ints
+        w_array = space.new_array_from_pairs([
+            (space.newint(5), space.newint(1)),
+        ])
+        w_copy = w_array.copy()
+        assert w_copy.strategy_name == 'int_hash'
+        doset(space, w_copy, space.newint(5), space.newint(2))
+        assert space.int_w(space.getitem(w_array, space.newint(5))) == 1
+        assert space.int_w(space.getitem(w_copy, space.newint(5))) == 2
+
+    def test_shift_list(self):
+        space = self.space
+        w_array = space.new_array_from_list(
+            [space.newint(i) for i in range(40)])
+        for i in range(17):
+            w_res, w_value = w_array._shift_maybe_inplace(space)
+            assert w_res is w_array
+            assert space.int_w(w_value) == i
+        # the items are not moved
+        assert w_array.shifted == 17
+        assert len(w_array.ints) == 40
+        assert w_array.arraylen() == 23
+        assert space.int_w(space.getitem(w_array, space.newint(0))) == 17
+        w_copy = w_array.copy()
+        doappend(space, w_array, space.newint(40))
+        assert w_array.shifted == 0
+        assert w_array.ints == range(17, 41)
+        assert w_copy.shifted == 17
+        assert w_copy.arraylen() == 23
+        # once more items were shifted than are left, they are dropped
+        for i in range(17, 33):
+            w_res, w_value = w_array._shift_maybe_inplace(space)
+            assert space.int_w(w_value) == i
+        assert w_array.shifted == 16
+        w_res, w_value = w_array._shift_maybe_inplace(space)
+        assert w_array.shifted == 0
+        assert w_array.ints == range(34, 41)
+        w_res, w_value = w_copy._shift_maybe_inplace(space)
+        assert space.int_w(w_value) == 17
+        assert [space.int_w(w_x) for w_x in w_copy.as_list_w()] == (
+            range(18, 40))
+
+    def test_hash_unset_keeps_slots(self):
+        space = self.space
+        w_array = space.new_array_from_pairs(
+            [(space.newstr("k%d" % i), space.newint(i)) for i in range(40)])
+        w_array.next(space)
+        dounset(space, w_array, space.newstr("k0"))
+        assert w_array.dct_w.end() == 40
+        assert space.int_w(w_array._current()) == 1
+        dounset(space, w_array, space.newstr("k1"))
+        assert space.int_w(w_array._current()) == 2
+        assert space.str_w(w_array._key(space)) == "k2"
+        dounset(space, w_array, space.newstr("k39"))
+        # the slot is not reused by the next item
+        assert w_array.dct_w.end() == 40
+        for i in range(10, 28):
+            dounset(space, w_array, space.newstr("k%d" % i))
+        # the tombstones outnumbered the items left: they are gone
+        assert w_array.dct_w.end() == w_array.arraylen() == 19
+        assert space.int_w(w_array._current()) == 2
+        assert w_array.current_idx == 0
+        assert w_array.dct_w.keys()[:9] == ["k%d" % i for i in range(2, 10)] + [
+            "k28"]
+
+    def test_hash_remap_slot(self):
+        from hippy.objects.orderedhash import StrOrderedHash
+        space = self.space
+        dct_w = StrOrderedHash()
+        for i in range(40):
+            dct_w.append("k%d" % i, space.newint(i))
+        for i in range(5, 40):
+            dct_w.delitem("k%d" % i)
+        new_dct_w = dct_w.compacted()
+        new_dct_w.append("k40", space.newint(40))
+        assert dct_w.remap_slot(3, new_dct_w) == 3
+        # past the last item left, but before the one added since
+        assert dct_w.remap_slot(6, new_dct_w) == 5
+        assert new_dct_w.keys_list[5] == "k40"
+        newer_dct_w = new_dct_w.compacted()
+        assert dct_w.remap_slot(6, newer_dct_w) == 5
+        # a copy keeps the slots
+        copy_w = new_dct_w.copy()
+        copy_w.delitem("k4")
+        copy_w.append("k41", space.newint(41))
+        assert new_dct_w.remap_slot(4, copy_w) == 5
+        assert new_dct_w.remap_slot(6, copy_w) == 6
+
+    def test_shift_hash(self):
+        space = self.space
+        w_array = space.new_array_from_pairs(
+            [(space.newstr("k%d" % i), space.newint(i)) for i in range(3)])
+        w_res, w_value = w_array._shift_maybe_inplace(space)
+        assert w_res is w_array
+        assert space.int_w(w_value) == 0
+        assert w_array.dct_w.keys() == ["k1", "k2"]
+        # the integer keys are renumbered
+        w_array = space.new_array_from_pairs([
+            (space.newstr("a"), space.newint(0)),
+            (space.newint(7), space.newint(1)),
+            (space.newstr("b"), space.newint(2)),
+            (space.newint(3), space.newint(3))])
+        w_res, w_value = w_array._shift_maybe_inplace(space)
+        assert w_res is w_array
+        assert w_array.dct_w.keys() == ["0", "b", "1"]
+        assert w_array.next_idx == 2
+        w_res, w_value = w_array._shift_maybe_inplace(space)
+        w_res, w_value = w_array._shift_maybe_inplace(space)
+        assert space.int_w(w_value) == 2
+        assert w_res.ints == [3]    # a list again
+        w_array = space.new_array_from_pairs([
+            (space.newint(5), space.newint(1)),
+            (space.newint(2), space.newint(2))])
+        w_res, w_value = w_array._shift_maybe_inplace(space)
+        assert space.int_w(w_value) == 1
+        assert w_res.ints == [2]
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import py
+import sys
 from hippy.objects.arrayiter import RDictArrayIteratorRef
 from hippy.objects.intobject import W_IntObject as W_Int
 from hippy.objects.strobject import W_ConstStringObject as W_Str
@@ -25,6 +26,44 @@ def test_iter_ref():
     assert (w_k, w_v.deref()) == (W_Int(2), W_Str('2'))
     assert it.finished
 
+def test_iter_ref_changing_hash():
+    space = ObjSpace()
+    w_arr = space.new_array_from_pairs([(W_Str("k%d" % i), W_Int(i))
+                                        for i in range(40)])
+    r_arr = W_Reference(w_arr)
+    it = w_arr.create_iter_ref(space, r_arr)
+    seen = []
+    while not it.finished:
+        w_k, w_v = it.next_item(space)
+        i = space.int_w(w_v.deref())
+        seen.append(i)
+        w_arr = r_arr.deref_unique()
+        # removing the items seen so far ends up compacting the storage
+        w_arr = w_arr._unsetitem(space, w_k)
+        if i % 2 == 0 and i < 100:
+            w_arr = w_arr._setitem_str("n%d" % i, W_Int(i + 100), False)
+        r_arr.store(w_arr, unique=True)
+    assert seen == range(40) + range(100, 140, 2)
+    assert w_arr.arraylen() == 0
+
+def test_iter_ref_int_hash_to_hash():
+    space = ObjSpace()
+    w_arr = space.new_array_from_pairs([(W_Int(i * 3), W_Int(i))
+                                        for i in range(5)])
+    r_arr = W_Reference(w_arr)
+    it = w_arr.create_iter_ref(space, r_arr)
+    seen = []
+    while not it.finished:
+        w_k, w_v = it.next_item(space)
+        seen.append(space.int_w(w_v.deref()))
+        if len(seen) == 2:
+            w_arr = r_arr.deref_unique()
+            w_arr = w_arr._unsetitem(space, W_Int(6))
+            w_arr = w_arr._setitem_str("x", W_Int(10), False)
+            assert w_arr.strategy_name == 'hash'
+            r_arr.store(w_arr, unique=True)
+    assert seen == [0, 1, 3, 4, 10]
+
 class TestArrayDirect(object):
     def create_array_strats(self, space):
         # int, float, mix, empty, hash, copy
@@ -345,24 +384,109 @@ class TestArray(BaseTestInterpreter):
         assert self.space.int_w(output[0]) == 2
 
     def test_float_strategy(self):
-        py.test.skip("no special float strategy for now")
         output = self.run('''
         $a = array();
         $a[] = 3.0;
         $b = array(1.2, 3.2);
-        echo $a, $b;
-        $a[1] = 1.2;
-        $b[0] = 1;
-        echo $a, $b;
-        ''')
-        [i.force_write() for i in output]
-        assert [i.strategy.name for i in output] == [
-            'lfloat', 'lfloat', 'lfloat', 'lobject']
-        assert output[0].strategy.unerase(output[0].storage) == [3.0]
-        assert output[1].strategy.unerase(output[1].storage) == [1.2, 3.2]
-        assert output[2].strategy.unerase(output[2].storage) == [3.0, 1.2]
-        assert self.space.int_w(
-            output[3].strategy.unerase(output[3].storage)[0]) == 1
+        $c = $a;
+        $c[1] = 1.2;
+        $d = $b;
+        $d[0] = 1;
+        echo $a, $b, $c, $d;
+        ''')
+        assert output[0].floats == [3.0]
+        assert output[1].floats == [1.2, 3.2]
+        assert output[2].floats == [3.0, 1.2]
+        assert output[3].floats is None
+        assert self.unwrap(output[3]) == [1, 3.2]
+
+    def test_int_strategy(self):
+        output = self.run('''
+        $a = array(1, 2, 3);
+        $b = $a;
+        $b[] = 4;
+        $c = $b;
+        $c[1] = "x";
+        $d = range(1, 5);
+        $d[2] = 7.5;
+        echo $a, $b, $c, array_fill(0, 3, 9), range(1, 5), $d;
+        ''')
+        assert output[0].ints == [1, 2, 3]
+        assert output[1].ints == [1, 2, 3, 4]
+        assert output[2].ints is None
+        assert self.unwrap(output[2]) == [1, "x", 3, 4]
+        assert output[3].ints == [9, 9, 9]
+        # range() is lazy until it is written to
+        assert output[4]._is_range()
+        assert self.unwrap(output[4]) == [1, 2, 3, 4, 5]
+        assert self.unwrap(output[5]) == [1, 2, 7.5, 4, 5]
+
+    def test_int_strategy_references(self):
+        output = self.run('''
+        $a = array(1, 2, 3);
+        $x = &$a[1];
+        $x = 5;
+        echo $a[1];
+        foreach ($a as &$v) { $v = $v * 2; }
+        unset($v);
+        echo implode(",", $a);
+        ''')
+        assert self.space.int_w(output[0]) == 5
+        assert self.space.str_w(output[1]) == "2,10,6"
+
+    def test_copy_on_write_nested(self):
+        output = self.run('''
+        $n = 1;
+        $config = array("db" => array("host" => "h", "port" => $n),
+                        "list" => array("x", "y"), "n" => $n);
+        function get($c) { return $c; }
+        function change($c) { $c["db"]["port"] = 2; $c["list"][] = "z";
+                              return $c; }
+        for ($i = 0; $i < 10; $i++) { $c = get($config); }
+        $d = change($config);
+        $e = $config;
+        $e["n"] = 3;
+        echo $config["db"]["port"], count($config["list"]), $config["n"];
+        echo $d["db"]["port"], count($d["list"]), $d["n"];
+        echo $e["db"]["port"], count($e["list"]), $e["n"];
+        $stats = hippy_array_copy_stats();
+        echo $stats["materialized"];
+        ''')
+        assert [self.space.int_w(w_v) for w_v in output[:9]] == [
+            1, 2, 1, 2, 3, 1, 1, 2, 3]
+        # $d, its "db" and "list", and $e: the ten calls to get() and
+        # the arrays that are only read are never duplicated
+        assert self.space.int_w(output[9]) == 4
+
+    def test_copy_on_write_read_then_write(self):
+        output = self.run('''
+        function fill($n) {
+            $b = array();
+            $b[] = 0;
+            $stats = hippy_array_copy_stats();
+            $start = $stats["materialized"];
+            for ($i = 0; $i < $n; $i++) {
+                if ($b) { $b[] = count($b); }
+            }
+            $stats = hippy_array_copy_stats();
+            return array(count($b), $stats["materialized"] - $start);
+        }
+        $a = array();
+        $a["n"] = 0;
+        $stats = hippy_array_copy_stats();
+        $start = $stats["materialized"];
+        for ($i = 0; $i < 10; $i++) {
+            if ($a) { $a["n"] += count($a); }
+            $a["k$i"] = $i;
+        }
+        $stats = hippy_array_copy_stats();
+        echo $a["n"], $stats["materialized"] - $start;
+        list($len, $materialized) = fill(10);
+        echo $len, $materialized;
+        ''')
+        # testing and counting the arrays does not leave copies behind
+        # that the next write would have to duplicate
+        assert [self.space.int_w(w_v) for w_v in output] == [55, 0, 11, 0]
 
     def test_append_empty(self):
         output = self.run('''
@@ -1024,6 +1148,35 @@ class TestArray(BaseTestInterpreter):
         assert self.space.str_w(output[0]) == "blue"
         assert self.space.int_w(output[1]) == 1
 
+    def test_array_diff_compares_strings(self):
+        output = self.run('''
+        // values are equal if their string forms are identical
+        echo implode(",", array_diff(array("10", "1e1", 1.5, "01", 7),
+                                     array(10, "1.5"), array("7")));
+        echo implode(",", array_intersect(array("10", "1e1", 1, 2),
+                                          array("10", 1, 1, 2),
+                                          array(10, 2)));
+        echo implode(",", array_intersect(array(1, 2), array(1, 1),
+                                          array(2)));
+        echo implode(",", array_diff_assoc(array("a" => "10", "b" => "1e1"),
+                                           array("a" => 10, "b" => "10")));
+        echo implode(",", array_intersect_assoc(array("a" => "10", 2),
+                                                array("a" => "1e1", 2)));
+        ''')
+        assert [self.space.str_w(w_v) for w_v in output] == [
+            "1e1,01", "10,2", "", "1e1", "2"]
+
+    def test_array_diff_large(self):
+        output = self.run('''
+        $a = range(0, 19999);
+        $b = range(10000, 29999);
+        $d = array_diff($a, $b);
+        $i = array_intersect($a, $b);
+        echo count($d), $d[9999], count($i), $i[10000];
+        ''')
+        assert [self.space.int_w(w_v) for w_v in output] == [
+            10000, 9999, 10000, 10000]
+
     def test_array_diff_ukey(self):
         output = self.run('''
         function key_compare_func($key1, $key2)
@@ -1350,6 +1503,22 @@ class TestArray(BaseTestInterpreter):
         assert self.space.float_w(output[0]) == 11.2
         assert self.space.float_w(output[1]) == 17.9
 
+    def test_array_sum_unboxed(self):
+        output = self.run('''
+        echo array_sum(range(1, 100));
+        echo array_sum(array(PHP_INT_MAX, 1));
+        echo array_sum(array(0.5, 0.25));
+        echo array_product(array(2, 3, 7));
+        echo array_product(array(PHP_INT_MAX, 2));
+        echo array_product(array(0.5, 3.0));
+        ''')
+        assert self.space.int_w(output[0]) == 5050
+        assert self.space.float_w(output[1]) == float(sys.maxint) + 1
+        assert self.space.float_w(output[2]) == 0.75
+        assert self.space.int_w(output[3]) == 42
+        assert self.space.float_w(output[4]) == float(sys.maxint) * 2
+        assert self.space.float_w(output[5]) == 1.5
+
     def test_array_pad(self):
         output = self.run('''
         $b = array(1229600459=>'large', 1229604787=>20, 9609459=>'red');
@@ -1771,6 +1940,25 @@ class TestArray(BaseTestInterpreter):
         res = [1, 2, 3, 4, 5]
         assert [self.space.int_w(i) for i in output] == res
 
+    def test_range_large(self):
+        output = self.run('''
+        $a = range(10000000, 1, 3);
+        echo count($a), $a[0], $a[3333332], array_sum(range(1, 100000));
+        $b = $a;
+        $b[1] = "x";
+        echo $a[1], $b[1], array_pop($a), count($a);
+        $a[] = 5;
+        echo $a[3333333];
+        $sum = 0;
+        foreach (range(5, 1) as $k => $v) {
+            $sum += $k * $v;
+        }
+        echo $sum;
+        ''')
+        assert [self.space.str_w(i) for i in output] == [
+            '3333334', '10000000', '4', '5000050000',
+            '9999997', 'x', '1', '3333333', '5', '20']
+
     def test_range_errors(self):
         output = self.run('''
         echo range();
@@ -2078,28 +2266,28 @@ class TestArray(BaseTestInterpreter):
         assert space.str_w(space.getitem(w_arr, space.wrap(1))) == 'b'
 
         w_arr2 = space.setitem(w_arr, space.wrap(11), space.wrap(15))
-        assert w_arr2.strategy_name == 'hash'
-        assert w_arr2._getkeylist() == ['0', '1', '2', '3', '4', '5', '11']
+        assert w_arr2.strategy_name == 'int_hash'
+        assert w_arr2._getkeylist() == [0, 1, 2, 3, 4, 5, 11]
         assert w_arr2.arraylen() == len(w_arr2.dct_w)
 
         w_arr3 = space.setitem(w_arr2, space.wrap(11), space.wrap(15))
-        assert w_arr3._getkeylist() == ['0', '1', '2', '3', '4', '5', '11']
+        assert w_arr3._getkeylist() == [0, 1, 2, 3, 4, 5, 11]
         assert w_arr3.arraylen() == len(w_arr3.dct_w)
 
         w_arr4 = w_arr3._unsetitem(space, space.wrap(0))
-        assert w_arr4._getkeylist() == ['1', '2', '3', '4', '5', '11']
+        assert w_arr4._getkeylist() == [1, 2, 3, 4, 5, 11]
         assert w_arr4.arraylen() == len(w_arr4.dct_w)
 
         w_arr5 = space.setitem(w_arr4, space.wrap(0), space.wrap(15))
-        assert w_arr5._getkeylist() == ['1', '2', '3', '4', '5', '11', '0']
+        assert w_arr5._getkeylist() == [1, 2, 3, 4, 5, 11, 0]
         assert w_arr5.arraylen() == len(w_arr5.dct_w)
 
         w_arr6 = space.setitem(w_arr5, space.wrap(11), space.wrap(15))
-        assert w_arr6._getkeylist() == ['1', '2', '3', '4', '5', '11', '0']
+        assert w_arr6._getkeylist() == [1, 2, 3, 4, 5, 11, 0]
         assert w_arr6.arraylen() == len(w_arr2.dct_w)
 
         w_arr7 = space.setitem(w_arr6, space.newstr('11'), space.wrap(15))
-        assert w_arr7._getkeylist() == ['1', '2', '3', '4', '5', '11', '0']
+        assert w_arr7._getkeylist() == [1, 2, 3, 4, 5, 11, 0]
         assert w_arr7.arraylen() == len(w_arr2.dct_w)
 
     def test_array_intersect_key(self):
@@ -2124,6 +2312,118 @@ class TestArray(BaseTestInterpreter):
         ''')
         assert [self.space.int_w(i) for i in output] == [55, 22, 33, 0]
 
+    def test_array_shift_renumbers(self):
+        output = self.run('''
+        $a = array('x' => 1, 5 => 2, 'y' => 3, 9 => 4);
+        echo array_shift($a);
+        $a[] = 5;
+        foreach ($a as $k => $v) {
+            echo $k, $v;
+        }
+        $b = array();
+        echo array_shift($b);
+        ''')
+        assert [self.space.str_w(i) for i in output] == [
+            '1', '0', '2', 'y', '3', '1', '4', '2', '5', '']
+
+    def test_array_shift_queue(self):
+        output = self.run('''
+        $q = array();
+        for ($i = 0; $i < 100; $i++) {
+            $q[] = $i;
+        }
+        $copy = $q;
+        $sum = 0;
+        while ($q) {
+            $x = array_shift($q);
+            $sum += $x;
+            if ($x % 3 == 0 && $x < 60) {
+                $q[] = $x + 1000;
+            }
+        }
+        echo $sum, count($copy), $copy[0];
+        $h = array();
+        for ($i = 0; $i < 50; $i++) {
+            $h["k$i"] = $i;
+        }
+        $sum = 0;
+        while ($h) {
+            $sum += array_shift($h);
+        }
+        echo $sum;
+        ''')
+        assert [self.space.int_w(i) for i in output] == [25520, 100, 0, 1225]
+
+    def test_array_shift_queue_is_not_copied(self):
+        output = self.run('''
+        function materialized() {
+            $stats = hippy_array_copy_stats();
+            return $stats["materialized"];
+        }
+        $q = array();
+        for ($i = 0; $i < 100; $i++) {
+            $q[] = $i;
+        }
+        $start = materialized();
+        $seen = 0;
+        while ($q) {
+            $x = array_shift($q);
+            $seen++;
+            if ($x < 50) {
+                $q[] = $x + 100;
+            }
+        }
+        echo $seen, materialized() - $start;
+        $h = array();
+        for ($i = 0; $i < 100; $i++) {
+            $h["k$i"] = $i;
+        }
+        $start = materialized();
+        $sum = 0;
+        while ($h) {
+            $sum += array_shift($h);
+        }
+        echo $sum, materialized() - $start;
+        $cache = array();
+        $start = materialized();
+        for ($i = 0; $i < 100; $i++) {
+            $cache["k$i"] = $i;
+            if (count($cache) > 10) {
+                reset($cache);
+                unset($cache[key($cache)]);
+            }
+        }
+        echo count($cache), materialized() - $start;
+        ''')
+        seen, shifted, total, popped, size, evicted = [
+            self.space.int_w(w_v) for w_v in output]
+        assert (seen, total, size) == (150, 4950, 10)
+        # at most the first write may copy an array that was shared
+        # before the loop
+        assert shifted <= 1
+        assert popped <= 1
+        assert evicted <= 1
+
+    def test_unset_moves_internal_pointer(self):
+        output = self.run('''
+        $a = array('a' => 1, 'b' => 2, 'c' => 3, 'd' => 4);
+        next($a);
+        next($a);
+        unset($a['a']);
+        echo current($a);
+        unset($a['c']);
+        echo current($a), key($a);
+        echo prev($a);
+        $a['e'] = 5;
+        echo end($a), key($a);
+        unset($a['e']);
+        echo next($a) === false;
+        $a['f'] = 6;
+        echo current($a);
+        ''')
+        assert [self.space.str_w(i) for i in output] == [
+            '3', '4', 'd', '2', '5', 'e', '1', '6']
+
     def test_array_unshift(self):
         output = self.run('''
         $a = array();
@@ -2543,3 +2843,20 @@ class TestArray(BaseTestInterpreter):
         ''')
         assert [self.space.str_w(s) for s in output] == \
             ['null', 'float', 'int', 'instance']
+
+    def test_sparse_int_keys(self):
+        output = self.run('''
+        $a = array(1000 => 'a', 7 => 'b');
+        $a[] = 'c';
+        $a["12"] = 'd';
+        unset($a[7]);
+        foreach ($a as $k => &$v) {
+            echo $k, $v;
+            if ($k == 1000) {
+                $a['x'] = 'e';
+            }
+        }
+        echo count($a), end($a), key($a);
+        ''')
+        assert [self.space.str_w(s) for s in output] == [
+            '1000', 'a', '1001', 'c', '12', 'd', 'x', 'e', '4', 'e', 'x']
@@ -0,0 +1,168 @@
+from hippy.sourceparser import parse
+from hippy.astcompiler import compile_ast
+from hippy.astoptimizer import optimize_ast
+from hippy.objspace import ObjSpace, ExecutionContext
+from hippy.objects.intobject import W_IntObject
+from hippy.objects.floatobject import W_FloatObject
+from hippy.ast import DelayedHash
+from testing.test_compiler import TestCompiler, FakeInterpreter
+from testing.test_interpreter import BaseTestInterpreter
+
+
+class TestASTOptimizer(object):
+    compare = TestCompiler.__dict__['compare']
+
+    def check_optimized(self, source, expected=None):
+        self.space = ObjSpace()
+        self.log = []
+        self.space.ec = ExecutionContext(self.space)
+        self.space.ec.interpreter = FakeInterpreter(self.log)
+        ast = parse(self.space, source, startlineno=1, filename='<input>')
+        ast = optimize_ast(self.space, ast)
+        bc = compile_ast('<input>', source, ast, self.space)
+        assert self.log == []
+        if expected is not None:
+            self.compare(bc, expected)
+        return bc
+
+    def test_fold_arithmetic(self):
+        bc = self.check_optimized("$x = 60 * 60 * 24;", """
+        VAR_PTR 0
+        LOAD_CONST 0
+        STORE
+        DISCARD_TOP
+        """)
+        assert isinstance(bc.consts[0], W_IntObject)
+        assert bc.consts[0].intval == 86400
+
+    def test_fold_mixed_and_overflow(self):
+        bc = self.check_optimized("$x = 1 / 4 + 2; $y = 9223372036854775807 + 1;")
+        assert isinstance(bc.consts[0], W_FloatObject)
+        assert bc.consts[0].floatval == 2.25
+        assert isinstance(bc.consts[1], W_FloatObject)
+
+    def test_no_fold_division_by_zero(self):
+        self.check_optimized("$x = 1 / 0;", """
+        VAR_PTR 0
+        LOAD_CONST 0
+        LOAD_CONST 1
+        BINARY_DIV
+        STORE
+        DISCARD_TOP
+        """)
+
+    def test_fold_concat(self):
+        bc = self.check_optimized("echo 'abc' . 'def' . 42;", """
+        LOAD_NAME 0
+        ECHO
+        """)
+        assert bc.names[0] == 'abc' + 'def42'
+
+    def test_no_fold_float_concat(self):
+        self.check_optimized("echo 'x' . 1.5;", """
+        LOAD_NAME 0
+        LOAD_CONST 0
+        BINARY_CONCAT
+        ECHO
+        """)
+
+    def test_fold_comparison(self):
+        self.check_optimized("$x = 1 == '1'; $y = 1 === '1';", """
+        VAR_PTR 0
+        LOAD_NAMED_CONSTANT 0
+        STORE
+        DISCARD_TOP
+        VAR_PTR 1
+        LOAD_NAMED_CONSTANT 1
+        STORE
+        DISCARD_TOP
+        """)
+
+    def test_dead_if(self):
+        self.check_optimized("""
+        if (false) { echo 'debug'; }
+        if (!true) { echo 'a'; } elseif (1 < 2) { echo 'b'; } else { echo 'c'; }
+        """, """
+        LOAD_NAME 0
+        ECHO
+        """)
+
+    def test_dead_elseif(self):
+        self.check_optimized("""
+        if ($a) { echo 'a'; } elseif (0) { echo 'b'; } else { echo 'c'; }
+        """, """
+        LOAD_VAR_TEMP 0
+        JUMP_IF_FALSE 13
+        LOAD_NAME 0
+        ECHO
+        JUMP_FORWARD 16
+        LOAD_NAME 1
+        ECHO
+        """)
+
+    def test_dead_branch_with_label(self):
+        self.check_optimized("""
+        goto a;
+        if (false) { a: echo 'a'; }
+        """)
+
+    def test_dead_while(self):
+        self.check_optimized("while (0) { echo 'x'; } echo 'y';", """
+        LOAD_NAME 0
+        ECHO
+        """)
+
+    def test_and_or(self):
+        self.check_optimized("$x = false && f(); $y = true || f(); $z = true && $a;", """
+        VAR_PTR 0
+        LOAD_NAMED_CONSTANT 0
+        STORE
+        DISCARD_TOP
+        VAR_PTR 1
+        LOAD_NAMED_CONSTANT 1
+        STORE
+        DISCARD_TOP
+        VAR_PTR 2
+        LOAD_VAR 3
+        IS_TRUE
+        STORE
+        DISCARD_TOP
+        """)
+
+    def test_constant_array(self):
+        bc = self.check_optimized("$x = array('a' => 60 * 60, 'b' => 'x' . 'y');", """
+        VAR_PTR 0
+        LOAD_CONST 0
+        STORE
+        DISCARD_TOP
+        """)
+        assert isinstance(bc.consts[0], DelayedHash)
+
+    def test_inside_functions(self):
+        bc = self.check_optimized("""
+        function f() { return 2 * 3; }
+        class A { function m() { if (false) { return 1; } return 'a' . 'b'; } }
+        """)
+        f = bc.functions[0]
+        assert f.bytecode.consts[0].intval == 6
+        m = bc.classes[0].method_decl['m'].func
+        assert m.bytecode.names == ['ab']
+
+
+class TestASTOptimizerRun(BaseTestInterpreter):
+    def test_semantics(self):
+        output = self.run("""
+        echo 60 * 60 * 24, 7 % 3, -7 % 3, 1 << 3, 7 / 2, 6 / 2;
+        echo 'a' . 1 . true . null, 1 == '1.0', 'abc' == 0, null === null;
+        echo true ? 'yes' : 'no', (false || 'x');
+        if (0) { echo 'dead'; } elseif ('0') { echo 'dead'; } else { echo 'live'; }
+        """)
+        assert [self.space.str_w(o) for o in output] == [
+            '86400', '1', '-1', '8', '3.5', '3',
+            'a11', '1', '1', '1', 'yes', '1', 'live']
+
+    def test_division_by_zero_kept(self):
+        output = self.run("""
+        echo 1 % 0;
+        """, ["Warning: Division by zero"])
+        assert output[0] == self.space.w_False
@@ -2,6 +2,7 @@ import py
 import math, os
 from hippy.objspace import ObjSpace
 from hippy.phpcompiler import compile_php
+from hippy.gcstats import HippyGcHooks
 from hippy.objects.reference import W_Reference
 from hippy.builtin import (
     BuiltinFunctionBuilder, BuiltinSignature, Optional, FilenameArg,
@@ -11,6 +12,21 @@ from testing.test_interpreter import BaseTestInterpreter, MockInterpreter
 from testing.conftest import option
 
 
+def test_gc_pause_units():
+    hooks = HippyGcHooks()
+    assert hooks.ticks_to_ms(1000) == 0.0    # the clock is not started
+    hooks.clock_time = 100.0
+    hooks.clock_ticks = 5000.0
+    # 2 seconds for 4e6 ticks: a tick is half a microsecond
+    assert hooks._scale(3000, 102.0, 4005000.0) == 1.5
+    hooks.on_gc_minor(400, 0, 0)
+    hooks.on_gc_minor(1000, 0, 0)
+    assert hooks.minor_collections == 2
+    assert (hooks.minor_pause_total, hooks.minor_pause_max) == (1400, 1000)
+    hooks.start_clock()
+    assert hooks.ticks_to_ms(0) == 0.0
+
+
 def test_signature():
     sig = BuiltinSignature(['space', int, int])
     assert sig.php_indices == [0, 0, 1]
@@ -634,6 +650,34 @@ array(2) {
         """)
         assert self.space.str_w(output[0]) == '5.4.17'
 
+    def test_memory_get_usage(self):
+        output = self.run("""
+        echo memory_get_usage(), memory_get_usage(true);
+        echo memory_get_peak_usage(), memory_get_peak_usage(true);
+        """)
+        usage, real_usage, peak, real_peak = [self.space.int_w(w_v)
+                                              for w_v in output]
+        if os.path.exists('/proc/self/status'):
+            assert usage > 0 and real_usage > 0
+            assert peak >= usage and real_peak >= real_usage
+
+    def test_hippy_gc_stats(self):
+        output = self.run("""
+        echo gc_collect_cycles();
+        $s = hippy_gc_stats();
+        echo $s['minor_pause_total_ms'] >= $s['minor_pause_max_ms'];
+        echo $s['minor_collections'] == 0 || $s['minor_pause_max_ms'] >=
+            $s['minor_pause_total_ms'] / $s['minor_collections'];
+        echo $s['major_pause_total_ms'] >= $s['major_pause_max_ms'];
+        echo $s['major_steps'] == 0 || $s['major_pause_max_ms'] >=
+            $s['major_pause_total_ms'] / $s['major_steps'];
+        echo $s['total_gc_time_ms'] >= 0.0, $s['peak_memory_usage'];
+        """)
+        assert self.space.int_w(output[0]) == 0
+        assert [self.space.is_true(w) for w in output[1:6]] == [True] * 5
+        if os.path.exists('/proc/self/status'):
+            assert self.space.int_w(output[6]) > 0
+
     def test_is_callable(self):
         output = self.run("""
         echo is_callable("xyz");
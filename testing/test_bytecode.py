@@ -4,6 +4,8 @@ from hippy.objspace import getspace
 from hippy.phpcompiler import compile_php
 from hippy.bytecode import unserialize
 from hippy.bytecode_cache import BytecodeCache
+from hippy.bcimage import (BytecodeImage, ImageError, build_image,
+                           find_sources)
 from hippy.interpreter import get_printable_location
 from testing.test_interpreter import MockInterpreter, BaseTestInterpreter
 
@@ -42,6 +44,25 @@ class TestBytecode(object):
         interp.run_main(space, bc2)
         assert space.int_w(interp.output[0]) == 3 + 4
 
+    def test_serialize_with_patterns(self):
+        source = """<?
+        function f($a) {
+            return preg_match('/^[a-z]+$/', $a);
+        }
+        echo f('abc'), f('a1');
+        ?>"""
+        space = getspace()
+        bc = compile_php('<input>', source, space)
+        dump = bc.serialize(space)
+        bc2 = unserialize(dump, space)
+        w_pattern = bc.functions[0].bytecode.patterns_w[0]
+        w_pattern2 = bc2.functions[0].bytecode.patterns_w[0]
+        assert w_pattern2.unwrap() == w_pattern.unwrap()
+        assert w_pattern2.pce is w_pattern.pce
+        interp = MockInterpreter(space)
+        interp.run_main(space, bc2)
+        assert [space.int_w(w_x) for w_x in interp.output] == [1, 0]
+
     def test_serialize_with_classes(self):
         source = """<?
         class X {
@@ -76,6 +97,56 @@ class TestBytecode(object):
         assert space.str_w(interp.output[0]) == "b"
         assert space.str_w(interp.output[1]) == "b"
 
+    def test_serialize_defaults_and_static_vars(self):
+        source = """<?
+        function f($a, $b=1.5, $c=array(1, "x"=>FOO), $d=null) {
+            static $n = 10;
+            $n++;
+            return $n + $b;
+        }
+        define('FOO', 3);
+        f(1);
+        echo f(1);
+        ?>"""
+        space = getspace()
+        bc = compile_php('<input>', source, space)
+        bc2 = unserialize(bc.serialize(space), space)
+        func = bc2.functions[0]
+        assert func.names == ['a', 'b', 'c', 'd']
+        assert func.defaults_w[0] is None
+        assert space.float_w(func.defaults_w[1]) == 1.5
+        assert func.defaults_w[3] is space.w_Null
+        interp = MockInterpreter(space)
+        interp.run_main(space, bc2)
+        assert space.float_w(interp.output[0]) == 13.5
+
+    def test_serialize_full_classes(self):
+        source = """<?
+        interface I { const C = 4; }
+        class A { public $x = 3; protected static $y = array(); }
+        /** doc */
+        class B extends A implements I {
+            function get($k=self::C) { return $this->x + $k; }
+        }
+        $b = new B();
+        echo $b->get();
+        ?>"""
+        space = getspace()
+        bc = compile_php('<input>', source, space)
+        bc2 = unserialize(bc.serialize(space), space)
+        [orig] = [decl for decl in bc.classes + bc.late_declarations
+                  if decl.name == 'B']
+        [klass] = [decl for decl in bc2.classes + bc2.late_declarations
+                   if decl.name == 'B']
+        assert klass.extends_name == 'A'
+        assert klass.base_interface_names == ['I']
+        assert klass.reflection.doc == orig.reflection.doc
+        assert klass.method_decl['get'].func.bytecode.method_of_class is klass
+        interp = MockInterpreter(space)
+        interp.run_main(space, bc2)
+        assert space.int_w(interp.output[0]) == 7
+
+
 class TestBytecodeCache(BaseTestInterpreter):
     def test_caching_works(self):
         tmpdir = py.path.local(tempfile.mkdtemp())
@@ -114,10 +185,150 @@ class TestBytecodeCache(BaseTestInterpreter):
         bc2 = self.interp.cached_files[str(f)]
         assert bc2 is not bc1
 
+    def test_disk_cache(self):
+        tmpdir = py.path.local(tempfile.mkdtemp())
+        f = tmpdir.join('x.php')
+        f.write("""<? function f($a=2) { return $a * 21; } ?>""")
+        f.setmtime(f.mtime() - 10)
+        old_cache = self.space.bytecode_cache
+        try:
+            cache = BytecodeCache()
+            cache.set_cache_dir(str(tmpdir.join('cache')))
+            self.space.bytecode_cache = cache
+            output = self.run("""
+            include "%s";
+            echo f();
+            """ % f)
+            assert self.space.int_w(output[0]) == 42
+            assert (cache.disk_misses, cache.disk_writes) == (1, 1)
+            # a fresh process: loaded from disk, not compiled
+            cache = BytecodeCache()
+            cache.set_cache_dir(str(tmpdir.join('cache')))
+            self.space.bytecode_cache = cache
+            output = self.run("""
+            include "%s";
+            echo f();
+            """ % f)
+            assert self.space.int_w(output[0]) == 42
+            assert cache.disk_hits == 1
+            # changing the source invalidates the entry
+            f.write("""<? function f($a=2) { return $a * 20; } ?>""")
+            f.setmtime(f.mtime() - 10)
+            cache = BytecodeCache()
+            cache.set_cache_dir(str(tmpdir.join('cache')))
+            self.space.bytecode_cache = cache
+            output = self.run("""
+            include "%s";
+            echo f();
+            """ % f)
+            assert self.space.int_w(output[0]) == 40
+            assert (cache.disk_hits, cache.disk_misses) == (0, 1)
+        finally:
+            self.space.bytecode_cache = old_cache
+
+    def test_disk_cache_corrupted_entry(self):
+        tmpdir = py.path.local(tempfile.mkdtemp())
+        f = tmpdir.join('x.php')
+        f.write("""<? $a = 5; ?>""")
+        f.setmtime(f.mtime() - 10)
+        space = self.space
+        cache = BytecodeCache()
+        cache.set_cache_dir(str(tmpdir.join('cache')))
+        cache.compile_file(str(f), space)
+        entry = py.path.local(cache._disk_path(str(f)))
+        data = entry.read_binary()
+        entry.write_binary(data[:-3] + 'xyz')
+        cache = BytecodeCache()
+        cache.set_cache_dir(str(tmpdir.join('cache')))
+        bc = cache.compile_file(str(f), space)
+        assert space.int_w(bc.consts[0]) == 5
+        assert (cache.disk_hits, cache.disk_misses) == (0, 1)
+
+    def test_disk_cache_failed_write(self):
+        tmpdir = py.path.local(tempfile.mkdtemp())
+        f = tmpdir.join('x.php')
+        f.write("""<? $a = 5; ?>""")
+        f.setmtime(f.mtime() - 10)
+        cache = BytecodeCache()
+        cache.set_cache_dir(str(tmpdir.join('cache')))
+        # a directory in the way of the entry makes the rename fail
+        entry = py.path.local(cache._disk_path(str(f)))
+        entry.ensure('in-the-way')
+        bc = cache.compile_file(str(f), self.space)
+        assert self.space.int_w(bc.consts[0]) == 5
+        assert cache.disk_writes == 0
+        assert entry.dirpath().listdir() == [entry]
+
     def test_get_printable_location(self):
         source = "<? $a = 3; ?>"
         space = getspace()
         bc = compile_php('<input>', source, space)
-        assert get_printable_location(0, bc) == "<main> 1 VAR_PTR"
+        assert get_printable_location(0, bc) == "<main> 1 LOAD_CONST"
         # it may be called with pc = len(bc.code) during jitting
         assert get_printable_location(len(bc.code), bc) == "<main> END ?"
+
+
+class TestBytecodeImage(BaseTestInterpreter):
+    def make_tree(self):
+        tmpdir = py.path.local(tempfile.mkdtemp())
+        tmpdir.join('lib').mkdir()
+        a = tmpdir.join('lib', 'a.php')
+        a.write("""<? function f($a=2) { return $a * 21; } ?>""")
+        b = tmpdir.join('lib', 'b.inc')
+        b.write("""<? class B { const X = 5; } ?>""")
+        tmpdir.join('lib', 'notes.txt').write("not php")
+        main = tmpdir.join('main.php')
+        main.write("""<? require_once "%s"; echo f(); ?>""" % a)
+        return tmpdir, a, b, main
+
+    def test_find_sources(self):
+        tmpdir, a, b, main = self.make_tree()
+        assert find_sources([str(tmpdir)]) == [str(a), str(b), str(main)]
+        assert find_sources([str(b)]) == [str(b)]
+
+    def test_build_and_load(self):
+        tmpdir, a, b, main = self.make_tree()
+        space = self.space
+        path = str(tmpdir.join('image.bin'))
+        assert build_image(space, [str(tmpdir)], path) == 3
+        image = BytecodeImage(path)
+        assert image.matches(space)
+        assert sorted(image.entries.keys()) == [str(a), str(b), str(main)]
+        old_cache = space.bytecode_cache
+        try:
+            cache = BytecodeCache()
+            cache.image = image
+            space.bytecode_cache = cache
+            assert image.preload(space, cache) == 3
+            bc = cache.cached_files[str(a)][0]
+            output = self.run("""
+            include "%s";
+            include "%s";
+            echo f(), B::X;
+            """ % (main, b))
+            assert [self.space.int_w(w) for w in output] == [42, 42, 5]
+            assert self.interp.cached_files[str(a)] is bc
+            # a changed file is compiled again
+            a.write("""<? function f($a=2) { return $a * 20; } ?>""")
+            a.setmtime(a.mtime() + 10)
+            cache = BytecodeCache()
+            cache.image = image
+            space.bytecode_cache = cache
+            output = self.run("""
+            include "%s";
+            """ % main)
+            assert self.space.int_w(output[0]) == 40
+            assert image.stale == 1
+        finally:
+            space.bytecode_cache = old_cache
+            image.close()
+
+    def test_not_an_image(self):
+        tmpdir, a, b, main = self.make_tree()
+        py.test.raises(ImageError, BytecodeImage, str(a))
+        py.test.raises(ImageError, BytecodeImage, str(tmpdir.join('none')))
+        path = str(tmpdir.join('image.bin'))
+        build_image(self.space, [str(a)], path)
+        data = py.path.local(path).read_binary()
+        py.path.local(path).write_binary(data[:-5])
+        py.test.raises(ImageError, BytecodeImage, path)
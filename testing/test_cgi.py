@@ -77,3 +77,82 @@ class TestCGI(BaseTestInterpreter):
         echo $_COOKIE["a"];
         ''', cgi=True)
         assert self.unwrap(output[0]) == "b="
+
+    def run_multipart(self, source, body, expected_warnings=[]):
+        os.environ['CONTENT_TYPE'] = 'multipart/form-data; boundary=XyZ'
+        os.environ['CONTENT_LENGTH'] = str(len(body))
+        try:
+            return self.run(source, expected_warnings,
+                            inp_stream=StringIO(body), cgi=True)
+        finally:
+            del os.environ['CONTENT_TYPE']
+            del os.environ['CONTENT_LENGTH']
+
+    def test_multipart(self):
+        # ends in a near miss of the delimiter, which is '\r\n--XyZ'
+        content = 'line\r\n' * 20000 + 'line--XyZ'
+        body = ('--XyZ\r\n'
+                'Content-Disposition: form-data; name="a"\r\n\r\n'
+                'first\r\nsecond\r\n'
+                '--XyZ\r\n'
+                'Content-Disposition: form-data; name="f"; '
+                'filename="dir/up.txt"\r\n'
+                'Content-Type: text/plain\r\n\r\n' +
+                content + '\r\n'
+                '--XyZ\r\n'
+                'Content-Disposition: form-data; name="g"; filename=""\r\n'
+                'Content-Type: application/octet-stream\r\n\r\n'
+                '\r\n'
+                '--XyZ--\r\n')
+        output = self.run_multipart('''
+        echo $_POST["a"];
+        $f = $_FILES["f"];
+        echo $f["name"], $f["type"], $f["error"], $f["size"];
+        echo file_get_contents($f["tmp_name"]);
+        echo $_FILES["g"]["error"], $_FILES["g"]["tmp_name"];
+        ''', body)
+        assert [self.unwrap(w) for w in output] == [
+            'first\r\nsecond', 'up.txt', 'text/plain', 0, len(content),
+            content, 4, '']
+
+    def test_multipart_max_file_size(self):
+        body = ('--XyZ\r\n'
+                'Content-Disposition: form-data; name="MAX_FILE_SIZE"\r\n\r\n'
+                '100\r\n'
+                '--XyZ\r\n'
+                'Content-Disposition: form-data; name="f"; '
+                'filename="big.bin"\r\n\r\n' +
+                'x' * 1000 + '\r\n'
+                '--XyZ--\r\n')
+        output = self.run_multipart('''
+        $f = $_FILES["f"];
+        echo $f["error"], $f["size"], $f["tmp_name"];
+        ''', body)
+        assert [self.unwrap(w) for w in output] == [2, 0, '']
+
+    def test_post_max_size(self):
+        os.environ['CONTENT_TYPE'] = 'multipart/form-data; boundary=XyZ'
+        os.environ['CONTENT_LENGTH'] = str(9 * 1024 * 1024)
+        try:
+            output = self.run('''
+            echo count($_POST), count($_FILES);
+            ''', ['Warning: POST Content-Length of 9437184 bytes exceeds '
+                  'the limit of 8388608 bytes'],
+                inp_stream=StringIO('--XyZ--\r\n'), cgi=True)
+        finally:
+            del os.environ['CONTENT_TYPE']
+            del os.environ['CONTENT_LENGTH']
+        assert [self.unwrap(w) for w in output] == [0, 0]
+
+    def test_invalid_content_length(self):
+        os.environ['CONTENT_TYPE'] = 'application/x-www-form-urlencoded'
+        os.environ['CONTENT_LENGTH'] = 'abc'
+        try:
+            output = self.run('''
+            echo count($_POST);
+            ''', ['Warning: Invalid CONTENT_LENGTH: abc, ignoring post'],
+                inp_stream=StringIO('x=1'), cgi=True)
+        finally:
+            del os.environ['CONTENT_TYPE']
+            del os.environ['CONTENT_LENGTH']
+        assert self.unwrap(output[0]) == 0
@@ -347,6 +347,32 @@ class TestCompiler(object):
         """)
         assert bc.stackdepth == 3
 
+    def test_function_call_literal_pattern(self):
+        bc = self.check_compile("""
+        preg_match('/^\\d+$/', $s);
+        PREG_SPLIT('x', $s);
+        """, """
+        LOAD_NAME 0
+        GETFUNC
+        LOAD_PATTERN 0
+        ARG_BY_VALUE 0
+        VAR_PTR 0
+        ARG_BY_PTR 1
+        CALL 2
+        DISCARD_TOP
+        LOAD_NAME 1
+        GETFUNC
+        LOAD_NAME 2
+        ARG_BY_VALUE 0
+        VAR_PTR 0
+        ARG_BY_PTR 1
+        CALL 2
+        DISCARD_TOP
+        """)
+        w_pattern, = bc.patterns_w
+        assert w_pattern.unwrap() == '/^\\d+$/'
+        assert w_pattern.pce is not None
+
     def test_function_call_mayberef_arg(self):
         self.check_compile("""
         f($a[5]);
@@ -422,6 +448,15 @@ class TestCompiler(object):
         """)
         assert bc.names[0] == '\n';
 
+    def test_str_consts_interned(self):
+        bc1 = self.check_compile('echo "interned" . "abc";')
+        bc2 = self.check_compile('$a = array("interned" => 1);')
+        w_name = bc1.names_w[bc1.names.index("interned")]
+        assert w_name.unwrap() == "interned"
+        key, _ = bc2.consts[0].pairs[0]
+        assert key.unwrap() is w_name.unwrap()
+        assert bc1.names_w[bc1.names.index("abc")] is not w_name
+
     def test_getitem_setitem(self):
         self.check_compile("$x[3]; $x[3] = 1;", """
         LOAD_CONST 0
@@ -1662,7 +1697,7 @@ class TestCompiler(object):
                         "DISCARD_TOP\n") * count
         #
         self.check_compile("if($x){%s}" % block, """
-        LOAD_VAR 0
+        LOAD_VAR_TEMP 0
         JUMP_IF_FALSE 132
         %s
         """ % block_disass)
@@ -1689,7 +1724,7 @@ class TestCompiler(object):
                         "DISCARD_TOP\n") * count
         #
         self.check_compile("if($x){%s}" % block, """
-        LOAD_VAR 0
+        LOAD_VAR_TEMP 0
         JUMP_IF_FALSE 16386
         %s
         """ % block_disass)
@@ -1832,7 +1867,7 @@ class TestCompiler(object):
         }
         """, """
       0 _CHECKSTACK 0          # while
-        LOAD_VAR 0
+        LOAD_VAR_TEMP 0
         JUMP_IF_FALSE 94
         LOAD_VAR 0             # foreach
         CREATE_ITER
@@ -1842,7 +1877,7 @@ class TestCompiler(object):
         STORE
         DISCARD_TOP
      21 _CHECKSTACK 1
-        LOAD_VAR 1             # while
+        LOAD_VAR_TEMP 1        # while
         JUMP_IF_FALSE 85
         LOAD_VAR 1             # foreach
         CREATE_ITER
@@ -50,3 +50,11 @@ class TestConfig(object):
         E_STRICT = CONSTS['Core']['E_STRICT']
         E_WARNING = CONSTS['Core']['E_WARNING']
         assert self.space.int_w(conf.ini['error_reporting']) == E_ALL & ~E_STRICT & ~E_WARNING
+
+    def test_output_write_size_of_owner(self):
+        space = ObjSpace()
+        interp = Interpreter(space)
+        other = Interpreter(space)    # now space.ec.interpreter
+        interp.config.set_ini_w('hippy.output_write_size', space.wrap(0))
+        assert interp.stdout.size == 0
+        assert other.stdout.size > 0
@@ -261,6 +261,48 @@ class TestFileOps(BaseTestInterpreter):
         ''' % f)
         assert [self.space.int_w(i) for i in output] == [21, 63, 1]
 
+    @py.test.mark.skipif("config.option.runappdirect",
+                         reason="hippy_realpath_cache_stats is hippy only")
+    def test_include_path_cache(self, tmpdir):
+        lib = tmpdir.mkdir('lib')
+        lib.join('a.php').write('<?php return 42;')
+        output = self.run("""
+        set_include_path('%s' . PATH_SEPARATOR . '%s');
+        clearstatcache();
+        $before = hippy_realpath_cache_stats();
+        include 'a.php';
+        $middle = hippy_realpath_cache_stats();
+        echo include 'a.php';
+        $after = hippy_realpath_cache_stats();
+        echo $middle['misses'] - $before['misses'];
+        echo $after['misses'] - $middle['misses'];
+        echo $after['hits'] - $middle['hits'];
+        $entries = realpath_cache_get();
+        echo $entries['%s']['realpath'];
+        echo realpath_cache_size() > 0;
+        clearstatcache(true);
+        echo realpath_cache_size();
+        """ % (tmpdir, lib, lib.join('a.php')))
+        assert [self.unwrap(w) for w in output] == [
+            42, 2, 0, 2, str(lib.join('a.php')), True, 0]
+
+    def test_include_created_after_failed_include(self, tmpdir):
+        f = tmpdir.join('late.php')
+        with self.warnings([
+                'Warning: include(late.php): '
+                    'failed to open stream: No such file or directory',
+                "Warning: include(): Failed opening "
+                    "'late.php' for inclusion (include_path=...)"]):
+            output = self.run("""
+            set_include_path('%s');
+            $x = include 'late.php';
+            echo $x;
+            file_put_contents('%s', '<?php return "late";');
+            echo include 'late.php';
+            """ % (tmpdir, f))
+        assert self.space.is_w(output[0], self.space.w_False)
+        assert self.space.str_w(output[1]) == 'late'
+
     def test_throw_in_include(self, tmpdir):
         f = tmpdir.join('x.php')
         f.write('''<?php
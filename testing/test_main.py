@@ -147,6 +147,27 @@ Stack trace:
         ?>''', capfd, cgi=True)
         assert output == "Content-Type: text/css\r\n\r\n"
 
+    def test_output_order_with_stdout_resource(self, capfd):
+        output = self.run('''<?
+        echo "a";
+        fwrite(STDOUT, "b");
+        echo "c";
+        $f = fopen("php://output", "w");
+        fwrite($f, "d");
+        echo "e";
+        ?>''', capfd)
+        assert output == "abcde"
+
+    def test_output_write_size(self, capfd):
+        output = self.run('''<?
+        echo ini_get("hippy.output_write_size");
+        ini_set("hippy.output_write_size", "0");
+        echo "x";
+        flush();
+        echo "y";
+        ?>''', capfd)
+        assert output == "8Kxy"
+
     def test_hippy_ini_read(self, capfd):
         tmpdir = tempfile.mkdtemp()
         d = os.getcwd()
@@ -173,6 +194,17 @@ class TestStdin(BaseTestInterpreter):
         child.expect("e0e1e2")
         child.expect(pexpect.EOF)
 
+    def test_output_order_with_errors(self, tmpdir):
+        # stdout and stderr both go to the terminal here
+        f = tmpdir.join("file.php")
+        f.write("<?php echo 'before'; echo $undefined; echo 'after'; ?>")
+        child = pexpect.spawn(sys.executable,
+                [HIPPY_MAIN, f.strpath], env=os.environ)
+        child.expect("before")
+        child.expect("Notice: Undefined variable: undefined")
+        child.expect("after")
+        child.expect(pexpect.EOF)
+
     def test_code_from_file(self, tmpdir):
         f = tmpdir.join("file.php")
         f.write("<?php for ($i=0; $i < 3; $i++) {echo \"e$i\";} ?>")
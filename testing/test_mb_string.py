@@ -1,6 +1,25 @@
-
+from hippy.module.mbstring import utf8
 from testing.test_interpreter import BaseTestInterpreter
 
+
+def test_utf8_index():
+    s = "a\xc3\xa9" * 100 + "\xe6\x97\xa5\x84\xc4"
+    index = utf8.Utf8Index(s)
+    assert not index.ascii
+    assert index.length == 203
+    assert index.byte_offset(0) == 0
+    assert index.byte_offset(65) == 97
+    assert index.byte_offset(200) == 300
+    assert index.byte_offset(202) == 304
+    assert index.byte_offset(203) == len(s) == 305
+    assert index.char_index(97) == 65
+    assert index.char_index(98) == 65
+    assert index.char_index(302) == 200
+    assert index.substring(199, 201) == "\xc3\xa9\xe6\x97\xa5"
+    index = utf8.Utf8Index("abc")
+    assert index.ascii and index.length == 3 and index.byte_offset(2) == 2
+
+
 class TestMBString(BaseTestInterpreter):
     def test_mb_strlen(self):
         output = self.run(r'''
@@ -15,3 +34,74 @@ class TestMBString(BaseTestInterpreter):
         ''')
         assert [self.space.int_w(s) for s in output] == [
             3, 4, 4, 5, 3, 3, 3, 3]
+
+    def test_mb_substr(self):
+        output = self.run(r'''
+        $s = "a\xc3\xa9\xe6\x97\xa5b";
+        echo mb_substr($s, 1);
+        echo mb_substr($s, 1, 2);
+        echo mb_substr($s, -2);
+        echo mb_substr($s, 0, -1);
+        echo mb_substr($s, 1, null);
+        echo mb_substr($s, 5);
+        echo mb_substr($s, 3, -2);
+        echo mb_substr("hello world", 6, 3);
+        $long = str_repeat("\xc3\xa9t\xc3\xa9 ", 1000);
+        echo mb_substr($long, 3998, 4);
+        ''')
+        assert [self.space.str_w(s) for s in output] == [
+            "\xc3\xa9\xe6\x97\xa5b", "\xc3\xa9\xe6\x97\xa5", "\xe6\x97\xa5b",
+            "a\xc3\xa9\xe6\x97\xa5", "\xc3\xa9\xe6\x97\xa5b", "", "", "wor",
+            "\xc3\xa9 ",
+        ]
+
+    def test_mb_strpos(self):
+        output = self.run(r'''
+        $s = "\xc3\xa9t\xc3\xa9 \xc3\xa9t\xc3\xa9";
+        echo mb_strpos($s, "t");
+        echo mb_strpos($s, "t", 2);
+        echo mb_strpos($s, "x");
+        echo mb_strpos("abcabc", "c", 3);
+        ''')
+        assert self.space.int_w(output[0]) == 1
+        assert self.space.int_w(output[1]) == 5
+        assert self.space.is_w(output[2], self.space.w_False)
+        assert self.space.int_w(output[3]) == 5
+        with self.warnings() as w:
+            output = self.run('''
+            echo mb_strpos("abc", "a", 4);
+            echo mb_strpos("abc", "");
+            ''')
+        assert w == ['Warning: mb_strpos(): Offset not contained in string',
+                     'Warning: mb_strpos(): Empty delimiter']
+
+    def test_mb_case(self):
+        output = self.run(r'''
+        echo mb_strtolower("\xc3\x89COLE Stra\xc3\x9fe \xce\x91\xce\x92");
+        echo mb_strtoupper("\xc3\xa9cole stra\xc3\x9fe \xce\xb1\xce\xb2");
+        echo mb_strtoupper("abc");
+        echo mb_strtolower("ABC\xff");
+        ''')
+        assert [self.space.str_w(s) for s in output] == [
+            "\xc3\xa9cole stra\xc3\x9fe \xce\xb1\xce\xb2",
+            "\xc3\x89COLE STRA\xc3\x9fE \xce\x91\xce\x92",
+            "ABC", "abc\xff",
+        ]
+
+    def test_mb_str_split(self):
+        output = self.run(r'''
+        echo implode("|", mb_str_split("a\xc3\xa9\xe6\x97\xa5b"));
+        echo implode("|", mb_str_split("a\xc3\xa9\xe6\x97\xa5b", 3));
+        echo count(mb_str_split(""));
+        ''')
+        assert self.space.str_w(output[0]) == "a|\xc3\xa9|\xe6\x97\xa5|b"
+        assert self.space.str_w(output[1]) == "a\xc3\xa9\xe6\x97\xa5|b"
+        assert self.space.int_w(output[2]) == 0
+
+    def test_mb_strwidth(self):
+        output = self.run(r'''
+        echo mb_strwidth("abc");
+        echo mb_strwidth("\xe6\x97\xa5\xe6\x9c\xac\xe8\xaa\x9eabc");
+        echo mb_strwidth("\xc3\xa9\xef\xbd\xb1");
+        ''')
+        assert [self.space.int_w(s) for s in output] == [3, 9, 2]
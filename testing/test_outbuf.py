@@ -0,0 +1,97 @@
+import os
+import errno
+from hippy.outbuf import StdoutWriter, writev, WRITEV_THRESHOLD
+
+
+def read_all(fd):
+    chunks = []
+    while True:
+        data = os.read(fd, 65536)
+        if not data:
+            return ''.join(chunks)
+        chunks.append(data)
+
+
+class TestStdoutWriter(object):
+    def setup_method(self, meth):
+        self.r, self.w = os.pipe()
+
+    def teardown_method(self, meth):
+        for fd in [self.r, self.w]:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def output(self):
+        os.close(self.w)
+        return read_all(self.r)
+
+    def test_writev(self):
+        assert writev(self.w, ['ab', '', 'cd', 'x' * 10]) == 14
+        assert self.output() == 'abcd' + 'x' * 10
+
+    def test_coalesce(self):
+        writer = StdoutWriter(self.w, 20)
+        for piece in ['<li>', 'one', '</li>', '<li>']:
+            writer.write(piece)
+        assert writer.syscalls == 0
+        writer.write('two</li>')
+        assert writer.syscalls == 1
+        writer.write('\n')
+        writer.flush()
+        assert writer.syscalls == 2
+        writer.flush()
+        assert writer.syscalls == 2
+        assert self.output() == '<li>one</li><li>two</li>\n'
+
+    def test_size_zero(self):
+        writer = StdoutWriter(self.w, 0)
+        writer.write('a')
+        writer.write('')
+        writer.write('b')
+        assert writer.syscalls == 2
+        assert self.output() == 'ab'
+
+    def test_set_size_flushes(self):
+        writer = StdoutWriter(self.w, 1024)
+        writer.write('a')
+        writer.set_size(0)
+        assert writer.syscalls == 1
+        writer.write('b')
+        assert self.output() == 'ab'
+
+    def test_large_piece(self):
+        writer = StdoutWriter(self.w, 1024)
+        big = 'x' * WRITEV_THRESHOLD
+        writer.write('<pre>')
+        writer.write(big)
+        # written together with what was pending, in a single writev()
+        assert writer.syscalls == 1
+        writer.write('</pre>')
+        writer.flush()
+        assert self.output() == '<pre>' + big + '</pre>'
+
+    def test_broken_pipe(self):
+        writer = StdoutWriter(self.w, 0)
+        os.close(self.r)
+        import signal
+        handler = signal.signal(signal.SIGPIPE, signal.SIG_IGN)
+        try:
+            writer.write('lost')
+            writer.write('lost too')
+        finally:
+            signal.signal(signal.SIGPIPE, handler)
+        assert writer.broken
+        assert writer.syscalls == 1
+
+    def test_bad_fd(self):
+        writer = StdoutWriter(self.w, 1024)
+        writer.write('x')
+        os.close(self.w)
+        try:
+            writer.flush()
+        except OSError, e:
+            assert e.errno == errno.EBADF
+        else:
+            assert False, "expected an OSError"
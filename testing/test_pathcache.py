@@ -0,0 +1,69 @@
+import os
+from hippy.pathcache import RealpathCache, ENTRY_OVERHEAD
+
+
+def test_lookup(tmpdir):
+    f = tmpdir.join('a.php')
+    f.write('<?php ')
+    cache = RealpathCache()
+    entry = cache.lookup(str(f))
+    assert entry.exists and not entry.is_dir
+    assert entry.abspath == str(f)
+    assert cache.lookup(str(tmpdir)).is_dir
+    assert not cache.exists(str(tmpdir.join('missing.php')))
+    assert (cache.hits, cache.misses) == (0, 3)
+    assert cache.lookup(str(f)) is entry
+    assert not cache.exists(str(tmpdir.join('missing.php')))
+    assert (cache.hits, cache.misses) == (2, 3)
+    assert cache.count() == 3
+    assert cache.used == sum([e.size for e in cache.entries()])
+
+
+def test_relative_path(tmpdir):
+    old = os.getcwd()
+    os.chdir(str(tmpdir))
+    try:
+        tmpdir.join('b.php').write('')
+        cache = RealpathCache()
+        assert cache.abspath('./b.php') == str(tmpdir.join('b.php'))
+    finally:
+        os.chdir(old)
+
+
+def test_ttl(tmpdir):
+    f = tmpdir.join('a.php')
+    cache = RealpathCache(ttl=0)
+    assert not cache.exists(str(f))
+    f.write('')
+    assert cache.exists(str(f))
+    cache = RealpathCache(ttl=120)
+    f.remove()
+    assert not cache.exists(str(f))
+    f.write('')
+    assert not cache.exists(str(f))    # until clearstatcache()
+    cache.forget(str(f))
+    assert cache.exists(str(f))
+
+
+def test_size_limit(tmpdir):
+    path = str(tmpdir.join('x'))
+    one = ENTRY_OVERHEAD + 2 * len(path + '0')
+    cache = RealpathCache(size_limit=3 * one)
+    for i in range(5):
+        cache.lookup(path + str(i))
+    assert cache.count() == 3
+    assert cache.used == 3 * one
+    cache.lookup(path + '4')
+    assert cache.misses == 6
+    cache.configure(one, 120)
+    assert cache.count() == 0 and cache.used == 0
+    cache.configure(0, 120)
+    cache.lookup(path + '0')
+    assert cache.count() == 0
+
+
+def test_clear(tmpdir):
+    cache = RealpathCache()
+    cache.lookup(str(tmpdir))
+    cache.clear()
+    assert cache.count() == 0 and cache.used == 0
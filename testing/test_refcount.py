@@ -221,3 +221,24 @@ array(3) {
         count($a);
         ''')
         assert ''.join(output) == ""
+
+    def test_nested_arrays_copied_lazily(self):
+        output = self.run('''
+        function f($c) { $c["k"] = 2; }
+        $x = 1;
+        $a = array("db" => array("host" => "h", "n" => $x), "k" => $x);
+        f($a);
+        ''')
+        assert ''.join(output) == """\
+array(2) {
+  ["db"]=>
+  array(2) {
+    ["host"]=>
+    string(1) "h"
+    ["n"]=>
+    int(1)
+  }
+  ["k"]=>
+  int(1)
+}
+"""
@@ -2,6 +2,7 @@
 
 import py
 from testing.test_interpreter import BaseTestInterpreter, hippy_fail
+from hippy.module.regex.cache import RegexpCache
 
 
 class TestRegex(BaseTestInterpreter):
@@ -452,3 +453,70 @@ class TestRegex(BaseTestInterpreter):
         echo $m;
         ''')
         assert output[0].dump() == "array(array(array('', 0), array('', 2)))"
+
+    def test_cache_size_ini(self):
+        output = self.run('''
+        ini_set('pcre.cache_size', 2);
+        $a = '/cache_a/';
+        $b = '/cache_b/';
+        $c = '/cache_c/';
+        preg_match($a, 'x');
+        preg_match($b, 'x');
+        preg_match($a, 'x');
+        preg_match($c, 'x');
+        $stats = hippy_pcre_cache_stats();
+        echo $stats['size'], $stats['capacity'], $stats['evictions'] > 0;
+        ''')
+        assert [self.space.int_w(w_x) for w_x in output] == [2, 2, 1]
+
+    def test_literal_pattern(self):
+        output = self.run(r'''
+        $before = hippy_pcre_cache_stats();
+        $n = 0;
+        for ($i = 0; $i < 10; $i++) {
+            $n += preg_match('/^\d+$/', (string)$i);
+            $n += count(preg_split('/,/', "a,b"));
+            $n += strlen(preg_replace('/[aeiou]/', '', "literal"));
+        }
+        $after = hippy_pcre_cache_stats();
+        echo $n, $after['misses'] - $before['misses'],
+             $after['hits'] - $before['hits'];
+        ''')
+        assert [self.space.int_w(w_x) for w_x in output] == [70, 0, 0]
+
+    def test_literal_pattern_invalid(self):
+        with self.warnings() as w:
+            output = self.run('''
+            for ($i = 0; $i < 2; $i++) {
+                echo preg_match('abc', 'abc');
+            }
+            ''')
+        assert [self.space.is_w(w_x, self.space.w_False)
+                for w_x in output] == [True, True]
+        assert w == ['Warning: preg_match(): Delimiter must not be '
+                     'alphanumeric or backslash'] * 2
+
+
+class TestRegexpCache(object):
+    def test_lru_eviction(self):
+        cache = RegexpCache(None, capacity=2)
+        cache.set('/a/', 'A')
+        cache.set('/b/', 'B')
+        assert cache.get('/a/') == 'A'     # '/b/' is now the oldest
+        cache.set('/c/', 'C')
+        assert cache.get('/b/') is None
+        assert cache.get('/a/') == 'A'
+        assert cache.get('/c/') == 'C'
+        assert cache.size() == 2
+        assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+
+    def test_set_capacity(self):
+        cache = RegexpCache(None, capacity=3)
+        for pattern in ['/a/', '/b/', '/c/']:
+            cache.set(pattern, pattern)
+        cache.set_capacity(1)
+        assert cache.size() == 1
+        assert cache.get('/c/') == '/c/'
+        cache.set_capacity(0)
+        cache.set('/d/', '/d/')
+        assert cache.get('/d/') is None
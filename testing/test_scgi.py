@@ -0,0 +1,48 @@
+import os
+import py
+from hippy.scgi import (ScgiError, parse_scgi_headers, read_scgi_request,
+                        encode_scgi_request)
+
+
+def pipe_with(data):
+    r, w = os.pipe()
+    os.write(w, data)
+    os.close(w)
+    return r
+
+
+def test_parse_headers():
+    params = parse_scgi_headers('CONTENT_LENGTH\x0027\x00SCGI\x001\x00'
+                                'REQUEST_METHOD\x00POST\x00EMPTY\x00\x00')
+    assert params == {'CONTENT_LENGTH': '27', 'SCGI': '1',
+                      'REQUEST_METHOD': 'POST', 'EMPTY': ''}
+
+
+def test_parse_headers_malformed():
+    py.test.raises(ScgiError, parse_scgi_headers, 'CONTENT_LENGTH\x000')
+    py.test.raises(ScgiError, parse_scgi_headers, 'A\x00b\x00C\x00')
+    py.test.raises(ScgiError, parse_scgi_headers, 'SCGI\x001\x00')
+    py.test.raises(ScgiError, parse_scgi_headers, '\x00x\x00')
+
+
+def test_read_request_leaves_body():
+    data = encode_scgi_request({'SCRIPT_FILENAME': '/srv/index.php'},
+                               'a=1&b=2')
+    fd = pipe_with(data)
+    try:
+        params = read_scgi_request(fd)
+        assert params == {'CONTENT_LENGTH': '7',
+                          'SCRIPT_FILENAME': '/srv/index.php'}
+        assert os.read(fd, 100) == 'a=1&b=2'
+    finally:
+        os.close(fd)
+
+
+def test_read_request_malformed():
+    for data in ['', '12', ':,', 'x:', '5:CONTE', '1234567890:',
+                 '17:CONTENT_LENGTH\x000\x00;']:
+        fd = pipe_with(data)
+        try:
+            py.test.raises(ScgiError, read_scgi_request, fd)
+        finally:
+            os.close(fd)
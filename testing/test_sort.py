@@ -1,8 +1,9 @@
 import py
 from testing.test_interpreter import BaseTestInterpreter
 from hippy.sort import (
-    _get_key_func, default_cmp, MultiSort,
-    identity, to_double, to_string, to_string_lower)
+    _get_key_func, default_cmp, MultiSort, sort_unboxed, _sort_by_keys,
+    identity, to_double, to_string, to_string_lower, NONE, KEY, VALUE,
+    SORT_REGULAR, SORT_NUMERIC, SORT_STRING, SORT_NATURAL, SORT_FLAG_CASE)
 
 def convert(space, table):
     to_pair = lambda x: (space.wrap(0), space.wrap(x))
@@ -28,3 +29,82 @@ class TestSortDirect(BaseTestInterpreter):
         input_w = convert(self.space, input)
         MultiSort(self.space, input_w, keys, cmps, signs).sort()
         assert input_w == convert(self.space, expected)
+
+    def test_sort_unboxed(self):
+        space = self.space
+        w_arr = sort_unboxed(space, space.new_array_from_ints([3, -1, 2]))
+        assert w_arr.ints == [-1, 2, 3]
+        w_arr = sort_unboxed(space, space.new_array_from_floats([.5, -2.]),
+                             reverse=True)
+        assert w_arr.floats == [.5, -2.]
+        # these go through the generic sort
+        w_ints = space.new_array_from_ints([10, 9])
+        assert sort_unboxed(space, w_ints, SORT_STRING) is None
+        w_nan = space.new_array_from_floats([1., float('nan')])
+        assert sort_unboxed(space, w_nan) is None
+        w_list = space.new_array_from_list([space.newint(1),
+                                            space.newstr("a")])
+        assert sort_unboxed(space, w_list) is None
+
+    def test_sort_int_list(self):
+        output = self.run('''
+        $a = array(5, 3, 10, -1);
+        $b = $a;
+        sort($a);
+        rsort($b);
+        echo implode(",", $a), implode(",", $b);
+        $c = array(10, 9, 100);
+        sort($c, SORT_STRING);
+        echo implode(",", $c);
+        ''')
+        assert [self.space.str_w(w) for w in output] == [
+            "-1,3,5,10", "10,5,3,-1", "10,100,9"]
+
+    def test_sort_by_keys(self):
+        space = self.space
+        def check(items, sort_type, elem=NONE):
+            values = [space.wrap(x) for x in items]
+            if elem == KEY:
+                values = [(w_x, space.newint(0)) for w_x in values]
+            elif elem == VALUE:
+                values = [(space.newint(0), w_x) for w_x in values]
+            if not _sort_by_keys(space, values, sort_type, elem, False):
+                return None
+            if elem != NONE:
+                values = [pair[elem == VALUE] for pair in values]
+            return [self.unwrap(w_x) for w_x in values]
+        assert check([3, -1, 2], SORT_REGULAR) == [-1, 2, 3]
+        assert check(["b", "a10", "a9", "10"], SORT_REGULAR,
+                     KEY) == ["10", "a10", "a9", "b"]
+        assert check([2.5, "1e1", True], SORT_NUMERIC) == [True, 2.5, "1e1"]
+        assert check(["b", "B", "a"], SORT_STRING | SORT_FLAG_CASE,
+                     VALUE) == ["a", "b", "B"]
+        assert check([10, 9, 100], SORT_STRING) == [10, 100, 9]
+        assert check(["x10", "X9"], SORT_NATURAL | SORT_FLAG_CASE) == [
+            "X9", "x10"]
+        # these are not ordered by comparing keys of a single type
+        assert check(["10", "9", "a"], SORT_REGULAR) is None
+        assert check([1, "a"], SORT_REGULAR) is None
+        assert check([1.5, float('nan')], SORT_NUMERIC) is None
+
+    def test_sort_strings(self):
+        output = self.run('''
+        $a = array("b" => "pear", "a" => "Apple", "c" => "apple");
+        asort($a);
+        echo implode(",", array_keys($a));
+        arsort($a, SORT_STRING | SORT_FLAG_CASE);
+        echo implode(",", $a);
+        ksort($a);
+        echo implode(",", array_keys($a));
+        $b = array("img12", "img10", "IMG2", "img1");
+        sort($b, SORT_NATURAL | SORT_FLAG_CASE);
+        echo implode(",", $b);
+        sort($b, SORT_LOCALE_STRING);
+        echo implode(",", $b);
+        $c = array("10", "9", "x");
+        sort($c);
+        echo implode(",", $c);
+        ''')
+        assert [self.space.str_w(w) for w in output] == [
+            "a,c,b", "pear,apple,Apple", "a,b,c",
+            "img1,IMG2,img10,img12", "IMG2,img1,img10,img12", "9,10,x"]
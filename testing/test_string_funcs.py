@@ -2,6 +2,10 @@ import pytest, sys
 
 from hippy.module.standard.strings.funcs import (unwrap_needle, intsign, rstrcmp, _split_word,
         _substr_window)
+from hippy.module.standard.strings.multireplace import MultiReplacer
+from hippy.module.standard.strings.formatcache import compile_format
+from hippy.module.standard.strings import search
+from hippy.module.standard.strings.htmlentities import ENTITY_TRIE
 from hippy.objspace import ObjSpace
 
 from testing.test_interpreter import BaseTestInterpreter
@@ -52,6 +56,93 @@ def test_substr_window(n, start, length, result):
     assert (start, end) == result
 
 
+@pytest.mark.parametrize(["pairs", "subject", "expected"], [
+    [[("h", "x"), ("hello", "y"), ("hi", "z")], "hello hi", ("y z", 2)],
+    [[("bc", "1"), ("abcd", "2")], "abcabcd", ("a12", 2)],
+    [[("ab", "1"), ("abcde", "2")], "abcdabcde", ("1cd2", 2)],
+    [[("aa", "b")], "aaaaa", ("bba", 2)],
+    [[("a", "b"), ("b", "a")], "abba", ("baab", 4)],
+    [[("", "x"), ("a", "")], "banana", ("bnn", 3)],
+    [[("x", "y")], "", ("", 0)],
+    ])
+def test_multi_replacer(pairs, subject, expected):
+    replacer = MultiReplacer([key for key, _ in pairs],
+                             [value for _, value in pairs])
+    assert replacer.replace(subject) == expected
+
+
+@pytest.mark.parametrize(["needles", "replacements", "one_pass"], [
+    [["{name}", "{age}"], ["John", "42"], True],
+    [["&", "<", ">"], ["&amp;", "&lt;", "&gt;"], True],
+    [["<", "&"], ["&lt;", "&amp;"], False],     # "&" is found in "&lt;"
+    [["a", "b"], ["", "c"], False],             # "b" may get next to "a"
+    [["a", "b"], ["xy", ""], True],
+    [["ab", "b"], ["x", "y"], False],           # "b" is part of "ab"
+    [["ab", "bc"], ["x", "y"], False],          # "abc" has both
+    [["abab", "x"], ["y", "z"], True],
+    [["xa", "ab"], ["c", "x"], False],          # "xab" becomes "xx"
+    [["a", "bc"], ["xb", "y"], False],          # "ac" becomes "xbc"
+    ])
+def test_multi_replacer_one_pass(needles, replacements, one_pass):
+    replacer = MultiReplacer(needles, replacements)
+    replacer.check_one_pass(replacements)
+    assert replacer.one_pass == one_pass
+
+
+_FOLD = ''.join([chr(i).lower() for i in range(256)])
+
+
+@pytest.mark.parametrize(["haystack", "needle", "start", "end"], [
+    ("Hello World", "o", 0, 11),
+    ("Hello World", "wor", 0, 11),
+    ("Hello World", "wor", 0, 8),
+    ("Hello World", "wor", 7, 11),
+    ("abABabAB", "abab", 1, 8),
+    ("xXxXx", "xx", 0, 5),
+    ("aaa", "aaaa", 0, 3),
+    ("", "a", 0, 0),
+    ])
+def test_search(haystack, needle, start, end):
+    lowered = haystack.lower()
+    assert (search.find(haystack, needle, start, end, _FOLD) ==
+            lowered.find(needle, start, end))
+    assert (search.rfind(haystack, needle, start, end, _FOLD) ==
+            lowered.rfind(needle, start, end))
+    assert (search.find(haystack, needle, start, end) ==
+            haystack.find(needle, start, end))
+
+
+def test_compile_format():
+    compiled = compile_format("[%s] %-5d%%x%'*8.2f end")
+    assert [(spec.literal, spec.conv) for spec in compiled.specs] == [
+        ("[", "s"), ("] ", "d"), ("", "%"), ("x", "f")]
+    assert compiled.tail == " end"
+    spec = compiled.specs[1]
+    assert spec.to_left and spec.width == 5 and spec.consumes
+    assert not compiled.specs[2].consumes
+    spec = compiled.specs[3]
+    assert (spec.pad_char, spec.width, spec.precision) == ("*", 8, 2)
+    assert spec.prec_adjust
+    spec, = compile_format("%2$s").specs
+    assert spec.has_argnum and spec.argnum == 1
+    compiled = compile_format("abc%")
+    assert compiled.specs == [] and compiled.tail == "abc"
+    spec, = compile_format("abc%-5").specs
+    assert spec.truncated and spec.literal == "abc"
+
+
+@pytest.mark.parametrize(["s", "start", "expected"], [
+    ("&lt;", 1, (4, "<")),
+    ("x&nbsp;y", 2, (7, "\xc2\xa0")),
+    ("&euro;", 1, (6, "\xe2\x82\xac")),
+    ("&lt", 1, (-1, None)),
+    ("&ltx;", 1, (-1, None)),
+    ("&bogus;", 1, (-1, None)),
+    ])
+def test_entity_trie(s, start, expected):
+    assert ENTITY_TRIE.match(s, start) == expected
+
+
 class TestBuiltin(BaseTestInterpreter):
 
     @pytest.mark.parametrize(["input", "expected"], [
@@ -299,6 +390,23 @@ class TestBuiltin(BaseTestInterpreter):
             output = self.run('echo sprintf("foo %d bar");')
         assert self.space.is_w(output[0], self.space.w_False)
 
+    def test_sprintf_same_format(self):
+        output = self.run('''
+        $lines = array();
+        for ($i = 0; $i < 3; $i++) {
+            $lines[] = sprintf('[%05d] %-4s|%2$s|%.1f', $i, "ab", $i / 5);
+        }
+        echo implode(",", $lines);
+        echo sprintf("%s and %-5", "x", "y");
+        ''')
+        assert map(self.space.str_w, output) == [
+            "[00000] ab  |ab|0.0,[00001] ab  |ab|0.2,[00002] ab  |ab|0.4",
+            "x and "]
+        with self.warnings(['Warning: sprintf(): '
+                            'Argument number must be greater than zero']):
+            output = self.run('echo sprintf(\'%0$s\', "x");')
+        assert self.space.is_w(output[0], self.space.w_False)
+
     @pytest.mark.skipif('config.option.runappdirect', reason='prints to stdout')
     def test_vprintf(self):
         output = self.run('''
@@ -425,6 +533,23 @@ class TestBuiltin(BaseTestInterpreter):
         assert _as_list(self.space, output[0]) == ["Xab", "aXX"]
         assert self.space.int_w(output[1]) == 4
 
+    def test_str_replace_array_passes(self):
+        output = self.run('''
+        $search = array("&", "<", ">");
+        $replace = array("&amp;", "&lt;", "&gt;");
+        echo str_replace($search, $replace, "<a&b>", $count);
+        echo $count;
+        echo str_replace(array_reverse($search), array_reverse($replace),
+                         "<a&b>");
+        echo str_ireplace(array("A", "b"), array("bb", "c"), "aBAb", $count);
+        echo $count;
+        echo str_ireplace(array("X", "Y"), array("y", "z"), "xYxy", $count);
+        echo $count;
+        ''')
+        assert map(self.space.str_w, output) == [
+            "&lt;a&amp;b&gt;", "3", "&amp;lt;a&amp;b&amp;gt;",
+            "cccccc", "8", "zzzz", "6"]
+
     def test_str_rot13(self):
         output = self.run('''
         echo str_rot13("PHp 5");
@@ -734,6 +859,12 @@ class TestBuiltin(BaseTestInterpreter):
         ''')
         assert map(self.space.str_w, output) == ["y z"]
         output = self.run('''
+        $table = array("bc" => "1", "abcd" => "2", "cd" => "3");
+        echo strtr("abcabcdcd", $table);
+        echo strtr("bcd", $table);
+        ''')
+        assert map(self.space.str_w, output) == ["a123", "1d"]
+        output = self.run('''
         echo strtr("hello hi", array("h" => "x", "hello" => "y", "" => "z"));
         ''')
         assert self.space.is_w(output[0], self.space.w_False)
@@ -1010,6 +1141,53 @@ ooooord.''']
             '&lt;xyz&gt;', '3&amp;', '3&',
         ]
 
+    def test_htmlspecialchars_flags(self):
+        output = self.run('''
+        echo htmlspecialchars("clean text");
+        echo htmlspecialchars("<a href='x'>\\"&amp;\\"</a>");
+        echo htmlspecialchars("<a href='x'>\\"&amp;\\"</a>", ENT_QUOTES,
+                              "UTF-8", false);
+        echo htmlspecialchars("'\\"", ENT_NOQUOTES);
+        ''')
+        assert [self.space.str_w(w_v) for w_v in output] == [
+            'clean text',
+            "&lt;a href='x'&gt;&quot;&amp;amp;&quot;&lt;/a&gt;",
+            '&lt;a href=&#039;x&#039;&gt;&quot;&amp;&quot;&lt;/a&gt;',
+            '\'"',
+        ]
+
+    def test_htmlentities(self):
+        output = self.run('''
+        echo htmlentities("clean");
+        echo htmlentities("caf\\xc3\\xa9 <b> \\xe6\\x97\\xa5");
+        echo htmlentities("\\xe6\\x97\\xa5\\xe6\\x9c\\xac");
+        echo htmlentities("'x' & \\xe2\\x82\\xac", ENT_QUOTES);
+        ''')
+        assert [self.space.str_w(w_v) for w_v in output] == [
+            'clean', 'caf&eacute; &lt;b&gt; \xe6\x97\xa5',
+            '\xe6\x97\xa5\xe6\x9c\xac', '&#039;x&#039; &amp; &euro;',
+        ]
+
+    def test_html_decode(self):
+        output = self.run('''
+        $s = "&lt;b&gt; &amp;amp; &#60;&#x3c;&#0062; &quot;&#039;&apos; " .
+             "&nbsp;&euro;&#8364; &bogus; &#; &";
+        echo htmlspecialchars_decode($s);
+        echo htmlspecialchars_decode($s, ENT_QUOTES | ENT_HTML5);
+        echo html_entity_decode($s);
+        echo html_entity_decode($s, ENT_QUOTES);
+        echo html_entity_decode("no entities here");
+        ''')
+        assert [self.space.str_w(w_v) for w_v in output] == [
+            '<b> &amp; <<> "&#039;&apos; &nbsp;&euro;&#8364; &bogus; &#; &',
+            '<b> &amp; <<> "\'\' &nbsp;&euro;&#8364; &bogus; &#; &',
+            '<b> &amp; <<> "&#039;&apos; \xc2\xa0\xe2\x82\xac\xe2\x82\xac'
+            ' &bogus; &#; &',
+            '<b> &amp; <<> "\'&apos; \xc2\xa0\xe2\x82\xac\xe2\x82\xac'
+            ' &bogus; &#; &',
+            'no entities here',
+        ]
+
     def test_strnatcmp1(self):
         output = self.run('''
         echo strnatcmp("aBc", "abc");
@@ -0,0 +1,190 @@
+import os
+from hippy import consts
+from hippy.bcprofile import BytecodeProfile
+from testing.test_compiler import TestCompiler
+from testing.test_interpreter import BaseTestInterpreter
+
+
+class TestSuperinstructions(TestCompiler):
+    def check_fused(self, source, expected):
+        return self.check_compile(source, expected, superinstructions=True)
+
+    def test_table(self):
+        for (first, second), fused in consts.SUPERINSTRUCTIONS.items():
+            assert first != fused and second != fused
+
+    def test_assign(self):
+        bc = self.check_fused("$x = 3; $y = $x;", """
+        LOAD_CONST 0
+        STORE_VAR_DISCARD 0
+        LOAD_VAR 0
+        STORE_VAR_DISCARD 1
+        """)
+        assert bc.stackdepth == 1
+
+    def test_assign_unique(self):
+        self.check_fused("$x = array($y);", """
+        VAR_PTR 0
+        LOAD_VAR 1
+        DEREF
+        MAKE_ARRAY 1
+        STORE_UNIQUE
+        DISCARD_TOP
+        """)
+
+    def test_assign_item(self):
+        self.check_fused("$x[3] = 1;", """
+        VAR_PTR 0
+        LOAD_CONST 0
+        ITEM_PTR
+        LOAD_CONST 1
+        STORE_DISCARD
+        """)
+
+    def test_for(self):
+        bc = self.check_fused("""
+        for ($i = 0; $i < 10; $i++) {$k++;}
+        """, """
+        LOAD_CONST 0
+        STORE_VAR_DISCARD 0
+      4 CONST_VAR_BINARY_LT 1 0
+        JUMP_IF_FALSE 23
+        VAR_PTR 1
+        SUFFIX_PLUSPLUS
+        DISCARD_TOP
+        _CHECKSTACK 0
+        VAR_PTR 0
+        SUFFIX_PLUSPLUS
+        DISCARD_TOP
+        JUMP_BACKWARD 4
+     23 _CHECKSTACK 0
+        """)
+        assert bc.stackdepth == 1
+
+    def test_foreach(self):
+        bc = self.check_fused("""
+        foreach ($a as $b) {$b+1;}
+        """, """
+        LOAD_VAR 0
+        CREATE_ITER
+      3 _CHECKSTACK 1
+        NEXT_VALUE_ITER 17
+        STORE_VAR_DISCARD 1
+        CONST_VAR_BINARY_ADD 0 1
+        DISCARD_TOP
+        JUMP_BACKWARD 3
+     17 _CHECKSTACK 1
+        DISCARD_TOP
+        """)
+        assert bc.stackdepth == 2
+
+    def test_var_var_binop(self):
+        self.check_fused("echo $x + $y, $x . 'a';", """
+        VAR_VAR_BINARY_ADD 0 1
+        ECHO
+        LOAD_NAME 0
+        VAR_BINARY_CONCAT 1
+        ECHO
+        """)
+
+    def test_getitem(self):
+        self.check_fused("echo $a[$i], $b[$i][$j], $x[$y-1];", """
+        GETITEM_VAR_VAR 0 1
+        ECHO
+        GETITEM_VAR_VAR 0 2
+        LOAD_VAR_GETITEM 3
+        ECHO
+        CONST_VAR_BINARY_SUB 0 4
+        GETITEM_VAR 5
+        ECHO
+        """)
+
+    def test_not_across_jump_target(self):
+        self.check_fused("echo $a[$b ? $i : $j];", """
+        LOAD_VAR_TEMP 0
+        JUMP_IF_FALSE 13
+        LOAD_VAR 1
+        JUMP_FORWARD 15
+        DISCARD_TOP
+        LOAD_VAR 2
+        GETITEM_VAR 3
+        ECHO
+        """)
+
+    def test_inside_functions(self):
+        bc = self.check_fused("""
+        function f($a, $b) { return $a + $b; }""", "")
+        self.compare(bc.functions[0].bytecode, """
+        VAR_VAR_BINARY_ADD 1 0
+        DEREF
+        RETURN
+        LOAD_NULL
+        RETURN
+        """)
+
+    def test_lineno(self):
+        bc = self.check_fused("$x = 1;\n$y = $x + 1;\necho $a[$y];", None)
+        assert len(bc.bc_mapping) == len(bc.code)
+        assert bc.bc_mapping[0] == 1
+        assert bc.bc_mapping[len(bc.code) - 1] == 3
+
+
+class TestSuperinstructionsRun(BaseTestInterpreter):
+    def test_semantics(self):
+        with self.warnings(["Notice: Undefined variable: s"]):
+            output = self.run("""
+            $a = array(1, 2, 3);
+            $total = 0;
+            for ($i = 0; $i < 3; $i++) {
+                $total = $total + $a[$i] * 10;
+                $s = $s . $i;
+            }
+            echo $total, $s, $i - 1, $i == 3, $a[$i - 1];
+            $b = array();
+            foreach ($a as $k => $v) { $b[$k] = $v; }
+            echo $b[1];
+            """)
+        assert [self.space.str_w(o) for o in output] == [
+            '60', '012', '2', '1', '3', '2']
+
+    def test_notice_order(self):
+        with self.warnings(["Notice: Undefined variable: y",
+                            "Notice: Undefined variable: x",
+                            "Notice: Undefined variable: i",
+                            "Notice: Undefined variable: a"]):
+            self.run("""
+            echo $x + $y;
+            echo $a[$i];
+            """)
+
+
+class FakeFrame(object):
+    pass
+
+
+def test_bc_profile(tmpdir):
+    bc = None    # only needed for the two-args instructions
+    profile = BytecodeProfile()
+    frame = FakeFrame()
+    # LOAD_CONST 0; LOAD_VAR_SWAP 0; BINARY_ADD, then a jump back
+    profile.record(frame, bc, 0, 2, consts.LOAD_CONST)
+    profile.record(frame, bc, 2, 4, consts.LOAD_VAR_SWAP)
+    profile.record(frame, bc, 4, 5, consts.BINARY_ADD)
+    profile.record(frame, bc, 0, 2, consts.LOAD_CONST)
+    profile.record(FakeFrame(), bc, 2, 4, consts.LOAD_VAR_SWAP)
+    path = str(tmpdir.join('profile'))
+    fd = os.open(path, os.O_CREAT | os.O_WRONLY, 0644)
+    profile.dump(fd)
+    os.close(fd)
+    lines = open(path).read().splitlines()
+    assert lines == [
+        '# bytecodes',
+        '2 LOAD_CONST',
+        '2 LOAD_VAR_SWAP',
+        '1 BINARY_ADD',
+        '# pairs',
+        '1 LOAD_CONST LOAD_VAR_SWAP',
+        '1 LOAD_VAR_SWAP BINARY_ADD',
+        '# triples',
+        '1 LOAD_CONST LOAD_VAR_SWAP BINARY_ADD',
+    ]
@@ -0,0 +1,71 @@
+import socket
+import py
+from hippy.objspace import getspace
+from hippy.scgi import encode_scgi_request
+from hippy.worker import WorkerServer, get_script_filename
+
+
+def test_get_script_filename():
+    assert get_script_filename({'SCRIPT_FILENAME': '/srv/a.php'}) == \
+        '/srv/a.php'
+    assert get_script_filename({'DOCUMENT_ROOT': '/srv',
+                                'SCRIPT_NAME': '/b.php'}) == '/srv/b.php'
+
+
+class TestWorker(object):
+    def setup_class(cls):
+        cls.tmpdir = py.path.local.make_numbered_dir('hippy-worker')
+        cls.server = WorkerServer(getspace(), str(cls.tmpdir.join('sock')),
+                                  1)
+
+    def request(self, data):
+        ours, theirs = socket.socketpair()
+        try:
+            ours.sendall(data)
+            ours.shutdown(socket.SHUT_WR)
+            self.server.handle_connection(theirs.fileno())
+            theirs.close()
+            chunks = []
+            while True:
+                chunk = ours.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            return ''.join(chunks)
+        finally:
+            ours.close()
+
+    def test_requests_share_the_space(self):
+        script = self.tmpdir.join('index.php')
+        script.write('<?php\n'
+                     'function f() { return $_GET["x"]; }\n'
+                     'echo f(), " ", $_POST["y"];\n')
+        for x in ['1', '2']:
+            data = encode_scgi_request({
+                'SCRIPT_FILENAME': str(script),
+                'QUERY_STRING': 'x=' + x,
+                'CONTENT_TYPE': 'application/x-www-form-urlencoded'},
+                'y=post' + x)
+            response = self.request(data)
+            assert response.endswith('\r\n\r\n%s post%s' % (x, x))
+            assert 'Content-Type: text/html' in response
+        # compiled once, and f() declared again by the second request
+        space = self.server.space
+        assert str(script) in space.bytecode_cache.cached_files
+
+    def test_status_and_exit(self):
+        script = self.tmpdir.join('status.php')
+        script.write('<?php\nhttp_response_code(404);\nexit("gone");\n')
+        response = self.request(encode_scgi_request(
+            {'SCRIPT_FILENAME': str(script)}))
+        assert response.startswith('Status: 404\r\n')
+        assert response.endswith('gone')
+
+    def test_missing_script(self):
+        response = self.request(encode_scgi_request(
+            {'SCRIPT_FILENAME': str(self.tmpdir.join('missing.php'))}))
+        assert response.startswith('Status: 404 Not Found\r\n')
+
+    def test_bad_request(self):
+        response = self.request('garbage')
+        assert response.startswith('Status: 400 Bad Request\r\n')
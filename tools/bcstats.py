@@ -0,0 +1,64 @@
+#!/usr/bin/env python2.7
+#
+# Reports the bytecode size and the number of instructions of the given
+# scripts, with and without the AST optimizer (hippy/astoptimizer.py).
+
+import sys, os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def all_bytecodes(bc):
+    yield bc
+    for f in bc.functions:
+        yield f.bytecode
+    for c in bc.classes:
+        for meth in c.method_decl.values():
+            yield meth.func.bytecode
+
+
+def measure(space, filename, optimize):
+    from hippy.phpcompiler import compile_php
+
+    space.optimize_ast = optimize
+    source = open(filename).read()
+    bc = compile_php(os.path.abspath(filename), source, space)
+    size = 0
+    count = 0
+    consts = 0
+    for code in all_bytecodes(bc):
+        size += len(code.code)
+        count += code.count_instructions()
+        consts += len(code.consts)
+    return size, count, consts
+
+
+def main(filenames):
+    from hippy.objspace import getspace
+    from hippy.interpreter import Interpreter
+
+    space = getspace()
+    Interpreter(space)
+    print("%-40s %15s %15s %11s" % ("file", "bytes", "instructions",
+                                   "consts"))
+    total = [0] * 6
+    for filename in filenames:
+        try:
+            before = measure(space, filename, False)
+            after = measure(space, filename, True)
+        except Exception as e:
+            print("%-40s error: %s" % (filename, e))
+            continue
+        print("%-40s %7d->%-7d %7d->%-7d %5d->%-5d" % (
+            (filename[-40:],) + sum(zip(before, after), ())))
+        for i in range(3):
+            total[2 * i] += before[i]
+            total[2 * i + 1] += after[i]
+    print("%-40s %7d->%-7d %7d->%-7d %5d->%-5d" % (("total",) +
+                                                   tuple(total)))
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("usage: bcstats.py <script> [<script>...]")
+        sys.exit(1)
+    main(sys.argv[1:])